@@ -4,23 +4,23 @@ from __future__ import annotations
 
 import logging
 
-from browser import connect_browser_over_cdp
+from playwright.async_api import Page
+
+from ocr.pool import start_ocr_pool
 from settings.settings import BASE
+from telemetry import setup_logging, shutdown_logging, start_http_exporter, write_metrics_file
 
-from .browser_management import (
-    BrowserSessionClosedError,
-    prepare_context,
-    prepare_primary_page,
-)
+from .chat_navigation import ChatNavigationError, switch_to_chat
+from .connection_supervisor import ConnectionSupervisor
 from .login_state import LoginState, monitor_login_state
-from .chat_navigation import ChatNavigationError, open_chat
+from .multi_chat import build_cursors, monitor_chats
+from .session_housekeeping import build_housekeeper
 from .whatsapp_processing import (
-    CHAT_NAME,
+    build_chat_targets,
     ensure_directories,
-    init_csv,
-    load_cache,
-    monitor_conversation,
+    follow_conversation,
 )
+from .whatsapp_processing.constants import LOG_FILE
 
 logger = logging.getLogger(__name__)
 
@@ -30,89 +30,75 @@ async def run(settings=None) -> None:  # noqa: D401 - firma heredada
 
     del settings  # parámetro reservado para compatibilidad
 
-    logging.basicConfig(level=logging.INFO)
+    ensure_directories()
+    setup_logging(LOG_FILE)
+    # Antes de abrir más hilos: los procesos de OCR se crean con ``fork``.
+    ocr_pool = start_ocr_pool()
     logger.info("Conectando con Chrome existente mediante CDP...")
 
-    ensure_directories()
-    init_csv()
-    cache_state = load_cache()
-    processed_ids, last_id, last_signature = cache_state
-    previous_cached_id = cache_state.previous_id
-    
+    start_http_exporter()
+    chat_targets = build_chat_targets()
+    primary_target = chat_targets[0]
+    multi_chat = len(chat_targets) > 1
+
+    # Los puntos de control viven fuera de la sesión de captura: si Chrome se
+    # desconecta, la sesión se relanza con ellos sin repetir el barrido inicial.
+    cursors = build_cursors(chat_targets)
+
+    async def _capture_session(page: Page) -> None:
+        if not page.url.startswith(BASE):
+            await page.goto(f"{BASE}/", wait_until="domcontentloaded")
+        logger.info("WhatsApp Web abierto. Supervisando el estado de inicio de sesión...")
+
+        state = await monitor_login_state(page, logger_instance=logger)
+        if state != LoginState.LOGGED_IN:
+            return
+        logger.info("Sesión autenticada en WhatsApp Web.")
+
+        if multi_chat:
+            await monitor_chats(page, chat_targets, cursors=cursors)
+            return
+
+        try:
+            await switch_to_chat(page, primary_target.name)
+        except ChatNavigationError as navigation_error:
+            logger.error(str(navigation_error))
+            return
+        logger.info(
+            "Navegación al chat '%s' finalizada correctamente.",
+            primary_target.name,
+        )
+        await follow_conversation(page, cursors[primary_target.name])
+
     # Intentamos conectar con una instancia existente de Chrome mediante CDP.
-    browser_connection = await connect_browser_over_cdp()
-    if browser_connection is None:
+    # Sin recargas mientras algún chat recupera historial: tras recargar, el
+    # relleno volvería a empezar desde el final del chat.
+    housekeeper = build_housekeeper(
+        defer_reload=lambda: any(cursor.backfilling for cursor in cursors.values())
+    )
+    supervisor = ConnectionSupervisor(housekeeper=housekeeper)
+    if not await supervisor.connect():
         logger.error(
             "No se pudo conectar con el navegador Chrome en modo depuración remota. "
             "Asegúrate de ejecutar scripts/open_chrome_debug.ps1 antes de iniciar la app."
         )
+        if ocr_pool is not None:
+            ocr_pool.close()
         return
 
     logger.info("Conexión establecida con Chrome mediante CDP.")
 
-    # Normalizamos el contexto y la página principal para garantizar un entorno limpio.
-    attempt = 0
-    max_attempts = 2
-    while True:
-        attempt += 1
-        browser = browser_connection.browser
-        try:
-            context = await prepare_context(browser)
-            context, page = await prepare_primary_page(context)
-            break
-        except BrowserSessionClosedError:
-            logger.warning(
-                "Se perdió la conexión con Chrome. Intentando reconectar (%d/%d)...",
-                attempt,
-                max_attempts,
-            )
-            await browser_connection.close()
-            browser_connection = None
-            if attempt >= max_attempts:
-                logger.error(
-                    "No fue posible restablecer la sesión con Chrome en modo depuración."
-                )
-                return
-
-            new_connection = await connect_browser_over_cdp()
-            if new_connection is None:
-                logger.error(
-                    "No se pudo reconectar con el navegador Chrome en modo depuración remota."
-                )
-                return
-            browser_connection = new_connection
-            logger.info("Reconexión con Chrome exitosa.")
-            continue
-
-    await page.goto(f"{BASE}/", wait_until="domcontentloaded")
-    logger.info("WhatsApp Web abierto. Supervisando el estado de inicio de sesión...")
-
     try:
-        state = await monitor_login_state(page, logger_instance=logger)
-        if state == LoginState.LOGGED_IN:
-            logger.info("Sesión autenticada en WhatsApp Web.")
-            try:
-                await open_chat(page, CHAT_NAME)
-            except ChatNavigationError as navigation_error:
-                logger.error(str(navigation_error))
-            else:
-                logger.info(
-                    "Navegación al chat '%s' finalizada correctamente.", CHAT_NAME
-                )
-                try:
-                    await monitor_conversation(
-                        page,
-                        processed_ids,
-                        last_id,
-                        last_signature,
-                        previous_cached_id=previous_cached_id,
-                    )
-                except KeyboardInterrupt:
-                    logger.info("Captura detenida por el usuario a través de Ctrl+C.")
+        await supervisor.run(_capture_session)
+    except KeyboardInterrupt:
+        logger.info("Captura detenida por el usuario a través de Ctrl+C.")
     finally:
         logger.info("Monitor de sesión detenido. Chrome permanecerá abierto.")
-        if browser_connection is not None:
-            await browser_connection.close()
+        await supervisor.close()
+        if ocr_pool is not None:
+            ocr_pool.close()
+        write_metrics_file()
         logger.info("Trabajo terminado.")
+        shutdown_logging()
 
 __all__ = ["run"]
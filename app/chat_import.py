@@ -0,0 +1,336 @@
+"""Importa una exportación de chat de WhatsApp sin abrir el navegador.
+
+Sirve para recuperar meses de historial: se lee la transcripción, se
+clasifican los mensajes con las mismas reglas que la captura en vivo y sólo
+los comprobantes pasan por OCR, repartidos entre todos los núcleos.
+
+Uso::
+
+    python -m app.chat_import "Chat de WhatsApp con Comprobantes Eunoia.zip"
+    python -m app.chat_import chat.txt --media adjuntos.zip --no-sheets
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import zipfile
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Sequence, Set, Tuple
+
+from ocr.pool import OcrWorkerPool
+from telemetry import count
+
+from .whatsapp_processing.cache import ProcessedIds, load_cache, save_cache
+from .whatsapp_processing.chat_export import (
+    ChatExport,
+    ExportMessage,
+    content_key,
+    parse_export_lines,
+)
+from .whatsapp_processing.chats import ChatTarget, chat_target
+from .whatsapp_processing.classification import classify_snapshot
+from .whatsapp_processing.constants import CHAT_NAME, IMG_DIR
+from .whatsapp_processing.csv_export import append_csv, init_csv
+from .whatsapp_processing.image_store import get_image_store
+from .whatsapp_processing.jsonl_export import append_jsonl
+from .whatsapp_processing.partitions import PARTITIONS_DIR, months_of, write_partitions
+from .whatsapp_processing.payment_index import PaymentIndex, get_payment_index
+from .whatsapp_processing.rejections import RejectionReason
+from .whatsapp_processing.sheets_export import export_to_sheets
+from .whatsapp_processing.voucher_store import VoucherStore, get_voucher_store
+
+logger = logging.getLogger(__name__)
+
+# (origen, miembro del zip o "")
+Attachment = Tuple[str, str]
+
+
+@dataclass
+class ImportSummary:
+    """Resultado de una importación."""
+
+    messages: int = 0
+    duplicates: int = 0
+    imported: int = 0
+    sheets_failed: int = 0
+    rejected: Counter = field(default_factory=Counter)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "messages": self.messages,
+            "duplicates": self.duplicates,
+            "imported": self.imported,
+            "sheets_failed": self.sheets_failed,
+            "rejected": dict(self.rejected),
+        }
+
+
+def load_content_keys(jsonl_path: str | Path) -> Set[str]:
+    """Huellas (hora, remitente, texto) de los registros ya exportados."""
+
+    keys: Set[str] = set()
+    try:
+        handle = open(jsonl_path, "r", encoding="utf-8")
+    except FileNotFoundError:
+        return keys
+    with handle:
+        for line in handle:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, dict):
+                keys.add(
+                    content_key(
+                        str(record.get("timestamp", "") or ""),
+                        str(record.get("sender", "") or ""),
+                        str(record.get("raw_text", "") or ""),
+                    )
+                )
+    return keys
+
+
+def _store_attachment(
+    data_id: str, attachment: Attachment, suffix: str, archive: zipfile.ZipFile | None = None
+) -> str:
+    """Copia el adjunto al almacén de imágenes de ``IMG_DIR`` y devuelve su ruta.
+
+    Corre en el proceso principal, que es el único que escribe el índice del
+    almacén; un adjunto repetido en la exportación no se vuelve a copiar.
+    ``archive`` es el zip de adjuntos ya abierto (abrirlo por cada adjunto
+    relee su directorio central cada vez).
+    """
+
+    source, member = attachment
+    if member:
+        if archive is not None:
+            data = archive.read(member)
+        else:
+            with zipfile.ZipFile(source) as archive:
+                data = archive.read(member)
+    else:
+        data = Path(source).read_bytes()
+    return str(get_image_store(IMG_DIR).put(data_id, data, suffix))
+
+
+def _read_image(image_path: str) -> Dict[str, str]:
+    """Pasa un adjunto ya guardado por OCR (corre en un proceso hijo)."""
+
+    # Import diferido: ``--dry-run`` y el proceso principal no cargan los motores.
+    from ocr.ocr import read_voucher
+
+    try:
+        return read_voucher(image_path).to_record()
+    except Exception:
+        logger.exception("No se pudo leer el comprobante con OCR (%s)", image_path)
+        return {}
+
+
+def _read_images(image_paths: Sequence[str], workers: int) -> Iterator[Dict[str, str]]:
+    """Procesa los adjuntos en paralelo y devuelve los resultados en orden."""
+
+    if workers <= 1 or len(image_paths) <= 1:
+        yield from map(_read_image, image_paths)
+        return
+    chunksize = max(1, len(image_paths) // (workers * 4))
+    # Los modelos se cargan una vez aquí y los procesos los comparten.
+    with OcrWorkerPool(workers) as pool:
+        yield from pool.map(_read_image, image_paths, chunksize=chunksize)
+
+
+def _select_candidates(
+    export: ChatExport,
+    messages: Iterable[ExportMessage],
+    processed_ids: ProcessedIds,
+    known_keys: Set[str],
+    summary: ImportSummary,
+) -> List[Tuple[ExportMessage, Dict[str, str], Attachment]]:
+    candidates = []
+    for message in messages:
+        summary.messages += 1
+        data_id = message.data_id
+        key = content_key(message.timestamp, message.sender, message.text)
+        if data_id in processed_ids or key in known_keys:
+            summary.duplicates += 1
+            count("wa_import_messages_total", result="duplicate")
+            continue
+        known_keys.add(key)
+
+        location = export.locate(message.attachment) if message.has_image else None
+        reason, fields = classify_snapshot(message.snapshot(media_available=location is not None))
+        if reason is None and location is None:
+            reason = RejectionReason.NO_BLOB_IMAGE
+        if reason is not None:
+            summary.rejected[reason.value] += 1
+            count("wa_import_messages_total", result=reason.value)
+            continue
+
+        candidates.append((message, fields, location))
+    return candidates
+
+
+def import_chat_export(
+    path: str | Path,
+    *,
+    media: str | Path | None = None,
+    target: ChatTarget | None = None,
+    workers: int | None = None,
+    sheets: bool = True,
+    dry_run: bool = False,
+    day_first: bool = True,
+    payments: PaymentIndex | None = None,
+    vouchers: VoucherStore | None = None,
+    partitions: str | Path | None = None,
+) -> ImportSummary:
+    """Importa la exportación ``path`` en los archivos de ``target``.
+
+    Los mensajes ya capturados (por ``data_id`` o por hora, remitente y
+    texto) se omiten, así que importar dos veces el mismo archivo, o un chat
+    que la captura en vivo ya recorrió, no duplica filas. El punto de
+    reanudación de la captura en vivo no cambia. Con ``payments`` los pagos
+    repetidos se marcan igual que en la captura en vivo, con ``vouchers``
+    los registros también se guardan en la base local y con ``partitions``
+    se actualizan al final las particiones mensuales de esa carpeta (también
+    las de meses cerrados en los que cayó algún mensaje importado).
+    """
+
+    target = target or chat_target(CHAT_NAME)
+    export = ChatExport(path, media)
+    messages = parse_export_lines(export.read_lines(), day_first=day_first)
+
+    state = load_cache(
+        cache_path=str(target.cache_path),
+        csv_path=str(target.csv_path),
+        jsonl_path=str(target.jsonl_path),
+        use_cache_file=True,
+    )
+    known_keys = load_content_keys(target.jsonl_path)
+    summary = ImportSummary()
+    candidates = _select_candidates(export, messages, state.processed_ids, known_keys, summary)
+    if dry_run or not candidates:
+        return summary
+
+    target.csv_path.parent.mkdir(parents=True, exist_ok=True)
+    init_csv(str(target.csv_path))
+    workers = max(1, workers or os.cpu_count() or 1)
+    archive = zipfile.ZipFile(export.media) if export.media_is_zip else None
+    try:
+        image_paths = [
+            _store_attachment(message.data_id, attachment, Path(message.attachment).suffix, archive)
+            for message, _fields, attachment in candidates
+        ]
+    finally:
+        if archive is not None:
+            archive.close()
+    try:
+        for (message, fields, _attachment), image_path, ocr_fields in zip(
+            candidates, image_paths, _read_images(image_paths, workers)
+        ):
+            record: Dict[str, str] = {
+                "data_id": message.data_id,
+                "timestamp": message.timestamp,
+                "sender": message.sender,
+                "raw_text": message.text,
+                "img_src_blob": message.media_ref,
+                "img_src_data": "",
+                "img_file": image_path,
+            }
+            record.update(fields)
+            record.update(ocr_fields)
+            if payments is not None:
+                record.update(payments.lookup(record).flags())
+
+            append_csv(record, str(target.csv_path))
+            append_jsonl(record, str(target.jsonl_path))
+            if payments is not None:
+                payments.add(record)
+            if vouchers is not None:
+                # Como en la captura en vivo: la base local es un índice más;
+                # el registro ya quedó en CSV/JSONL.
+                try:
+                    vouchers.upsert(record, target.name)
+                except sqlite3.Error:
+                    logger.exception(
+                        "No se pudo guardar el comprobante en la base local (data-id=%s)",
+                        message.data_id,
+                    )
+            if sheets:
+                # Como en la captura en vivo: una caída de Sheets no detiene la
+                # importación; el registro ya quedó en CSV/JSONL.
+                try:
+                    export_to_sheets(record)
+                except Exception:
+                    logger.warning(
+                        "No se pudo registrar en Google Sheets (data-id=%s)",
+                        message.data_id,
+                        exc_info=True,
+                    )
+                    summary.sheets_failed += 1
+            state.processed_ids.add(message.data_id)
+            summary.imported += 1
+            count("wa_import_messages_total", result="imported")
+    finally:
+        save_cache(
+            state.processed_ids,
+            state.last_id,
+            state.last_signature,
+            cache_path=str(target.cache_path),
+        )
+    if partitions is not None and summary.imported:
+        # Los registros ya están en el JSONL: una falla aquí se corrige luego
+        # con ``reports --actualizar``. El historial suele caer en meses ya
+        # cerrados, así que se reescriben también los meses importados.
+        try:
+            imported_months = months_of(
+                message.timestamp
+                for message, _fields, _attachment in candidates
+                if message.data_id in state.processed_ids
+            )
+            write_partitions(root=partitions, months=imported_months)
+        except Exception:
+            logger.warning("No se pudieron actualizar las particiones mensuales", exc_info=True)
+    return summary
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("export", help="archivo .zip o .txt exportado desde WhatsApp")
+    parser.add_argument("--media", help="zip o carpeta con los adjuntos (si no están junto al .txt)")
+    parser.add_argument("--chat", default=CHAT_NAME, help="chat cuyos archivos de salida se usan")
+    parser.add_argument("--workers", type=int, default=None, help="procesos de OCR (por defecto, uno por núcleo)")
+    parser.add_argument("--no-sheets", action="store_true", help="no enviar los registros a Google Sheets")
+    parser.add_argument("--dry-run", action="store_true", help="sólo contar, sin OCR ni escritura")
+    parser.add_argument(
+        "--month-first", action="store_true", help="las fechas de la exportación vienen como M/D/AA"
+    )
+    args = parser.parse_args(argv)
+
+    summary = import_chat_export(
+        args.export,
+        media=args.media,
+        target=chat_target(args.chat),
+        workers=args.workers,
+        sheets=not args.no_sheets,
+        dry_run=args.dry_run,
+        day_first=not args.month_first,
+        payments=None if args.dry_run else get_payment_index(),
+        vouchers=None if args.dry_run else get_voucher_store(),
+        partitions=None if args.dry_run else PARTITIONS_DIR,
+    )
+    print(f"📥 Importación terminada: {summary.imported} nuevos, {summary.duplicates} ya registrados.")
+    if summary.sheets_failed:
+        print(f"⚠️ {summary.sheets_failed} registro(s) no se pudieron enviar a Google Sheets.")
+    print(json.dumps(summary.to_dict(), ensure_ascii=False, indent=2))
+
+
+__all__ = ["ImportSummary", "import_chat_export", "load_content_keys", "main"]
+
+
+if __name__ == "__main__":
+    main()
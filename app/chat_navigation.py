@@ -2,7 +2,10 @@
 
 from __future__ import annotations
 
+import json
 import logging
+from dataclasses import dataclass
+from typing import List, Sequence
 
 from playwright.async_api import Page, TimeoutError
 
@@ -13,12 +16,50 @@ _CHAT_INPUT_SELECTOR = "div[role='textbox']"
 _FIRST_RESULT_XPATH = (
     "//*[@id='pane-side']/div/div/div/div[2]/div/div/div/div[2]/div[1]/div[1]/span/span"
 )
+_SIDE_PANE_SELECTOR = "#pane-side"
+_SIDE_PANE_SWITCH_TIMEOUT_MS = 3_000
+
+# Lectura del panel lateral en una sola llamada: nombre, mensajes sin leer y
+# si la fila corresponde al chat abierto.
+_SIDE_PANE_SNAPSHOT_JS = """(pane) => {
+    const rows = pane.querySelectorAll("div[role='listitem'], div[role='row']");
+    const seen = new Set();
+    const entries = [];
+    for (const row of rows) {
+        const title = row.querySelector('span[title]');
+        if (!title) continue;
+        const name = (title.getAttribute('title') || '').trim();
+        if (!name || seen.has(name)) continue;
+        seen.add(name);
+        let unread = 0;
+        const badge = row.querySelector(
+            "span[aria-label*='no leído' i], span[aria-label*='unread' i]"
+        );
+        if (badge) {
+            const value = parseInt((badge.textContent || '').replace(/\\D+/g, ''), 10);
+            unread = Number.isFinite(value) && value > 0 ? value : 1;
+        }
+        const selected = row.getAttribute('aria-selected') === 'true'
+            || !!row.querySelector("[aria-selected='true']");
+        entries.push({ name, unread, selected });
+    }
+    return entries;
+}"""
 
 
 class ChatNavigationError(RuntimeError):
     """Indica que no se pudo abrir el chat solicitado."""
 
 
+@dataclass(frozen=True)
+class SidePaneChat:
+    """Fila del panel lateral de chats."""
+
+    name: str
+    unread: int = 0
+    selected: bool = False
+
+
 async def open_chat(page: Page, chat_name: str) -> None:
     """Localiza y abre un chat por nombre dentro de WhatsApp Web."""
 
@@ -39,4 +80,68 @@ async def open_chat(page: Page, chat_name: str) -> None:
     logger.info("Chat '%s' abierto correctamente.", chat_name)
 
 
-__all__ = ["ChatNavigationError", "open_chat"]
\ No newline at end of file
+async def read_side_pane(page: Page) -> List[SidePaneChat]:
+    """Lee los chats visibles del panel lateral en una sola evaluación."""
+
+    try:
+        raw_entries = await page.locator(_SIDE_PANE_SELECTOR).first.evaluate(
+            _SIDE_PANE_SNAPSHOT_JS
+        )
+    except Exception:  # pragma: no cover - depende del estado del DOM
+        return []
+
+    entries: List[SidePaneChat] = []
+    for raw in raw_entries or []:
+        if not isinstance(raw, dict) or not raw.get("name"):
+            continue
+        entries.append(
+            SidePaneChat(
+                name=str(raw["name"]),
+                unread=int(raw.get("unread") or 0),
+                selected=bool(raw.get("selected")),
+            )
+        )
+    return entries
+
+
+def chats_with_activity(
+    entries: Sequence[SidePaneChat], watched: Sequence[str]
+) -> List[str]:
+    """Filtra, en el orden de ``watched``, los chats con mensajes sin leer."""
+
+    unread = {entry.name for entry in entries if entry.unread > 0}
+    return [name for name in watched if name in unread]
+
+
+async def switch_to_chat(page: Page, chat_name: str) -> None:
+    """Abre el chat pulsando su fila del panel lateral.
+
+    Si el chat no está en la lista visible se recurre a la búsqueda clásica de
+    :func:`open_chat`.
+    """
+
+    quoted = json.dumps(chat_name, ensure_ascii=False)
+    title = page.locator(f"{_SIDE_PANE_SELECTOR} span[title={quoted}]").first
+    header = page.locator(f"#main header span[title={quoted}]").first
+    try:
+        if await title.count() > 0:
+            await title.click(timeout=_SIDE_PANE_SWITCH_TIMEOUT_MS)
+            await header.wait_for(
+                state="attached", timeout=_SIDE_PANE_SWITCH_TIMEOUT_MS
+            )
+            logger.debug("Chat '%s' abierto desde el panel lateral.", chat_name)
+            return
+    except Exception:  # pragma: no cover - interacción con la UI
+        logger.debug("No se pudo abrir '%s' desde el panel lateral.", chat_name)
+
+    await open_chat(page, chat_name)
+
+
+__all__ = [
+    "ChatNavigationError",
+    "SidePaneChat",
+    "chats_with_activity",
+    "open_chat",
+    "read_side_pane",
+    "switch_to_chat",
+]
\ No newline at end of file
@@ -0,0 +1,216 @@
+"""Supervisión de la sesión CDP: sondeo de salud y reconexión con backoff."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+from typing import Awaitable, Callable
+
+from playwright.async_api import BrowserContext, Error as PlaywrightError, Page
+from playwright._impl._errors import TargetClosedError
+
+from browser import connect_browser_over_cdp
+from browser.cdp import BrowserConnection
+
+from .browser_management import (
+    BrowserSessionClosedError,
+    prepare_context,
+    prepare_primary_page,
+)
+from .session_housekeeping import SessionHousekeeper
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PROBE_INTERVAL_SECONDS = 5.0
+HEALTH_PROBE_TIMEOUT_SECONDS = 3.0
+HEALTH_PROBE_MAX_FAILURES = 2
+RECONNECT_MAX_ATTEMPTS = 8
+RECONNECT_BASE_DELAY_SECONDS = 0.5
+RECONNECT_MAX_DELAY_SECONDS = 15.0
+
+_DISCONNECT_MARKERS = (
+    "target closed",
+    "target page, context or browser has been closed",
+    "browser has been closed",
+    "connection closed",
+    "browser closed",
+    "websocket",
+)
+
+CaptureSession = Callable[[Page], Awaitable[None]]
+
+
+def is_disconnect_error(error: BaseException) -> bool:
+    """Indica si la excepción corresponde a una pérdida de la sesión CDP."""
+
+    if isinstance(error, (BrowserSessionClosedError, TargetClosedError)):
+        return True
+    if isinstance(error, PlaywrightError):
+        message = str(error).lower()
+        return any(marker in message for marker in _DISCONNECT_MARKERS)
+    return False
+
+
+def backoff_delay(attempt: int) -> float:
+    """Retardo exponencial con jitter para el intento ``attempt`` (desde 1)."""
+
+    delay = RECONNECT_BASE_DELAY_SECONDS * (2 ** max(attempt - 1, 0))
+    delay = min(delay, RECONNECT_MAX_DELAY_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+async def cdp_health_probe(
+    page: Page, *, timeout: float = HEALTH_PROBE_TIMEOUT_SECONDS
+) -> bool:
+    """Sondeo liviano: una evaluación trivial con tiempo límite."""
+
+    if page.is_closed():
+        return False
+    try:
+        return await asyncio.wait_for(page.evaluate("1"), timeout) == 1
+    except Exception:
+        return False
+
+
+class ConnectionSupervisor:
+    """Mantiene viva la conexión con Chrome y relanza la captura tras caídas.
+
+    La sesión de captura recibe la página activa; sus puntos de control deben
+    vivir fuera de ella (por ejemplo en un ``CaptureCursor``) para que, tras
+    reconectar, se reanude sin repetir el barrido inicial.
+
+    Con un ``housekeeper`` la pestaña además se recarga cuando su memoria o
+    su DOM superan los umbrales: la sesión se cancela, se recarga la página y
+    se relanza sobre ella igual que tras una reconexión.
+    """
+
+    def __init__(self, *, housekeeper: SessionHousekeeper | None = None) -> None:
+        self.connection: BrowserConnection | None = None
+        self.context: BrowserContext | None = None
+        self.page: Page | None = None
+        self.housekeeper = housekeeper
+        self.reconnections = 0
+
+    async def connect(self, *, max_attempts: int = RECONNECT_MAX_ATTEMPTS) -> bool:
+        """Conecta (o reconecta) con Chrome reintentando con backoff exponencial."""
+
+        await self._drop_connection()
+        for attempt in range(1, max_attempts + 1):
+            connection = await connect_browser_over_cdp()
+            if connection is not None:
+                try:
+                    context = await prepare_context(connection.browser)
+                    context, page = await prepare_primary_page(context)
+                except BrowserSessionClosedError:
+                    await connection.close()
+                except PlaywrightError as error:
+                    logger.warning("No se pudo preparar la pestaña: %s", error)
+                    await connection.close()
+                else:
+                    self.connection = connection
+                    self.context = context
+                    self.page = page
+                    return True
+
+            if attempt < max_attempts:
+                delay = backoff_delay(attempt)
+                logger.warning(
+                    "Chrome no responde. Reintentando en %.1f s (%d/%d)...",
+                    delay,
+                    attempt,
+                    max_attempts,
+                )
+                await asyncio.sleep(delay)
+
+        logger.error("No fue posible restablecer la sesión con Chrome en modo depuración.")
+        return False
+
+    async def close(self) -> None:
+        """Cierra la conexión CDP sin finalizar Chrome."""
+
+        await self._drop_connection()
+
+    async def run(self, session: CaptureSession) -> None:
+        """Ejecuta ``session`` y la relanza tras cada desconexión detectada."""
+
+        while True:
+            if self.page is None and not await self.connect():
+                return
+
+            page = self.page
+            tasks = []
+            if self.housekeeper is not None:
+                await self.housekeeper.install(page)
+                tasks.append(asyncio.create_task(self.housekeeper.watch(page)))
+            capture = asyncio.create_task(session(page))
+            probe = asyncio.create_task(self._probe_until_failure(page))
+            tasks += [capture, probe]
+            try:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in tasks:
+                    if not task.done():
+                        task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+            if capture not in done and probe not in done and await self._reload(page, tasks[0]):
+                continue
+
+            if capture in done and not capture.cancelled():
+                error = capture.exception()
+                if error is None:
+                    return
+                if not is_disconnect_error(error):
+                    raise error
+                logger.warning("Se perdió la sesión de Chrome durante la captura: %s", error)
+            elif probe in done:
+                logger.warning("El sondeo de salud CDP falló; se reconectará.")
+
+            self.reconnections += 1
+            self.page = None
+            if not await self.connect():
+                return
+            logger.info("Reconexión con Chrome exitosa (%d).", self.reconnections)
+
+    async def _reload(self, page: Page, watch: asyncio.Task) -> bool:
+        """Recarga la pestaña que pidió el mantenimiento; ``False`` si hay que reconectar."""
+
+        reason = watch.result()
+        logger.warning("Recargando WhatsApp Web (%s); la captura se reanudará desde el caché.", reason)
+        try:
+            await self.housekeeper.reload(page)
+        except PlaywrightError as error:
+            logger.warning("No se pudo recargar la pestaña: %s", error)
+            return False
+        logger.info("Pestaña recargada (%d).", self.housekeeper.reloads)
+        return True
+
+    async def _probe_until_failure(self, page: Page) -> None:
+        """Sondea la página periódicamente y retorna tras fallos consecutivos."""
+
+        failures = 0
+        while True:
+            await asyncio.sleep(HEALTH_PROBE_INTERVAL_SECONDS)
+            browser = None if self.connection is None else self.connection.browser
+            healthy = (browser is None or browser.is_connected()) and await cdp_health_probe(
+                page
+            )
+            failures = 0 if healthy else failures + 1
+            if failures >= HEALTH_PROBE_MAX_FAILURES:
+                return
+
+    async def _drop_connection(self) -> None:
+        if self.connection is not None:
+            await self.connection.close()
+        self.connection = None
+        self.context = None
+        self.page = None
+
+
+__all__ = [
+    "ConnectionSupervisor",
+    "backoff_delay",
+    "cdp_health_probe",
+    "is_disconnect_error",
+]
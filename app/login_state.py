@@ -3,9 +3,10 @@
 from __future__ import annotations
 
 import asyncio
+import json
 import logging
 from enum import Enum
-from typing import Sequence
+from typing import Dict, Sequence
 
 from playwright.async_api import Error as PlaywrightError, Locator, Page
 
@@ -66,6 +67,60 @@ async def detect_login_state(
     return LoginState.UNKNOWN
 
 
+async def wait_for_login_state(
+    page: Page,
+    *,
+    timeout: float,
+    ignore: LoginState | None = None,
+    prompt_texts: Sequence[str] = DEFAULT_LOGIN_PROMPT_TEXTS,
+    logged_in_xpaths: Sequence[str] = DEFAULT_LOGGED_IN_XPATHS,
+) -> LoginState:
+    """Espera a que aparezca algún indicador de estado de sesión.
+
+    Lanza en paralelo un ``wait_for_selector`` por cada indicador y devuelve el
+    estado del primero que se vuelva visible. Los indicadores de ``ignore`` no
+    se esperan (así no se reporta de inmediato un estado ya conocido). Si nada
+    aparece antes de ``timeout`` segundos devuelve ``LoginState.UNKNOWN``.
+    """
+
+    selectors: Dict[str, LoginState] = {}
+    if ignore != LoginState.LOGGED_IN:
+        for xpath in logged_in_xpaths:
+            selectors[f"xpath={xpath}"] = LoginState.LOGGED_IN
+    if ignore != LoginState.LOGGED_OUT:
+        for text in prompt_texts:
+            selectors[f"text={json.dumps(text, ensure_ascii=False)}"] = LoginState.LOGGED_OUT
+
+    if not selectors:
+        return LoginState.UNKNOWN
+
+    # Playwright interpreta ``timeout=0`` como espera infinita.
+    timeout_ms = max(timeout * 1000, 1.0)
+    waiters: Dict[asyncio.Task, LoginState] = {
+        asyncio.create_task(
+            page.wait_for_selector(selector, state="visible", timeout=timeout_ms)
+        ): state
+        for selector, state in selectors.items()
+    }
+
+    pending = set(waiters)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if not task.cancelled() and task.exception() is None:
+                    return waiters[task]
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    return LoginState.UNKNOWN
+
+
 async def monitor_login_state(
     page: Page,
     *,
@@ -102,7 +157,16 @@ async def monitor_login_state(
             prompt_task = None
 
     while True:
-        state = await detect_login_state(page)
+        if last_state is None:
+            state = await detect_login_state(page)
+        else:
+            # En lugar de dormir un intervalo fijo esperamos a que cambie el
+            # estado: el resultado llega apenas aparece el indicador.
+            state = await wait_for_login_state(
+                page, timeout=check_interval, ignore=last_state
+            )
+            if state == LoginState.UNKNOWN:
+                state = await detect_login_state(page)
         if state != last_state:
             if state == LoginState.LOGGED_IN:
                 logger_to_use.info("Te has logueado correctamente.")
@@ -122,9 +186,6 @@ async def monitor_login_state(
         else:
             await _stop_prompt()
 
-        # Esperamos el intervalo configurado antes de volver a comprobar el estado.
-        await asyncio.sleep(check_interval)
-
 
 __all__ = [
     "DEFAULT_LOGGED_IN_XPATHS",
@@ -132,4 +193,5 @@ __all__ = [
     "LoginState",
     "detect_login_state",
     "monitor_login_state",
+    "wait_for_login_state",
 ]
\ No newline at end of file
@@ -0,0 +1,141 @@
+"""Captura alternada de varios chats de WhatsApp Web en una misma sesión CDP."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Dict, List, Sequence
+
+from playwright.async_api import Page
+
+from .chat_navigation import (
+    ChatNavigationError,
+    SidePaneChat,
+    chats_with_activity,
+    read_side_pane,
+    switch_to_chat,
+)
+from .whatsapp_processing import (
+    CaptureCursor,
+    ChatTarget,
+    capture_pass,
+    start_capture,
+)
+from .whatsapp_processing.constants import MULTI_CHAT_PASSES_PER_VISIT, POLL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def build_cursors(targets: Sequence[ChatTarget]) -> Dict[str, CaptureCursor]:
+    """Carga el caché de cada chat y crea su punto de control en memoria."""
+
+    return {target.name: CaptureCursor.from_target(target) for target in targets}
+
+
+async def visit_chat(
+    page: Page,
+    cursor: CaptureCursor,
+    *,
+    passes: int = MULTI_CHAT_PASSES_PER_VISIT,
+    verbose_print: bool = True,
+) -> int:
+    """Ejecuta el barrido inicial (una sola vez) y algunas pasadas de escucha."""
+
+    target = cursor.target
+    max_new = None if target is None else target.max_new_per_pass
+    new_count = 0
+    if not cursor.swept:
+        new_count += await start_capture(page, cursor, verbose_print=verbose_print)
+        cursor.save()
+
+    for index in range(max(passes, 1)):
+        new_count += await capture_pass(
+            page, cursor, verbose_print=verbose_print, max_new=max_new
+        )
+        if index + 1 < passes:
+            await asyncio.sleep(POLL_SECONDS)
+    return new_count
+
+
+def select_chats_to_visit(
+    targets: Sequence[ChatTarget],
+    cursors: Dict[str, CaptureCursor],
+    entries: Sequence[SidePaneChat],
+) -> List[ChatTarget]:
+    """Decide qué chats merecen una visita en esta ronda.
+
+    Se visitan los chats que aún no hicieron su barrido inicial, los que
+    muestran mensajes sin leer en el panel lateral y el chat abierto, que no
+    recibe indicador de no leídos aunque lleguen mensajes nuevos.
+    """
+
+    names = [target.name for target in targets]
+    with_activity = set(chats_with_activity(entries, names))
+    selected = {entry.name for entry in entries if entry.selected}
+    return [
+        target
+        for target in targets
+        if not cursors[target.name].swept
+        or target.name in with_activity
+        or target.name in selected
+    ]
+
+
+async def monitor_chats(
+    page: Page,
+    targets: Sequence[ChatTarget],
+    *,
+    passes_per_visit: int = MULTI_CHAT_PASSES_PER_VISIT,
+    verbose_print: bool = True,
+    cursors: Dict[str, CaptureCursor] | None = None,
+) -> None:
+    """Atiende los chats configurados sobre la misma pestaña.
+
+    WhatsApp Web sólo mantiene activa una pestaña por perfil, por lo que los
+    chats se atienden por turnos. En cada ronda se lee el panel lateral y sólo
+    se entra a los chats con actividad nueva; cada visita procesa como máximo
+    ``max_new_per_pass`` comprobantes por pasada antes de ceder el turno.
+
+    ``cursors`` permite reanudar con los puntos de control en memoria de una
+    sesión anterior (por ejemplo, tras reconectar con Chrome).
+    """
+
+    if cursors is None:
+        cursors = build_cursors(targets)
+    logger.info(
+        "Captura multi-chat iniciada para: %s",
+        ", ".join(target.name for target in targets),
+    )
+
+    current_chat = ""
+    try:
+        while True:
+            entries = await read_side_pane(page)
+            for target in select_chats_to_visit(targets, cursors, entries):
+                if target.name != current_chat:
+                    try:
+                        await switch_to_chat(page, target.name)
+                    except ChatNavigationError as navigation_error:
+                        logger.error(str(navigation_error))
+                        continue
+                    current_chat = target.name
+
+                new_count = await visit_chat(
+                    page,
+                    cursors[target.name],
+                    passes=passes_per_visit,
+                    verbose_print=verbose_print,
+                )
+                if new_count:
+                    logger.info(
+                        "Chat '%s': %d comprobante(s) nuevo(s) en esta visita.",
+                        target.name,
+                        new_count,
+                    )
+            await asyncio.sleep(POLL_SECONDS)
+    finally:
+        for cursor in cursors.values():
+            cursor.save()
+
+
+__all__ = ["build_cursors", "monitor_chats", "select_chats_to_visit", "visit_chat"]
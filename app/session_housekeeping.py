@@ -0,0 +1,224 @@
+"""Mantenimiento de la pestaña de WhatsApp Web durante capturas de varios días.
+
+Con el tiempo la pestaña acumula fotos de perfil, adjuntos y un DOM cada vez
+más grande; Chrome se vuelve lento y cada ``evaluate`` tarda más. Este
+módulo:
+
+* bloquea las fotos de perfil con ``Network.setBlockedURLs`` por CDP: Chrome
+  descarta esas peticiones sin consultar al cliente. ``page.route`` no sirve
+  para esto porque, con una sola ruta, Playwright intercepta todas las
+  peticiones de la pestaña (un viaje por CDP cada una) y desactiva su caché
+  HTTP. Stickers, audios y videos no se bloquean: se descargan cifrados por
+  ``fetch`` desde el mismo servidor que las imágenes de los comprobantes y se
+  reproducen como ``blob:``, así que no hay un tipo de recurso ni una URL que
+  los distinga;
+* muestrea ``Performance.getMetrics`` por CDP (memoria de JS, nodos del DOM,
+  listeners) y lo publica como indicadores Prometheus;
+* cuando se supera un umbral, pide una recarga controlada. El
+  :class:`~app.connection_supervisor.ConnectionSupervisor` cancela la
+  sesión de captura (que guarda su punto de control), recarga la página y
+  la relanza: la captura se reanuda desde el caché sin repetir el barrido.
+
+Mientras se recupera historial (:mod:`~app.whatsapp_processing.backfill`) la
+recarga se pospone: el relleno es justamente lo que agranda el DOM y, tras
+recargar, la vista vuelve al final del chat y el relleno tendría que subir
+de nuevo desde ahí, con lo que un hueco profundo nunca terminaría.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Tuple
+
+from playwright.async_api import CDPSession, Page
+
+from settings import getbool, getenv, getint
+from telemetry import count, gauge
+
+logger = logging.getLogger(__name__)
+
+HOUSEKEEPING_ENABLED = getbool("WA_HOUSEKEEPING", True)
+HOUSEKEEPING_INTERVAL_SECONDS = getint("WA_HOUSEKEEPING_SECONDS", 60)
+MAX_JS_HEAP_MB = getint("WA_MAX_JS_HEAP_MB", 1536)
+MAX_DOM_NODES = getint("WA_MAX_DOM_NODES", 300_000)
+# Evita recargas en bucle si un chat necesita legítimamente un DOM grande.
+RELOAD_MIN_MINUTES = getint("WA_RELOAD_MIN_MINUTES", 30)
+RELOAD_TIMEOUT_MS = 60_000
+
+
+def _url_pattern(item: str) -> str:
+    """``pps.whatsapp.net`` → ``*://pps.whatsapp.net/*``; un patrón con ``*`` o ``/`` queda igual."""
+
+    item = item.strip()
+    return item if "*" in item or "/" in item else f"*://{item}/*"
+
+
+# Patrones de ``Network.setBlockedURLs`` (``*`` como comodín). Por defecto,
+# sólo el servidor de las fotos de perfil.
+BLOCKED_URL_PATTERNS: Tuple[str, ...] = tuple(
+    _url_pattern(item) for item in getenv("WA_BLOCK_URL_PATTERNS", "pps.whatsapp.net").split(",") if item.strip()
+)
+
+
+@dataclass(frozen=True)
+class SessionMetrics:
+    """Muestra de ``Performance.getMetrics`` de la pestaña."""
+
+    js_heap_bytes: float
+    dom_nodes: int
+    listeners: int = 0
+    documents: int = 0
+
+    @property
+    def js_heap_mb(self) -> float:
+        return self.js_heap_bytes / (1024 * 1024)
+
+    @classmethod
+    def from_cdp(cls, payload: Dict[str, Any]) -> "SessionMetrics":
+        values = {item.get("name"): item.get("value", 0) for item in payload.get("metrics", [])}
+        return cls(
+            js_heap_bytes=float(values.get("JSHeapUsedSize", 0)),
+            dom_nodes=int(values.get("Nodes", 0)),
+            listeners=int(values.get("JSEventListeners", 0)),
+            documents=int(values.get("Documents", 0)),
+        )
+
+
+def _count_blocked(event: Dict[str, Any]) -> None:
+    """``Network.loadingFailed``: cuenta sólo las peticiones que bloqueó Chrome."""
+
+    if event.get("blockedReason"):
+        count(
+            "wa_blocked_requests_total",
+            resource=str(event.get("type", "")).lower(),
+            help_text="Peticiones de WhatsApp Web bloqueadas.",
+        )
+
+
+class SessionHousekeeper:
+    """Bloqueo de recursos, muestreo de métricas y recarga controlada de una pestaña."""
+
+    def __init__(
+        self,
+        *,
+        interval: float = HOUSEKEEPING_INTERVAL_SECONDS,
+        max_heap_mb: float = MAX_JS_HEAP_MB,
+        max_dom_nodes: int = MAX_DOM_NODES,
+        min_uptime: float = RELOAD_MIN_MINUTES * 60,
+        defer_reload: Callable[[], bool] | None = None,
+    ) -> None:
+        self.interval = interval
+        self.max_heap_mb = max_heap_mb
+        self.max_dom_nodes = max_dom_nodes
+        self.min_uptime = min_uptime
+        # ``True`` mientras no convenga recargar (por ejemplo, con un relleno en curso).
+        self.defer_reload = defer_reload
+        self.reloads = 0
+        self.last_metrics: SessionMetrics | None = None
+        self._page: Page | None = None
+        self._cdp: CDPSession | None = None
+        self._loaded_at = time.monotonic()
+
+    async def install(self, page: Page) -> None:
+        """Prepara ``page`` (una sola vez por pestaña): sesión CDP, métricas y bloqueo."""
+
+        if page is self._page:
+            return
+        self._page = page
+        self._cdp = None
+        self._loaded_at = time.monotonic()
+        try:
+            self._cdp = await page.context.new_cdp_session(page)
+            await self._cdp.send("Performance.enable")
+        except Exception as error:  # pragma: no cover - depende de Chrome
+            logger.warning("Métricas de rendimiento de Chrome no disponibles: %s", error)
+            self._cdp = None
+            return
+        if BLOCKED_URL_PATTERNS:
+            self._cdp.on("Network.loadingFailed", _count_blocked)
+            await self._block_urls()
+
+    async def _block_urls(self) -> None:
+        if self._cdp is None or not BLOCKED_URL_PATTERNS:
+            return
+        try:
+            await self._cdp.send("Network.enable")
+            await self._cdp.send("Network.setBlockedURLs", {"urls": list(BLOCKED_URL_PATTERNS)})
+        except Exception as error:  # pragma: no cover - depende de Chrome
+            logger.warning("No se pudo instalar el bloqueo de recursos: %s", error)
+
+    async def sample(self) -> SessionMetrics | None:
+        """Lee las métricas de la pestaña y las publica como indicadores."""
+
+        if self._cdp is None:
+            return None
+        try:
+            metrics = SessionMetrics.from_cdp(await self._cdp.send("Performance.getMetrics"))
+        except Exception as error:
+            logger.debug("No se pudieron leer las métricas de Chrome: %s", error)
+            return None
+        gauge("wa_browser_js_heap_bytes", metrics.js_heap_bytes, help_text="Memoria de JS usada por la pestaña.")
+        gauge("wa_browser_dom_nodes", metrics.dom_nodes, help_text="Nodos del DOM de la pestaña.")
+        gauge("wa_browser_js_listeners", metrics.listeners, help_text="Listeners de eventos de la pestaña.")
+        self.last_metrics = metrics
+        return metrics
+
+    def reload_reason(self, metrics: SessionMetrics, now: float | None = None) -> str:
+        """Motivo para recargar (``""`` si la pestaña sigue dentro de los umbrales o se pospone)."""
+
+        now = time.monotonic() if now is None else now
+        if now - self._loaded_at < self.min_uptime:
+            return ""
+        reason = ""
+        if self.max_heap_mb and metrics.js_heap_mb >= self.max_heap_mb:
+            reason = f"memoria de JS {metrics.js_heap_mb:.0f} MB"
+        elif self.max_dom_nodes and metrics.dom_nodes >= self.max_dom_nodes:
+            reason = f"{metrics.dom_nodes} nodos en el DOM"
+        if reason and self.defer_reload is not None and self.defer_reload():
+            logger.debug("Recarga pospuesta hasta terminar el relleno del historial (%s)", reason)
+            count("wa_browser_reloads_deferred_total", help_text="Recargas pospuestas por un relleno en curso.")
+            return ""
+        return reason
+
+    async def watch(self, page: Page) -> str:
+        """Muestrea periódicamente y retorna el motivo en cuanto haga falta recargar."""
+
+        await self.install(page)
+        while True:
+            await asyncio.sleep(self.interval)
+            metrics = await self.sample()
+            if metrics is None:
+                continue
+            reason = self.reload_reason(metrics)
+            if reason:
+                return reason
+
+    async def reload(self, page: Page) -> None:
+        """Recarga la pestaña y vuelve a activar las métricas y el bloqueo en su sesión CDP."""
+
+        await page.reload(wait_until="domcontentloaded", timeout=RELOAD_TIMEOUT_MS)
+        self._loaded_at = time.monotonic()
+        self.reloads += 1
+        count("wa_browser_reloads_total", help_text="Recargas controladas de WhatsApp Web.")
+        if self._cdp is not None:
+            try:
+                await self._cdp.send("Performance.enable")
+            except Exception:  # pragma: no cover - depende de Chrome
+                self._cdp = None
+            await self._block_urls()
+
+
+def build_housekeeper(defer_reload: Callable[[], bool] | None = None) -> SessionHousekeeper | None:
+    """Mantenimiento configurado por ``.env`` (``None`` si ``WA_HOUSEKEEPING=false``)."""
+
+    return SessionHousekeeper(defer_reload=defer_reload) if HOUSEKEEPING_ENABLED else None
+
+
+__all__ = [
+    "SessionHousekeeper",
+    "SessionMetrics",
+    "build_housekeeper",
+]
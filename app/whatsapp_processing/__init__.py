@@ -1,19 +1,40 @@
 """Herramientas asincrónicas para capturar comprobantes desde WhatsApp Web."""
 from .cache import CacheState, load_cache, save_cache
-from .constants import CHAT_NAME
+from .chats import ChatTarget, build_chat_targets, prepare_chat_target
+from .constants import CHAT_NAME, CHAT_NAMES
 from .csv_export import append_csv, init_csv
 from .directories import ensure_directories
 from .jsonl_export import append_jsonl
-from .loop import monitor_conversation
+from .loop import (
+    CaptureCursor,
+    capture_pass,
+    follow_conversation,
+    monitor_conversation,
+    start_capture,
+    start_live_capture,
+)
+from .rejections import MessageRejected, RejectionCache, RejectionReason
 
 __all__ = [
     "CacheState",
+    "CaptureCursor",
+    "ChatTarget",
     "append_csv",
     "append_jsonl",
+    "build_chat_targets",
+    "capture_pass",
     "CHAT_NAME",
+    "CHAT_NAMES",
     "ensure_directories",
+    "follow_conversation",
     "init_csv",
     "load_cache",
+    "MessageRejected",
     "monitor_conversation",
+    "prepare_chat_target",
+    "RejectionCache",
+    "RejectionReason",
     "save_cache",
-]
\ No newline at end of file
+    "start_capture",
+    "start_live_capture",
+]
@@ -0,0 +1,169 @@
+"""Recuperación del historial por tramos, intercalada con la escucha en vivo.
+
+Sin punto de control (o con uno que ya no está en la vista) el barrido
+inicial recorría todo el historial antes de volver al final del chat, y los
+comprobantes que llegaban mientras tanto esperaban horas. Ahora la captura
+mantiene dos cursores sobre el mismo chat:
+
+* la escucha (``CaptureCursor``), que sigue el final de la conversación con
+  prioridad;
+* el relleno (:class:`Backfill`), que sube por el historial de a un tramo
+  (una ráfaga de ``PageUp`` y como máximo ``BACKFILL_MAX_NEW_PER_STEP``
+  comprobantes) entre dos pasadas de la escucha.
+
+WhatsApp Web sólo admite una pestaña activa por perfil (abrir otra muestra
+"Usar aquí" y desconecta la primera), así que ambos cursores se turnan sobre
+la misma página en lugar de usar dos. Comparten el índice de procesados, el
+caché de descartes y el índice de pagos: un mensaje lo registra quien lo vea
+primero y el otro lo omite.
+
+El relleno termina al encontrar el mensaje donde se cortó la captura anterior
+(``stop_id``) o al llegar al inicio del chat. Su estado se guarda junto al
+caché del chat para retomarlo tras un reinicio.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from playwright.async_api import Page
+
+from telemetry import count, timed
+
+from .cache import ProcessedIds
+from .chats import ChatTarget
+from .constants import BACKFILL_MAX_NEW_PER_STEP, TOP_SCROLL_STABLE_ROUNDS
+from .payment_index import PaymentIndex
+from .processing import process_visible_top_to_bottom
+from .rejections import RejectionCache
+from .scrolling import load_older_messages
+from .voucher_store import VoucherStore
+
+logger = logging.getLogger(__name__)
+
+
+def backfill_path_for(cache_path: str | Path) -> Path:
+    """Archivo del relleno pendiente, junto al caché de mensajes procesados."""
+
+    cache_path = Path(cache_path)
+    return cache_path.with_name(f"{cache_path.stem}.backfill.json")
+
+
+@dataclass
+class Backfill:
+    """Cursor del relleno del historial de un chat."""
+
+    # Último mensaje capturado antes del hueco ("" = hasta el inicio del chat).
+    stop_id: str
+    path: Path | None = None
+    done: bool = False
+    steps: int = 0
+    captured: int = 0
+    _top_id: str = field(default="", repr=False)
+    _stable_rounds: int = field(default=0, repr=False)
+
+    def save(self) -> None:
+        """Persiste el relleno pendiente; al terminar borra el archivo."""
+
+        if self.path is None:
+            return
+        if self.done:
+            self.path.unlink(missing_ok=True)
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(temporary, "w", encoding="utf-8") as handle:
+            json.dump({"stop_id": self.stop_id, "captured": self.captured}, handle, ensure_ascii=False)
+        temporary.replace(self.path)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "Backfill | None":
+        """Relleno pendiente de una sesión anterior (``None`` si no hay)."""
+
+        try:
+            with open(path, "r", encoding="utf-8") as handle:
+                payload = json.load(handle)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if not isinstance(payload, dict):
+            return None
+        return cls(
+            stop_id=str(payload.get("stop_id") or ""),
+            path=Path(path),
+            captured=int(payload.get("captured") or 0),
+        )
+
+
+async def _is_loaded(page: Page, data_id: str) -> bool:
+    if not data_id:
+        return False
+    try:
+        return await page.locator(f'div[role="row"] div[data-id="{data_id}"]').count() > 0
+    except Exception:  # pragma: no cover - depende del estado del DOM
+        return False
+
+
+async def backfill_step(
+    page: Page,
+    backfill: Backfill,
+    processed_ids: ProcessedIds,
+    *,
+    target: ChatTarget | None = None,
+    rejections: RejectionCache | None = None,
+    payments: PaymentIndex | None = None,
+    vouchers: VoucherStore | None = None,
+    max_new: int = BACKFILL_MAX_NEW_PER_STEP,
+    verbose_print: bool = True,
+) -> int:
+    """Carga un tramo más antiguo y registra sus comprobantes pendientes.
+
+    Los mensajes más nuevos ya están en ``processed_ids`` (los registró la
+    escucha o un tramo anterior), así que sólo se procesan los del tramo
+    recién cargado. Devuelve la cantidad de comprobantes registrados.
+    """
+
+    if backfill.done:
+        return 0
+
+    with timed("backfill_step"):
+        top_id = await load_older_messages(page)
+        # Con ``stop_id`` en la vista, los mensajes anteriores a él ya se
+        # capturaron en otra sesión y sólo se marcan como vistos.
+        new_count, _, _ = await process_visible_top_to_bottom(
+            page,
+            processed_ids,
+            backfill.stop_id,
+            "",
+            verbose_print=verbose_print,
+            target=target,
+            max_new=max_new,
+            rejections=rejections,
+            payments=payments,
+            vouchers=vouchers,
+        )
+
+    backfill.steps += 1
+    backfill.captured += new_count
+    if top_id and top_id == backfill._top_id:
+        backfill._stable_rounds += 1
+    else:
+        backfill._stable_rounds = 0
+    backfill._top_id = top_id or backfill._top_id
+
+    reached_stop = await _is_loaded(page, backfill.stop_id)
+    reached_top = backfill._stable_rounds >= TOP_SCROLL_STABLE_ROUNDS
+    if new_count < max_new and (reached_stop or reached_top):
+        backfill.done = True
+        print(f"✅ Historial recuperado: {backfill.captured} comprobante(s) en {backfill.steps} tramo(s)")
+    count(
+        "wa_backfill_steps_total",
+        result="done" if backfill.done else "pending",
+        help_text="Tramos del relleno del historial intercalados con la escucha.",
+    )
+    return new_count
+
+
+__all__ = ["Backfill", "backfill_path_for", "backfill_step"]
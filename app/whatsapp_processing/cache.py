@@ -5,14 +5,26 @@ from __future__ import annotations
 import csv
 import json
 import hashlib
+from collections import deque
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Iterable, Iterator, List, Mapping, Sequence, Set, Tuple
+from typing import Iterable, Iterator, List, Mapping, Sequence, Set, Tuple, Union
 
-from .constants import CACHE_FILE, CSV_FILE, JSONL_FILE
+from .constants import CACHE_FILE, CSV_FILE, IMPORTED_ID_PREFIX, JSONL_FILE
+from .id_index import ProcessedIdIndex
 
 
-ProcessedIds = Set[str]
+ProcessedIds = Union[ProcessedIdIndex, Set[str]]
+# Cantidad de IDs recientes del CSV que se conservan en orden (para ubicar el
+# penúltimo mensaje); el resto sólo vive en el índice compacto.
+ORDERED_TAIL = 64
+
+
+def index_path_for(cache_path: str | Path) -> Path:
+    """Archivo binario del índice compacto asociado a un caché JSON."""
+
+    cache_path = Path(cache_path)
+    return cache_path.with_name(f"{cache_path.stem}.ids")
 
 
 @dataclass
@@ -35,15 +47,21 @@ class CacheState:
 
 def _load_ids_from_csv(
     csv_path: str | None = None,
-) -> tuple[ProcessedIds, str, Tuple[str, ...]]:
-    """Recupera los identificadores previamente exportados al CSV."""
+    into: ProcessedIdIndex | None = None,
+) -> tuple[ProcessedIdIndex, str, Tuple[str, ...]]:
+    """Recupera los identificadores previamente exportados al CSV.
 
+    Los IDs se vuelcan en el índice ``into``; sólo los últimos ``ORDERED_TAIL``
+    se devuelven en orden. Los registros importados desde una exportación del
+    chat no existen en el DOM, así que no se usan como punto de reanudación.
+    """
+
+    collected = ProcessedIdIndex() if into is None else into
     path = Path(CSV_FILE if csv_path is None else csv_path)
     if not path.exists():
-        return set(), "", tuple()
+        return collected, "", tuple()
 
-    collected: ProcessedIds = set()
-    ordered: list[str] = []
+    ordered: deque[str] = deque(maxlen=ORDERED_TAIL)
     last_seen = ""
 
     try:
@@ -62,6 +80,8 @@ def _load_ids_from_csv(
                 if not data_id:
                     continue
                 collected.add(data_id)
+                if data_id.startswith(IMPORTED_ID_PREFIX):
+                    continue
                 ordered.append(data_id)
                 last_seen = data_id
     except Exception:
@@ -107,7 +127,7 @@ def _load_last_signature_from_jsonl(
         if not isinstance(record, dict):
             continue
         data_id = str(record.get("data_id", "") or "")
-        if not data_id:
+        if not data_id or data_id.startswith(IMPORTED_ID_PREFIX):
             continue
         return data_id, _build_signature(record)
 
@@ -125,6 +145,7 @@ def load_cache(
 
     raw_ids: List[str] = []
     data: dict[str, object] = {}
+    processed = ProcessedIdIndex()
 
     if use_cache_file:
         path = CACHE_FILE if cache_path is None else cache_path
@@ -141,8 +162,10 @@ def load_cache(
                 for value in data.get("processed_ids", [])
                 if isinstance(value, str)
             ]
+            if data.get("index_file"):
+                processed = ProcessedIdIndex.load(index_path_for(path))
 
-    processed: ProcessedIds = set(raw_ids)
+    processed.update(raw_ids)
     last_id = str(data.get("last_id", "") or "")
     last_signature = str(data.get("last_signature", "") or "")
 
@@ -154,9 +177,7 @@ def load_cache(
                 last_signature = ""
                 break
 
-    csv_ids, csv_last_id, ordered_csv_ids = _load_ids_from_csv(csv_path)
-    if csv_ids:
-        processed.update(csv_ids)
+    _, csv_last_id, ordered_csv_ids = _load_ids_from_csv(csv_path, into=processed)
 
     if csv_last_id:
         if last_id != csv_last_id:
@@ -195,14 +216,35 @@ def load_cache(
     )
 
 def save_cache(
-    processed_ids: Iterable[str],
+    processed_ids: ProcessedIds | Iterable[str],
     last_id: str,
     last_signature: str = "",
     cache_path: str | None = None,
 ) -> None:
-    """Guarda el estado actual de captura para continuar en futuras ejecuciones."""
+    """Guarda el estado actual de captura para continuar en futuras ejecuciones.
+
+    Con un :class:`ProcessedIdIndex` sólo se anexan las claves nuevas al
+    archivo ``.ids`` y el JSON queda con el punto de control, por lo que el
+    costo no crece con el historial. Cualquier otro iterable se guarda con el
+    formato clásico (lista completa de IDs).
+    """
 
     path = CACHE_FILE if cache_path is None else cache_path
+
+    if isinstance(processed_ids, ProcessedIdIndex):
+        if last_id:
+            processed_ids.add(last_id)
+        index_path = index_path_for(path)
+        processed_ids.save(index_path)
+        payload = {
+            "processed_ids": [last_id] if last_id else [],
+            "index_file": index_path.name,
+            "last_id": last_id,
+            "last_signature": last_signature,
+        }
+        _write_json(path, payload)
+        return
+
     ids = set(processed_ids)
     if last_id:
         ids.add(last_id)
@@ -220,8 +262,19 @@ def save_cache(
         "last_id": last_id,
         "last_signature": last_signature,
     }
+    _write_json(path, payload)
+
+
+def _write_json(path: str | Path, payload: Mapping[str, object]) -> None:
     with open(path, "w", encoding="utf-8") as handle:
         json.dump(payload, handle, ensure_ascii=False, indent=2)
 
 
-__all__ = ["CacheState", "ProcessedIds", "load_cache", "save_cache"]
+__all__ = [
+    "CacheState",
+    "ProcessedIdIndex",
+    "ProcessedIds",
+    "index_path_for",
+    "load_cache",
+    "save_cache",
+]
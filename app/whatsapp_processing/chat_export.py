@@ -0,0 +1,295 @@
+"""Lectura de los archivos de "Exportar chat" de WhatsApp.
+
+El teléfono genera un ``.txt`` con la transcripción (o un ``.zip`` con el
+``.txt`` y los adjuntos). Cada mensaje se convierte al mismo formato que
+produce la captura desde el navegador: marca temporal con el texto de
+``data-pre-plain-text`` (``11:28 p. m., 7/12/2025``), remitente y texto, de
+modo que la clasificación, la deduplicación y los exportadores se reutilizan
+sin cambios.
+
+Formatos reconocidos::
+
+    7/12/25, 11:28 p. m. - Nicole: IMG-20251207-WA0012.jpg (archivo adjunto)
+    [7/12/25, 11:28:05 p. m.] Nicole: <adjunto: 00000012-PHOTO-2025-12-07.jpg>
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from .constants import IMPORTED_ID_PREFIX
+from .snapshot import MessageSnapshot
+
+# Marcas de dirección y espacios finos que WhatsApp intercala en el texto.
+_INVISIBLE = dict.fromkeys(map(ord, "\u200e\u200f\u202a\u202c\ufeff"), None)
+_SPACES = re.compile(r"[\u00a0\u2009\u202f]")
+
+_DATE = r"(?P<date>\d{1,2}/\d{1,2}/\d{2,4})"
+_TIME = r"(?P<time>\d{1,2}:\d{2}(?::\d{2})?(?:\s*[ap]\.?\s*m\.?)?)"
+_ANDROID_HEADER = re.compile(rf"^{_DATE},?\s+{_TIME}\s+-\s+(?P<body>.*)$", re.IGNORECASE)
+_IOS_HEADER = re.compile(rf"^\[{_DATE},?\s+{_TIME}\]\s+(?P<body>.*)$", re.IGNORECASE)
+_TIME_PARTS = re.compile(r"(\d{1,2}):(\d{2})(?::\d{2})?\s*(?:([ap])\.?\s*m\.?)?", re.IGNORECASE)
+
+_ATTACHED_SUFFIX = re.compile(
+    r"(?P<name>[^\s<>/\\]+\.[A-Za-z0-9]{2,5})\s+\((?:archivo adjunto|file attached)\)",
+    re.IGNORECASE,
+)
+_ATTACHED_TAG = re.compile(r"<(?:adjunto|attached):\s*(?P<name>[^>]+)>", re.IGNORECASE)
+_MEDIA_OMITTED = re.compile(r"<(?:multimedia omitido|media omitted)>", re.IGNORECASE)
+IMAGE_EXTENSIONS = frozenset({".jpg", ".jpeg", ".png", ".webp"})
+
+
+@dataclass(frozen=True)
+class ExportMessage:
+    """Mensaje leído de la transcripción exportada."""
+
+    line: int
+    timestamp: str
+    sender: str
+    text: str = ""
+    attachment: str = ""
+    media_omitted: bool = False
+
+    @property
+    def has_image(self) -> bool:
+        return PurePosixPath(self.attachment).suffix.lower() in IMAGE_EXTENSIONS
+
+    @property
+    def data_id(self) -> str:
+        """Identificador estable, igual en cada re-exportación del mismo chat."""
+
+        joined = "\u241e".join((self.timestamp, self.sender, self.attachment, self.text))
+        digest = hashlib.sha1(joined.encode("utf-8", "ignore")).hexdigest()[:32]
+        return f"{IMPORTED_ID_PREFIX}{digest}"
+
+    def snapshot(self, media_available: bool) -> MessageSnapshot:
+        """Representa el mensaje como lo vería la clasificación del navegador."""
+
+        return MessageSnapshot(
+            data_id=self.data_id,
+            pre_plain_text=f"[{self.timestamp}] {self.sender}: ",
+            text=self.text,
+            blob_src=self.media_ref if media_available and self.has_image else "",
+        )
+
+    @property
+    def media_ref(self) -> str:
+        return f"export:{self.attachment}" if self.attachment else ""
+
+
+def _clean(line: str) -> str:
+    return _SPACES.sub(" ", line.translate(_INVISIBLE)).rstrip("\r\n")
+
+
+def normalize_timestamp(date: str, time: str, *, day_first: bool = True) -> str:
+    """Convierte fecha y hora de la exportación al formato del DOM.
+
+    ``("7/12/25", "23:28")`` → ``"11:28 p. m., 7/12/2025"``. Devuelve
+    ``""`` si alguna parte no se reconoce.
+    """
+
+    match = _TIME_PARTS.fullmatch(_clean(time).strip())
+    try:
+        first, second, year = (int(piece) for piece in date.split("/"))
+    except ValueError:
+        return ""
+    if not match:
+        return ""
+    day, month = (first, second) if day_first else (second, first)
+    if year < 100:
+        year += 2000
+
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2)), match.group(3)
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem.lower() == "p" else 0)
+    if not (0 <= hour < 24 and 0 <= minute < 60 and 1 <= day <= 31 and 1 <= month <= 12):
+        return ""
+    suffix = "p" if hour >= 12 else "a"
+    hour12 = hour % 12 or 12
+    return f"{hour12}:{minute:02d} {suffix}.\u00a0m., {day}/{month}/{year}"
+
+
+def _split_body(body: str) -> Tuple[str, str]:
+    """Separa ``Remitente: texto``; los avisos del sistema no tienen remitente."""
+
+    sender, separator, text = body.partition(": ")
+    if not separator:
+        return "", body
+    return sender.strip(), text
+
+
+def _extract_attachment(text: str) -> Tuple[str, str, bool]:
+    """Quita del texto la referencia al adjunto y la devuelve por separado."""
+
+    if _MEDIA_OMITTED.search(text):
+        return _MEDIA_OMITTED.sub("", text).strip(), "", True
+    for pattern in (_ATTACHED_TAG, _ATTACHED_SUFFIX):
+        match = pattern.search(text)
+        if match:
+            remaining = (text[: match.start()] + text[match.end() :]).strip()
+            return remaining, match.group("name").strip(), False
+    return text.strip(), "", False
+
+
+def _build_message(
+    line: int, header: re.Match[str], extra: List[str], day_first: bool
+) -> ExportMessage | None:
+    sender, first = _split_body(header.group("body"))
+    if not sender:
+        return None
+    timestamp = normalize_timestamp(header.group("date"), header.group("time"), day_first=day_first)
+    if not timestamp:
+        return None
+    text, attachment, omitted = _extract_attachment("\n".join([first, *extra]))
+    return ExportMessage(
+        line=line,
+        timestamp=timestamp,
+        sender=sender,
+        text="\n".join(part.strip() for part in text.splitlines() if part.strip()),
+        attachment=attachment,
+        media_omitted=omitted,
+    )
+
+
+def _merge_split_captions(messages: Iterable[ExportMessage]) -> Iterator[ExportMessage]:
+    """Une un adjunto sin texto con el texto que el mismo remitente envió en el mismo minuto.
+
+    iOS suele exportar la imagen y su descripción como dos mensajes seguidos.
+    """
+
+    pending: ExportMessage | None = None
+    for message in messages:
+        if (
+            pending is not None
+            and not message.attachment
+            and not message.media_omitted
+            and message.sender == pending.sender
+            and message.timestamp == pending.timestamp
+        ):
+            yield ExportMessage(
+                line=pending.line,
+                timestamp=pending.timestamp,
+                sender=pending.sender,
+                text=message.text,
+                attachment=pending.attachment,
+                media_omitted=pending.media_omitted,
+            )
+            pending = None
+            continue
+        if pending is not None:
+            yield pending
+            pending = None
+        if (message.attachment or message.media_omitted) and not message.text:
+            pending = message
+        else:
+            yield message
+    if pending is not None:
+        yield pending
+
+
+def parse_export_lines(lines: Iterable[str], *, day_first: bool = True) -> List[ExportMessage]:
+    """Convierte las líneas de la transcripción en mensajes.
+
+    Las líneas que no comienzan con fecha y hora continúan el mensaje anterior
+    (textos con saltos de línea); los avisos del sistema se ignoran.
+    """
+
+    def _parse() -> Iterator[ExportMessage]:
+        header: re.Match[str] | None = None
+        header_line = 0
+        extra: List[str] = []
+        for number, raw in enumerate(lines, start=1):
+            line = _clean(raw)
+            match = _IOS_HEADER.match(line) or _ANDROID_HEADER.match(line)
+            if match is None:
+                if header is not None:
+                    extra.append(line)
+                continue
+            if header is not None:
+                message = _build_message(header_line, header, extra, day_first)
+                if message is not None:
+                    yield message
+            header, header_line, extra = match, number, []
+        if header is not None:
+            message = _build_message(header_line, header, extra, day_first)
+            if message is not None:
+                yield message
+
+    return list(_merge_split_captions(_parse()))
+
+
+class ChatExport:
+    """Transcripción y adjuntos de una exportación (``.zip`` o ``.txt`` + carpeta).
+
+    ``media`` puede ser otro ``.zip`` o una carpeta; por defecto se buscan los
+    adjuntos junto a la transcripción.
+    """
+
+    def __init__(self, path: str | Path, media: str | Path | None = None) -> None:
+        self.path = Path(path)
+        self.media = Path(media) if media is not None else (
+            self.path if self.path.suffix.lower() == ".zip" else self.path.parent
+        )
+        self._members: Dict[str, str] | None = None
+
+    def read_lines(self) -> List[str]:
+        if self.path.suffix.lower() != ".zip":
+            return self.path.read_text(encoding="utf-8-sig", errors="replace").splitlines()
+        with zipfile.ZipFile(self.path) as archive:
+            names = [name for name in archive.namelist() if name.lower().endswith(".txt")]
+            if not names:
+                raise FileNotFoundError(f"El archivo {self.path} no contiene una transcripción .txt")
+            # El chat es el .txt de mayor tamaño (``_chat.txt`` en iOS).
+            transcript = max(names, key=lambda name: archive.getinfo(name).file_size)
+            raw = archive.read(transcript)
+        return raw.decode("utf-8-sig", errors="replace").splitlines()
+
+    @property
+    def media_is_zip(self) -> bool:
+        return self.media.suffix.lower() == ".zip"
+
+    def _zip_members(self) -> Dict[str, str]:
+        if self._members is None:
+            with zipfile.ZipFile(self.media) as archive:
+                self._members = {
+                    PurePosixPath(name).name: name for name in archive.namelist() if not name.endswith("/")
+                }
+        return self._members
+
+    def locate(self, attachment: str) -> Tuple[str, str] | None:
+        """Ubica el adjunto: ``(ruta del zip, miembro)`` o ``(ruta del archivo, "")``."""
+
+        if not attachment:
+            return None
+        if self.media_is_zip:
+            member = self._zip_members().get(attachment)
+            return (str(self.media), member) if member else None
+        candidate = self.media / attachment
+        return (str(candidate), "") if candidate.is_file() else None
+
+
+def content_key(timestamp: str, sender: str, text: str) -> str:
+    """Huella del mensaje independiente de su ``data-id`` y de los espacios.
+
+    Permite reconocer un comprobante ya capturado desde el navegador al
+    importarlo desde la exportación (y viceversa).
+    """
+
+    parts = (" ".join(_clean(value).split()) for value in (timestamp, sender, text))
+    joined = "\u241e".join(parts)
+    return hashlib.sha1(joined.encode("utf-8", "ignore")).hexdigest()
+
+
+__all__ = [
+    "ChatExport",
+    "ExportMessage",
+    "IMAGE_EXTENSIONS",
+    "content_key",
+    "normalize_timestamp",
+    "parse_export_lines",
+]
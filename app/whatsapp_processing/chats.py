@@ -0,0 +1,108 @@
+"""Configuración y particiones de salida por cada chat capturado."""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List
+
+from .cache import CacheState, load_cache
+from .constants import (
+    CACHE_FILE,
+    CHAT_NAME,
+    CHAT_NAMES,
+    CHATS_DIR,
+    CSV_FILE,
+    JSONL_FILE,
+    MULTI_CHAT_MAX_NEW_PER_PASS,
+)
+from .csv_export import init_csv
+from .rejections import rejections_path_for
+
+
+@dataclass(frozen=True)
+class ChatTarget:
+    """Chat a supervisar junto con los archivos donde se guardan sus datos."""
+
+    name: str
+    csv_path: Path
+    jsonl_path: Path
+    cache_path: Path
+    max_new_per_pass: int = MULTI_CHAT_MAX_NEW_PER_PASS
+
+    @property
+    def rejections_path(self) -> Path:
+        """Archivo del caché negativo, junto al caché de procesados."""
+
+        return rejections_path_for(self.cache_path)
+
+
+def chat_slug(chat_name: str) -> str:
+    """Convierte el nombre del chat en un nombre de carpeta seguro."""
+
+    normalized = unicodedata.normalize("NFD", chat_name)
+    normalized = "".join(ch for ch in normalized if unicodedata.category(ch) != "Mn")
+    slug = re.sub(r"[^a-zA-Z0-9]+", "_", normalized).strip("_").lower()
+    return slug or "chat"
+
+
+def chat_target(chat_name: str) -> ChatTarget:
+    """Construye el destino de un chat.
+
+    El chat histórico (``CHAT_NAME``) conserva las rutas originales para no
+    invalidar los archivos ya exportados; el resto se particiona en
+    ``outputs/chats/<slug>/``.
+    """
+
+    if chat_name == CHAT_NAME:
+        return ChatTarget(
+            name=chat_name,
+            csv_path=CSV_FILE,
+            jsonl_path=JSONL_FILE,
+            cache_path=CACHE_FILE,
+        )
+
+    folder = CHATS_DIR / chat_slug(chat_name)
+    return ChatTarget(
+        name=chat_name,
+        csv_path=folder / "comprobantes.csv",
+        jsonl_path=folder / "comprobantes.jsonl",
+        cache_path=folder / "wa_cache.json",
+    )
+
+
+def build_chat_targets(names: Iterable[str] | None = None) -> List[ChatTarget]:
+    """Devuelve los destinos configurados sin duplicados, respetando el orden."""
+
+    targets: List[ChatTarget] = []
+    seen: set[str] = set()
+    for name in CHAT_NAMES if names is None else names:
+        cleaned = name.strip()
+        if not cleaned or cleaned in seen:
+            continue
+        seen.add(cleaned)
+        targets.append(chat_target(cleaned))
+    return targets
+
+
+def prepare_chat_target(target: ChatTarget) -> CacheState:
+    """Crea los archivos de salida del chat y recupera su estado en caché."""
+
+    target.csv_path.parent.mkdir(parents=True, exist_ok=True)
+    init_csv(str(target.csv_path))
+    return load_cache(
+        cache_path=str(target.cache_path),
+        csv_path=str(target.csv_path),
+        jsonl_path=str(target.jsonl_path),
+    )
+
+
+__all__ = [
+    "ChatTarget",
+    "build_chat_targets",
+    "chat_slug",
+    "chat_target",
+    "prepare_chat_target",
+]
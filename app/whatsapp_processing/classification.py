@@ -0,0 +1,64 @@
+"""Clasificación barata de mensajes antes de esperar o descargar imágenes.
+
+Las etapas van de la más económica a la más costosa y todas trabajan sobre el
+:class:`MessageSnapshot`, sin nuevas consultas al navegador. Sólo los mensajes
+que superan todas pasan a la espera del ``blob:``, la descarga y el OCR.
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Dict, Sequence, Tuple
+
+from .constants import ALLOWED_SENDERS, THUMBNAIL_TRIAGE
+from .parsing import get_text_fields
+from .rejections import RejectionReason
+from .snapshot import MessageSnapshot
+from .triage import triage_thumbnail
+
+Stage = Tuple[str, RejectionReason, Callable[[MessageSnapshot], bool]]
+
+
+def _sender_allowed(snapshot: MessageSnapshot) -> bool:
+    return not ALLOWED_SENDERS or snapshot.sender in ALLOWED_SENDERS
+
+
+def _has_image(snapshot: MessageSnapshot) -> bool:
+    return bool(snapshot.blob_src or snapshot.data_src)
+
+
+def _thumbnail_may_be_voucher(snapshot: MessageSnapshot) -> bool:
+    if not THUMBNAIL_TRIAGE or not snapshot.data_src:
+        return True
+    return not triage_thumbnail(snapshot.data_src).rejects
+
+
+# (etapa, motivo de descarte, condición que debe cumplirse para continuar).
+# No se filtra por palabras clave del formulario: hay comprobantes reales con
+# pies libres ("CLAVE: 0912") que ``get_text_fields`` sí acepta.
+STAGES: Sequence[Stage] = (
+    ("copyable_block", RejectionReason.NO_COPYABLE_BLOCK, lambda s: s.has_copyable_block),
+    ("sender", RejectionReason.SENDER_NOT_ALLOWED, _sender_allowed),
+    ("text", RejectionReason.NO_TEXT, lambda s: bool(s.text)),
+    ("image", RejectionReason.NO_BLOB_IMAGE, _has_image),
+    ("thumbnail", RejectionReason.NOT_A_VOUCHER_IMAGE, _thumbnail_may_be_voucher),
+)
+
+
+def classify_snapshot(snapshot: MessageSnapshot) -> Tuple[RejectionReason | None, Dict[str, str]]:
+    """Aplica las etapas en orden y devuelve el motivo de descarte (o ``None``).
+
+    Si el mensaje es candidato también se devuelven los campos del formulario,
+    para no volver a interpretarlos más adelante.
+    """
+
+    for _stage, reason, passes in STAGES:
+        if not passes(snapshot):
+            return reason, {}
+
+    fields = get_text_fields(snapshot.text)
+    if not fields:
+        return RejectionReason.NO_FIELDS, {}
+    return None, fields
+
+
+__all__ = ["STAGES", "classify_snapshot"]
@@ -5,7 +5,19 @@ from __future__ import annotations
 import re
 from pathlib import Path
 
+from settings import getbool, getenv, getint
+
 CHAT_NAME = "Comprobantes Eunoia"
+# Lista de chats a capturar separada por comas (``WA_CHATS`` en ``.env``).
+CHAT_NAMES = tuple(
+    name.strip() for name in getenv("WA_CHATS", CHAT_NAME).split(",") if name.strip()
+) or (CHAT_NAME,)
+
+# Remitentes autorizados a enviar comprobantes (``WA_ALLOWED_SENDERS``); vacío
+# significa que se aceptan todos.
+ALLOWED_SENDERS = frozenset(
+    name.strip() for name in getenv("WA_ALLOWED_SENDERS", "").split(",") if name.strip()
+)
 
 OUT_DIR = Path("outputs")
 IMG_DIR = OUT_DIR / "images"
@@ -13,6 +25,16 @@ CSV_FILE = OUT_DIR / "comprobantes.csv"
 JSONL_FILE = OUT_DIR / "comprobantes.jsonl"
 CACHE_FILE = OUT_DIR / f"wa_cache_{CHAT_NAME}.json"
 LOG_FILE = OUT_DIR / "processing_errors.log"
+CHATS_DIR = OUT_DIR / "chats"
+# Índice global de números de operación y pagos exportados (todos los chats).
+PAYMENT_INDEX_FILE = OUT_DIR / "payments_index.jsonl"
+# Base SQLite con los comprobantes exportados, indexada para consultas.
+VOUCHER_DB_FILE = OUT_DIR / "comprobantes.sqlite3"
+# Libros Excel mensuales para contabilidad (``WA_EXCEL_DIR`` en ``.env``).
+EXCEL_DIR = Path(getenv("WA_EXCEL_DIR", str(OUT_DIR / "excel")))
+# Prefijo de los ``data_id`` sintetizados al importar una exportación del chat;
+# esos registros no cuentan como punto de reanudación de la captura en vivo.
+IMPORTED_ID_PREFIX = "export_"
 
 TOP_SCROLL_MAX_ROUNDS = 0
 TOP_SCROLL_PGUP_BURST = 10
@@ -21,7 +43,34 @@ SLOW_PER_MESSAGE_MS = 350
 SLOW_AFTER_SCROLL_MS = 400
 BLOB_WAIT_MS_TOTAL = 2_500
 BLOB_POLL_STEP_MS = 200
+# Descargas ``blob:`` agrupadas en un solo ``evaluate`` y escritas en paralelo.
+BLOB_BATCH_SIZE = getint("WA_BLOB_BATCH_SIZE", 8)
+BLOB_BATCH_LINGER_MS = 400
+BLOB_WRITE_WORKERS = 4
 POLL_SECONDS = 1.0
+# Mensajes de una misma vista que se descargan y pasan por OCR a la vez.
+CAPTURE_CONCURRENCY = getint("WA_CAPTURE_CONCURRENCY", 4)
+# Descarta por la miniatura ``data:image`` las fotos que no son comprobantes
+# antes de esperar el ``blob:`` (``WA_THUMBNAIL_TRIAGE``).
+THUMBNAIL_TRIAGE = getbool("WA_THUMBNAIL_TRIAGE", True)
+# Comprobantes casi duplicados: distancia de Hamming máxima entre pHash
+# (``WA_PHASH_MAX_DISTANCE``, negativo = sin consulta) y reutilización de la
+# lectura OCR del comprobante parecido tras confirmarla sobre recortes del
+# monto y la operación (``WA_PHASH_REUSE_OCR``, desactivada por defecto).
+PHASH_INDEX_FILE = IMG_DIR / "phash.jsonl"
+PHASH_MAX_DISTANCE = getint("WA_PHASH_MAX_DISTANCE", 6)
+PHASH_REUSE_OCR = getbool("WA_PHASH_REUSE_OCR", False)
+REJECTION_CACHE_MAX_ENTRIES = 20_000
+REJECTION_MAX_RETRIES = 3
+REJECTION_RETRY_SECONDS = 30.0
+# Con un punto de control ausente o fuera de la vista, el historial se
+# recupera por tramos intercalados con la escucha del final del chat
+# (``WA_LIVE_TAIL_BACKFILL``); cada tramo registra a lo sumo
+# ``WA_BACKFILL_MAX_NEW_PER_STEP`` comprobantes antes de volver al final.
+LIVE_TAIL_BACKFILL = getbool("WA_LIVE_TAIL_BACKFILL", True)
+BACKFILL_MAX_NEW_PER_STEP = getint("WA_BACKFILL_MAX_NEW_PER_STEP", 5)
+MULTI_CHAT_PASSES_PER_VISIT = getint("WA_MULTI_CHAT_PASSES_PER_VISIT", 3)
+MULTI_CHAT_MAX_NEW_PER_PASS = getint("WA_MULTI_CHAT_MAX_NEW_PER_PASS", 10)
 
 _FIELD_BOUNDARY = (
     r"(?="
@@ -62,20 +111,42 @@ FIELD_PATTERNS = {
 }
 
 __all__ = [
+    "ALLOWED_SENDERS",
+    "BACKFILL_MAX_NEW_PER_STEP",
+    "BLOB_BATCH_LINGER_MS",
+    "BLOB_BATCH_SIZE",
     "BLOB_POLL_STEP_MS",
     "BLOB_WAIT_MS_TOTAL",
+    "BLOB_WRITE_WORKERS",
+    "CAPTURE_CONCURRENCY",
     "CACHE_FILE",
     "CHAT_NAME",
+    "CHAT_NAMES",
+    "CHATS_DIR",
     "CSV_FILE",
+    "EXCEL_DIR",
     "FIELD_PATTERNS",
     "IMG_DIR",
+    "IMPORTED_ID_PREFIX",
     "JSONL_FILE",
+    "LIVE_TAIL_BACKFILL",
     "LOG_FILE",
+    "MULTI_CHAT_MAX_NEW_PER_PASS",
+    "MULTI_CHAT_PASSES_PER_VISIT",
     "OUT_DIR",
+    "PAYMENT_INDEX_FILE",
+    "PHASH_INDEX_FILE",
+    "PHASH_MAX_DISTANCE",
+    "PHASH_REUSE_OCR",
     "POLL_SECONDS",
+    "REJECTION_CACHE_MAX_ENTRIES",
+    "REJECTION_MAX_RETRIES",
+    "REJECTION_RETRY_SECONDS",
     "SLOW_AFTER_SCROLL_MS",
     "SLOW_PER_MESSAGE_MS",
+    "THUMBNAIL_TRIAGE",
     "TOP_SCROLL_STABLE_ROUNDS",
     "TOP_SCROLL_MAX_ROUNDS",
     "TOP_SCROLL_PGUP_BURST",
+    "VOUCHER_DB_FILE",
 ]
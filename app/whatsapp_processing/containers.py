@@ -22,4 +22,10 @@ def message_rows(page: Page) -> Locator:
     return page.locator(_MESSAGE_ROWS_SELECTOR)
 
 
-__all__ = ["get_messages_container", "message_rows"]
\ No newline at end of file
+def message_row_by_id(page: Page, data_id: str) -> Locator:
+    """Localizador fijado al mensaje ``data_id``, estable aunque la lista se desplace."""
+
+    return page.locator(f'div[role="row"] div[data-id="{data_id}"]').first
+
+
+__all__ = ["get_messages_container", "message_row_by_id", "message_rows"]
\ No newline at end of file
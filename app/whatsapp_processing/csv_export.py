@@ -6,6 +6,8 @@ import csv
 from pathlib import Path
 from typing import Mapping
 
+from telemetry import timed
+
 from .constants import CSV_FILE
 
 
@@ -43,7 +45,7 @@ def append_csv(row: Mapping[str, str], csv_path: str | None = None) -> None:
     """Agrega una fila con los datos extraídos al archivo CSV."""
 
     path = Path(CSV_FILE if csv_path is None else csv_path)
-    with open(path, "a", newline="", encoding="utf-8") as handle:
+    with timed("csv_write"), open(path, "a", newline="", encoding="utf-8") as handle:
         writer = csv.writer(handle)
         writer.writerow([row.get(column, "") for column in HEADER])
 
@@ -0,0 +1,210 @@
+"""Libros Excel mensuales con el formato de la planilla de Google Sheets.
+
+Cada mes se escribe en ``EXCEL_DIR/comprobantes_AAAA-MM.xlsx`` con una hoja
+titulada como la pestaña de Sheets (``DICIEMBRE``) y las mismas columnas:
+encabezados en B2:J2 (MES, FECHA, N° DE OPERACIÓN, DESCRIPCIÓN, DETALLE,
+MÉTODO DE PAGO, ESTADO, INGRESOS, EGRESOS) y el SALDO acumulado en K.
+
+Los libros se generan en modo de sólo-escritura de openpyxl: las filas se
+leen del JSONL una a una y se vuelcan al archivo sin cargar el mes entero en
+memoria. Sin ``full`` sólo se regeneran el último mes ya escrito y los
+posteriores (el mes en curso crece en cada ejecución); los meses cerrados no
+se vuelven a tocar. Uso::
+
+    python -m app.whatsapp_processing.excel_export
+    python -m app.whatsapp_processing.excel_export --completo
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Mapping
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+from sheets.googlesheets import MONTH_WORKSHEET_TITLES
+from telemetry import count, timed
+
+from .constants import EXCEL_DIR
+from .payment_index import exported_jsonl_paths
+from .sheets_export import build_sheet_payload
+
+logger = logging.getLogger(__name__)
+
+WORKBOOK_PREFIX = "comprobantes_"
+HEADERS = (
+    "MES",
+    "FECHA",
+    "N° DE OPERACIÓN",
+    "DESCRIPCIÓN",
+    "DETALLE",
+    "MÉTODO DE PAGO",
+    "ESTADO",
+    "INGRESOS",
+    "EGRESOS",
+    "SALDO",
+)
+# Como en la planilla: columna A vacía, encabezados en la fila 2.
+HEADER_ROW = 2
+DATE_FORMAT = "DD/MM/YYYY"
+AMOUNT_FORMAT = "#,##0.00"
+
+
+def workbook_path(month: str, root: str | Path = EXCEL_DIR) -> Path:
+    return Path(root) / f"{WORKBOOK_PREFIX}{month}.xlsx"
+
+
+def existing_months(root: str | Path = EXCEL_DIR) -> List[str]:
+    return sorted(path.stem[len(WORKBOOK_PREFIX) :] for path in Path(root).glob(f"{WORKBOOK_PREFIX}*.xlsx"))
+
+
+def iter_jsonl_records(jsonl_paths: Iterable[str | Path]) -> Iterator[Dict[str, str]]:
+    """Registros de los JSONL de uno en uno, sin repetir ``data_id``."""
+
+    seen = set()
+    for path in jsonl_paths:
+        try:
+            handle = open(path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            continue
+        with handle:
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if not isinstance(record, dict):
+                    continue
+                data_id = record.get("data_id")
+                if data_id:
+                    if data_id in seen:
+                        continue
+                    seen.add(data_id)
+                yield record
+
+
+class _MonthWriter:
+    """Hoja de sólo-escritura de un mes; guarda en un temporal y reemplaza al cerrar."""
+
+    def __init__(self, month: str, path: Path, title: str) -> None:
+        self.month = month
+        self.path = path
+        self.rows = 0
+        self._workbook = Workbook(write_only=True)
+        self._sheet = self._workbook.create_sheet(title)
+        self._sheet.append([])
+        bold = Font(bold=True)
+        header = []
+        for name in HEADERS:
+            cell = WriteOnlyCell(self._sheet, value=name)
+            cell.font = bold
+            header.append(cell)
+        self._sheet.append([None, *header])
+
+    def _cell(self, value: object, number_format: str | None = None) -> WriteOnlyCell:
+        cell = WriteOnlyCell(self._sheet, value=value)
+        if number_format:
+            cell.number_format = number_format
+        return cell
+
+    def append(self, payload: Mapping[str, object]) -> None:
+        row = HEADER_ROW + self.rows + 1
+        previous = f"K{row - 1}+" if self.rows else ""
+        self._sheet.append(
+            [
+                None,
+                payload["mes"],
+                self._cell(datetime.strptime(str(payload["fecha"]), "%d/%m/%Y"), DATE_FORMAT),
+                payload["numero_operacion"],
+                payload["descripcion"],
+                payload["detalle"],
+                payload["metodo_pago"],
+                payload["estado"],
+                self._cell(payload["ingresos"] or 0, AMOUNT_FORMAT),
+                self._cell(payload["egresos"] or 0, AMOUNT_FORMAT),
+                self._cell(f"={previous}I{row}-J{row}", AMOUNT_FORMAT),
+            ]
+        )
+        self.rows += 1
+
+    def close(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_name(f".{self.path.name}.tmp")
+        self._workbook.save(temporary)
+        temporary.replace(self.path)
+
+
+def export_workbooks(
+    jsonl_paths: Iterable[str | Path] | None = None,
+    *,
+    root: str | Path = EXCEL_DIR,
+    full: bool = False,
+) -> Dict[str, int]:
+    """Genera los libros mensuales y devuelve las filas escritas por mes.
+
+    Sin ``full`` se omiten los meses anteriores al último libro existente.
+    """
+
+    if jsonl_paths is None:
+        jsonl_paths = exported_jsonl_paths()
+    done = existing_months(root)
+    first_open = None if full or not done else done[-1]
+
+    writers: Dict[str, _MonthWriter] = {}
+    skipped = 0
+    with timed("excel_export"):
+        for record in iter_jsonl_records(jsonl_paths):
+            payload = build_sheet_payload(record)
+            if payload is None:
+                skipped += 1
+                continue
+            _, month_number, year = str(payload["fecha"]).split("/")
+            month = f"{year}-{month_number}"
+            if first_open is not None and month < first_open:
+                continue
+            writer = writers.get(month)
+            if writer is None:
+                title = MONTH_WORKSHEET_TITLES.get(str(payload["mes"]), str(payload["mes"]))
+                writer = writers[month] = _MonthWriter(month, workbook_path(month, root), title)
+            writer.append(payload)
+        # Los libros anteriores sólo se reemplazan si la lectura terminó bien.
+        for writer in writers.values():
+            writer.close()
+    if skipped:
+        logger.info("%s registros sin fecha no se exportaron a Excel", skipped)
+    written = {month: writers[month].rows for month in sorted(writers)}
+    count("wa_excel_rows_total", sum(written.values()), help_text="Filas escritas en los libros Excel mensuales.")
+    return written
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Libros Excel mensuales de comprobantes")
+    parser.add_argument("--root", default=str(EXCEL_DIR), help="carpeta de los libros")
+    parser.add_argument("--completo", action="store_true", help="regenerar también los meses cerrados")
+    args = parser.parse_args(argv)
+
+    written = export_workbooks(root=args.root, full=args.completo)
+    for month, rows in written.items():
+        print(f"📗 {workbook_path(month, args.root)}: {rows} filas")
+    if not written:
+        print("⚠️ No hay meses abiertos con comprobantes para exportar")
+
+
+__all__ = [
+    "HEADERS",
+    "existing_months",
+    "export_workbooks",
+    "iter_jsonl_records",
+    "main",
+    "workbook_path",
+]
+
+
+if __name__ == "__main__":
+    main()
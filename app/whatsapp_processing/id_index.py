@@ -0,0 +1,199 @@
+"""Índice compacto de ``data-id`` ya procesados.
+
+Los identificadores de WhatsApp repiten el JID del chat en cada mensaje
+(``false_120363…@g.us_3EB0…_1300…@lid``). En lugar de guardar cada cadena se
+separa ese prefijo y se almacena una clave de 64 bits por mensaje:
+
+* 8 bits altos: huella del prefijo ``<de_mí>_<jid del chat>``;
+* 56 bits bajos: huella del resto del identificador.
+
+Las claves viven en un ``array('Q')`` ordenado (8 bytes por mensaje) más un
+pequeño conjunto de inserciones recientes que se fusiona por lotes. En disco
+se guardan en un archivo binario de sólo-anexado, de modo que cada guardado
+escribe únicamente las claves nuevas. El CSV exportado sigue siendo la fuente
+exacta: si el índice se pierde, se reconstruye desde ahí.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Iterator, Set
+
+_ID_PATTERN = re.compile(r"^((?:true|false)_[^_]+)_(.+)$")
+_KEY_BITS = 56
+_KEY_MASK = (1 << _KEY_BITS) - 1
+_TYPECODE = "Q"
+# Inserciones acumuladas antes de fusionarlas con el arreglo ordenado.
+MERGE_THRESHOLD = 4_096
+
+
+def _digest(value: str, size: int) -> int:
+    data = hashlib.blake2b(value.encode("utf-8", "ignore"), digest_size=size).digest()
+    return int.from_bytes(data, "big")
+
+
+@lru_cache(maxsize=1_024)
+def _prefix_bits(prefix: str) -> int:
+    # Hay un prefijo por chat: se calcula una sola vez.
+    return _digest(prefix, 1) << _KEY_BITS
+
+
+def split_message_id(data_id: str) -> tuple[str, str]:
+    """Separa ``data_id`` en prefijo del chat y clave del mensaje."""
+
+    match = _ID_PATTERN.match(data_id)
+    if not match:
+        return "", data_id
+    return match.group(1), match.group(2)
+
+
+def message_key(data_id: str) -> int:
+    """Clave de 64 bits de ``data_id`` (prefijo en los 8 bits altos)."""
+
+    prefix, rest = split_message_id(data_id)
+    return _prefix_bits(prefix) | (_digest(rest, 8) & _KEY_MASK)
+
+
+class ProcessedIdIndex:
+    """Conjunto de ``data-id`` procesados con costo fijo de 8 bytes por mensaje.
+
+    Ofrece la parte de la interfaz de ``set`` que usa la captura (``in``,
+    ``add``, ``update``, ``len``). Al iterar devuelve las claves numéricas en
+    orden (agrupadas por chat), no los identificadores originales.
+    """
+
+    def __init__(self, data_ids: Iterable[str] = ()) -> None:
+        self._sorted = array(_TYPECODE)
+        self._recent: Set[int] = set()
+        self._unsaved = array(_TYPECODE)
+        self._synced_path: Path | None = None
+        self.update(data_ids)
+
+    def __contains__(self, data_id: object) -> bool:
+        if not isinstance(data_id, str):
+            return False
+        return self._contains_key(message_key(data_id))
+
+    def __len__(self) -> int:
+        return len(self._sorted) + len(self._recent)
+
+    def __iter__(self) -> Iterator[int]:
+        self._merge()
+        return iter(self._sorted)
+
+    def _contains_key(self, key: int) -> bool:
+        if key in self._recent:
+            return True
+        position = bisect_left(self._sorted, key)
+        return position < len(self._sorted) and self._sorted[position] == key
+
+    def _add_key(self, key: int) -> bool:
+        if self._contains_key(key):
+            return False
+        self._recent.add(key)
+        if self._synced_path is not None:
+            # Antes del primer guardado se reescribe todo; no hace falta anotarla.
+            self._unsaved.append(key)
+        if len(self._recent) >= MERGE_THRESHOLD:
+            self._merge()
+        return True
+
+    def _merge(self, fresh: array | None = None) -> None:
+        """Fusiona las inserciones recientes (y ``fresh``, ya ordenado) con el arreglo."""
+
+        if not self._recent and not fresh:
+            return
+        merged = self._sorted + array(_TYPECODE, sorted(self._recent))
+        if fresh:
+            merged += fresh
+        # Tramos ya ordenados: timsort los detecta y los fusiona en tiempo
+        # lineal, sin reordenar el arreglo completo.
+        self._sorted = array(_TYPECODE, sorted(merged))
+        self._recent.clear()
+
+    def add(self, data_id: str) -> None:
+        if data_id:
+            self._add_key(message_key(data_id))
+
+    def update(self, data_ids: Iterable[str]) -> None:
+        """Agrega muchos identificadores con una sola fusión (carga inicial, CSV)."""
+
+        keys = {message_key(data_id) for data_id in data_ids if data_id}
+        fresh = array(_TYPECODE, sorted(key for key in keys if not self._contains_key(key)))
+        if not fresh:
+            return
+        if self._synced_path is not None:
+            self._unsaved.extend(fresh)
+        self._merge(fresh)
+
+    @property
+    def pending(self) -> int:
+        """Claves agregadas desde el último guardado."""
+
+        return len(self._unsaved)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes ocupados por el arreglo ordenado de claves."""
+
+        return len(self._sorted) * self._sorted.itemsize
+
+    def save(self, path: str | Path) -> None:
+        """Anexa al archivo las claves nuevas (costo proporcional a lo agregado).
+
+        La primera vez que se guarda en ``path`` se reescribe el archivo
+        completo, porque el índice en memoria pudo reconstruirse desde el CSV.
+        """
+
+        target = Path(path)
+        if self._synced_path != target:
+            self.compact(target)
+            return
+        if not self._unsaved:
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with open(target, "ab") as handle:
+            self._unsaved.tofile(handle)
+        self._unsaved = array(_TYPECODE)
+
+    def compact(self, path: str | Path) -> None:
+        """Reescribe el archivo con las claves ordenadas y sin duplicados."""
+
+        self._merge()
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temporary = target.with_suffix(target.suffix + ".tmp")
+        with open(temporary, "wb") as handle:
+            self._sorted.tofile(handle)
+        temporary.replace(target)
+        self._unsaved = array(_TYPECODE)
+        self._synced_path = target
+
+    @classmethod
+    def load(cls, path: str | Path) -> "ProcessedIdIndex":
+        """Lee un índice guardado; un archivo ausente o truncado no es un error."""
+
+        index = cls()
+        try:
+            raw = Path(path).read_bytes()
+        except FileNotFoundError:
+            return index
+        keys = array(_TYPECODE)
+        usable = len(raw) - len(raw) % keys.itemsize
+        keys.frombytes(raw[:usable])
+        index._sorted = array(_TYPECODE, sorted(set(keys)))
+        index._synced_path = Path(path)
+        return index
+
+
+__all__ = [
+    "MERGE_THRESHOLD",
+    "ProcessedIdIndex",
+    "message_key",
+    "split_message_id",
+]
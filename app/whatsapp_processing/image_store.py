@@ -0,0 +1,433 @@
+"""Almacén de imágenes direccionado por contenido.
+
+Cada imagen se guarda una sola vez con el SHA-256 de sus bytes como nombre,
+repartida en subcarpetas por los primeros caracteres del hash::
+
+    outputs/images/3f/a2/3fa2…c9.jpg
+
+Un comprobante reenviado produce los mismos bytes y reutiliza el archivo
+existente. El índice ``index.jsonl`` asocia cada ``data_id`` con su archivo
+y el mes en que se guardó; es de sólo-anexado (una línea por imagen nueva) y
+la última línea de un ``data_id`` es la vigente.
+
+Los meses viejos se pueden compactar: recomprimir a WebP y/o empaquetar en
+``archive/<AAAA-MM>.zip``. Eso mueve los archivos a los que apunta el
+``img_file`` ya registrado en CSV, JSONL, SQLite y Sheets; esas rutas se
+resuelven con :meth:`ImageStore.locate` (por el hash del nombre o por
+``data_id``), que también entiende las rutas planas ``<data_id>.jpg`` de
+antes del almacén una vez migradas con ``migrate``. Uso::
+
+    python -m app.whatsapp_processing.image_store migrate
+    python -m app.whatsapp_processing.image_store compact --before 2025-11 --webp 80 --archive
+    python -m app.whatsapp_processing.image_store resolve "outputs\\images\\<data_id>.jpg"
+    python -m app.whatsapp_processing.image_store stats
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import zipfile
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Tuple
+
+import cv2
+import numpy as np
+
+from settings import getint
+from telemetry import count
+
+from .constants import IMG_DIR
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "index.jsonl"
+ARCHIVE_DIR = "archive"
+# Niveles de subcarpetas y caracteres del hash por nivel (256 x 256 carpetas).
+SHARD_LEVELS = 2
+SHARD_WIDTH = 2
+WEBP_QUALITY = getint("WA_IMAGE_WEBP_QUALITY", 80)
+# Formatos que no se recomprimen (ya son WebP o pierden animación).
+_KEEP_FORMAT = {"webp", "gif"}
+_IMAGE_EXTENSIONS = {"jpg", "jpeg", "png", "webp", "gif"}
+
+_stores: Dict[Path, "ImageStore"] = {}
+_stores_lock = threading.Lock()
+
+
+class StoredImage(NamedTuple):
+    """Ubicación de una imagen: archivo relativo a la raíz y miembro si está en un zip."""
+
+    file: str
+    month: str
+    member: str = ""
+
+    @property
+    def digest(self) -> str:
+        return Path(self.member or self.file).stem
+
+    @property
+    def archived(self) -> bool:
+        return bool(self.member)
+
+
+@dataclass
+class CompactionSummary:
+    """Resultado de :meth:`ImageStore.compact`."""
+
+    recompressed: int = 0
+    archived: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def shard_path(digest: str, extension: str) -> str:
+    """Ruta relativa (con ``/``) de un hash dentro del almacén."""
+
+    parts = [digest[i * SHARD_WIDTH : (i + 1) * SHARD_WIDTH] for i in range(SHARD_LEVELS)]
+    return "/".join([*parts, f"{digest}.{extension.lstrip('.').lower()}"])
+
+
+class ImageStore:
+    """Imágenes deduplicadas por contenido con un índice ``data_id`` → archivo.
+
+    Es seguro usarlo desde varios hilos del mismo proceso (el pool de
+    escritura de :mod:`media`); el índice sólo lo escribe el proceso dueño.
+    """
+
+    def __init__(self, root: str | Path = IMG_DIR) -> None:
+        self.root = Path(root)
+        self.index_path = self.root / INDEX_NAME
+        self._entries: Dict[str, StoredImage] = {}
+        self._by_hash: Dict[str, StoredImage] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _read_index(self) -> List[Tuple[str, StoredImage]]:
+        """Líneas del índice en disco, en orden (``data_id``, ubicación)."""
+
+        lines: List[Tuple[str, StoredImage]] = []
+        try:
+            handle = open(self.index_path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return lines
+        with handle:
+            for line in handle:
+                try:
+                    raw = json.loads(line)
+                    entry = StoredImage(raw["file"], raw.get("month", ""), raw.get("member", ""))
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    continue  # línea truncada por un corte
+                lines.append((raw.get("id", ""), entry))
+        return lines
+
+    def _load(self) -> None:
+        for data_id, entry in self._read_index():
+            self._entries[data_id] = entry
+            self._by_hash[entry.digest] = entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def distinct(self) -> int:
+        """Imágenes distintas (por contenido) referidas por el índice."""
+
+        return len(self._by_hash)
+
+    def __contains__(self, data_id: object) -> bool:
+        return data_id in self._entries
+
+    def entry(self, data_id: str) -> StoredImage | None:
+        return self._entries.get(data_id)
+
+    def path_for(self, data_id: str) -> Path | None:
+        """Archivo suelto de ``data_id`` (``None`` si no existe o está en un zip)."""
+
+        entry = self._entries.get(data_id)
+        if entry is None or entry.archived:
+            return None
+        return self.root / entry.file
+
+    def read_bytes(self, data_id: str) -> bytes | None:
+        entry = self._entries.get(data_id)
+        return None if entry is None else self._read_entry(entry)
+
+    def _read_entry(self, entry: StoredImage) -> bytes:
+        if entry.archived:
+            with zipfile.ZipFile(self.root / entry.file) as archive:
+                return archive.read(entry.member)
+        return (self.root / entry.file).read_bytes()
+
+    def locate(self, img_file: str = "", data_id: str = "") -> StoredImage | None:
+        """Ubicación vigente de una imagen ya registrada en un ``img_file``.
+
+        El nombre de los archivos del almacén es el hash del contenido, que se
+        conserva al recomprimir y al archivar; las rutas planas anteriores
+        (``<data_id>.jpg``) se resuelven por ``data_id`` tras :meth:`migrate_flat`.
+        """
+
+        stem = Path(img_file.replace("\\", "/")).stem if img_file else ""
+        with self._lock:
+            return self._by_hash.get(stem) or self._entries.get(data_id) or self._entries.get(stem)
+
+    def read_recorded(self, img_file: str = "", data_id: str = "") -> bytes | None:
+        """Bytes de la imagen de un registro exportado, esté suelta o archivada."""
+
+        entry = self.locate(img_file, data_id)
+        if entry is not None:
+            return self._read_entry(entry)
+        legacy = Path(img_file.replace("\\", "/")) if img_file else None
+        return legacy.read_bytes() if legacy is not None and legacy.is_file() else None
+
+    def migrate_flat(self) -> int:
+        """Pasa al almacén las imágenes planas ``<data_id>.<ext>`` de la raíz.
+
+        El mes se toma de la fecha de modificación del archivo. Devuelve la
+        cantidad de archivos migrados.
+        """
+
+        moved = 0
+        for path in sorted(self.root.glob("*.*")):
+            extension = path.suffix.lstrip(".").lower()
+            if not path.is_file() or extension not in _IMAGE_EXTENSIONS:
+                continue
+            month = time.strftime("%Y-%m", time.localtime(path.stat().st_mtime))
+            self.put(path.stem, path.read_bytes(), extension, month=month)
+            path.unlink()
+            moved += 1
+        return moved
+
+    def _append_index(self, data_id: str, entry: StoredImage) -> None:
+        record = {"id": data_id, "file": entry.file, "month": entry.month}
+        if entry.member:
+            record["member"] = entry.member
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.index_path, "a", encoding="utf-8") as handle:
+            handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def put(self, data_id: str, data: bytes, extension: str, *, month: str | None = None) -> Path:
+        """Guarda ``data`` (si su contenido es nuevo) y devuelve la ruta del archivo.
+
+        Un contenido que sólo existe dentro de un zip archivado se vuelve a
+        escribir suelto: quien llama siempre recibe un archivo legible por el OCR.
+        """
+
+        digest = content_hash(data)
+        month = month or time.strftime("%Y-%m")
+        with self._lock:
+            existing = self._by_hash.get(digest)
+            if existing is not None and not existing.archived and (self.root / existing.file).exists():
+                entry, result = existing, "deduplicated"
+            else:
+                entry = StoredImage(shard_path(digest, extension), month)
+                target = self.root / entry.file
+                target.parent.mkdir(parents=True, exist_ok=True)
+                temporary = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+                temporary.write_bytes(data)
+                temporary.replace(target)
+                self._by_hash[digest] = entry
+                result = "stored"
+            if self._entries.get(data_id) != entry:
+                self._entries[data_id] = entry
+                self._append_index(data_id, entry)
+        count("wa_image_store_total", result=result, help_text="Imágenes guardadas o deduplicadas por contenido.")
+        return self.root / entry.file
+
+    def months(self) -> Counter:
+        """Cantidad de ``data_id`` por mes."""
+
+        return Counter(entry.month for entry in self._entries.values())
+
+    def _files_by_month(self, before: str) -> Dict[str, Dict[str, List[str]]]:
+        grouped: Dict[str, Dict[str, List[str]]] = defaultdict(lambda: defaultdict(list))
+        for data_id, entry in self._entries.items():
+            if entry.month and entry.month < before and not entry.archived:
+                grouped[entry.month][entry.file].append(data_id)
+        return grouped
+
+    def _replace(self, data_ids: List[str], entry: StoredImage) -> None:
+        for data_id in data_ids:
+            self._entries[data_id] = entry
+        self._by_hash[entry.digest] = entry
+
+    def _recompress(self, file: str, quality: int) -> Tuple[str, int, int]:
+        """Convierte ``file`` a WebP; devuelve el nuevo nombre y los tamaños."""
+
+        source = self.root / file
+        before = source.stat().st_size
+        extension = source.suffix.lstrip(".").lower()
+        if extension in _KEEP_FORMAT:
+            return file, before, before
+        image = cv2.imdecode(np.fromfile(str(source), dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        ok, encoded = (False, None) if image is None else cv2.imencode(
+            ".webp", image, [cv2.IMWRITE_WEBP_QUALITY, quality]
+        )
+        if not ok or len(encoded) >= before:
+            return file, before, before
+        # Se conserva el hash del contenido original: un reenvío idéntico
+        # sigue encontrando la imagen.
+        target_name = shard_path(Path(file).stem, "webp")
+        (self.root / target_name).write_bytes(encoded.tobytes())
+        source.unlink()
+        return target_name, before, len(encoded)
+
+    def compact(
+        self,
+        before: str,
+        *,
+        webp_quality: int | None = None,
+        archive: bool = False,
+    ) -> CompactionSummary:
+        """Recomprime y/o archiva las imágenes de los meses anteriores a ``before`` (``AAAA-MM``).
+
+        Al cerrar cada mes (aunque falle a mitad) reescribe el índice con una
+        línea por ``data_id``, sumando antes las líneas que otro proceso haya
+        anexado. Conviene correrlo con la captura detenida: su copia del
+        índice en memoria sigue apuntando a los archivos movidos hasta que se
+        reinicia. Los ``img_file`` ya exportados dejan de apuntar a un archivo
+        suelto y se leen con :meth:`read_recorded`.
+        """
+
+        summary = CompactionSummary()
+        with self._lock:
+            for month, files in sorted(self._files_by_month(before).items()):
+                archive_path = self.root / ARCHIVE_DIR / f"{month}.zip"
+                bundle = None
+                if archive:
+                    archive_path.parent.mkdir(parents=True, exist_ok=True)
+                    bundle = zipfile.ZipFile(archive_path, "a", compression=zipfile.ZIP_STORED)
+                try:
+                    for file, data_ids in files.items():
+                        if not (self.root / file).exists():
+                            logger.warning("Falta la imagen %s del índice", file)
+                            continue
+                        size = (self.root / file).stat().st_size
+                        summary.bytes_before += size
+                        if webp_quality is not None:
+                            new_file, _, size = self._recompress(file, webp_quality)
+                            if new_file != file:
+                                summary.recompressed += 1
+                                file = new_file
+                                self._replace(data_ids, StoredImage(file, month))
+                        if bundle is not None:
+                            member = Path(file).name
+                            if member not in bundle.namelist():
+                                bundle.write(self.root / file, member)
+                            (self.root / file).unlink()
+                            summary.archived += 1
+                            relative = f"{ARCHIVE_DIR}/{month}.zip"
+                            self._replace(data_ids, StoredImage(relative, month, member))
+                        summary.bytes_after += size
+                finally:
+                    if bundle is not None:
+                        bundle.close()
+                    # Los archivos de este mes ya se movieron: el índice debe
+                    # reflejarlo aunque el mes siguiente falle.
+                    self._rewrite_index()
+        return summary
+
+    def _merge_appended(self) -> None:
+        """Suma los ``data_id`` que otro proceso (la captura) anexó al índice desde que se cargó."""
+
+        for data_id, entry in self._read_index():
+            if data_id in self._entries:
+                continue
+            moved = self._by_hash.get(entry.digest)
+            if moved is not None and not entry.archived and not (self.root / entry.file).exists():
+                entry = moved  # reenvío de una imagen que esta compactación movió
+            self._entries[data_id] = entry
+            self._by_hash.setdefault(entry.digest, entry)
+
+    def _rewrite_index(self) -> None:
+        self._merge_appended()
+        self.root.mkdir(parents=True, exist_ok=True)
+        temporary = self.index_path.with_suffix(".jsonl.tmp")
+        with open(temporary, "w", encoding="utf-8") as handle:
+            for data_id, entry in self._entries.items():
+                record = {"id": data_id, "file": entry.file, "month": entry.month}
+                if entry.member:
+                    record["member"] = entry.member
+                handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+        temporary.replace(self.index_path)
+
+
+def get_image_store(root: str | Path = IMG_DIR) -> ImageStore:
+    """Almacén compartido del proceso para ``root`` (se crea en el primer uso)."""
+
+    key = Path(root).resolve()
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = ImageStore(root)
+        return store
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Almacén de imágenes de comprobantes")
+    parser.add_argument("--root", default=str(IMG_DIR), help="carpeta del almacén")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compact = commands.add_parser("compact", help="recomprimir/archivar meses anteriores")
+    compact.add_argument("--before", required=True, help="primer mes que se conserva intacto (AAAA-MM)")
+    compact.add_argument(
+        "--webp", type=int, nargs="?", const=WEBP_QUALITY, default=None, help="recomprimir a WebP con esta calidad"
+    )
+    compact.add_argument("--archive", action="store_true", help="empaquetar cada mes en archive/AAAA-MM.zip")
+    commands.add_parser("migrate", help="pasar al almacén las imágenes planas <data_id>.jpg")
+    resolve = commands.add_parser("resolve", help="ubicación actual de un img_file registrado")
+    resolve.add_argument("img_file", help="ruta img_file del CSV/JSONL/Sheets (o un data_id)")
+    commands.add_parser("stats", help="imágenes por mes")
+    args = parser.parse_args(argv)
+
+    store = get_image_store(args.root)
+    if args.command == "stats":
+        for month, total in sorted(store.months().items()):
+            print(f"{month or '—'}: {total}")
+        print(f"🗂️ {len(store)} mensajes, {store.distinct} imágenes distintas")
+        return
+    if args.command == "migrate":
+        print(f"📦 {store.migrate_flat()} imágenes planas migradas al almacén")
+        return
+    if args.command == "resolve":
+        entry = store.locate(args.img_file, args.img_file)
+        if entry is None:
+            print("⚠️ La imagen no está en el índice del almacén")
+        elif entry.archived:
+            print(f"🗜️ {store.root / entry.file} → {entry.member}")
+        else:
+            print(f"🖼️ {store.root / entry.file}")
+        return
+
+    summary = store.compact(args.before, webp_quality=args.webp, archive=args.archive)
+    print(
+        f"🗜️ {summary.recompressed} recomprimidas, {summary.archived} archivadas "
+        f"({summary.bytes_before / 1e6:.1f} MB → {summary.bytes_after / 1e6:.1f} MB)"
+    )
+    print("ℹ️ Los img_file ya exportados se resuelven con el subcomando resolve (por hash o data_id).")
+
+
+__all__ = [
+    "ARCHIVE_DIR",
+    "CompactionSummary",
+    "ImageStore",
+    "StoredImage",
+    "content_hash",
+    "get_image_store",
+    "main",
+    "shard_path",
+]
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,8 @@ import json
 from pathlib import Path
 from typing import Mapping
 
+from telemetry import timed
+
 from .constants import JSONL_FILE
 
 
@@ -13,7 +15,7 @@ def append_jsonl(row: Mapping[str, str], jsonl_path: str | None = None) -> None:
     """Agrega un registro en formato JSON Lines al archivo configurado."""
 
     path = Path(JSONL_FILE if jsonl_path is None else jsonl_path)
-    with open(path, "a", encoding="utf-8") as handle:
+    with timed("jsonl_write"), open(path, "a", encoding="utf-8") as handle:
         handle.write(json.dumps(row, ensure_ascii=False) + "\n")
 
 
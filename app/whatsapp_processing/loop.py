@@ -4,14 +4,21 @@ from __future__ import annotations
 
 import asyncio
 import logging
+from dataclasses import dataclass, field
+from pathlib import Path
 
 from playwright.async_api import Locator, Page
 
+from .backfill import Backfill, backfill_path_for, backfill_step
 from .cache import ProcessedIds, save_cache
-from .constants import POLL_SECONDS, SLOW_AFTER_SCROLL_MS
+from .chats import ChatTarget, prepare_chat_target
+from .constants import CACHE_FILE, LIVE_TAIL_BACKFILL, POLL_SECONDS, SLOW_AFTER_SCROLL_MS
 from .containers import get_messages_container
+from .payment_index import PaymentIndex, get_payment_index
 from .processing import process_visible_top_to_bottom
+from .rejections import RejectionCache, rejections_path_for
 from .scrolling import scroll_to_last_processed, scroll_to_very_top
+from .voucher_store import VoucherStore, get_voucher_store
 
 logger = logging.getLogger(__name__)
 
@@ -117,25 +124,82 @@ async def _announce_last_id_context(
         if previous_cached_id:
             print(f"↪️ Referencia previa en caché: {previous_cached_id}")
 
-async def monitor_conversation(
+@dataclass
+class CaptureCursor:
+    """Punto de control en memoria de la captura de un chat."""
+
+    processed_ids: ProcessedIds
+    last_id: str
+    last_signature: str
+    previous_cached_id: str = ""
+    target: ChatTarget | None = None
+    swept: bool = False
+    rejections: RejectionCache = field(default_factory=RejectionCache)
+    payments: PaymentIndex | None = None
+    vouchers: VoucherStore | None = None
+    backfill: Backfill | None = None
+
+    @classmethod
+    def from_target(cls, target: ChatTarget) -> "CaptureCursor":
+        """Prepara los archivos del chat y recupera sus cachés desde disco."""
+
+        state = prepare_chat_target(target)
+        return cls(
+            processed_ids=state.processed_ids,
+            last_id=state.last_id,
+            last_signature=state.last_signature,
+            previous_cached_id=state.previous_id,
+            target=target,
+            rejections=RejectionCache.load(target.rejections_path),
+            payments=get_payment_index(),
+            vouchers=get_voucher_store(),
+        )
+
+    @property
+    def rejections_path(self) -> Path:
+        if self.target is None:
+            return rejections_path_for(CACHE_FILE)
+        return self.target.rejections_path
+
+    @property
+    def backfill_path(self) -> Path:
+        return backfill_path_for(CACHE_FILE if self.target is None else self.target.cache_path)
+
+    @property
+    def backfilling(self) -> bool:
+        return self.backfill is not None and not self.backfill.done
+
+    def save(self) -> None:
+        """Persiste el punto de control en el caché correspondiente al chat."""
+
+        cache_path = None if self.target is None else str(self.target.cache_path)
+        save_cache(
+            self.processed_ids,
+            self.last_id,
+            self.last_signature,
+            cache_path=cache_path,
+        )
+        self.rejections.save(self.rejections_path)
+        if self.backfill is not None:
+            self.backfill.save()
+
+
+async def start_capture(
     page: Page,
-    processed_ids: ProcessedIds,
-    last_id: str,
-    last_signature: str,
+    cursor: CaptureCursor,
     *,
-    previous_cached_id: str = "",
     verbose_print: bool = True,
-) -> str:
-    """Mantiene la captura de mensajes nuevos siguiendo la simulación original."""
+) -> int:
+    """Reubica la vista en el último mensaje conocido y hace el barrido inicial."""
 
     await _prepare_messages_container(page)
-    
-    await _announce_last_id_context(page, last_id, previous_cached_id)
 
-    if last_id and last_id not in processed_ids:
-        processed_ids.add(last_id)
+    await _announce_last_id_context(page, cursor.last_id, cursor.previous_cached_id)
 
-    if not last_id:
+    if cursor.last_id and cursor.last_id not in cursor.processed_ids:
+        cursor.processed_ids.add(cursor.last_id)
+
+    if not cursor.last_id:
         # eliminar comentario a futuro
         print("⚠️ No tenemos un ID de búsqueda en caché (svc). Se partirá desde el inicio.")
         await scroll_to_very_top(page)
@@ -143,57 +207,204 @@ async def monitor_conversation(
         # 1) Reubicación en el último mensaje procesado.
         #    Mantiene el punto de partida cuando hay datos en caché para
         #    evitar re-procesar la conversación completa tras una desconexión.
-        print(f"🔎 Intentando reubicar el ID de búsqueda: {last_id}")
-        await scroll_to_last_processed(page, last_id)
+        print(f"🔎 Intentando reubicar el ID de búsqueda: {cursor.last_id}")
+        await scroll_to_last_processed(page, cursor.last_id)
 
     # 2) Barrido inicial y guardado de mensajes visibles.
     #    Se recorre la ventana actual de mensajes desde el inicio hacia abajo para
     #    procesar y registrar cualquier mensaje que aún no esté en caché. La
-    #    función devuelve el conteo de mensajes nuevos (ignoramos el valor), el
-    #    último ID procesado y su firma, que se almacenan para mantener la
-    #    continuidad del seguimiento.
-    _, last_id, last_signature = await process_visible_top_to_bottom(
+    #    función devuelve el conteo de mensajes nuevos, el último ID procesado y
+    #    su firma, que se almacenan para mantener la continuidad del seguimiento.
+    new_count, cursor.last_id, cursor.last_signature = await process_visible_top_to_bottom(
         page,
-        processed_ids,
-        last_id,
-        last_signature,
+        cursor.processed_ids,
+        cursor.last_id,
+        cursor.last_signature,
         verbose_print=verbose_print,
+        target=cursor.target,
+        rejections=cursor.rejections,
+        payments=cursor.payments,
+        vouchers=cursor.vouchers,
     )
+    cursor.swept = True
+    return new_count
 
-    #    Tras el barrido se persisten los identificadores procesados y el último
-    #    punto de control para que, si la sesión se interrumpe, el sistema pueda
-    #    reanudar desde el mismo lugar sin re-trabajar mensajes ya vistos
 
-    print("🔄 Conectado. Escuchando nuevos mensajes... (Ctrl+C para salir)")
+async def start_live_capture(
+    page: Page,
+    cursor: CaptureCursor,
+    *,
+    verbose_print: bool = True,
+) -> int:
+    """Barrido inicial que sólo cubre el final del chat.
+
+    Si el último mensaje conocido no está en la vista (o no hay caché), el
+    historial intermedio queda a cargo de un :class:`Backfill` que avanza
+    entre las pasadas de escucha en lugar de recorrerse antes de empezar.
+    """
+
+    await _prepare_messages_container(page)
+
+    await _announce_last_id_context(page, cursor.last_id, cursor.previous_cached_id)
+
+    if cursor.last_id and cursor.last_id not in cursor.processed_ids:
+        cursor.processed_ids.add(cursor.last_id)
 
     try:
-        while True:
-            await _prepare_messages_container(page)
+        await page.keyboard.press("End")
+    except Exception:  # pragma: no cover - depende del estado del DOM
+        pass
+    await page.wait_for_timeout(SLOW_AFTER_SCROLL_MS)
+
+    cursor.backfill = Backfill.load(cursor.backfill_path)
+    last_loaded = bool(cursor.last_id) and (
+        await page.locator(f'div[role="row"] div[data-id="{cursor.last_id}"]').count() > 0
+    )
+    if cursor.backfill is not None:
+        stop = cursor.backfill.stop_id or "el inicio del chat"
+        print(f"🕰️ Se retoma la recuperación del historial hasta {stop}")
+    elif not last_loaded:
+        cursor.backfill = Backfill(stop_id=cursor.last_id, path=cursor.backfill_path)
+        cursor.backfill.save()
+        print("🕰️ El historial pendiente se recuperará por tramos mientras se escuchan los mensajes nuevos.")
+
+    new_count, cursor.last_id, cursor.last_signature = await process_visible_top_to_bottom(
+        page,
+        cursor.processed_ids,
+        cursor.last_id,
+        cursor.last_signature,
+        verbose_print=verbose_print,
+        target=cursor.target,
+        rejections=cursor.rejections,
+        payments=cursor.payments,
+        vouchers=cursor.vouchers,
+        mark_before_last=not cursor.backfilling,
+    )
+    cursor.swept = True
+    cursor.save()
+    return new_count
+
+
+async def capture_pass(
+    page: Page,
+    cursor: CaptureCursor,
+    *,
+    verbose_print: bool = True,
+    max_new: int | None = None,
+) -> int:
+    """Ejecuta una pasada de escucha sobre el final de la conversación."""
 
-            if await _needs_scroll_to_bottom(page, last_id):
-                await scroll_to_last_processed(page, last_id)
-                try:
-                    await page.keyboard.press("End")
-                except Exception:  # pragma: no cover - depende del estado del DOM
-                    pass
-                await page.wait_for_timeout(SLOW_AFTER_SCROLL_MS)
+    await _prepare_messages_container(page)
+
+    if await _needs_scroll_to_bottom(page, cursor.last_id):
+        await scroll_to_last_processed(page, cursor.last_id)
+        try:
+            await page.keyboard.press("End")
+        except Exception:  # pragma: no cover - depende del estado del DOM
+            pass
+        await page.wait_for_timeout(SLOW_AFTER_SCROLL_MS)
+
+    new_count, cursor.last_id, cursor.last_signature = await process_visible_top_to_bottom(
+        page,
+        cursor.processed_ids,
+        cursor.last_id,
+        cursor.last_signature,
+        verbose_print=verbose_print,
+        target=cursor.target,
+        max_new=max_new,
+        rejections=cursor.rejections,
+        payments=cursor.payments,
+        vouchers=cursor.vouchers,
+        # Lo anterior al final ya registrado es del relleno mientras siga
+        # pendiente: marcarlo aquí perdería lo que aún no capturó.
+        mark_before_last=not cursor.backfilling,
+    )
+
+    # Tras cada pasada se persisten los identificadores procesados y el último
+    # punto de control para que, si la sesión se interrumpe, el sistema pueda
+    # reanudar desde el mismo lugar sin re-trabajar mensajes ya vistos.
+    if new_count or cursor.last_id or cursor.rejections.dirty:
+        cursor.save()
+    return new_count
 
-            new_count, last_id, last_signature = await process_visible_top_to_bottom(
+
+async def follow_conversation(
+    page: Page,
+    cursor: CaptureCursor,
+    *,
+    verbose_print: bool = True,
+) -> str:
+    """Escucha el chat abierto a partir del punto de control ``cursor``.
+
+    Si el barrido inicial ya se hizo (por ejemplo, tras una reconexión) se
+    reanuda directamente con las pasadas de escucha. Mientras quede historial
+    por recuperar, cada pasada de escucha se alterna con un tramo del relleno.
+    """
+
+    if not cursor.swept:
+        if LIVE_TAIL_BACKFILL:
+            await start_live_capture(page, cursor, verbose_print=verbose_print)
+        else:
+            await start_capture(page, cursor, verbose_print=verbose_print)
+        print("🔄 Conectado. Escuchando nuevos mensajes... (Ctrl+C para salir)")
+    else:
+        print(f"🔁 Reanudando la escucha desde el ID {cursor.last_id or '(vacío)'}")
+
+    try:
+        while True:
+            await capture_pass(page, cursor, verbose_print=verbose_print)
+            if not cursor.backfilling:
+                await asyncio.sleep(POLL_SECONDS)
+                continue
+            # Un tramo del historial entre dos pasadas: los mensajes nuevos
+            # esperan como mucho lo que dura un tramo.
+            await backfill_step(
                 page,
-                processed_ids,
-                last_id,
-                last_signature,
+                cursor.backfill,
+                cursor.processed_ids,
+                target=cursor.target,
+                rejections=cursor.rejections,
+                payments=cursor.payments,
+                vouchers=cursor.vouchers,
                 verbose_print=verbose_print,
             )
-
-            if new_count or last_id:
-                save_cache(processed_ids, last_id, last_signature)
-
-            await asyncio.sleep(POLL_SECONDS)
+            cursor.save()
     finally:
-        save_cache(processed_ids, last_id, last_signature)
+        cursor.save()
 
-    return last_id
+    return cursor.last_id
 
 
-__all__ = ["monitor_conversation"]
\ No newline at end of file
+async def monitor_conversation(
+    page: Page,
+    processed_ids: ProcessedIds,
+    last_id: str,
+    last_signature: str,
+    *,
+    previous_cached_id: str = "",
+    verbose_print: bool = True,
+    target: ChatTarget | None = None,
+) -> str:
+    """Mantiene la captura de mensajes nuevos siguiendo la simulación original."""
+
+    cursor = CaptureCursor(
+        processed_ids=processed_ids,
+        last_id=last_id,
+        last_signature=last_signature,
+        previous_cached_id=previous_cached_id,
+        target=target,
+        payments=get_payment_index(),
+        vouchers=get_voucher_store(),
+    )
+    cursor.rejections = RejectionCache.load(cursor.rejections_path)
+    return await follow_conversation(page, cursor, verbose_print=verbose_print)
+
+
+__all__ = [
+    "CaptureCursor",
+    "capture_pass",
+    "follow_conversation",
+    "monitor_conversation",
+    "start_capture",
+    "start_live_capture",
+]
@@ -4,13 +4,61 @@ from __future__ import annotations
 
 import asyncio
 import base64
-from typing import Tuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Mapping, Tuple
 
 from playwright.async_api import Locator, Page
 
-from .constants import BLOB_POLL_STEP_MS, BLOB_WAIT_MS_TOTAL, IMG_DIR
+from telemetry import count, timed
+
+from .constants import (
+    BLOB_BATCH_LINGER_MS,
+    BLOB_BATCH_SIZE,
+    BLOB_POLL_STEP_MS,
+    BLOB_WAIT_MS_TOTAL,
+    BLOB_WRITE_WORKERS,
+    IMG_DIR,
+)
+from .image_store import get_image_store
 from .text_blocks import find_copyable_block_in
 
+# Descarga en paralelo dentro de la página: ``Promise.allSettled`` evita que un
+# blob revocado haga fallar al resto del lote. La conversión a base64 se hace
+# por bloques para no desbordar la pila con imágenes grandes.
+_FETCH_BLOBS_JS = """async (blobs) => {
+    const toBase64 = (buf) => {
+        const bytes = new Uint8Array(buf);
+        let binary = '';
+        for (let i = 0; i < bytes.length; i += 0x8000) {
+            binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+        }
+        return btoa(binary);
+    };
+    const keys = Object.keys(blobs);
+    const settled = await Promise.allSettled(keys.map(async (key) => {
+        const res = await fetch(blobs[key]);
+        const buf = await res.arrayBuffer();
+        const ct = res.headers.get('content-type') || 'image/jpeg';
+        return { b64: toBase64(buf), contentType: ct };
+    }));
+    const out = {};
+    settled.forEach((item, index) => {
+        out[keys[index]] = item.status === 'fulfilled'
+            ? item.value
+            : { error: String(item.reason) };
+    });
+    return out;
+}"""
+
+_writer_pool: ThreadPoolExecutor | None = None
+
+
+class BlobFetchError(RuntimeError):
+    """No se pudo descargar una imagen ``blob:`` del lote."""
+
 
 async def fetch_blob_to_base64(page: Page, blob_url: str) -> dict[str, str]:
     """Descarga un recurso ``blob:`` y lo convierte en base64."""
@@ -74,35 +122,220 @@ async def strict_has_blob_img_inside_copyable(message: Locator) -> Tuple[Locator
     if await blob_images.count() == 0:
         await _wake_up_blob_image(message)
 
+    data_src = ""
+    if await data_images.count() > 0:
+        data_src = await data_images.first.get_attribute("src") or ""
+
     if await blob_images.count() == 0:
-        return None, "", ""
+        # Se devuelve la miniatura (si existe) para distinguir una imagen que
+        # aún no terminó de cargar de un mensaje que no tiene imagen.
+        return None, "", data_src
 
     blob_element = blob_images.first
     blob_src = await blob_element.get_attribute("src") or ""
-    data_src = ""
-    if await data_images.count() > 0:
-        data_src = await data_images.first.get_attribute("src") or ""
     return blob_element, blob_src, data_src
 
 
+async def wait_for_blob_src(message: Locator) -> str:
+    """Espera a que la imagen diferida del mensaje exponga su ``src`` ``blob:``."""
+
+    await _wake_up_blob_image(message)
+    block = await find_copyable_block_in(message)
+    if block is None:
+        return ""
+    blob_images = block.locator('img[src^="blob:"]')
+    if await blob_images.count() == 0:
+        return ""
+    return await blob_images.first.get_attribute("src") or ""
+
+
+@dataclass(frozen=True)
+class BlobResult:
+    """Resultado de una descarga del lote: ruta escrita o mensaje de error."""
+
+    key: str
+    path: str = ""
+    error: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.path) and not self.error
+
+
+def _get_writer_pool() -> ThreadPoolExecutor:
+    global _writer_pool
+    if _writer_pool is None:
+        _writer_pool = ThreadPoolExecutor(
+            max_workers=BLOB_WRITE_WORKERS, thread_name_prefix="wa-blob-writer"
+        )
+    return _writer_pool
+
+
+def _store_image(data_id: str, b64: str, extension: str) -> str:
+    """Guarda la imagen en el almacén por contenido de ``IMG_DIR``."""
+
+    return str(get_image_store(IMG_DIR).put(data_id, base64.b64decode(b64), extension))
+
+
+async def download_blobs(page: Page, blobs: Mapping[str, str]) -> Dict[str, BlobResult]:
+    """Descarga varias imágenes ``blob:`` con un solo ``evaluate``.
+
+    ``blobs`` asocia cada clave (el ``data-id`` del mensaje) con su URL. Las
+    imágenes se guardan en el almacén por contenido de ``IMG_DIR`` desde un
+    pool de hilos y cada clave informa su propio error.
+    """
+
+    wanted = {key: url for key, url in blobs.items() if url}
+    results: Dict[str, BlobResult] = {
+        key: BlobResult(key=key, error="sin URL blob") for key in blobs if key not in wanted
+    }
+    if not wanted:
+        return results
+
+    with timed("blob_download"):
+        try:
+            payloads = await page.evaluate(_FETCH_BLOBS_JS, wanted)
+        except Exception as exc:
+            payloads = {key: {"error": str(exc)} for key in wanted}
+
+        loop = asyncio.get_running_loop()
+        writes: List[asyncio.Future] = []
+        pending: List[str] = []
+        for key in wanted:
+            payload = (payloads or {}).get(key) or {"error": "sin respuesta"}
+            if payload.get("error"):
+                results[key] = BlobResult(key=key, error=str(payload["error"]))
+                continue
+            extension = ext_from_content_type(payload.get("contentType"))
+            pending.append(key)
+            writes.append(
+                loop.run_in_executor(
+                    _get_writer_pool(), _store_image, key, payload.get("b64", ""), extension
+                )
+            )
+
+        outcomes = await asyncio.gather(*writes, return_exceptions=True)
+        for key, outcome in zip(pending, outcomes):
+            if isinstance(outcome, BaseException):
+                results[key] = BlobResult(key=key, error=str(outcome))
+            else:
+                results[key] = BlobResult(key=key, path=outcome)
+
+    count("wa_blob_batches_total", help_text="Lotes de descargas blob ejecutados.")
+    return results
+
+
+class BlobBatcher:
+    """Agrupa las descargas pedidas en paralelo durante una pasada.
+
+    Cada llamada a :meth:`download` espera hasta ``linger_ms`` a que lleguen
+    otras y luego todas viajan juntas en un solo :func:`download_blobs`.
+    """
+
+    def __init__(
+        self,
+        page: Page,
+        *,
+        max_batch: int = BLOB_BATCH_SIZE,
+        linger_ms: float = BLOB_BATCH_LINGER_MS,
+    ) -> None:
+        self.page = page
+        self.max_batch = max(max_batch, 1)
+        self.linger = max(linger_ms, 0) / 1000.0
+        self._pending: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def download(self, blob_src: str, file_stem: str) -> str:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.create_future()
+        self._pending[file_stem] = (blob_src, future)
+        if len(self._pending) >= self.max_batch:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.linger, self.flush)
+        return await future
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: Dict[str, Tuple[str, asyncio.Future]]) -> None:
+        try:
+            results = await download_blobs(self.page, {key: src for key, (src, _) in batch.items()})
+        except Exception as exc:  # pragma: no cover - fallos inesperados del lote
+            for _, future in batch.values():
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for key, (_, future) in batch.items():
+            if future.done():
+                continue
+            result = results.get(key) or BlobResult(key=key, error="sin respuesta")
+            if result.ok:
+                future.set_result(result.path)
+            else:
+                future.set_exception(BlobFetchError(f"{key}: {result.error}"))
+
+    async def aclose(self) -> None:
+        self.flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+_BLOB_BATCHER: ContextVar[BlobBatcher | None] = ContextVar("wa_blob_batcher", default=None)
+
+
+@asynccontextmanager
+async def blob_batching(page: Page, **options: float) -> AsyncIterator[BlobBatcher]:
+    """Activa el agrupamiento de descargas para ``download_from_blob``."""
+
+    batcher = BlobBatcher(page, **options)
+    token = _BLOB_BATCHER.set(batcher)
+    try:
+        yield batcher
+    finally:
+        _BLOB_BATCHER.reset(token)
+        await batcher.aclose()
+
+
 async def download_from_blob(page: Page, blob_src: str, file_stem: str) -> str:
-    """Descarga y persiste una imagen ``blob:`` retornando la ruta creada."""
+    """Descarga y persiste una imagen ``blob:`` retornando la ruta en el almacén.
+
+    Dentro de :func:`blob_batching` la descarga se agrupa con las demás de la
+    misma pasada.
+    """
 
     if not blob_src:
         return ""
 
-    response = await fetch_blob_to_base64(page, blob_src)
-    extension = ext_from_content_type(response.get("contentType"))
-    path = IMG_DIR / f"{file_stem}.{extension}"
-    IMG_DIR.mkdir(parents=True, exist_ok=True)
-    with open(path, "wb") as handle:
-        handle.write(base64.b64decode(response.get("b64", "")))
-    return str(path)
+    batcher = _BLOB_BATCHER.get()
+    if batcher is not None and batcher.page is page:
+        return await batcher.download(blob_src, file_stem)
+
+    with timed("blob_download"):
+        response = await fetch_blob_to_base64(page, blob_src)
+        extension = ext_from_content_type(response.get("contentType"))
+        path = await asyncio.to_thread(_store_image, file_stem, response.get("b64", ""), extension)
+    return path
 
 
 __all__ = [
+    "BlobBatcher",
+    "BlobFetchError",
+    "BlobResult",
+    "blob_batching",
+    "download_blobs",
     "download_from_blob",
     "ext_from_content_type",
     "fetch_blob_to_base64",
     "strict_has_blob_img_inside_copyable",
+    "wait_for_blob_src",
 ]
\ No newline at end of file
@@ -0,0 +1,230 @@
+"""Índice de comprobantes casi duplicados por hash perceptual.
+
+El mismo pago suele llegar dos veces como capturas distintas (reenviada,
+recomprimida, con otro tamaño). El hash SHA-256 del almacén de imágenes no
+las reconoce, pero su pHash de 64 bits difiere en pocos bits. Cada imagen
+nueva se busca por distancia de Hamming antes del OCR: si aparece un vecino
+cercano se marca el registro. Un vecino cercano no garantiza el mismo pago
+(dos Yapes al mismo comercio se ven casi iguales), así que su extracción
+sólo se reutiliza si una lectura de las franjas del monto y la operación en
+la imagen nueva da los mismos valores.
+
+El índice persiste en un JSONL de sólo-anexado (hash, ``data_id``, campos
+del OCR y sus cajas relativas) y las tablas se reconstruyen en memoria al
+cargarlo.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from telemetry import count, timed
+
+logger = logging.getLogger(__name__)
+
+# Lado de la imagen reducida y del bloque de frecuencias bajas de la DCT.
+_PHASH_SIDE = 32
+_PHASH_BLOCK = 8
+
+_indexes: Dict[Path, "NearDuplicateIndex"] = {}
+_indexes_lock = threading.Lock()
+
+# Caja de un campo en fracciones del ancho y alto de la imagen.
+RelativeBoxes = Dict[str, Sequence[float]]
+
+
+def phash(image: np.ndarray) -> int:
+    """pHash de 64 bits: signo de las frecuencias bajas de la DCT respecto de su mediana."""
+
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(image, (_PHASH_SIDE, _PHASH_SIDE), interpolation=cv2.INTER_AREA)
+    block = cv2.dct(np.float32(small))[:_PHASH_BLOCK, :_PHASH_BLOCK].flatten()
+    # El componente continuo (brillo medio) no participa de la mediana.
+    bits = block > np.median(block[1:])
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def phash_file(image_path: str) -> int | None:
+    """pHash de un archivo de imagen (``None`` si OpenCV no lo puede abrir)."""
+
+    image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    return None if image is None else phash(image)
+
+
+def hamming(left: int, right: int) -> int:
+    return (left ^ right).bit_count()
+
+
+class MultiIndexHash:
+    """Búsqueda por distancia de Hamming con varias tablas hash (multi-index hashing).
+
+    El hash de 64 bits se parte en ``max_distance + 1`` fragmentos: si dos
+    hashes difieren en ``max_distance`` bits o menos, por el principio del
+    palomar al menos un fragmento coincide exacto. Sólo se comparan los
+    valores que comparten algún fragmento con la consulta, unos cientos aun
+    con decenas de miles de comprobantes.
+    """
+
+    def __init__(self, max_distance: int, bits: int = 64) -> None:
+        self.max_distance = max(0, max_distance)
+        parts = min(bits, self.max_distance + 1)
+        edges = [round(i * bits / parts) for i in range(parts + 1)]
+        self._spans = [(low, high - low) for low, high in zip(edges, edges[1:])]
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in self._spans]
+        self._hashes: List[int] = []
+        self._values: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def _chunks(self, value_hash: int) -> Iterator[int]:
+        for low, width in self._spans:
+            yield (value_hash >> low) & ((1 << width) - 1)
+
+    def add(self, value_hash: int, value: str) -> None:
+        slot = len(self._hashes)
+        self._hashes.append(value_hash)
+        self._values.append(value)
+        for table, chunk in zip(self._tables, self._chunks(value_hash)):
+            table.setdefault(chunk, []).append(slot)
+
+    def search(self, value_hash: int) -> Iterator[Tuple[int, str]]:
+        """Valores a distancia ``<= max_distance`` de ``value_hash`` (sin orden)."""
+
+        seen = set()
+        for table, chunk in zip(self._tables, self._chunks(value_hash)):
+            for slot in table.get(chunk, ()):
+                if slot in seen:
+                    continue
+                seen.add(slot)
+                distance = hamming(value_hash, self._hashes[slot])
+                if distance <= self.max_distance:
+                    yield distance, self._values[slot]
+
+
+class NearDuplicate(NamedTuple):
+    """Comprobante ya indexado parecido a la imagen consultada."""
+
+    data_id: str
+    distance: int
+    record: Dict[str, str]
+    boxes: RelativeBoxes
+
+
+class NearDuplicateIndex:
+    """Índice persistente de los pHash de los comprobantes ya leídos por OCR."""
+
+    def __init__(self, path: str | Path, *, max_distance: int = 6) -> None:
+        self.path = Path(path)
+        self.max_distance = max_distance
+        self._hashes = MultiIndexHash(max_distance)
+        self._records: Dict[str, Tuple[Dict[str, str], RelativeBoxes]] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            handle = open(self.path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with handle:
+            for line in handle:
+                try:
+                    raw = json.loads(line)
+                    value_hash = int(raw["phash"], 16)
+                    data_id = str(raw["data_id"])
+                except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                    continue
+                self._insert(value_hash, data_id, raw.get("record") or {}, raw.get("boxes") or {})
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def _insert(
+        self, value_hash: int, data_id: str, record: Dict[str, str], boxes: RelativeBoxes
+    ) -> None:
+        if data_id in self._records:
+            return
+        self._records[data_id] = (record, boxes)
+        self._hashes.add(value_hash, data_id)
+
+    def nearest(self, value_hash: int) -> NearDuplicate | None:
+        """Comprobante más parecido dentro de ``max_distance`` (o ``None``)."""
+
+        with self._lock:
+            matches = list(self._hashes.search(value_hash))
+            if not matches:
+                return None
+            distance, data_id = min(matches)
+            record, boxes = self._records[data_id]
+            return NearDuplicate(data_id, distance, dict(record), dict(boxes))
+
+    def lookup(self, image_path: str) -> Tuple[int | None, NearDuplicate | None]:
+        """Calcula el pHash de ``image_path`` y busca su vecino más cercano."""
+
+        with timed("phash_lookup"):
+            value_hash = phash_file(image_path)
+            match = self.nearest(value_hash) if value_hash is not None else None
+        count(
+            "wa_near_duplicates_total",
+            result="hit" if match else "miss",
+            help_text="Consultas al índice de comprobantes casi duplicados.",
+        )
+        return value_hash, match
+
+    def add(
+        self,
+        value_hash: int,
+        data_id: str,
+        record: Dict[str, str],
+        boxes: RelativeBoxes | None = None,
+    ) -> None:
+        """Indexa un comprobante leído y anexa su línea al archivo.
+
+        ``boxes`` (fracciones del ancho y alto) permite confirmar luego la
+        lectura sobre recortes de un comprobante parecido.
+        """
+
+        boxes = {name: [round(value, 4) for value in box] for name, box in (boxes or {}).items()}
+        with self._lock:
+            if data_id in self._records:
+                return
+            self._insert(value_hash, data_id, record, boxes)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            line = {"phash": f"{value_hash:016x}", "data_id": data_id, "record": record, "boxes": boxes}
+            with open(self.path, "a", encoding="utf-8") as handle:
+                handle.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+
+def get_near_duplicate_index(path: str | Path, *, max_distance: int = 6) -> NearDuplicateIndex:
+    """Índice compartido del proceso para ``path`` (se carga en el primer uso)."""
+
+    key = Path(path).resolve()
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = NearDuplicateIndex(path, max_distance=max_distance)
+        return index
+
+
+__all__ = [
+    "MultiIndexHash",
+    "NearDuplicate",
+    "NearDuplicateIndex",
+    "RelativeBoxes",
+    "get_near_duplicate_index",
+    "hamming",
+    "phash",
+    "phash_file",
+]
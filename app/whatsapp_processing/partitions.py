@@ -0,0 +1,249 @@
+"""Particiones mensuales columnares de los comprobantes exportados.
+
+Los JSONL guardan cada registro como texto; para los reportes se convierten
+en una tabla tipada por mes::
+
+    outputs/partitions/month=2025-12/comprobantes.parquet
+
+con ``monto`` numérico, ``sent_at``/``fecha`` como fechas, el método de pago
+normalizado igual que en Google Sheets y las columnas repetitivas como
+categorías. Los meses cerrados no se vuelven a escribir salvo que se pida
+una reconstrucción completa.
+
+Las particiones se actualizan al terminar cada importación de historial
+(:mod:`app.chat_import`) y con ``reports --actualizar``. La captura en vivo
+no las toca registro a registro: cada escritura relee todos los JSONL.
+
+Parquet requiere ``pyarrow``. Si no está instalado se usa el formato
+``pickle`` de pandas (igual de tipado, sólo legible desde Python) y se avisa
+en el registro.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import pandas as pd
+
+from telemetry import timed
+
+from .constants import OUT_DIR
+from .payment_index import exported_jsonl_paths
+from .sheets_export import normalize_payment_method
+from .text_blocks import TIMESTAMP_PATTERN
+from .voucher_store import chat_for_jsonl
+
+logger = logging.getLogger(__name__)
+
+PARTITIONS_DIR = OUT_DIR / "partitions"
+PARTITION_STEM = "comprobantes"
+
+# Columnas de la partición: (nombre, campo del registro).
+_TEXT_COLUMNS = (
+    ("data_id", "data_id"),
+    ("timestamp", "timestamp"),
+    ("sender", "sender"),
+    ("cliente", "Nombre de cliente"),
+    ("telefono", "N° de cel"),
+    ("servicio", "servicio_o_descripcion"),
+    ("metodo", "Método de pago"),
+    ("cuenta", "Cuenta"),
+    ("balance", "Balance"),
+    ("numero_operacion", "numero_operacion"),
+    ("monto", "monto"),
+)
+_CATEGORY_COLUMNS = ("sender", "metodo", "cuenta", "balance")
+# Símbolos de moneda de los estados de cuenta: ``S/``, ``S/.``, ``US$``, ``$``, ``PEN``, ``USD``.
+_CURRENCY = r"(?i)s/\.?|us\$|\$|pen|usd"
+
+
+def parquet_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def partition_suffix() -> str:
+    return ".parquet" if parquet_available() else ".pkl"
+
+
+def parse_timestamps(values: pd.Series) -> pd.Series:
+    """Versión vectorizada de ``parse_message_timestamp`` para una columna."""
+
+    text = values.fillna("").astype(str).str.replace("\u00a0", " ", regex=False)
+    parts = text.str.extract(TIMESTAMP_PATTERN)
+    parts.columns = ["hour", "minute", "meridiem", "day", "month", "year"]
+    hour = pd.to_numeric(parts["hour"], errors="coerce")
+    meridiem = parts["meridiem"].str.lower()
+    hour = hour.where(meridiem.isna(), hour % 12 + (meridiem == "p") * 12)
+    frame = pd.DataFrame(
+        {
+            "year": pd.to_numeric(parts["year"], errors="coerce"),
+            "month": pd.to_numeric(parts["month"], errors="coerce"),
+            "day": pd.to_numeric(parts["day"], errors="coerce"),
+            "hour": hour,
+            "minute": pd.to_numeric(parts["minute"], errors="coerce"),
+        }
+    )
+    return pd.to_datetime(frame, errors="coerce")
+
+
+def parse_amounts(values: pd.Series) -> pd.Series:
+    """``"15"``, ``"15,00"``, ``"1,234.50"`` y ``"S/. 1,250.00"`` → ``float`` (``NaN`` si no es un número)."""
+
+    text = values.fillna("").astype(str).str.replace(r"\s", "", regex=True)
+    text = text.str.replace(_CURRENCY, "", regex=True)
+    both = text.str.contains(",", regex=False) & text.str.contains(".", regex=False)
+    text = text.where(~both, text.str.replace(",", "", regex=False))
+    text = text.str.replace(",", ".", regex=False)
+    return pd.to_numeric(text, errors="coerce")
+
+
+def months_of(timestamps: Iterable[str]) -> List[str]:
+    """Meses (``AAAA-MM``) de las marcas de tiempo del DOM; las que no se entienden se ignoran."""
+
+    moments = parse_timestamps(pd.Series(list(timestamps), dtype="object"))
+    return sorted(set(moments.dropna().dt.strftime("%Y-%m")))
+
+
+def records_frame(records: Iterable[Dict[str, str]], chat: str = "") -> pd.DataFrame:
+    """Tabla tipada a partir de registros exportados (uno por fila)."""
+
+    rows = [{column: record.get(field) or "" for column, field in _TEXT_COLUMNS} for record in records]
+    frame = pd.DataFrame(rows, columns=[column for column, _ in _TEXT_COLUMNS])
+    frame["chat"] = chat
+    frame["sent_at"] = parse_timestamps(frame["timestamp"])
+    frame["fecha"] = frame["sent_at"].dt.normalize()
+    frame["month"] = frame["sent_at"].dt.strftime("%Y-%m")
+    frame["monto"] = parse_amounts(frame["monto"])
+    frame["metodo"] = frame["metodo"].map(normalize_payment_method)
+    frame["cuenta"] = frame["cuenta"].str.strip().str.upper()
+    frame["balance"] = frame["balance"].str.strip().str.upper()
+    for column in (*_CATEGORY_COLUMNS, "chat"):
+        frame[column] = frame[column].astype("category")
+    return frame
+
+
+def read_jsonl_records(path: str | Path) -> List[Dict[str, str]]:
+    records: List[Dict[str, str]] = []
+    try:
+        handle = open(path, "r", encoding="utf-8")
+    except FileNotFoundError:
+        return records
+    with handle:
+        for line in handle:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, dict):
+                records.append(record)
+    return records
+
+
+def partition_path(month: str, root: str | Path = PARTITIONS_DIR) -> Path:
+    return Path(root) / f"month={month}" / f"{PARTITION_STEM}{partition_suffix()}"
+
+
+def existing_months(root: str | Path = PARTITIONS_DIR) -> List[str]:
+    """Meses que ya tienen partición escrita (en cualquiera de los formatos)."""
+
+    months = set()
+    for path in Path(root).glob(f"month=*/{PARTITION_STEM}.*"):
+        months.add(path.parent.name.split("=", 1)[1])
+    return sorted(months)
+
+
+def _write(frame: pd.DataFrame, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f"{path.name}.tmp")
+    if path.suffix == ".parquet":
+        frame.to_parquet(temporary, index=False)
+    else:
+        frame.to_pickle(temporary)
+    temporary.replace(path)
+
+
+def write_partitions(
+    jsonl_paths: Iterable[str | Path] | None = None,
+    *,
+    root: str | Path = PARTITIONS_DIR,
+    full: bool = False,
+    months: Iterable[str] = (),
+) -> List[str]:
+    """Escribe las particiones mensuales desde los JSONL exportados (por defecto, los de todos los chats).
+
+    Sin ``full`` sólo se reescriben el último mes ya particionado, los
+    posteriores y los de ``months`` (p. ej. los que tocó una importación de
+    historial); los demás meses cerrados quedan intactos. Devuelve los meses
+    escritos.
+    """
+
+    if jsonl_paths is None:
+        jsonl_paths = exported_jsonl_paths()
+    if not parquet_available():
+        logger.warning("pyarrow no está instalado: las particiones se guardan en formato pickle")
+
+    with timed("partitions_build"):
+        frames = [records_frame(read_jsonl_records(path), chat_for_jsonl(Path(path))) for path in jsonl_paths]
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return []
+        frame = pd.concat(frames, ignore_index=True)
+        for column in (*_CATEGORY_COLUMNS, "chat"):
+            frame[column] = frame[column].astype("category")
+        frame = frame.dropna(subset=["month"]).drop_duplicates(subset="data_id", keep="last")
+
+    done = existing_months(root)
+    first_open = None if full or not done else done[-1]
+    touched = set(months)
+    written: List[str] = []
+    with timed("partitions_write"):
+        for month, part in frame.groupby("month", sort=True, observed=True):
+            if first_open is not None and month < first_open and month not in touched:
+                continue
+            target = partition_path(month, root)
+            _write(part.drop(columns="month").reset_index(drop=True), target)
+            # Una partición del otro formato (antes o después de instalar pyarrow) queda obsoleta.
+            for stale in target.parent.glob(f"{PARTITION_STEM}.*"):
+                if stale != target:
+                    stale.unlink()
+            written.append(month)
+    return written
+
+
+def read_partitions(
+    months: Iterable[str] | None = None,
+    *,
+    root: str | Path = PARTITIONS_DIR,
+) -> pd.DataFrame:
+    """Une las particiones pedidas (por defecto, todas) en una sola tabla."""
+
+    wanted = set(months) if months is not None else None
+    frames = []
+    for path in sorted(Path(root).glob(f"month=*/{PARTITION_STEM}.*")):
+        month = path.parent.name.split("=", 1)[1]
+        if wanted is not None and month not in wanted:
+            continue
+        frames.append(pd.read_parquet(path) if path.suffix == ".parquet" else pd.read_pickle(path))
+    if not frames:
+        return records_frame([]).drop(columns="month")
+    frame = pd.concat(frames, ignore_index=True)
+    for column in (*_CATEGORY_COLUMNS, "chat"):
+        frame[column] = frame[column].astype("category")
+    return frame
+
+
+__all__ = [
+    "PARTITIONS_DIR",
+    "existing_months",
+    "months_of",
+    "parquet_available",
+    "parse_amounts",
+    "parse_timestamps",
+    "read_partitions",
+    "records_frame",
+    "write_partitions",
+]
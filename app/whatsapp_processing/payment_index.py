@@ -0,0 +1,240 @@
+"""Índice global de pagos ya registrados para detectar duplicados al capturar.
+
+El número de operación leído por OCR se exporta, pero hasta ahora no se
+comparaba con el historial: hacerlo exigía recorrer todo el CSV. Este índice
+guarda dos diccionarios en memoria, consultados en O(1) antes de exportar:
+
+* número de operación normalizado → ``data_id``;
+* (monto, fecha, método de pago) → ``data_id``.
+
+Coincidir en el número de operación es prácticamente una certeza; coincidir
+sólo en monto, fecha y método es una sospecha (dos clientes pueden pagar lo
+mismo el mismo día) y se marca por separado.
+
+En disco es un JSONL de sólo-anexado, compartido por todos los chats. Si no
+existe, se reconstruye una vez desde los JSONL exportados.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+import threading
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Tuple
+
+from .constants import CHATS_DIR, JSONL_FILE, PAYMENT_INDEX_FILE
+from .text_blocks import parse_message_timestamp
+
+logger = logging.getLogger(__name__)
+
+PaymentKey = Tuple[str, str, str]
+
+_NOT_ALNUM = re.compile(r"[^0-9A-Z]")
+# Códigos más cortos son lecturas parciales del OCR y darían falsos positivos.
+MIN_OPERATION_LENGTH = 4
+
+_active: "PaymentIndex | None" = None
+_active_lock = threading.Lock()
+
+
+def normalize_operation(value: str | None) -> str:
+    """``"0656-2708"`` → ``"6562708"``: sin separadores ni ceros a la izquierda."""
+
+    code = _NOT_ALNUM.sub("", (value or "").upper()).lstrip("0")
+    return code if len(code) >= MIN_OPERATION_LENGTH else ""
+
+
+def normalize_amount(value: str | None) -> str:
+    """``"15"``, ``"15,00"`` y ``"15.00"`` → ``"15.00"`` (``""`` si no es un número)."""
+
+    raw = (value or "").strip().replace(" ", "")
+    if "," in raw and "." in raw:
+        raw = raw.replace(",", "")
+    else:
+        raw = raw.replace(",", ".")
+    try:
+        amount = Decimal(raw)
+    except InvalidOperation:
+        return ""
+    return f"{amount.quantize(Decimal('0.01'))}" if amount > 0 else ""
+
+
+def message_date(timestamp: str | None) -> str:
+    """Fecha ISO del ``timestamp`` del DOM (``"11:28 p. m., 7/12/2025"`` → ``"2025-12-07"``)."""
+
+    moment = parse_message_timestamp(timestamp or "")
+    return moment.date().isoformat() if moment else ""
+
+
+def payment_key(record: Mapping[str, str]) -> PaymentKey | None:
+    """Clave (monto, fecha, método) del registro, o ``None`` si falta alguna parte."""
+
+    key = (
+        normalize_amount(record.get("monto")),
+        message_date(record.get("timestamp")),
+        " ".join((record.get("Método de pago") or "").upper().split()),
+    )
+    return key if all(key) else None
+
+
+def _index_line(data_id: str, operation: str, key: PaymentKey | None) -> str:
+    row = {"data_id": data_id, "operacion": operation, "pago": list(key) if key else None}
+    return json.dumps(row, ensure_ascii=False) + "\n"
+
+
+class PaymentMatches(NamedTuple):
+    """``data_id`` previos con el mismo número de operación o el mismo pago."""
+
+    operation: List[str]
+    payment: List[str]
+
+    def __bool__(self) -> bool:
+        return bool(self.operation or self.payment)
+
+    def flags(self) -> Dict[str, str]:
+        """Campos que se agregan al registro (sólo llegan al JSONL)."""
+
+        fields: Dict[str, str] = {}
+        if self.operation:
+            fields["duplicado_operacion"] = ",".join(self.operation)
+        if self.payment:
+            fields["duplicado_pago"] = ",".join(self.payment)
+        return fields
+
+
+class PaymentIndex:
+    """Números de operación y pagos exportados, con persistencia incremental."""
+
+    def __init__(self, path: str | Path = PAYMENT_INDEX_FILE) -> None:
+        self.path = Path(path)
+        self._operations: Dict[str, List[str]] = {}
+        self._payments: Dict[PaymentKey, List[str]] = {}
+        self._known: set[str] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._known)
+
+    def _insert(self, data_id: str, operation: str, key: PaymentKey | None) -> bool:
+        if not data_id or data_id in self._known:
+            return False
+        self._known.add(data_id)
+        if operation:
+            self._operations.setdefault(operation, []).append(data_id)
+        if key is not None:
+            self._payments.setdefault(key, []).append(data_id)
+        return True
+
+    def lookup(self, record: Mapping[str, str]) -> PaymentMatches:
+        """Registros previos que coinciden con ``record`` (excluido él mismo)."""
+
+        data_id = record.get("data_id", "")
+        operation = normalize_operation(record.get("numero_operacion"))
+        key = payment_key(record)
+        with self._lock:
+            by_operation = self._operations.get(operation, []) if operation else []
+            by_payment = self._payments.get(key, []) if key is not None else []
+            return PaymentMatches(
+                [other for other in by_operation if other != data_id],
+                [other for other in by_payment if other != data_id and other not in by_operation],
+            )
+
+    def add(self, record: Mapping[str, str]) -> None:
+        """Indexa un registro recién exportado y anexa su línea al archivo."""
+
+        data_id = record.get("data_id", "")
+        operation = normalize_operation(record.get("numero_operacion"))
+        key = payment_key(record)
+        with self._lock:
+            if not self._insert(data_id, operation, key):
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as handle:
+                handle.write(_index_line(data_id, operation, key))
+
+    @classmethod
+    def load(cls, path: str | Path = PAYMENT_INDEX_FILE) -> "PaymentIndex":
+        """Lee el índice; un archivo ausente devuelve un índice vacío."""
+
+        index = cls(path)
+        try:
+            handle = open(index.path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return index
+        with handle:
+            for line in handle:
+                try:
+                    raw = json.loads(line)
+                    key = tuple(raw["pago"]) if raw.get("pago") else None
+                    index._insert(str(raw["data_id"]), str(raw.get("operacion") or ""), key)
+                except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                    continue
+        return index
+
+    @classmethod
+    def rebuild(
+        cls, jsonl_paths: Iterable[str | Path], path: str | Path = PAYMENT_INDEX_FILE
+    ) -> "PaymentIndex":
+        """Construye el índice desde los JSONL exportados y lo escribe completo."""
+
+        index = cls(path)
+        rows = []
+        for jsonl_path in jsonl_paths:
+            try:
+                handle = open(jsonl_path, "r", encoding="utf-8")
+            except FileNotFoundError:
+                continue
+            with handle:
+                for line in handle:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if not isinstance(record, dict):
+                        continue
+                    data_id = str(record.get("data_id") or "")
+                    operation = normalize_operation(record.get("numero_operacion"))
+                    key = payment_key(record)
+                    if index._insert(data_id, operation, key):
+                        rows.append(_index_line(data_id, operation, key))
+        index.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = index.path.with_suffix(index.path.suffix + ".tmp")
+        with open(temporary, "w", encoding="utf-8") as handle:
+            handle.writelines(rows)
+        temporary.replace(index.path)
+        logger.info("Índice de pagos reconstruido con %s registros", len(index))
+        return index
+
+
+def exported_jsonl_paths() -> List[Path]:
+    """JSONL del chat histórico y de los chats particionados en ``CHATS_DIR``."""
+
+    return [JSONL_FILE, *sorted(CHATS_DIR.glob("*/comprobantes.jsonl"))]
+
+
+def get_payment_index(path: str | Path = PAYMENT_INDEX_FILE) -> PaymentIndex:
+    """Índice compartido del proceso; la primera vez se reconstruye si falta el archivo."""
+
+    global _active
+    with _active_lock:
+        if _active is None or _active.path != Path(path):
+            if Path(path).exists():
+                _active = PaymentIndex.load(path)
+            else:
+                _active = PaymentIndex.rebuild(exported_jsonl_paths(), path)
+        return _active
+
+
+__all__ = [
+    "PaymentIndex",
+    "PaymentMatches",
+    "exported_jsonl_paths",
+    "get_payment_index",
+    "message_date",
+    "normalize_amount",
+    "normalize_operation",
+    "payment_key",
+]
@@ -2,85 +2,234 @@
 
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import logging
-from typing import Dict, Tuple
+import sqlite3
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Deque, Dict, Tuple
 from uuid import uuid4
 
 from playwright.async_api import Locator, Page
 
 from .cache import ProcessedIds
-from .constants import LOG_FILE, SLOW_PER_MESSAGE_MS
+from .chats import ChatTarget
+from .constants import (
+    BLOB_BATCH_SIZE,
+    CAPTURE_CONCURRENCY,
+    CHAT_NAME,
+    PHASH_INDEX_FILE,
+    PHASH_MAX_DISTANCE,
+    PHASH_REUSE_OCR,
+    SLOW_PER_MESSAGE_MS,
+)
 from .csv_export import append_csv
 from .jsonl_export import append_jsonl
-from .media import download_from_blob, strict_has_blob_img_inside_copyable
-from .parsing import get_text_fields
+from .classification import classify_snapshot
+from .media import BlobBatcher, blob_batching, download_from_blob, wait_for_blob_src
+from .near_duplicates import get_near_duplicate_index
+from .payment_index import PaymentIndex
+from .voucher_store import VoucherStore
+from .rejections import MessageRejected, RejectionCache, RejectionReason
 from .sheets_export import export_to_sheets
-from .text_blocks import extract_timestamp_and_sender, get_text_block
-from .containers import message_rows
-from .directories import ensure_directories
-from ocr.ocr import extract_voucher_data
+from .snapshot import read_message_snapshot
+from .containers import message_row_by_id, message_rows
+from .triage import triage_thumbnail
+from ocr.ocr import confirm_voucher, read_voucher
+from telemetry import count, maybe_write_metrics_file, timed
 
 
-ensure_directories()
+# El archivo de registro (``LOG_FILE``) lo configura ``telemetry.setup_logging``
+# al arrancar la aplicación; aquí sólo se emiten registros.
 logger = logging.getLogger(__name__)
-if not logger.handlers:
-    handler = logging.FileHandler(LOG_FILE, encoding="utf-8")
-    formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
-logger.setLevel(logging.INFO)
 
-async def process_message_strict(page: Page, message: Locator) -> Dict[str, str] | None:
-    """Evalúa si un mensaje cumple con la estructura requerida y extrae sus datos."""
+DISCARDED_METRIC = "wa_discarded_messages_total"
+CAPTURED_METRIC = "wa_captured_messages_total"
 
+# Candado de las interacciones con la UI (scroll, hover) durante una pasada:
+# las descargas y el OCR corren en paralelo, pero sólo un mensaje a la vez
+# puede mover la vista.
+_UI_LOCK: ContextVar[asyncio.Lock | None] = ContextVar("wa_ui_lock", default=None)
+
+
+@asynccontextmanager
+async def _pass_scope(page: Page, *, max_batch: int) -> AsyncIterator[BlobBatcher]:
+    """Estado compartido por las tareas de una pasada: candado de UI y lote de blobs."""
+
+    token = _UI_LOCK.set(asyncio.Lock())
+    try:
+        async with blob_batching(page, max_batch=max_batch) as batcher:
+            yield batcher
+    finally:
+        _UI_LOCK.reset(token)
+
+
+@asynccontextmanager
+async def _ui_turn() -> AsyncIterator[None]:
+    lock = _UI_LOCK.get()
+    if lock is None:
+        yield
+        return
+    async with lock:
+        yield
+
+
+def _count_discard(reason: str) -> None:
+    count(DISCARDED_METRIC, help_text="Mensajes descartados por motivo.", reason=reason)
+
+
+def _log_fields(data_id: str, stage: str, started: float) -> Dict[str, object]:
+    """Campos estructurados que ``telemetry.StructuredFormatter`` agrega a la línea."""
+
+    return {
+        "data_id": data_id,
+        "stage": stage,
+        "duration_ms": (time.perf_counter() - started) * 1000.0,
+    }
+
+
+def _reject(reason: RejectionReason, data_id: str) -> MessageRejected:
+    _count_discard(reason.value)
+    return MessageRejected(reason, data_id)
+
+
+async def process_message_strict(
+    page: Page, message: Locator, expected_id: str = ""
+) -> Dict[str, str] | None:
+    """Evalúa si un mensaje cumple con la estructura requerida y extrae sus datos.
+
+    Primero se clasifica el mensaje con una sola lectura del DOM; sólo los
+    candidatos esperan la imagen ``blob:``, la descargan y pasan por OCR.
+    Lanza :class:`MessageRejected` con el motivo cuando el mensaje no es un
+    comprobante, para que el llamador pueda recordarlo en el caché negativo.
+
+    Con ``expected_id`` se verifica que ``message`` siga siendo ese mensaje;
+    si no, se descarta como error transitorio en lugar de leer otra fila.
+    """
+
+    started = time.perf_counter()
     try:
         data_id = await message.get_attribute("data-id") or ""
     except Exception as exc:
         logger.exception("No se pudo leer el data-id del mensaje", exc_info=exc)
+        _count_discard("unreadable_id")
         return None
-    blob_element, blob_src, data_src = await strict_has_blob_img_inside_copyable(message)
-    if blob_element is None or not blob_src:
-        logger.info("Se descartó un mensaje sin comprobante adjunto (data-id=%s)", data_id)
-        return None
+    if expected_id and data_id != expected_id:
+        logger.warning(
+            "El mensaje cambió antes de procesarse (esperado %s, encontrado %s)",
+            expected_id,
+            data_id,
+            extra=_log_fields(expected_id, "row_moved", started),
+        )
+        raise _reject(RejectionReason.ERROR, expected_id)
+
+    async with _ui_turn():
+        with timed("dom_snapshot"):
+            snapshot = await read_message_snapshot(message, data_id)
+        reason, fields = classify_snapshot(snapshot)
+        if reason is not None:
+            logger.info(
+                "Se descartó un mensaje (%s, data-id=%s)",
+                reason.value,
+                data_id,
+                extra=_log_fields(data_id, reason.value, started),
+            )
+            raise _reject(reason, data_id)
+
+        blob_src = snapshot.blob_src
+        if not blob_src:
+            with timed("blob_wait"):
+                blob_src = await wait_for_blob_src(message)
+    if not blob_src:
+        logger.info(
+            "La imagen del mensaje aún no terminó de cargar (data-id=%s)",
+            data_id,
+            extra=_log_fields(data_id, RejectionReason.IMAGE_NOT_LOADED.value, started),
+        )
+        raise _reject(RejectionReason.IMAGE_NOT_LOADED, data_id)
 
-    full_text = await get_text_block(message)
-    if not full_text:
-        logger.info("Se descartó un mensaje sin texto visible (data-id=%s)", data_id)
-        return None
-
-    fields = get_text_fields(full_text)
-    if not fields:
-        logger.info("No se detectaron campos en el mensaje (data-id=%s)", data_id)
-        return None
-
-    timestamp, sender = await extract_timestamp_and_sender(message)
     file_stem = data_id or uuid4().hex
     image_path = await download_from_blob(page, blob_src, file_stem)
 
     result: Dict[str, str] = {
         "data_id": data_id,
-        "timestamp": timestamp,
-        "sender": sender,
-        "raw_text": full_text,
+        "timestamp": snapshot.timestamp,
+        "sender": snapshot.sender,
+        "raw_text": snapshot.text,
         "img_src_blob": blob_src,
-        "img_src_data": data_src,
+        "img_src_data": snapshot.data_src,
         "img_file": image_path,
     }
     result.update(fields)
+    if snapshot.data_src:
+        # Pista del triaje de la miniatura (ya memorizada); sólo llega al JSONL.
+        provider = triage_thumbnail(snapshot.data_src).provider
+        if provider:
+            result["proveedor"] = provider
+
+    result.update(await _read_voucher_fields(data_id, image_path, started))
+
+    logger.info(
+        "Comprobante procesado (data-id=%s)",
+        data_id,
+        extra=_log_fields(data_id, "captured", started),
+    )
+    return result
 
-    try:
-        ocr_amount, ocr_operation = extract_voucher_data(image_path)
-    except Exception as exc:
-        logger.exception("No se pudo leer el comprobante con OCR (data-id=%s)", data_id, exc_info=exc)
-        ocr_amount, ocr_operation = None, None
 
-    if ocr_amount:
-        result["monto"] = ocr_amount
-    if ocr_operation:
-        result["numero_operacion"] = ocr_operation
+async def _read_voucher_fields(data_id: str, image_path: str, started: float) -> Dict[str, str]:
+    """Campos del OCR, reutilizados de un comprobante casi idéntico si lo hay.
+
+    Antes del OCR se busca el pHash de la imagen en el índice de casi
+    duplicados: un vecino cercano sólo marca el registro con ``duplicado_de``.
+    Con ``PHASH_REUSE_OCR`` su lectura se reutiliza si el OCR de las franjas
+    del monto y la operación en esta imagen da los mismos valores; si no,
+    la imagen se lee completa.
+    """
+
+    fields: Dict[str, str] = {}
+    value_hash = match = None
+    index = None
+    if PHASH_MAX_DISTANCE >= 0:
+        index = get_near_duplicate_index(PHASH_INDEX_FILE, max_distance=PHASH_MAX_DISTANCE)
+        value_hash, match = await asyncio.to_thread(index.lookup, image_path)
+    if match is not None:
+        logger.info(
+            "Comprobante parecido a %s (distancia %s, data-id=%s)",
+            match.data_id,
+            match.distance,
+            data_id,
+            extra=_log_fields(data_id, "near_duplicate", started),
+        )
+        fields["duplicado_de"] = match.data_id
+        if PHASH_REUSE_OCR and match.record and await asyncio.to_thread(
+            confirm_voucher, image_path, match.record, match.boxes
+        ):
+            fields.update(match.record)
+            return fields
 
-    return result
+    try:
+        ocr_result = await asyncio.to_thread(read_voucher, image_path)
+    except Exception as exc:
+        logger.exception(
+            "No se pudo leer el comprobante con OCR (data-id=%s)",
+            data_id,
+            exc_info=exc,
+            extra=_log_fields(data_id, "ocr", started),
+        )
+        return fields
+
+    # Monto y operación van a todos los destinos; la confianza por campo,
+    # el motor usado y la marca de duplicado sólo quedan en el JSONL (el CSV
+    # tiene columnas fijas).
+    record = ocr_result.to_record()
+    fields.update(record)
+    if index is not None and value_hash is not None and match is None and data_id:
+        await asyncio.to_thread(index.add, value_hash, data_id, record, ocr_result.relative_boxes())
+    return fields
 
 
 def _build_signature(payload: Dict[str, str]) -> str:
@@ -97,6 +246,17 @@ def _build_signature(payload: Dict[str, str]) -> str:
     return hashlib.sha1(joined.encode("utf-8", "ignore")).hexdigest()
 
 
+def _export_record(parsed: Dict[str, str], target: ChatTarget | None) -> None:
+    """Escribe el registro en CSV/JSONL del chat indicado (o en los globales)."""
+
+    if target is None:
+        append_csv(parsed)
+        append_jsonl(parsed)
+    else:
+        append_csv(parsed, str(target.csv_path))
+        append_jsonl(parsed, str(target.jsonl_path))
+
+
 async def process_visible_top_to_bottom(
     page: Page,
     processed_ids: ProcessedIds,
@@ -104,8 +264,38 @@ async def process_visible_top_to_bottom(
     last_signature: str,
     *,
     verbose_print: bool = True,
+    target: ChatTarget | None = None,
+    max_new: int | None = None,
+    rejections: RejectionCache | None = None,
+    concurrency: int = CAPTURE_CONCURRENCY,
+    payments: PaymentIndex | None = None,
+    vouchers: VoucherStore | None = None,
+    mark_before_last: bool = True,
 ) -> Tuple[int, str, str]:
-    """Recorre los mensajes visibles y procesa los que aún no fueron atendidos."""
+    """Recorre los mensajes visibles y procesa los que aún no fueron atendidos.
+
+    ``max_new`` limita cuántos comprobantes nuevos se registran en una pasada;
+    el resto queda para la siguiente, lo que permite alternar entre chats.
+
+    ``rejections`` recuerda los mensajes descartados: los que ya se sabe que
+    no son comprobantes se omiten sin consultar el DOM ni esperar la imagen.
+
+    Hasta ``concurrency`` mensajes se procesan a la vez (descarga y OCR), pero
+    los resultados se confirman estrictamente en el orden del chat: un mensaje
+    sólo se exporta cuando todos los anteriores ya se resolvieron, de modo que
+    ``last_id``/``last_signature`` siempre describen un prefijo completo.
+
+    Con ``payments`` cada comprobante se busca antes de exportarlo entre los
+    pagos ya registrados; las coincidencias quedan marcadas en el registro
+    (``duplicado_operacion``/``duplicado_pago``) y el índice se actualiza.
+    Con ``vouchers`` cada registro exportado se guarda también en la base
+    SQLite de consultas.
+
+    Los mensajes anteriores a ``last_id`` se marcan como procesados sin
+    leerlos. Con ``mark_before_last=False`` sólo se omiten: mientras hay un
+    relleno del historial pendiente esos mensajes le tocan a él, que puede
+    haberlos dejado para su próximo tramo (``max_new``) o para reintentarlos.
+    """
 
     new_count = 0
     skip_until_last = False
@@ -121,53 +311,18 @@ async def process_visible_top_to_bottom(
     if not skip_until_last:
         has_seen_last = True
 
-    rows = message_rows(page)
-    index = 0
-    while True:
-        try:
-            total = await rows.count()
-        except Exception:
-            break
-
-        if total == 0 or index >= total:
-            break
-
-        element = rows.nth(index)
-        index += 1
-        try:
-            data_id = await element.get_attribute("data-id") or ""
-        except Exception:
-            continue
-        if not data_id:
-            continue
-
-        if data_id == last_id:
-            has_seen_last = True
-            if data_id not in processed_ids:
-                processed_ids.add(data_id)
-            continue
-
-        if skip_until_last and not has_seen_last:
-            if data_id not in processed_ids:
-                processed_ids.add(data_id)
-            continue
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    # Buffer de reordenamiento: tareas en curso en el orden en que aparecen.
+    in_flight: Deque[Tuple[str, asyncio.Task]] = deque()
 
-        if data_id in processed_ids:
-            continue
+    async def _process(data_id: str) -> Dict[str, str] | None:
+        async with semaphore:
+            # La tarea puede arrancar después de que la lista se desplace: se
+            # fija el mensaje por su ``data-id`` y no por su posición.
+            return await process_message_strict(page, message_row_by_id(page, data_id), data_id)
 
-        try:
-            await element.scroll_into_view_if_needed(timeout=1_500)
-        except Exception:  # pragma: no cover - depende de la UI
-            pass
-        await page.wait_for_timeout(SLOW_PER_MESSAGE_MS)
-
-        try:
-            parsed = await process_message_strict(page, element)
-        except Exception as exc:
-            logger.exception("Fallo al procesar mensaje (data-id=%s)", data_id, exc_info=exc)
-            continue
-        if not parsed:
-            continue
+    def _commit(data_id: str, parsed: Dict[str, str]) -> None:
+        nonlocal new_count, last_id, last_signature, has_seen_last
 
         signature = _build_signature(parsed)
         if parsed["data_id"] in processed_ids:
@@ -178,31 +333,51 @@ async def process_visible_top_to_bottom(
             last_id = parsed["data_id"]
             last_signature = signature
             has_seen_last = True
-            continue
+            return
 
         if last_signature and signature == last_signature and (
             not last_id or data_id == last_id
         ):
+            _count_discard("duplicate_signature")
             processed_ids.add(parsed["data_id"])
             last_id = parsed["data_id"]
             last_signature = signature
             has_seen_last = True
-            continue
+            return
 
         if data_id == last_id:
             if data_id not in processed_ids:
                 processed_ids.add(data_id)
             last_signature = signature
             has_seen_last = True
-            continue
-
-        append_csv(parsed)
-        append_jsonl(parsed)
+            return
+
+        if payments is not None:
+            matches = payments.lookup(parsed)
+            if matches:
+                parsed.update(matches.flags())
+                count("wa_duplicate_payments_total", help_text="Comprobantes que repiten un pago ya registrado.")
+                if verbose_print:
+                    print(
+                        f"⚠️ Posible pago duplicado: {', '.join(matches.operation + matches.payment)}"
+                    )
+        _export_record(parsed, target)
+        if payments is not None:
+            payments.add(parsed)
+        if vouchers is not None:
+            try:
+                vouchers.upsert(parsed, target.name if target is not None else CHAT_NAME)
+            except sqlite3.Error:
+                logger.exception(
+                    "No se pudo guardar el comprobante en la base local (data-id=%s)",
+                    parsed["data_id"],
+                )
         try:
             export_to_sheets(parsed)
         except Exception:
             if verbose_print:
                 print("⚠️ No se pudo registrar en Google Sheets.")
+        count(CAPTURED_METRIC, help_text="Comprobantes capturados y exportados.")
 
         processed_ids.add(parsed["data_id"])
         last_id = parsed["data_id"]
@@ -227,14 +402,107 @@ async def process_visible_top_to_bottom(
             # print(f"  Img File   : {parsed.get('img_file', '')}")
         new_count += 1
 
-        await page.wait_for_timeout(SLOW_PER_MESSAGE_MS)
+    async def _settle_next() -> None:
+        """Espera al mensaje más antiguo en curso y confirma su resultado."""
 
+        data_id, task = in_flight.popleft()
+        if not task.done() and batcher is not None:
+            # No tiene sentido esperar a que el lote se llene si ya se necesita.
+            batcher.flush()
         try:
-            if index < total:
-                await rows.nth(index).scroll_into_view_if_needed(timeout=1_500)
-        except Exception:  # pragma: no cover - depende de la UI
-            pass
+            parsed = await task
+        except MessageRejected as rejected:
+            if rejections is not None:
+                rejections.record(data_id, rejected.reason)
+            return
+        except Exception as exc:
+            logger.exception(
+                "Fallo al procesar mensaje (data-id=%s)",
+                data_id,
+                exc_info=exc,
+                extra={"data_id": data_id, "stage": RejectionReason.ERROR.value},
+            )
+            _count_discard(RejectionReason.ERROR.value)
+            if rejections is not None:
+                rejections.record(data_id, RejectionReason.ERROR)
+            return
+        if not parsed:
+            return
+        if rejections is not None:
+            rejections.forget(data_id)
+        _commit(data_id, parsed)
 
+    rows = message_rows(page)
+    index = 0
+    batcher: BlobBatcher | None = None
+    try:
+        async with _pass_scope(page, max_batch=min(BLOB_BATCH_SIZE, concurrency)) as batcher:
+            while True:
+                # Se confirman los mensajes ya resueltos al frente del buffer.
+                while in_flight and in_flight[0][1].done():
+                    await _settle_next()
+
+                # Recorrido de filas; la lectura de cada mensaje se mide aparte (``dom_snapshot``).
+                with timed("row_scan"):
+                    try:
+                        total = await rows.count()
+                    except Exception:
+                        break
+
+                    if total == 0 or index >= total:
+                        break
+
+                    element = rows.nth(index)
+                    index += 1
+                    try:
+                        data_id = await element.get_attribute("data-id") or ""
+                    except Exception:
+                        continue
+                if not data_id:
+                    continue
+
+                if data_id == last_id:
+                    has_seen_last = True
+                    if data_id not in processed_ids:
+                        processed_ids.add(data_id)
+                    continue
+
+                if skip_until_last and not has_seen_last:
+                    if mark_before_last and data_id not in processed_ids:
+                        processed_ids.add(data_id)
+                    continue
+
+                if data_id in processed_ids:
+                    continue
+
+                if rejections is not None and rejections.should_skip(data_id):
+                    continue
+
+                if max_new is not None:
+                    # Los mensajes en curso pueden terminar siendo comprobantes.
+                    while in_flight and new_count + len(in_flight) >= max_new:
+                        await _settle_next()
+                    if new_count >= max_new:
+                        break
+
+                async with _ui_turn():
+                    try:
+                        await element.scroll_into_view_if_needed(timeout=1_500)
+                    except Exception:  # pragma: no cover - depende de la UI
+                        pass
+                    await page.wait_for_timeout(SLOW_PER_MESSAGE_MS)
+
+                in_flight.append((data_id, asyncio.create_task(_process(data_id))))
+
+            while in_flight:
+                await _settle_next()
+    finally:
+        for _, task in in_flight:
+            task.cancel()
+        if in_flight:
+            await asyncio.gather(*(task for _, task in in_flight), return_exceptions=True)
+
+    maybe_write_metrics_file()
     return new_count, last_id, last_signature
 
 
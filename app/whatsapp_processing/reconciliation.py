@@ -0,0 +1,411 @@
+"""Conciliación de comprobantes capturados contra estados de cuenta.
+
+Los estados exportados de BCP, Yape o Plin (CSV) se cruzan con los
+comprobantes capturados en dos pasadas vectorizadas con pandas:
+
+1. *hash join* por número de operación normalizado (igual que el índice de
+   pagos): si además coinciden el monto, la fecha y la dirección, el par
+   queda conciliado; si no, es un conflicto;
+2. para lo que quede sin pareja, un cruce por (monto, dirección, método de
+   pago, día)
+   probando primero el mismo día y luego desfases crecientes hasta la
+   ventana; en cada desfase los pares se asignan uno a uno por orden dentro
+   de cada grupo, así que el costo crece con las filas y no con su producto.
+
+La dirección de un movimiento del estado sale del signo de su monto (abono
+``INGRESO``, cargo ``EGRESO``) y la de un comprobante de su ``Balance``. Un
+comprobante sin ``Balance`` sólo se concilia por número de operación.
+
+El resultado separa conciliados, conflictos y pendientes de cada lado. Uso::
+
+    python -m app.whatsapp_processing.reconciliation estados/bcp_diciembre.csv estados/yape.csv
+    python -m app.whatsapp_processing.reconciliation estado.csv --proveedor plin --ventana 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Sequence
+
+import pandas as pd
+
+from telemetry import count, timed
+
+from .constants import OUT_DIR
+from .partitions import parse_amounts, read_jsonl_records, records_frame
+from .payment_index import MIN_OPERATION_LENGTH, exported_jsonl_paths
+from .sheets_export import normalize_payment_method
+from .voucher_store import chat_for_jsonl
+
+logger = logging.getLogger(__name__)
+
+RECONCILIATION_DIR = OUT_DIR / "conciliacion"
+DEFAULT_WINDOW_DAYS = 1
+
+# Encabezados reconocidos en los CSV de cada banco/billetera (sin tildes, en minúsculas).
+OPERATION_HEADERS = (
+    "n de operacion",
+    "nro de operacion",
+    "nro operacion",
+    "numero de operacion",
+    "numero operacion",
+    "operacion",
+    "n operacion",
+    "codigo de operacion",
+    "id de transaccion",
+)
+AMOUNT_HEADERS = ("monto", "importe", "monto s", "importe s", "cargo abono", "valor")
+DATE_HEADERS = ("fecha de operacion", "fecha operacion", "fecha", "fecha y hora", "fecha valuta")
+DESCRIPTION_HEADERS = ("descripcion", "descripcion operacion", "concepto", "detalle", "origen", "destino")
+# Proveedor deducido del nombre del archivo cuando no se indica.
+PROVIDERS = ("bcp", "yape", "plin", "ligo")
+INCOME = "INGRESO"
+EXPENSE = "EGRESO"
+
+
+def _plain(text: str) -> str:
+    """``"N° de Operación"`` → ``"n de operacion"``."""
+
+    decomposed = unicodedata.normalize("NFKD", str(text))
+    ascii_text = "".join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+    return " ".join("".join(ch if ch.isalnum() else " " for ch in ascii_text).split())
+
+
+def normalize_operations(values: pd.Series) -> pd.Series:
+    """Versión vectorizada de ``normalize_operation`` (``""`` si es muy corto)."""
+
+    codes = values.fillna("").astype(str).str.upper().str.replace(r"[^0-9A-Z]", "", regex=True).str.lstrip("0")
+    return codes.where(codes.str.len() >= MIN_OPERATION_LENGTH, "")
+
+
+def _cents(amounts: pd.Series) -> pd.Series:
+    return (amounts.abs() * 100).round().astype("Int64")
+
+
+def _find_column(columns: Sequence[str], candidates: Sequence[str]) -> str | None:
+    plain = {_plain(column): column for column in columns}
+    for candidate in candidates:
+        if candidate in plain:
+            return plain[candidate]
+    for candidate in candidates:
+        for name, column in plain.items():
+            if name.startswith(candidate):
+                return column
+    return None
+
+
+def _header_row(path: Path, encoding: str) -> int:
+    """Fila del encabezado: los estados del banco traen líneas de cabecera antes de la tabla."""
+
+    with open(path, "r", encoding=encoding, newline="") as handle:
+        for number, line in enumerate(handle):
+            plain = _plain(line)
+            if "fecha" in plain and any(word in plain for word in ("monto", "importe", "valor", "cargo")):
+                return number
+            if number > 50:
+                break
+    return 0
+
+
+def load_statement(path: str | Path, provider: str | None = None) -> pd.DataFrame:
+    """Lee un estado de cuenta CSV con columnas normalizadas.
+
+    Devuelve ``fila``, ``fecha``, ``monto`` (positivo), ``direccion``
+    (``INGRESO`` o ``EGRESO`` según el signo), ``operacion``, ``metodo``,
+    ``descripcion`` y ``archivo``. Las filas sin fecha o monto legibles se
+    descartan y se avisan en el registro.
+    """
+
+    path = Path(path)
+    if provider is None:
+        lowered = path.stem.lower()
+        provider = next((name for name in PROVIDERS if name in lowered), "")
+
+    for encoding in ("utf-8-sig", "latin-1"):
+        try:
+            skip = _header_row(path, encoding)
+            raw = pd.read_csv(path, sep=None, engine="python", encoding=encoding, skiprows=skip, dtype=str)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:  # pragma: no cover - latin-1 decodifica cualquier byte
+        raise ValueError(f"No se pudo leer {path}")
+
+    date_column = _find_column(raw.columns, DATE_HEADERS)
+    amount_column = _find_column(raw.columns, AMOUNT_HEADERS)
+    if date_column is None or amount_column is None:
+        raise ValueError(f"{path.name}: faltan las columnas de fecha o monto ({', '.join(raw.columns)})")
+    operation_column = _find_column(raw.columns, OPERATION_HEADERS)
+    description_column = _find_column(raw.columns, DESCRIPTION_HEADERS)
+
+    amounts = parse_amounts(raw[amount_column])
+    dates = pd.to_datetime(raw[date_column].str.strip(), dayfirst=True, errors="coerce", format="mixed")
+    frame = pd.DataFrame(
+        {
+            "fila": raw.index + skip + 2,
+            "fecha": dates.dt.normalize(),
+            "monto": amounts.abs(),
+            "direccion": amounts.lt(0).map({True: EXPENSE, False: INCOME}),
+            "operacion": normalize_operations(raw[operation_column]) if operation_column else "",
+            "metodo": normalize_payment_method(provider) if provider else "",
+            "descripcion": raw[description_column].fillna("") if description_column else "",
+            "archivo": path.name,
+        }
+    )
+    unreadable = frame["fecha"].isna() | frame["monto"].isna()
+    if unreadable.any():
+        logger.warning(
+            "%s: %d fila(s) sin fecha o monto legibles se omiten: %s",
+            path.name,
+            int(unreadable.sum()),
+            ", ".join(str(row) for row in frame.loc[unreadable, "fila"]),
+        )
+        count(
+            "wa_reconciliation_rows_total",
+            int(unreadable.sum()),
+            outcome="unreadable",
+            help_text="Filas por resultado de la conciliación.",
+        )
+    return frame[~unreadable].reset_index(drop=True)
+
+
+def captured_frame(jsonl_paths: Iterable[str | Path] | None = None) -> pd.DataFrame:
+    """Comprobantes capturados (tipados como en las particiones) con la operación normalizada."""
+
+    if jsonl_paths is None:
+        jsonl_paths = exported_jsonl_paths()
+    frames = [records_frame(read_jsonl_records(path), chat_for_jsonl(Path(path))) for path in jsonl_paths]
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        frame = records_frame([])
+    else:
+        frame = pd.concat(frames, ignore_index=True).drop_duplicates(subset="data_id", keep="last")
+    balance = frame["balance"].astype(str)
+    frame = frame.assign(
+        operacion=normalize_operations(frame["numero_operacion"]),
+        metodo=frame["metodo"].astype(str),
+        direccion=balance.where(balance.isin([INCOME, EXPENSE]), ""),
+    )
+    return frame.dropna(subset=["monto"]).reset_index(drop=True)
+
+
+@dataclass
+class Reconciliation:
+    """Resultado de :func:`reconcile`."""
+
+    matched: pd.DataFrame
+    conflicts: pd.DataFrame
+    unmatched_statement: pd.DataFrame
+    unmatched_captured: pd.DataFrame
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.matched)} conciliados, {len(self.conflicts)} conflictos, "
+            f"{len(self.unmatched_statement)} del estado sin comprobante, "
+            f"{len(self.unmatched_captured)} comprobantes sin movimiento"
+        )
+
+    def write(self, out_dir: str | Path = RECONCILIATION_DIR) -> List[Path]:
+        """Guarda cada conjunto como CSV y devuelve las rutas."""
+
+        out = Path(out_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        paths = []
+        for name, frame in (
+            ("conciliados", self.matched),
+            ("conflictos", self.conflicts),
+            ("estado_sin_comprobante", self.unmatched_statement),
+            ("comprobantes_sin_movimiento", self.unmatched_captured),
+        ):
+            path = out / f"{name}.csv"
+            frame.to_csv(path, index=False, encoding="utf-8-sig")
+            paths.append(path)
+        return paths
+
+
+_PAIR_COLUMNS = {
+    "fila": "fila",
+    "archivo": "archivo",
+    "fecha_x": "fecha_estado",
+    "fecha_y": "fecha_comprobante",
+    "monto_x": "monto_estado",
+    "monto_y": "monto_comprobante",
+    "metodo_x": "metodo",
+    "direccion_x": "direccion",
+    "descripcion": "descripcion",
+    "data_id": "data_id",
+    "cliente": "cliente",
+    "sender": "sender",
+}
+
+
+def _pairs(merged: pd.DataFrame, criterion: str) -> pd.DataFrame:
+    pairs = merged.rename(columns=_PAIR_COLUMNS)[["operacion", *_PAIR_COLUMNS.values()]].copy()
+    pairs.insert(0, "criterio", criterion)
+    return pairs
+
+
+def _day_offsets(window_days: int) -> List[int]:
+    """``[0, -1, 1, -2, 2, ...]``: primero el mismo día y luego el estado posterior al comprobante."""
+
+    offsets = [0]
+    for days in range(1, max(0, window_days) + 1):
+        offsets += [-days, days]
+    return offsets
+
+
+def _one_to_one(
+    statement: pd.DataFrame, captured: pd.DataFrame, keys: List[str], window_days: int
+) -> pd.DataFrame:
+    """Pares uno a uno por ``keys`` con fechas dentro de la ventana, de la más cercana a la más lejana.
+
+    Para cada desfase de días los dos lados se agrupan por ``keys`` y día, y
+    el *n*-ésimo movimiento del grupo se une con el *n*-ésimo comprobante
+    (``cumcount``): cada fila aparece en un solo grupo por desfase, por lo
+    que ningún lado se usa dos veces y cada ronda es un *hash join* exacto.
+    """
+
+    chosen = []
+    statement = statement.sort_values("st_id")
+    captured = captured.sort_values(["sent_at", "cap_id"])
+    for offset in _day_offsets(window_days):
+        if statement.empty or captured.empty:
+            break
+        left = statement.assign(dia=statement["fecha"] + pd.Timedelta(days=offset))
+        left["orden"] = left.groupby([*keys, "dia"], observed=True).cumcount()
+        right = captured.assign(dia=captured["fecha"])
+        right["orden"] = right.groupby([*keys, "dia"], observed=True).cumcount()
+        pairs = left.merge(right, on=[*keys, "dia", "orden"], how="inner")
+        if pairs.empty:
+            continue
+        chosen.append(pairs.drop(columns=["dia", "orden"]))
+        statement = statement[~statement["st_id"].isin(pairs["st_id"])]
+        captured = captured[~captured["cap_id"].isin(pairs["cap_id"])]
+    if not chosen:
+        return pd.DataFrame()
+    pairs = pd.concat(chosen, ignore_index=True)
+    return pairs.rename(columns={"metodo": "metodo_x", "direccion": "direccion_x"})
+
+
+def reconcile(
+    statement: pd.DataFrame,
+    captured: pd.DataFrame,
+    *,
+    window_days: int = DEFAULT_WINDOW_DAYS,
+) -> Reconciliation:
+    """Cruza ``statement`` (de :func:`load_statement`) con ``captured`` (de :func:`captured_frame`)."""
+
+    window = pd.Timedelta(days=window_days)
+    statement = statement.reset_index(drop=True)
+    statement = statement.assign(st_id=statement.index, cents=_cents(statement["monto"]))
+    # Sólo cuentan los comprobantes del periodo y de los métodos presentes en el estado.
+    lower, upper = statement["fecha"].min() - window, statement["fecha"].max() + window
+    captured = captured[
+        captured["fecha"].between(lower, upper)
+        & (captured["metodo"].isin(set(statement["metodo"])) | statement["metodo"].eq("").any())
+    ].reset_index(drop=True)
+    captured = captured.assign(cap_id=captured.index, cents=_cents(captured["monto"]))
+    conflicts: List[pd.DataFrame] = []
+
+    with timed("reconcile_operation_join"):
+        by_operation = statement[statement["operacion"] != ""].merge(
+            captured[captured["operacion"] != ""], on="operacion", how="inner"
+        )
+        by_operation = by_operation.sort_values(["st_id", "sent_at"])
+        repeated = by_operation.duplicated("st_id") | by_operation.duplicated("cap_id")
+        # Un comprobante sin Balance no contradice la dirección del estado.
+        same_direction = by_operation["direccion_y"].eq("") | by_operation["direccion_x"].eq(
+            by_operation["direccion_y"]
+        )
+        agrees = (by_operation["cents_x"] == by_operation["cents_y"]) & (
+            (by_operation["fecha_x"] - by_operation["fecha_y"]).abs() <= window
+        )
+        accepted = agrees & same_direction & ~repeated
+        matched = [_pairs(by_operation[accepted], "operacion")]
+        conflict = by_operation[~accepted]
+        if not conflict.empty:
+            pairs = _pairs(conflict, "operacion")
+            pairs.insert(1, "motivo", "monto_o_fecha_distintos")
+            pairs.loc[(agrees & ~same_direction)[~accepted].to_numpy(), "motivo"] = "direccion_distinta"
+            pairs.loc[repeated[~accepted].to_numpy(), "motivo"] = "operacion_repetida"
+            conflicts.append(pairs)
+        used_statement = set(by_operation["st_id"])
+        used_captured = set(by_operation["cap_id"])
+
+    with timed("reconcile_amount_join"):
+        # Un comprobante con número de operación que no apareció en el estado
+        # todavía puede estar ahí con la operación mal leída por el OCR.
+        rest_statement = statement[~statement["st_id"].isin(used_statement)]
+        rest_captured = captured[~captured["cap_id"].isin(used_captured)]
+        known_method = rest_statement["metodo"].ne("")
+        # Un estado sin proveedor conocido no restringe el método: se cruza
+        # sólo por monto con lo que quede tras los de método conocido.
+        for part, keys in (
+            (rest_statement[known_method], ["cents", "direccion", "metodo"]),
+            (rest_statement[~known_method], ["cents", "direccion"]),
+        ):
+            if part.empty:
+                continue
+            candidates = _one_to_one(part, rest_captured, keys, window_days)
+            if candidates.empty:
+                continue
+            candidates = candidates.rename(columns={"operacion_x": "operacion"})
+            matched.append(_pairs(candidates, "monto_fecha_metodo"))
+            used_statement |= set(candidates["st_id"])
+            used_captured |= set(candidates["cap_id"])
+            rest_captured = rest_captured[~rest_captured["cap_id"].isin(candidates["cap_id"])]
+
+    result = Reconciliation(
+        matched=pd.concat(matched, ignore_index=True),
+        conflicts=pd.concat(conflicts, ignore_index=True) if conflicts else pd.DataFrame(),
+        unmatched_statement=statement[~statement["st_id"].isin(used_statement)].drop(columns=["st_id", "cents"]),
+        unmatched_captured=captured[~captured["cap_id"].isin(used_captured)].drop(columns=["cap_id", "cents"]),
+    )
+    for outcome, frame in (
+        ("matched", result.matched),
+        ("conflict", result.conflicts),
+        ("unmatched_statement", result.unmatched_statement),
+        ("unmatched_captured", result.unmatched_captured),
+    ):
+        count(
+            "wa_reconciliation_rows_total",
+            len(frame),
+            outcome=outcome,
+            help_text="Filas por resultado de la conciliación.",
+        )
+    return result
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Conciliar comprobantes con estados de cuenta (CSV)")
+    parser.add_argument("estados", nargs="+", help="archivos CSV exportados del banco o billetera")
+    parser.add_argument(
+        "--proveedor", choices=PROVIDERS, help="proveedor de todos los archivos (por defecto, según el nombre)"
+    )
+    parser.add_argument("--ventana", type=int, default=DEFAULT_WINDOW_DAYS, help="días de tolerancia entre fechas")
+    parser.add_argument("--salida", default=str(RECONCILIATION_DIR), help="carpeta de resultados")
+    args = parser.parse_args(argv)
+
+    statement = pd.concat([load_statement(path, args.proveedor) for path in args.estados], ignore_index=True)
+    result = reconcile(statement, captured_frame(), window_days=args.ventana)
+    for path in result.write(args.salida):
+        print(f"🧾 {path}")
+    print(f"⚖️ {result.summary()}")
+
+
+__all__ = [
+    "Reconciliation",
+    "captured_frame",
+    "load_statement",
+    "main",
+    "normalize_operations",
+    "reconcile",
+]
+
+
+if __name__ == "__main__":
+    main()
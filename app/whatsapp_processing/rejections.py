@@ -0,0 +1,202 @@
+"""Caché negativo de mensajes descartados para no re-evaluarlos en cada pasada."""
+
+from __future__ import annotations
+
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Dict
+
+from .constants import (
+    REJECTION_CACHE_MAX_ENTRIES,
+    REJECTION_MAX_RETRIES,
+    REJECTION_RETRY_SECONDS,
+)
+
+
+class RejectionReason(str, Enum):
+    """Motivos por los que un mensaje no se considera comprobante."""
+
+    NO_COPYABLE_BLOCK = "no_copyable_block"
+    SENDER_NOT_ALLOWED = "sender_not_allowed"
+    NOT_A_FORM = "not_a_form"
+    IMAGE_NOT_LOADED = "image_not_loaded"
+    NO_BLOB_IMAGE = "no_blob_image"
+    NOT_A_VOUCHER_IMAGE = "not_a_voucher_image"
+    NO_TEXT = "no_text"
+    NO_FIELDS = "no_fields"
+    ERROR = "error"
+
+    @property
+    def retryable(self) -> bool:
+        """Los motivos transitorios admiten una cantidad acotada de re-chequeos.
+
+        La vista previa o el pie de un comprobante pueden tardar en
+        renderizarse, y el pie puede editarse después; sólo el remitente y la
+        falta de bloque copiable son definitivos.
+        """
+
+        return self in _RETRYABLE_REASONS
+
+
+_RETRYABLE_REASONS = frozenset(
+    {
+        RejectionReason.IMAGE_NOT_LOADED,
+        # Ya no se emite; las entradas guardadas por versiones anteriores se
+        # vuelven a evaluar.
+        RejectionReason.NOT_A_FORM,
+        RejectionReason.NO_BLOB_IMAGE,
+        # La heurística sobre la miniatura puede equivocarse con un mensaje que
+        # ya tiene pie de formulario; se reintenta con la vista previa final.
+        RejectionReason.NOT_A_VOUCHER_IMAGE,
+        RejectionReason.NO_TEXT,
+        RejectionReason.NO_FIELDS,
+        RejectionReason.ERROR,
+    }
+)
+
+
+class MessageRejected(Exception):
+    """Se lanza cuando un mensaje se descarta durante el análisis estricto."""
+
+    def __init__(self, reason: RejectionReason, data_id: str = "") -> None:
+        super().__init__(f"{reason.value} (data-id={data_id})")
+        self.reason = reason
+        self.data_id = data_id
+
+
+@dataclass
+class RejectionEntry:
+    reason: RejectionReason
+    attempts: int = 1
+    checked_at: float = 0.0
+
+
+def rejections_path_for(cache_path: str | Path) -> Path:
+    """Ubica el caché negativo junto al caché de mensajes procesados."""
+
+    cache_path = Path(cache_path)
+    return cache_path.with_name(f"{cache_path.stem}.rejections.json")
+
+
+class RejectionCache:
+    """Registro LRU acotado de mensajes descartados, indexado por ``data-id``.
+
+    Los descartes definitivos se omiten siempre; los transitorios (imagen aún
+    sin cargar, errores) se vuelven a evaluar hasta ``max_retries`` veces,
+    espaciados al menos ``retry_seconds``.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_entries: int = REJECTION_CACHE_MAX_ENTRIES,
+        max_retries: int = REJECTION_MAX_RETRIES,
+        retry_seconds: float = REJECTION_RETRY_SECONDS,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_retries = max_retries
+        self.retry_seconds = retry_seconds
+        self._entries: "OrderedDict[str, RejectionEntry]" = OrderedDict()
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, data_id: object) -> bool:
+        return data_id in self._entries
+
+    def reason(self, data_id: str) -> RejectionReason | None:
+        entry = self._entries.get(data_id)
+        return None if entry is None else entry.reason
+
+    def should_skip(self, data_id: str, now: float | None = None) -> bool:
+        """``True`` si el mensaje no debe procesarse en esta pasada."""
+
+        entry = self._entries.get(data_id)
+        if entry is None:
+            return False
+        if not entry.reason.retryable or entry.attempts > self.max_retries:
+            return True
+        current = time.time() if now is None else now
+        return current - entry.checked_at < self.retry_seconds
+
+    def record(self, data_id: str, reason: RejectionReason, now: float | None = None) -> None:
+        """Registra (o actualiza) el descarte de ``data_id``."""
+
+        if not data_id:
+            return
+        current = time.time() if now is None else now
+        entry = self._entries.pop(data_id, None)
+        if entry is None:
+            entry = RejectionEntry(reason=reason, attempts=1, checked_at=current)
+        else:
+            entry = RejectionEntry(
+                reason=reason,
+                attempts=entry.attempts + 1 if reason == entry.reason else 1,
+                checked_at=current,
+            )
+        self._entries[data_id] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self.dirty = True
+
+    def forget(self, data_id: str) -> None:
+        if self._entries.pop(data_id, None) is not None:
+            self.dirty = True
+
+    def to_payload(self) -> Dict[str, list]:
+        return {
+            data_id: [entry.reason.value, entry.attempts, round(entry.checked_at, 3)]
+            for data_id, entry in self._entries.items()
+        }
+
+    def save(self, path: str | Path) -> None:
+        """Persiste el caché (sólo si cambió desde la última escritura)."""
+
+        if not self.dirty:
+            return
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temporary = target.with_suffix(target.suffix + ".tmp")
+        with open(temporary, "w", encoding="utf-8") as handle:
+            json.dump(self.to_payload(), handle, ensure_ascii=False)
+        temporary.replace(target)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: str | Path, **options: float) -> "RejectionCache":
+        """Recupera el caché desde disco; ignora entradas con formato inválido."""
+
+        cache = cls(**options)
+        try:
+            with open(path, "r", encoding="utf-8") as handle:
+                payload = json.load(handle)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return cache
+
+        if not isinstance(payload, dict):
+            return cache
+        for data_id, raw in payload.items():
+            try:
+                reason = RejectionReason(raw[0])
+                cache._entries[data_id] = RejectionEntry(
+                    reason=reason, attempts=int(raw[1]), checked_at=float(raw[2])
+                )
+            except (ValueError, TypeError, IndexError, KeyError):
+                continue
+        while len(cache._entries) > cache.max_entries:
+            cache._entries.popitem(last=False)
+        return cache
+
+
+__all__ = [
+    "MessageRejected",
+    "RejectionCache",
+    "RejectionEntry",
+    "RejectionReason",
+    "rejections_path_for",
+]
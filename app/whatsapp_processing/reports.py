@@ -0,0 +1,133 @@
+"""Reportes de fin de mes sobre las particiones mensuales.
+
+Todos los totales se calculan con agregaciones vectorizadas de pandas sobre
+las particiones de :mod:`partitions`, sin volver a leer los CSV/JSONL. Como
+en la planilla de Google Sheets, un comprobante con ``Balance`` ``INGRESO``
+suma a ingresos y uno con ``EGRESO`` a egresos; los que no tienen ninguno de
+los dos se suman aparte en ``sin_balance`` y no entran al neto. Uso::
+
+    python -m app.whatsapp_processing.reports --por metodo --mes 2025-12
+    python -m app.whatsapp_processing.reports --por dia --actualizar
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import pandas as pd
+
+from telemetry import timed
+
+from .partitions import PARTITIONS_DIR, read_partitions, write_partitions
+
+logger = logging.getLogger(__name__)
+
+# Dimensión del reporte → columna de la partición.
+DIMENSIONS: Dict[str, str] = {
+    "dia": "fecha",
+    "metodo": "metodo",
+    "cuenta": "cuenta",
+    "remitente": "sender",
+    "chat": "chat",
+}
+INCOME = "INGRESO"
+EXPENSE = "EGRESO"
+
+
+def totals_by(frame: pd.DataFrame, column: str) -> pd.DataFrame:
+    """Ingresos, egresos, sin balance, neto y cantidad de comprobantes por valor de ``column``."""
+
+    amount = frame["monto"].fillna(0.0)
+    balance = frame["balance"].astype(str)
+    income = balance.eq(INCOME)
+    expense = balance.eq(EXPENSE)
+    parts = pd.DataFrame(
+        {
+            column: frame[column],
+            "ingresos": amount.where(income, 0.0),
+            "egresos": amount.where(expense, 0.0),
+            "sin_balance": amount.where(~(income | expense), 0.0),
+            "comprobantes": 1,
+        }
+    )
+    with timed("report_aggregate"):
+        totals = parts.groupby(column, observed=True, sort=True).sum()
+    totals["neto"] = totals["ingresos"] - totals["egresos"]
+    return totals[["ingresos", "egresos", "sin_balance", "neto", "comprobantes"]]
+
+
+def daily_totals(frame: pd.DataFrame) -> pd.DataFrame:
+    return totals_by(frame, "fecha")
+
+
+def method_totals(frame: pd.DataFrame) -> pd.DataFrame:
+    return totals_by(frame, "metodo")
+
+
+def account_totals(frame: pd.DataFrame) -> pd.DataFrame:
+    return totals_by(frame, "cuenta")
+
+
+def sender_totals(frame: pd.DataFrame) -> pd.DataFrame:
+    return totals_by(frame, "sender")
+
+
+def monthly_report(
+    months: Iterable[str] | None = None,
+    *,
+    root: str | Path = PARTITIONS_DIR,
+) -> Dict[str, pd.DataFrame]:
+    """Los cuatro reportes de fin de mes para ``months`` (por defecto, todo el historial)."""
+
+    frame = read_partitions(months, root=root)
+    return {
+        "dia": daily_totals(frame),
+        "metodo": method_totals(frame),
+        "cuenta": account_totals(frame),
+        "remitente": sender_totals(frame),
+    }
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Totales de comprobantes por día, método, cuenta o remitente")
+    parser.add_argument("--por", choices=sorted(DIMENSIONS), default="dia", help="dimensión del reporte")
+    parser.add_argument("--mes", action="append", help="mes a incluir (AAAA-MM); se puede repetir")
+    parser.add_argument("--root", default=str(PARTITIONS_DIR), help="carpeta de particiones")
+    parser.add_argument("--actualizar", action="store_true", help="reescribir antes las particiones abiertas")
+    parser.add_argument("--completo", action="store_true", help="con --actualizar, reescribir todos los meses")
+    args = parser.parse_args(argv)
+
+    if args.actualizar:
+        written = write_partitions(root=args.root, full=args.completo)
+        print(f"🧱 Particiones actualizadas: {', '.join(written) or 'ninguna'}")
+
+    frame = read_partitions(args.mes, root=args.root)
+    if frame.empty:
+        print("⚠️ No hay particiones; ejecuta con --actualizar")
+        return
+    report = totals_by(frame, DIMENSIONS[args.por])
+    with pd.option_context("display.max_rows", None, "display.width", 120):
+        print(report.round(2).to_string())
+    print(f"📊 {len(frame)} comprobantes, neto {report['neto'].sum():.2f}")
+    unassigned = report["sin_balance"].sum()
+    if unassigned:
+        print(f"⚠️ {unassigned:.2f} en comprobantes sin Balance INGRESO/EGRESO (fuera del neto)")
+
+
+__all__ = [
+    "DIMENSIONS",
+    "account_totals",
+    "daily_totals",
+    "main",
+    "method_totals",
+    "monthly_report",
+    "sender_totals",
+    "totals_by",
+]
+
+
+if __name__ == "__main__":
+    main()
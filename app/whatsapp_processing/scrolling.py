@@ -22,6 +22,33 @@ async def _pageup_burst(page: Page) -> None:
         await page.wait_for_timeout(SLOW_AFTER_SCROLL_MS)
 
 
+async def _older_round(page: Page, messages) -> str:
+    """Sube una ráfaga de páginas y devuelve el primer mensaje cargado."""
+
+    await _pageup_burst(page)
+    try:
+        await page.evaluate("(el)=>{el.scrollTop=0}", messages)
+    except Exception:  # pragma: no cover - puede fallar según el renderizado
+        pass
+    await page.wait_for_timeout(SLOW_AFTER_SCROLL_MS + 200)
+    return await first_message_id(page)
+
+
+async def load_older_messages(page: Page) -> str:
+    """Carga un tramo más antiguo del historial (una sola ráfaga).
+
+    Devuelve el identificador del primer mensaje cargado; si no cambia entre
+    llamadas, ya se llegó al inicio de la conversación.
+    """
+
+    messages = get_messages_container(page)
+    try:
+        await messages.focus()
+    except Exception:  # pragma: no cover - depende del estado del DOM
+        pass
+    return await _older_round(page, messages)
+
+
 async def scroll_to_very_top(page: Page) -> None:
     """Intenta llegar al inicio completo de la conversación."""
 
@@ -39,14 +66,7 @@ async def scroll_to_very_top(page: Page) -> None:
         if TOP_SCROLL_MAX_ROUNDS and attempts >= TOP_SCROLL_MAX_ROUNDS:
             break
         attempts += 1
-        await _pageup_burst(page)
-        try:
-            await page.evaluate("(el)=>{el.scrollTop=0}", messages)
-        except Exception:  # pragma: no cover - puede fallar según el renderizado
-            pass
-        await page.wait_for_timeout(SLOW_AFTER_SCROLL_MS + 200)
-
-        top_id = await first_message_id(page)
+        top_id = await _older_round(page, messages)
         if not top_id:
             rounds_without_change += 1
             if rounds_without_change >= TOP_SCROLL_STABLE_ROUNDS:
@@ -117,5 +137,5 @@ async def scroll_to_last_processed(page: Page, last_id: str) -> None:
             break
 
 
-__all__ = ["scroll_to_last_processed", "scroll_to_very_top"]
+__all__ = ["load_older_messages", "scroll_to_last_processed", "scroll_to_very_top"]
 
@@ -12,6 +12,7 @@ from sheets.googlesheets import (
     get_worksheet_by_month,
     registrar_movimiento,
 )
+from telemetry import count, timed
 
 
 DATE_PATTERN = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{2,4})")
@@ -83,7 +84,9 @@ def _extract_date(*candidates: str) -> datetime | None:
     return None
 
 
-def _normalize_payment_method(raw: str) -> str:
+def normalize_payment_method(raw: str) -> str:
+    """Agrupa los alias de un método de pago (``yape`` → ``BCP``, ``plin`` → ``LIGO``)."""
+
     if not raw:
         return ""
 
@@ -95,7 +98,9 @@ def _normalize_payment_method(raw: str) -> str:
     return raw.strip().upper()
 
 
-def _build_sheet_payload(parsed: Mapping[str, str]) -> dict[str, Any] | None:
+def build_sheet_payload(parsed: Mapping[str, str]) -> dict[str, Any] | None:
+    """Fila de la planilla mensual (MES … EGRESOS) o ``None`` si el registro no tiene fecha."""
+
     timestamp = parsed.get("timestamp", "")
     raw_text = parsed.get("raw_text", "")
     parsed_date = _extract_date(timestamp, raw_text)
@@ -108,7 +113,7 @@ def _build_sheet_payload(parsed: Mapping[str, str]) -> dict[str, Any] | None:
 
     descripcion = parsed.get("servicio_o_descripcion", "").strip()
     detalle = parsed.get("Detalle", "").strip()
-    metodo_pago = _normalize_payment_method(parsed.get("Método de pago", ""))
+    metodo_pago = normalize_payment_method(parsed.get("Método de pago", ""))
     numero_operacion = parsed.get("numero_operacion") or parsed.get("Cuenta", "").strip()
 
     monto = _parse_amount(parsed.get("monto"))
@@ -132,26 +137,28 @@ def _build_sheet_payload(parsed: Mapping[str, str]) -> dict[str, Any] | None:
 def export_to_sheets(parsed: Mapping[str, str]) -> bool:
     """Envía el mensaje procesado a la pestaña mensual correspondiente."""
 
-    payload = _build_sheet_payload(parsed)
+    payload = build_sheet_payload(parsed)
     if payload is None:
         return False
 
-    worksheet = get_worksheet_by_month(payload["mes"])
-    if worksheet is None:
-        return False
+    with timed("sheets_call"):
+        worksheet = get_worksheet_by_month(payload["mes"])
+        if worksheet is None:
+            return False
 
-    success = registrar_movimiento(
-        worksheet,
-        payload["mes"],
-        payload["fecha"],
-        payload["numero_operacion"],
-        payload["descripcion"],
-        payload["detalle"],
-        payload["metodo_pago"],
-        payload["estado"],
-        ingresos=payload["ingresos"],
-        egresos=payload["egresos"],
-    )
+        success = registrar_movimiento(
+            worksheet,
+            payload["mes"],
+            payload["fecha"],
+            payload["numero_operacion"],
+            payload["descripcion"],
+            payload["detalle"],
+            payload["metodo_pago"],
+            payload["estado"],
+            ingresos=payload["ingresos"],
+            egresos=payload["egresos"],
+        )
+    count("wa_sheets_rows_total", result="ok" if success else "failed")
 
     if success:
         logger.info(
@@ -165,4 +172,9 @@ def export_to_sheets(parsed: Mapping[str, str]) -> bool:
     return success
 
 
-__all__ = ["export_to_sheets"]
\ No newline at end of file
+__all__ = [
+    "PAYMENT_METHOD_ALIASES",
+    "build_sheet_payload",
+    "export_to_sheets",
+    "normalize_payment_method",
+]
@@ -0,0 +1,80 @@
+"""Lectura en una sola consulta de los datos visibles de un mensaje."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict
+
+from playwright.async_api import Locator
+
+from .text_blocks import parse_pre_plain_text
+
+# Replica lo que hacen ``get_text_block`` y ``strict_has_blob_img_inside_copyable``
+# pero en un único viaje CDP, sin esperar a que la imagen termine de cargar.
+MESSAGE_SNAPSHOT_JS = """(el) => {
+    const block = el.querySelector('div.copyable-text[data-pre-plain-text]');
+    if (!block) {
+        return { prePlainText: '', text: '', blobSrc: '', dataSrc: '', imgAlt: '' };
+    }
+    const texts = [];
+    for (const span of Array.from(block.querySelectorAll('span.selectable-text')).slice(0, 120)) {
+        const value = (span.innerText || '').trim();
+        if (value) texts.push(value);
+    }
+    const blob = block.querySelector('img[src^="blob:"]');
+    const data = block.querySelector('img[src^="data:image"]');
+    const img = blob || data;
+    return {
+        prePlainText: block.getAttribute('data-pre-plain-text') || '',
+        text: texts.join('\\n'),
+        blobSrc: blob ? blob.getAttribute('src') || '' : '',
+        dataSrc: data ? data.getAttribute('src') || '' : '',
+        imgAlt: img ? img.getAttribute('alt') || '' : '',
+    };
+}"""
+
+
+@dataclass(frozen=True)
+class MessageSnapshot:
+    """Datos baratos de un mensaje, leídos sin esperar la imagen ``blob:``."""
+
+    data_id: str
+    pre_plain_text: str = ""
+    text: str = ""
+    blob_src: str = ""
+    data_src: str = ""
+    img_alt: str = ""
+
+    @property
+    def has_copyable_block(self) -> bool:
+        return bool(self.pre_plain_text)
+
+    @property
+    def timestamp(self) -> str:
+        return parse_pre_plain_text(self.pre_plain_text)[0]
+
+    @property
+    def sender(self) -> str:
+        return parse_pre_plain_text(self.pre_plain_text)[1]
+
+    @classmethod
+    def from_payload(cls, data_id: str, payload: Dict[str, Any] | None) -> "MessageSnapshot":
+        payload = payload if isinstance(payload, dict) else {}
+        return cls(
+            data_id=data_id,
+            pre_plain_text=str(payload.get("prePlainText") or ""),
+            text=str(payload.get("text") or ""),
+            blob_src=str(payload.get("blobSrc") or ""),
+            data_src=str(payload.get("dataSrc") or ""),
+            img_alt=str(payload.get("imgAlt") or ""),
+        )
+
+
+async def read_message_snapshot(message: Locator, data_id: str) -> MessageSnapshot:
+    """Obtiene el :class:`MessageSnapshot` de ``message`` con un solo ``evaluate``."""
+
+    payload = await message.evaluate(MESSAGE_SNAPSHOT_JS)
+    return MessageSnapshot.from_payload(data_id, payload)
+
+
+__all__ = ["MESSAGE_SNAPSHOT_JS", "MessageSnapshot", "read_message_snapshot"]
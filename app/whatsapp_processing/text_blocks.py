@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 import re
+from datetime import datetime
 from typing import Tuple
 
 from playwright.async_api import Locator
@@ -45,10 +46,46 @@ async def extract_timestamp_and_sender(message: Locator) -> Tuple[str, str]:
     if block is None:
         return "", ""
     raw = await block.get_attribute("data-pre-plain-text") or ""
+    return parse_pre_plain_text(raw)
+
+
+def parse_pre_plain_text(raw: str) -> Tuple[str, str]:
+    """Separa ``[hora, fecha] Remitente: `` en marca temporal y remitente."""
+
     match = re.search(r"\[(.*?)\]\s*(.*?):\s*$", raw)
     if not match:
         return "", ""
     return match.group(1).strip(), match.group(2).strip()
 
 
-__all__ = ["extract_timestamp_and_sender", "find_copyable_block_in", "get_text_block"]
\ No newline at end of file
+# ``11:28 p. m., 7/12/2025`` (con espacio común o de no separación) o ``23:28, 7/12/2025``.
+TIMESTAMP_PATTERN = re.compile(
+    r"^\s*(\d{1,2}):(\d{2})(?::\d{2})?\s*(?:([ap])\.?\s*m\.?)?\s*,\s*(\d{1,2})/(\d{1,2})/(\d{4})\s*$",
+    re.IGNORECASE,
+)
+
+
+def parse_message_timestamp(timestamp: str) -> datetime | None:
+    """Convierte la marca temporal del DOM (día/mes/año, 12 o 24 h) en ``datetime``."""
+
+    match = TIMESTAMP_PATTERN.match((timestamp or "").replace("\u00a0", " "))
+    if not match:
+        return None
+    hour, minute, meridiem, day, month, year = match.groups()
+    hour = int(hour)
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem.lower() == "p" else 0)
+    try:
+        return datetime(int(year), int(month), int(day), hour, int(minute))
+    except ValueError:
+        return None
+
+
+__all__ = [
+    "TIMESTAMP_PATTERN",
+    "extract_timestamp_and_sender",
+    "find_copyable_block_in",
+    "get_text_block",
+    "parse_message_timestamp",
+    "parse_pre_plain_text",
+]
\ No newline at end of file
@@ -0,0 +1,169 @@
+"""Triaje de la miniatura ``data:image`` antes de esperar la imagen ``blob:``.
+
+WhatsApp incrusta en el mensaje una vista previa diminuta (unos 60x100 px) en
+base64 mucho antes de que la imagen completa termine de cargar. Decodificarla
+en memoria cuesta menos de un milisegundo y alcanza para distinguir una
+captura de pantalla de una app de pagos (fondos planos, pocos colores,
+formato vertical) de una foto común. A las fotos se les ahorra la espera del
+``blob:``, la descarga y el OCR.
+
+El triaje es conservador: sólo descarta cuando la miniatura se parece
+claramente a una foto. Si no hay miniatura o no se puede decodificar, el
+mensaje sigue su camino normal. De paso se estima el proveedor por el color
+de marca dominante, como pista para el registro (``proveedor``).
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import logging
+from functools import lru_cache
+from typing import NamedTuple, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from telemetry import count, timed
+
+logger = logging.getLogger(__name__)
+
+# Las capturas de comprobantes reales tienen al menos la mitad de los píxeles
+# en zonas planas y casi todo el color concentrado en cuatro tonos; las fotos
+# quedan muy por debajo de ambos umbrales.
+MIN_FLAT_RATIO = 0.35
+MIN_PALETTE_SHARE = 0.55
+# Bordes suaves: el gradiente de Sobel por debajo de este valor cuenta como plano.
+FLAT_GRADIENT = 40.0
+# Miniaturas más chicas no aportan información suficiente para decidir.
+MIN_THUMBNAIL_SIDE = 16
+# Píxeles con saturación y brillo suficientes para considerar su tono.
+MIN_BRAND_SATURATION = 90
+MIN_BRAND_VALUE = 60
+MIN_BRAND_SHARE = 0.05
+
+# (proveedor, tono mínimo, tono máximo) en la escala 0-180 de OpenCV.
+PROVIDER_HUES: Sequence[Tuple[str, int, int]] = (
+    ("yape", 125, 160),
+    ("bcp", 100, 125),
+    ("ligo", 55, 100),
+)
+
+
+class ThumbnailVerdict(NamedTuple):
+    """Resultado del triaje: ``is_voucher`` es ``None`` cuando no se pudo decidir."""
+
+    is_voucher: bool | None
+    provider: str = ""
+    flat_ratio: float = 0.0
+    palette_share: float = 0.0
+
+    @property
+    def rejects(self) -> bool:
+        return self.is_voucher is False
+
+
+UNKNOWN = ThumbnailVerdict(None)
+
+
+def decode_thumbnail(data_src: str) -> np.ndarray | None:
+    """Decodifica un ``data:image/...;base64,`` en una imagen BGR (o ``None``)."""
+
+    if not data_src.startswith("data:image") or "," not in data_src:
+        return None
+    try:
+        raw = base64.b64decode(data_src.split(",", 1)[1], validate=False)
+    except (binascii.Error, ValueError):
+        return None
+    if not raw:
+        return None
+    return cv2.imdecode(np.frombuffer(raw, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def flat_ratio(gray: np.ndarray, threshold: float = FLAT_GRADIENT) -> float:
+    """Fracción de píxeles sin bordes (fondos y tarjetas lisas de las apps)."""
+
+    gx = cv2.Sobel(gray, cv2.CV_32F, 1, 0)
+    gy = cv2.Sobel(gray, cv2.CV_32F, 0, 1)
+    return float((cv2.magnitude(gx, gy) < threshold).mean())
+
+
+def palette_share(image: np.ndarray, colors: int = 4) -> float:
+    """Proporción de píxeles cubierta por los ``colors`` tonos más frecuentes.
+
+    Cada canal se cuantiza a cuatro niveles (64 tonos posibles); una captura
+    de app se reparte en muy pocos, una foto en muchos.
+    """
+
+    quantized = (image // 64).reshape(-1, 3).astype(np.int32)
+    codes = quantized[:, 0] * 16 + quantized[:, 1] * 4 + quantized[:, 2]
+    histogram = np.bincount(codes, minlength=64)
+    return float(np.sort(histogram)[::-1][:colors].sum() / max(1, histogram.sum()))
+
+
+def guess_provider(image: np.ndarray) -> str:
+    """Proveedor cuyo color de marca domina la miniatura (``""`` si ninguno)."""
+
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    vivid = (hsv[..., 1] >= MIN_BRAND_SATURATION) & (hsv[..., 2] >= MIN_BRAND_VALUE)
+    if vivid.mean() < MIN_BRAND_SHARE:
+        return ""
+    hues = hsv[..., 0][vivid]
+    best, best_share = "", 0.0
+    for provider, low, high in PROVIDER_HUES:
+        share = float(((hues >= low) & (hues < high)).mean())
+        if share > best_share:
+            best, best_share = provider, share
+    return best if best_share >= 0.5 else ""
+
+
+def classify_thumbnail(image: np.ndarray) -> ThumbnailVerdict:
+    """Aplica las heurísticas de diseño sobre una miniatura ya decodificada."""
+
+    height, width = image.shape[:2]
+    if min(height, width) < MIN_THUMBNAIL_SIDE:
+        return UNKNOWN
+    flat = flat_ratio(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+    share = palette_share(image)
+    is_voucher = flat >= MIN_FLAT_RATIO or share >= MIN_PALETTE_SHARE
+    provider = guess_provider(image) if is_voucher else ""
+    return ThumbnailVerdict(is_voucher, provider, flat, share)
+
+
+@lru_cache(maxsize=256)
+def triage_thumbnail(data_src: str) -> ThumbnailVerdict:
+    """Decide con la miniatura si vale la pena esperar la imagen completa.
+
+    El resultado se memoriza por ``data_src``: la clasificación y el armado
+    del registro consultan el mismo veredicto sin volver a decodificar.
+    """
+
+    with timed("thumbnail_triage"):
+        image = decode_thumbnail(data_src) if data_src else None
+        verdict = classify_thumbnail(image) if image is not None else UNKNOWN
+    outcome = {True: "voucher", False: "photo", None: "unknown"}[verdict.is_voucher]
+    count(
+        "wa_thumbnail_triage_total",
+        verdict=outcome,
+        help_text="Veredicto del triaje de miniaturas antes de esperar el blob.",
+    )
+    if verdict.rejects:
+        logger.debug(
+            "Miniatura descartada como foto (plano=%.2f, paleta=%.2f)",
+            verdict.flat_ratio,
+            verdict.palette_share,
+        )
+    return verdict
+
+
+__all__ = [
+    "MIN_FLAT_RATIO",
+    "MIN_PALETTE_SHARE",
+    "PROVIDER_HUES",
+    "ThumbnailVerdict",
+    "classify_thumbnail",
+    "decode_thumbnail",
+    "guess_provider",
+    "palette_share",
+    "triage_thumbnail",
+]
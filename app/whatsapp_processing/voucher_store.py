@@ -0,0 +1,321 @@
+"""Base SQLite local de comprobantes con índices para consultas rápidas.
+
+El CSV y el JSONL siguen siendo los registros de sólo-anexado; esta base se
+alimenta en la misma etapa de exportación y permite buscar por teléfono del
+cliente, número de operación, remitente o rango de fechas sin recorrer los
+archivos. La marca temporal de WhatsApp (``11:28 p. m., 7/12/2025``) se guarda
+como fecha ISO para que los rangos usen el índice.
+
+Si la base no existe se construye una vez desde los JSONL exportados. Uso::
+
+    python -m app.whatsapp_processing.voucher_store buscar --telefono 929919731
+    python -m app.whatsapp_processing.voucher_store buscar --desde 2025-12-01 --hasta 2025-12-31
+    python -m app.whatsapp_processing.voucher_store reconstruir
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping
+
+from telemetry import timed
+
+from .chats import chat_slug
+from .constants import CHAT_NAME, CHAT_NAMES, JSONL_FILE, VOUCHER_DB_FILE
+from .payment_index import exported_jsonl_paths, normalize_amount, normalize_operation
+from .text_blocks import parse_message_timestamp
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS vouchers (
+    data_id     TEXT PRIMARY KEY,
+    chat        TEXT NOT NULL DEFAULT '',
+    sent_at     TEXT,
+    timestamp   TEXT NOT NULL DEFAULT '',
+    sender      TEXT NOT NULL DEFAULT '',
+    client      TEXT NOT NULL DEFAULT '',
+    phone       TEXT NOT NULL DEFAULT '',
+    operation   TEXT NOT NULL DEFAULT '',
+    amount      REAL,
+    method      TEXT NOT NULL DEFAULT '',
+    account     TEXT NOT NULL DEFAULT '',
+    balance     TEXT NOT NULL DEFAULT '',
+    record      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS vouchers_phone ON vouchers (phone);
+CREATE INDEX IF NOT EXISTS vouchers_operation ON vouchers (operation);
+CREATE INDEX IF NOT EXISTS vouchers_sent_at ON vouchers (sent_at);
+CREATE INDEX IF NOT EXISTS vouchers_sender ON vouchers (sender, sent_at);
+"""
+
+_UPSERT = """
+INSERT INTO vouchers (
+    data_id, chat, sent_at, timestamp, sender, client, phone, operation,
+    amount, method, account, balance, record
+) VALUES (
+    :data_id, :chat, :sent_at, :timestamp, :sender, :client, :phone, :operation,
+    :amount, :method, :account, :balance, :record
+)
+ON CONFLICT (data_id) DO UPDATE SET
+    chat = excluded.chat, sent_at = excluded.sent_at, timestamp = excluded.timestamp,
+    sender = excluded.sender, client = excluded.client, phone = excluded.phone,
+    operation = excluded.operation, amount = excluded.amount, method = excluded.method,
+    account = excluded.account, balance = excluded.balance, record = excluded.record
+"""
+
+_active: "VoucherStore | None" = None
+_active_lock = threading.Lock()
+
+_NON_DIGITS = re.compile(r"\D")
+# Celulares peruanos: 9 dígitos, con o sin el prefijo 51.
+_PHONE_DIGITS = 9
+
+
+def normalize_phone(value: str | None) -> str:
+    """``"+51 929 919 731"`` → ``"929919731"`` (últimos nueve dígitos)."""
+
+    digits = _NON_DIGITS.sub("", value or "")
+    return digits[-_PHONE_DIGITS:] if len(digits) > _PHONE_DIGITS else digits
+
+
+def _row(record: Mapping[str, str], chat: str) -> Dict[str, Any]:
+    moment = parse_message_timestamp(record.get("timestamp", ""))
+    amount = normalize_amount(record.get("monto"))
+    return {
+        "data_id": record.get("data_id", ""),
+        "chat": chat,
+        "sent_at": moment.isoformat(timespec="minutes") if moment else None,
+        "timestamp": record.get("timestamp", ""),
+        "sender": record.get("sender", ""),
+        "client": record.get("Nombre de cliente", ""),
+        "phone": normalize_phone(record.get("N° de cel")),
+        "operation": normalize_operation(record.get("numero_operacion")),
+        "amount": float(amount) if amount else None,
+        "method": " ".join((record.get("Método de pago") or "").upper().split()),
+        "account": record.get("Cuenta", ""),
+        "balance": (record.get("Balance") or "").upper().strip(),
+        "record": json.dumps(dict(record), ensure_ascii=False),
+    }
+
+
+def chat_for_jsonl(jsonl_path: Path) -> str:
+    """Nombre del chat dueño de un JSONL exportado (por su carpeta en ``CHATS_DIR``)."""
+
+    if jsonl_path == JSONL_FILE:
+        return CHAT_NAME
+    names = {chat_slug(name): name for name in CHAT_NAMES}
+    return names.get(jsonl_path.parent.name, jsonl_path.parent.name)
+
+
+def _bound(value: date | datetime | str | None, *, end: bool) -> str | None:
+    """Límite ISO de un rango; una fecha sin hora abarca el día completo."""
+
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat(timespec="minutes")
+    text = value.isoformat() if isinstance(value, date) else str(value)
+    if len(text) == 10 and end:
+        return f"{text}T23:59"
+    return text
+
+
+class VoucherStore:
+    """Comprobantes exportados en SQLite, con consultas por los campos clave."""
+
+    def __init__(self, path: str | Path = VOUCHER_DB_FILE) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(self.path))
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM vouchers").fetchone()[0]
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def __enter__(self) -> "VoucherStore":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def upsert(self, record: Mapping[str, str], chat: str = CHAT_NAME) -> None:
+        """Guarda (o actualiza) un registro exportado."""
+
+        if not record.get("data_id"):
+            return
+        with timed("voucher_db_write"), self._connection:
+            self._connection.execute(_UPSERT, _row(record, chat))
+
+    def upsert_many(self, records: Iterable[Mapping[str, str]], chat: str = CHAT_NAME) -> int:
+        rows = [_row(record, chat) for record in records if record.get("data_id")]
+        with self._connection:
+            self._connection.executemany(_UPSERT, rows)
+        return len(rows)
+
+    def query(
+        self,
+        *,
+        phone: str | None = None,
+        operation: str | None = None,
+        sender: str | None = None,
+        method: str | None = None,
+        chat: str | None = None,
+        since: date | datetime | str | None = None,
+        until: date | datetime | str | None = None,
+        limit: int | None = None,
+    ) -> List[Dict[str, str]]:
+        """Registros originales que cumplen todos los filtros, del más antiguo al más nuevo.
+
+        Un filtro indicado cuyo valor normalizado queda vacío (``operation="123"``,
+        un teléfono sin dígitos) no coincide con ningún registro.
+        """
+
+        clauses: List[str] = []
+        params: List[Any] = []
+        for column, given, value in (
+            ("phone", phone, normalize_phone(phone)),
+            ("operation", operation, normalize_operation(operation)),
+            ("sender", sender, sender),
+            ("method", method, " ".join((method or "").upper().split())),
+            ("chat", chat, chat),
+        ):
+            if given is None:
+                continue
+            if not value:
+                # En la base esas columnas vacías son "sin dato": omitir el
+                # filtro devolvería todos los registros.
+                return []
+            clauses.append(f"{column} = ?")
+            params.append(value)
+        lower, upper = _bound(since, end=False), _bound(until, end=True)
+        if lower:
+            clauses.append("sent_at >= ?")
+            params.append(lower)
+        if upper:
+            clauses.append("sent_at <= ?")
+            params.append(upper)
+
+        sql = "SELECT record FROM vouchers"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY sent_at, data_id"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with timed("voucher_db_query"):
+            rows = self._connection.execute(sql, params).fetchall()
+        return [json.loads(row["record"]) for row in rows]
+
+    def rebuild(self, jsonl_paths: Iterable[str | Path] | None = None) -> int:
+        """Carga los JSONL exportados (por defecto, los de todos los chats)."""
+
+        total = 0
+        for jsonl_path in jsonl_paths if jsonl_paths is not None else exported_jsonl_paths():
+            jsonl_path = Path(jsonl_path)
+            try:
+                handle = open(jsonl_path, "r", encoding="utf-8")
+            except FileNotFoundError:
+                continue
+            records = []
+            with handle:
+                for line in handle:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(record, dict):
+                        records.append(record)
+            total += self.upsert_many(records, chat_for_jsonl(jsonl_path))
+        logger.info("Base de comprobantes cargada con %s registros", total)
+        return total
+
+
+def open_voucher_store(path: str | Path = VOUCHER_DB_FILE) -> VoucherStore:
+    """Abre la base; si todavía no existe la construye desde los JSONL exportados."""
+
+    fresh = not Path(path).exists()
+    store = VoucherStore(path)
+    if fresh:
+        store.rebuild()
+    return store
+
+
+def get_voucher_store(path: str | Path = VOUCHER_DB_FILE) -> VoucherStore:
+    """Base compartida por todos los chats de la captura (se abre en el primer uso)."""
+
+    global _active
+    with _active_lock:
+        if _active is None or _active.path != Path(path):
+            _active = open_voucher_store(path)
+        return _active
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Consultas sobre la base local de comprobantes")
+    parser.add_argument("--db", default=str(VOUCHER_DB_FILE), help="archivo SQLite")
+    commands = parser.add_subparsers(dest="command", required=True)
+    search = commands.add_parser("buscar", help="buscar comprobantes")
+    search.add_argument("--telefono")
+    search.add_argument("--operacion")
+    search.add_argument("--remitente")
+    search.add_argument("--metodo")
+    search.add_argument("--chat")
+    search.add_argument("--desde", help="AAAA-MM-DD")
+    search.add_argument("--hasta", help="AAAA-MM-DD")
+    search.add_argument("--limite", type=int)
+    commands.add_parser("reconstruir", help="recargar la base desde los JSONL exportados")
+    args = parser.parse_args(argv)
+    if args.command == "buscar":
+        if args.telefono is not None and not normalize_phone(args.telefono):
+            parser.error(f"--telefono {args.telefono!r} no tiene dígitos")
+        if args.operacion is not None and not normalize_operation(args.operacion):
+            parser.error(
+                f"--operacion {args.operacion!r} no es un número de operación válido "
+                "(muy corto o sólo ceros)"
+            )
+
+    with open_voucher_store(args.db) as store:
+        if args.command == "reconstruir":
+            print(f"🗃️ {store.rebuild()} comprobantes cargados en {store.path}")
+            return
+        records = store.query(
+            phone=args.telefono,
+            operation=args.operacion,
+            sender=args.remitente,
+            method=args.metodo,
+            chat=args.chat,
+            since=args.desde,
+            until=args.hasta,
+            limit=args.limite,
+        )
+    for record in records:
+        print(json.dumps(record, ensure_ascii=False))
+    print(f"🔎 {len(records)} comprobantes encontrados")
+
+
+__all__ = [
+    "VoucherStore",
+    "chat_for_jsonl",
+    "get_voucher_store",
+    "main",
+    "normalize_phone",
+    "open_voucher_store",
+]
+
+
+if __name__ == "__main__":
+    main()
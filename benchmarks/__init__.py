@@ -0,0 +1 @@
+"""Benchmarks fuera de línea de la captura y de los extractores."""
@@ -0,0 +1,146 @@
+"""Benchmark de la ruta de captura sobre una conversación simulada.
+
+Uso::
+
+    python -m benchmarks.bench_capture --messages 500 --latency-ms 2
+    python -m benchmarks.bench_capture --snapshot outputs/comprobantes.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Dict, List
+from unittest import mock
+
+from app.whatsapp_processing import media, processing
+from app.whatsapp_processing.chats import ChatTarget
+from app.whatsapp_processing.csv_export import init_csv
+from app.whatsapp_processing.rejections import RejectionCache
+from ocr.engines import OcrResult
+
+from .fake_page import FakeMessage, FakePage, load_snapshot, synthetic_messages
+
+
+def _fake_ocr(image_path: str) -> OcrResult:
+    """Sustituye al OCR: el benchmark mide la captura, no EasyOCR."""
+
+    return OcrResult(values={"monto": "10", "numero_operacion": "00000000"})
+
+
+async def _run(page: FakePage, target: ChatTarget, passes: int) -> Dict[str, Any]:
+    processed_ids: set[str] = set()
+    last_id = ""
+    last_signature = ""
+    rejections = RejectionCache()
+    captured = 0
+    started = time.perf_counter()
+    pass_durations: List[float] = []
+    for _ in range(passes):
+        pass_started = time.perf_counter()
+        new_count, last_id, last_signature = await processing.process_visible_top_to_bottom(
+            page,
+            processed_ids,
+            last_id,
+            last_signature,
+            verbose_print=False,
+            target=target,
+            rejections=rejections,
+        )
+        pass_durations.append(time.perf_counter() - pass_started)
+        captured += new_count
+    elapsed = time.perf_counter() - started
+    total_messages = len(page.messages)
+    return {
+        "messages": total_messages,
+        "captured": captured,
+        "passes": passes,
+        "elapsed_s": round(elapsed, 4),
+        "first_pass_s": round(pass_durations[0], 4) if pass_durations else 0.0,
+        "steady_pass_s": round(pass_durations[-1], 4) if len(pass_durations) > 1 else None,
+        "messages_per_s": round(total_messages * passes / elapsed, 2) if elapsed else None,
+        "round_trips": page.stats.round_trips,
+        "round_trips_per_message": round(
+            page.stats.round_trips / max(total_messages * passes, 1), 2
+        ),
+        "evaluations": page.stats.evaluations,
+        "simulated_wait_ms": page.stats.simulated_wait_ms,
+        "rejected_cached": len(rejections),
+    }
+
+
+def run_capture_benchmark(
+    messages: List[FakeMessage],
+    *,
+    latency_ms: float = 0.0,
+    passes: int = 2,
+    blob_wait_ms: int | None = 200,
+) -> Dict[str, Any]:
+    """Recorre ``messages`` con ``process_visible_top_to_bottom`` y mide.
+
+    Las exportaciones CSV/JSONL se escriben en un directorio temporal; Google
+    Sheets y el OCR se reemplazan para no depender de red ni de modelos.
+    ``blob_wait_ms`` acota la espera real de imágenes diferidas para que el
+    benchmark termine en un tiempo razonable (``None`` usa el valor real).
+    """
+
+    page = FakePage(messages, latency_ms=latency_ms)
+    with tempfile.TemporaryDirectory() as tmp, ExitStack() as stack:
+        root = Path(tmp)
+        target = ChatTarget(
+            name="benchmark",
+            csv_path=root / "comprobantes.csv",
+            jsonl_path=root / "comprobantes.jsonl",
+            cache_path=root / "wa_cache.json",
+        )
+        init_csv(str(target.csv_path))
+        stack.enter_context(mock.patch.object(processing.logger, "disabled", True))
+        stack.enter_context(mock.patch.object(media, "IMG_DIR", root / "images"))
+        stack.enter_context(mock.patch.object(processing, "PHASH_INDEX_FILE", root / "images" / "phash.jsonl"))
+        stack.enter_context(mock.patch.object(processing, "export_to_sheets", lambda parsed: True))
+        stack.enter_context(mock.patch.object(processing, "read_voucher", _fake_ocr))
+        if blob_wait_ms is not None:
+            stack.enter_context(mock.patch.object(media, "BLOB_WAIT_MS_TOTAL", blob_wait_ms))
+        return asyncio.run(_run(page, target, passes))
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=300, help="mensajes sintéticos")
+    parser.add_argument("--voucher-ratio", type=float, default=0.3)
+    parser.add_argument("--text-only-ratio", type=float, default=0.1)
+    parser.add_argument("--snapshot", help="JSONL/JSON grabado a reproducir")
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="latencia por llamada CDP")
+    parser.add_argument("--passes", type=int, default=2, help="pasadas sobre la misma vista")
+    parser.add_argument("--blob-wait-ms", type=int, default=200)
+    parser.add_argument("--output", help="archivo donde anexar el resultado (JSON)")
+    args = parser.parse_args(argv)
+
+    if args.snapshot:
+        messages = load_snapshot(args.snapshot)
+    else:
+        messages = synthetic_messages(
+            args.messages,
+            voucher_ratio=args.voucher_ratio,
+            text_only_ratio=args.text_only_ratio,
+        )
+
+    result = run_capture_benchmark(
+        messages,
+        latency_ms=args.latency_ms,
+        passes=args.passes,
+        blob_wait_ms=args.blob_wait_ms,
+    )
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as handle:
+            handle.write(json.dumps({"bench": "capture", **result}, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
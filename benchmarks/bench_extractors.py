@@ -0,0 +1,100 @@
+"""Benchmark de los extractores de texto sobre el corpus real de comprobantes.
+
+Uso::
+
+    python -m benchmarks.bench_extractors --corpus outputs/comprobantes.jsonl --repeat 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from app.whatsapp_processing.constants import JSONL_FILE
+from app.whatsapp_processing.parsing import get_text_fields
+from ocr.amount_extractor import find_amount_from_texts
+from ocr.op_extractor import find_operation_number_from_texts
+
+
+def load_corpus(path: str | Path = JSONL_FILE) -> List[Dict[str, Any]]:
+    """Lee los registros exportados en JSONL ignorando líneas dañadas."""
+
+    records: List[Dict[str, Any]] = []
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, dict):
+                records.append(record)
+    return records
+
+
+def ocr_like_lines(record: Dict[str, Any]) -> List[str]:
+    """Reconstruye una transcripción similar a la de EasyOCR para un registro.
+
+    El corpus no guarda el texto OCR crudo, así que se arma una pantalla de
+    comprobante típica con el monto y el número de operación ya validados.
+    Sirve sólo para medir tiempos: como las líneas salen de los valores que
+    los propios extractores produjeron, no dicen nada de su precisión.
+    """
+
+    lines = ["Yapeaste!", f"S/ {record.get('monto', '')}"]
+    timestamp = str(record.get("timestamp", "") or "")
+    if timestamp:
+        lines.append(timestamp)
+    lines.extend(["Nro. de operación", str(record.get("numero_operacion", "") or "")])
+    return lines
+
+
+def _time_calls(func: Callable[[Any], Any], inputs: List[Any], repeat: int) -> Dict[str, Any]:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for value in inputs:
+            func(value)
+    elapsed = time.perf_counter() - started
+    calls = len(inputs) * repeat
+    return {
+        "calls": calls,
+        "elapsed_s": round(elapsed, 4),
+        "calls_per_s": round(calls / elapsed, 1) if elapsed else None,
+        "us_per_call": round(elapsed / calls * 1e6, 1) if calls else None,
+    }
+
+
+def run_extractor_benchmark(records: List[Dict[str, Any]], *, repeat: int = 10) -> Dict[str, Any]:
+    """Mide ``get_text_fields`` y los extractores OCR sobre ``records``."""
+
+    texts = [str(record.get("raw_text", "") or "") for record in records]
+    ocr_inputs = [ocr_like_lines(record) for record in records]
+
+    return {
+        "records": len(records),
+        "get_text_fields": _time_calls(get_text_fields, texts, repeat),
+        "find_amount_from_texts": _time_calls(find_amount_from_texts, ocr_inputs, repeat),
+        "find_operation_number_from_texts": _time_calls(find_operation_number_from_texts, ocr_inputs, repeat),
+    }
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", default=str(JSONL_FILE))
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--output", help="archivo donde anexar el resultado (JSON)")
+    args = parser.parse_args(argv)
+
+    result = run_extractor_benchmark(load_corpus(args.corpus), repeat=args.repeat)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as handle:
+            handle.write(json.dumps({"bench": "extractors", **result}, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
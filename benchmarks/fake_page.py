@@ -0,0 +1,310 @@
+"""Página falsa de Playwright que reproduce el DOM de WhatsApp Web sin navegador.
+
+Cada llamada ``await`` cuenta como un viaje de ida y vuelta por CDP y puede
+simular una latencia fija, de modo que el benchmark muestre el costo real de
+las consultas que hace la captura por cada mensaje.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import random
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from app.whatsapp_processing.snapshot import MESSAGE_SNAPSHOT_JS
+
+# JPEG de 1x1 píxel: basta para que la descarga escriba un archivo válido.
+_TINY_JPEG_B64 = (
+    "/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDAAgGBgcGBQgHBwcJCQgKDBQNDAsLDBkSEw8UHRofHh0a"
+    "HBwgJC4nICIsIxwcKDcpLDAxNDQ0Hyc5PTgyPC4zNDL/wAALCAABAAEBAREA/8QAFAABAAAAAAAA"
+    "AAAAAAAAAAAACf/EABQQAQAAAAAAAAAAAAAAAAAAAAD/2gAIAQEAAD8AKp//2Q=="
+)
+
+_ROWS_SELECTOR = "div[role='row'] div[data-id]"
+_ROW_BY_ID_PATTERN = re.compile(r'data-id="([^"]+)"')
+_CHILD_SELECTORS = {
+    "div.copyable-text[data-pre-plain-text]": "block",
+    'img[src^="blob:"]': "blob",
+    'img[src^="data:image"]': "data",
+    "span.selectable-text": "span",
+}
+
+
+@dataclass
+class FakeMessage:
+    """Mensaje renderizado en la conversación simulada."""
+
+    data_id: str
+    texts: List[str] = field(default_factory=list)
+    timestamp: str = ""
+    sender: str = ""
+    blob_src: str = ""
+    data_src: str = ""
+
+    @property
+    def pre_plain_text(self) -> str:
+        if not self.timestamp and not self.sender:
+            return ""
+        return f"[{self.timestamp}] {self.sender}: "
+
+
+@dataclass
+class CallStats:
+    """Contadores de viajes CDP y esperas simuladas."""
+
+    round_trips: int = 0
+    evaluations: int = 0
+    simulated_wait_ms: float = 0.0
+
+
+_Node = Tuple[str, FakeMessage, int]
+
+
+def _snapshot_payload(message: FakeMessage) -> Dict[str, str]:
+    """Respuesta de ``MESSAGE_SNAPSHOT_JS`` para un mensaje simulado."""
+
+    if not message.pre_plain_text:
+        return {"prePlainText": "", "text": "", "blobSrc": "", "dataSrc": "", "imgAlt": ""}
+    return {
+        "prePlainText": message.pre_plain_text,
+        "text": "\n".join(text.strip() for text in message.texts if text.strip()),
+        "blobSrc": message.blob_src,
+        "dataSrc": message.data_src,
+        "imgAlt": "",
+    }
+
+
+class FakeLocator:
+    """Subconjunto de ``Locator`` usado por la captura."""
+
+    def __init__(self, page: "FakePage", nodes: Sequence[_Node]) -> None:
+        self._page = page
+        self._nodes = list(nodes)
+
+    @property
+    def first(self) -> "FakeLocator":
+        return self.nth(0)
+
+    def nth(self, index: int) -> "FakeLocator":
+        if 0 <= index < len(self._nodes):
+            return FakeLocator(self._page, [self._nodes[index]])
+        return FakeLocator(self._page, [])
+
+    def locator(self, selector: str) -> "FakeLocator":
+        kind = _CHILD_SELECTORS.get(selector)
+        nodes: List[_Node] = []
+        for _, message, _ in self._nodes:
+            if kind == "block" and message.pre_plain_text:
+                nodes.append(("block", message, 0))
+            elif kind == "blob" and message.blob_src:
+                nodes.append(("blob", message, 0))
+            elif kind == "data" and message.data_src:
+                nodes.append(("data", message, 0))
+            elif kind == "span":
+                nodes.extend(("span", message, i) for i in range(len(message.texts)))
+        return FakeLocator(self._page, nodes)
+
+    async def count(self) -> int:
+        await self._page.round_trip()
+        return len(self._nodes)
+
+    async def get_attribute(self, name: str, timeout: float | None = None) -> str | None:
+        await self._page.round_trip()
+        if not self._nodes:
+            return None
+        kind, message, _ = self._nodes[0]
+        if name == "data-id" and kind == "row":
+            return message.data_id
+        if name == "data-pre-plain-text" and kind == "block":
+            return message.pre_plain_text
+        if name == "src" and kind == "blob":
+            return message.blob_src
+        if name == "src" and kind == "data":
+            return message.data_src
+        return None
+
+    async def inner_text(self, timeout: float | None = None) -> str:
+        await self._page.round_trip()
+        if not self._nodes:
+            return ""
+        kind, message, index = self._nodes[0]
+        if kind == "span":
+            return message.texts[index]
+        return "\n".join(message.texts)
+
+    async def evaluate(self, script: str, arg: Any = None) -> Any:
+        if script == MESSAGE_SNAPSHOT_JS and self._nodes:
+            await self._page.round_trip()
+            self._page.stats.evaluations += 1
+            return _snapshot_payload(self._nodes[0][1])
+        return await self._page.evaluate(script, arg)
+
+    async def scroll_into_view_if_needed(self, timeout: float | None = None) -> None:
+        await self._page.round_trip()
+
+    async def hover(self, timeout: float | None = None) -> None:
+        await self._page.round_trip()
+
+    async def bounding_box(self) -> Dict[str, float] | None:
+        await self._page.round_trip()
+        if not self._nodes:
+            return None
+        return {"x": 0.0, "y": float(self._page.index_of(self._nodes[0][1])), "width": 1.0, "height": 1.0}
+
+
+class _FakeKeyboard:
+    def __init__(self, page: "FakePage") -> None:
+        self._page = page
+
+    async def press(self, key: str) -> None:
+        await self._page.round_trip()
+
+
+class FakePage:
+    """Conversación simulada con latencia CDP configurable por llamada."""
+
+    def __init__(self, messages: Iterable[FakeMessage], *, latency_ms: float = 0.0) -> None:
+        self.messages = list(messages)
+        self.latency = max(latency_ms, 0.0) / 1000.0
+        self.stats = CallStats()
+        self.keyboard = _FakeKeyboard(self)
+        self._positions = {message.data_id: index for index, message in enumerate(self.messages)}
+
+    def index_of(self, message: FakeMessage) -> int:
+        return self._positions.get(message.data_id, 0)
+
+    async def round_trip(self) -> None:
+        self.stats.round_trips += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def locator(self, selector: str) -> FakeLocator:
+        if selector == _ROWS_SELECTOR:
+            return FakeLocator(self, [("row", message, 0) for message in self.messages])
+        match = _ROW_BY_ID_PATTERN.search(selector)
+        if match:
+            wanted = match.group(1)
+            return FakeLocator(
+                self,
+                [("row", message, 0) for message in self.messages if message.data_id == wanted],
+            )
+        return FakeLocator(self, [])
+
+    async def evaluate(self, script: str, arg: Any = None) -> Any:
+        await self.round_trip()
+        self.stats.evaluations += 1
+        if isinstance(arg, str) and arg.startswith("blob:"):
+            return {"b64": _TINY_JPEG_B64, "contentType": "image/jpeg"}
+        if isinstance(arg, dict):
+            # Descarga agrupada: una respuesta por clave, como ``Promise.allSettled``.
+            return {
+                key: {"b64": _TINY_JPEG_B64, "contentType": "image/jpeg"}
+                if str(url).startswith("blob:")
+                else {"error": "TypeError: Failed to fetch"}
+                for key, url in arg.items()
+            }
+        return None
+
+    async def wait_for_timeout(self, value: float) -> None:
+        self.stats.simulated_wait_ms += value
+
+    def is_closed(self) -> bool:
+        return False
+
+
+def message_from_record(record: Dict[str, Any]) -> FakeMessage:
+    """Convierte un registro exportado (JSONL) en un mensaje renderizado."""
+
+    raw_text = str(record.get("raw_text", "") or "")
+    return FakeMessage(
+        data_id=str(record.get("data_id", "") or ""),
+        texts=[line.strip() for line in raw_text.splitlines() if line.strip()],
+        timestamp=str(record.get("timestamp", "") or ""),
+        sender=str(record.get("sender", "") or ""),
+        blob_src=str(record.get("img_src_blob", "") or ""),
+        data_src=str(record.get("img_src_data", "") or "")[:64],
+    )
+
+
+def load_snapshot(path: str | Path) -> List[FakeMessage]:
+    """Carga una instantánea grabada: JSONL exportado o lista JSON de registros."""
+
+    source = Path(path)
+    text = source.read_text(encoding="utf-8")
+    if source.suffix == ".jsonl":
+        records = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        records = json.loads(text)
+    return [message_from_record(record) for record in records if isinstance(record, dict)]
+
+
+_CHATTER = (
+    "Buenos días equipo",
+    "Ok, gracias",
+    "¿Ya enviaron el pedido de Lima?",
+    "Confirmado 👍",
+)
+
+
+def synthetic_messages(
+    total: int,
+    *,
+    voucher_ratio: float = 0.3,
+    text_only_ratio: float = 0.1,
+    seed: int = 7,
+) -> List[FakeMessage]:
+    """Genera una conversación sintética con comprobantes, texto y avisos."""
+
+    rng = random.Random(seed)
+    messages: List[FakeMessage] = []
+    for index in range(total):
+        data_id = f"false_120363000000000000@g.us_{index:020X}_100000000000000@lid"
+        roll = rng.random()
+        if roll < voucher_ratio:
+            messages.append(
+                FakeMessage(
+                    data_id=data_id,
+                    texts=[
+                        f"Nombre de cliente: Cliente {index}",
+                        "Producto y cantidad: 1 PACK AMOR PROPIO",
+                        "Balance: INGRESO",
+                        "Servicio: ENVIO",
+                        "Método de pago: YAPE",
+                        "Cuenta: EUNOIA",
+                        "Detalle: ANTICIPO",
+                    ],
+                    timestamp=f"10:{index % 60:02d} a. m., {1 + index % 28}/12/2025",
+                    sender="Equipo Ventas",
+                    blob_src=f"blob:https://web.whatsapp.com/{index:08x}",
+                    data_src="data:image/jpeg;base64,AAAA",
+                )
+            )
+        elif roll < voucher_ratio + text_only_ratio:
+            messages.append(
+                FakeMessage(
+                    data_id=data_id,
+                    texts=[rng.choice(_CHATTER)],
+                    timestamp=f"11:{index % 60:02d} a. m., {1 + index % 28}/12/2025",
+                    sender="Equipo Ventas",
+                )
+            )
+        else:
+            # Stickers, avisos del sistema y mensajes sin bloque copiable.
+            messages.append(FakeMessage(data_id=data_id, texts=[rng.choice(_CHATTER)]))
+    return messages
+
+
+__all__ = [
+    "CallStats",
+    "FakeLocator",
+    "FakeMessage",
+    "FakePage",
+    "load_snapshot",
+    "message_from_record",
+    "synthetic_messages",
+]
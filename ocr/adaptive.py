@@ -0,0 +1,185 @@
+"""OCR adaptativo: primero una versión reducida, resolución completa sólo si hace falta.
+
+La mayoría de los comprobantes son capturas de pantalla nítidas donde el
+monto y el número de operación se leen bien a la mitad de resolución. El
+lector arranca por esa versión reducida y escala únicamente cuando algún
+campo falta o queda por debajo de la confianza mínima:
+
+1. imagen reducida (lado mayor ``OCR_FAST_MAX_SIDE``);
+2. recorte a resolución completa alrededor de la línea dudosa, si el campo
+   se encontró pero con baja confianza;
+3. imagen completa, si todavía falta algún campo.
+
+Al combinar las lecturas de cada paso sólo se comparan confianzas del mismo
+motor; entre motores distintos se prefiere el más preciso de la cascada,
+igual que dentro de :class:`OcrCascade`.
+
+El paso en que terminó cada lectura se cuenta en
+``wa_ocr_adaptive_total{step=...}``.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, Mapping, Sequence, Tuple
+
+import cv2
+
+from settings import getbool, getint
+from telemetry import count, timed
+
+from .engines import FIELDS, Box, OcrCascade, OcrResult
+
+logger = logging.getLogger(__name__)
+
+OCR_ADAPTIVE = getbool("OCR_ADAPTIVE", True)
+FAST_MAX_SIDE = getint("OCR_FAST_MAX_SIDE", 1280)
+# Alto de línea que se agrega arriba y abajo del campo dudoso al recortar.
+CROP_MARGIN_LINES = 2.0
+
+
+def downscale(image: Any, max_side: int) -> Tuple[Any, float]:
+    """Reduce ``image`` para que su lado mayor sea ``max_side`` (nunca amplía)."""
+
+    height, width = image.shape[:2]
+    scale = max_side / float(max(height, width))
+    if scale >= 1.0:
+        return image, 1.0
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+
+def _rescale(result: OcrResult, factor: float, offset_y: int = 0) -> OcrResult:
+    """Lleva las cajas de ``result`` a coordenadas de la imagen completa."""
+
+    result.boxes = {
+        name: (
+            int(box[0] * factor),
+            int(box[1] * factor) + offset_y,
+            int(box[2] * factor),
+            int(box[3] * factor) + offset_y,
+        )
+        for name, box in result.boxes.items()
+    }
+    return result
+
+
+def crop_band(image: Any, box: Box, margin_lines: float = CROP_MARGIN_LINES) -> Tuple[Any, int]:
+    """Franja de ancho completo alrededor de ``box``; devuelve el recorte y su ``y`` inicial."""
+
+    height = image.shape[0]
+    line = max(1, box[3] - box[1])
+    top = max(0, int(box[1] - margin_lines * line))
+    bottom = min(height, int(box[3] + margin_lines * line))
+    return image[top:bottom], top
+
+
+class AdaptiveReader:
+    """Envuelve una :class:`OcrCascade` con la escalera de resoluciones."""
+
+    def __init__(self, cascade: OcrCascade, *, max_side: int = FAST_MAX_SIDE) -> None:
+        self.cascade = cascade
+        self.max_side = max_side
+
+    @property
+    def min_confidence(self) -> float:
+        return self.cascade.min_confidence
+
+    def _finish(self, result: OcrResult, step: str) -> OcrResult:
+        count(
+            "wa_ocr_adaptive_total",
+            step=step,
+            help_text="Paso de la escalera de resoluciones en que terminó cada lectura.",
+        )
+        return result
+
+    def read(self, image_path: str) -> OcrResult:
+        image = cv2.imread(image_path)
+        if image is None:
+            # Formato que OpenCV no abre: se deja al motor leer el archivo.
+            return self._finish(self.cascade.extract(image_path), "full")
+        result = self._read_image(image)
+        result.size = image.shape[:2]
+        return result
+
+    def _read_image(self, image: Any) -> OcrResult:
+        small, scale = downscale(image, self.max_side)
+        if scale == 1.0:
+            return self._finish(self.cascade.extract(image), "full")
+
+        with timed("ocr_step", step="downscaled"):
+            result = _rescale(self.cascade.extract(small), 1.0 / scale)
+        if result.is_confident(self.min_confidence):
+            return self._finish(result, "downscaled")
+
+        weak = result.weak_fields(self.min_confidence)
+        missing = [name for name in ("monto", "numero_operacion") if name not in result.values]
+        if weak and not missing and all(name in result.boxes for name in weak):
+            with timed("ocr_step", step="crop"):
+                for name in weak:
+                    band, top = crop_band(image, result.boxes[name])
+                    result.merge(
+                        _rescale(self.cascade.extract(band), 1.0, top),
+                        fields=(name,),
+                        engine_order=self.cascade.engine_names,
+                    )
+            if result.is_confident(self.min_confidence):
+                return self._finish(result, "crop")
+
+        with timed("ocr_step", step="full"):
+            result.merge(self.cascade.extract(image), engine_order=self.cascade.engine_names)
+        return self._finish(result, "full")
+
+
+def confirm_fields(
+    cascade: OcrCascade,
+    image_path: str,
+    values: Mapping[str, str],
+    boxes: Mapping[str, Sequence[float]],
+) -> bool:
+    """Comprueba, leyendo sólo las franjas de cada campo, que la imagen muestra ``values``.
+
+    ``boxes`` viene en fracciones del ancho y alto (:meth:`OcrResult.relative_boxes`)
+    de otra captura del mismo comprobante. Cada franja se lee con los motores
+    en orden hasta que uno extrae exactamente el mismo valor; si algún campo
+    falta, no tiene caja o ningún motor lo confirma, la respuesta es ``False``.
+    """
+
+    image = cv2.imread(image_path)
+    if image is None:
+        return False
+    height, width = image.shape[:2]
+    engines = [engine for engine in cascade.engines if engine.available()]
+    for name in FIELDS:
+        value, box = values.get(name), boxes.get(name)
+        if not value or not box or len(box) != 4:
+            return False
+        absolute = (
+            int(box[0] * width),
+            int(box[1] * height),
+            int(box[2] * width),
+            int(box[3] * height),
+        )
+        band, _top = crop_band(image, absolute)
+        if not any(_band_value(engine, band, name) == value for engine in engines):
+            return False
+    return True
+
+
+def _band_value(engine: Any, band: Any, name: str) -> str | None:
+    try:
+        detections = engine.read(band)
+    except Exception:
+        logger.exception("El motor %s falló al confirmar un recorte", engine.name)
+        return None
+    return OcrResult.from_detections(engine.name, detections).values.get(name)
+
+
+__all__ = [
+    "AdaptiveReader",
+    "FAST_MAX_SIDE",
+    "OCR_ADAPTIVE",
+    "confirm_fields",
+    "crop_band",
+    "downscale",
+]
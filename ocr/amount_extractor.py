@@ -1,5 +1,17 @@
 # amount_extractor.py
 import re
+from bisect import bisect_right
+
+
+def line_of_offset(text_list: list[str], offset: int) -> int:
+    """Índice de la línea de ``text_list`` que contiene la posición ``offset`` de ``" ".join(text_list)``."""
+
+    starts = []
+    position = 0
+    for text in text_list:
+        starts.append(position)
+        position += len(text) + 1
+    return max(0, bisect_right(starts, offset) - 1)
 
 
 def find_amount_from_texts(text_list: list[str]) -> str | None:
@@ -10,6 +22,15 @@ def find_amount_from_texts(text_list: list[str]) -> str | None:
     - Evita tomar horas/fechas como 17.04 h.
     - Para patrones tipo 5/15.00 usa 15.00.
     """
+    found = find_amount_with_source(text_list)
+    return None if found is None else found[0]
+
+
+def find_amount_with_source(text_list: list[str]) -> tuple[str, int] | None:
+    """
+    Igual que ``find_amount_from_texts`` pero devuelve también el índice de
+    la línea de donde salió el monto (para tomar su confianza y su caja).
+    """
     # Texto unido (para las reglas globales)
     full_text = " ".join(text_list).replace("\n", " ")
     text_case = full_text.casefold()  # para comparar sin importar mayúsculas/acentos
@@ -21,11 +42,11 @@ def find_amount_from_texts(text_list: list[str]) -> str | None:
         # cubre 'comisión' y 'comision'
         return "comisión" in before or "comision" in before
 
-    # Listas para candidatos globales (fallback)
-    candidates_pos: list[tuple[float, str]] = []   # montos > 0
-    candidates_zero: list[tuple[float, str]] = []  # montos == 0
+    # Listas para candidatos globales (fallback): (valor, texto, línea)
+    candidates_pos: list[tuple[float, str, int]] = []   # montos > 0
+    candidates_zero: list[tuple[float, str, int]] = []  # montos == 0
 
-    def add_candidate(raw_amount: str, idx: int):
+    def add_candidate(raw_amount: str, idx: int, amount_idx: int):
         """Agrega un candidato normal (no prioritario), respetando COMISIÓN."""
         if context_has_comision(idx):
             return
@@ -34,10 +55,11 @@ def find_amount_from_texts(text_list: list[str]) -> str | None:
             value = float(amt_str)
         except ValueError:
             return
+        line = line_of_offset(text_list, amount_idx)
         if value > 0:
-            candidates_pos.append((value, raw_amount))
+            candidates_pos.append((value, raw_amount, line))
         else:
-            candidates_zero.append((value, raw_amount))
+            candidates_zero.append((value, raw_amount, line))
 
     # ─────────────────────────────────────────
     #   Helpers para la regla basada en líneas
@@ -102,7 +124,7 @@ def find_amount_from_texts(text_list: list[str]) -> str | None:
         keywords=("yapeaste", "operación exitosa", "plin"),
         extra_labels=("importe enviado",),
         max_lines=4,
-    ) -> str | None:
+    ) -> tuple[str, int] | None:
         """
         Busca un monto en las N líneas siguientes a:
         - 'yapeaste', 'operación exitosa', 'plin'
@@ -126,7 +148,7 @@ def find_amount_from_texts(text_list: list[str]) -> str | None:
                         break
                     cand = extract_amount_from_line(lines[j])
                     if cand is not None:
-                        return cand
+                        return cand, j
 
                 # ── 2) Regla nueva especial YAPE:
                 #     Después de "yapeaste" puede venir:
@@ -144,7 +166,7 @@ def find_amount_from_texts(text_list: list[str]) -> str | None:
                         siguiente_linea = lines[j + 1]
                         m = re.search(r"([0-9]{1,4})", siguiente_linea)
                         if m:
-                            return m.group(1)
+                            return m.group(1), j + 1
 
         return None
 
@@ -169,18 +191,18 @@ def find_amount_from_texts(text_list: list[str]) -> str | None:
 
     # Regla 1: S110 / S1129.90 (S1 pegado)
     for m in re.finditer(r"\b[sS3][1lI]([0-9]+(?:[.,][0-9]+)?)\b", full_text):
-        add_candidate(m.group(1), m.start())
+        add_candidate(m.group(1), m.start(), m.start(1))
 
     # Regla 2: SI110 (SI pegado al monto)
     for m in re.finditer(r"\b[sS][iI]([0-9]+(?:[.,][0-9]+)?)\b", full_text):
-        add_candidate(m.group(1), m.start())
+        add_candidate(m.group(1), m.start(), m.start(1))
 
     # Regla 3: moneda separada → "S/ 20", "s/20.00", "SI 110", "S1 10", etc.
     pattern_moneda_global = re.compile(
         r"(?:\b[sS35][/71lI]|\b[sS][iI]\b)\s*([0-9]{1,4}(?:[.,][0-9]{1,2})?)"
     )
     for m in pattern_moneda_global.finditer(full_text):
-        add_candidate(m.group(1), m.start())
+        add_candidate(m.group(1), m.start(), m.start(1))
 
     # Regla 4: después de palabras tipo "monto", "importe", "importe enviado"
     pattern_label = re.compile(
@@ -188,24 +210,24 @@ def find_amount_from_texts(text_list: list[str]) -> str | None:
         re.IGNORECASE,
     )
     for m in pattern_label.finditer(full_text):
-        add_candidate(m.group(1), m.start())
+        add_candidate(m.group(1), m.start(), m.start(1))
 
     # Regla 5 (fallback): cualquier número con decimales
     for m in decimal_pat.finditer(full_text):
-        add_candidate(m.group(0), m.start())
+        add_candidate(m.group(0), m.start(), m.start())
 
     # Regla 6: Detectar montos con el formato 5/15.00 (tomamos 15.00)
     for m in pattern_fraction.finditer(full_text):
-        add_candidate(m.group(1), m.start())
+        add_candidate(m.group(1), m.start(), m.start(1))
 
     # ── Decisión final ───────────────────────
     if candidates_pos:
         # devolvemos el MAYOR monto positivo (solo si no hubo prioridad)
         best = max(candidates_pos, key=lambda x: x[0])
-        return best[1]
+        return best[1], best[2]
 
     if candidates_zero:
         # Solo si no hay ningún monto > 0, devolvemos uno cero
-        return candidates_zero[0][1]
+        return candidates_zero[0][1], candidates_zero[0][2]
 
     return None
@@ -0,0 +1,455 @@
+"""Motores de OCR intercambiables y la cascada que decide cuál usar.
+
+Cada motor devuelve una lista de :class:`TextDetection` (texto, confianza y
+caja). La cascada ejecuta primero el motor barato (Tesseract) y sólo recurre
+a EasyOCR cuando el monto o el número de operación no salen completos, bien
+formados y con confianza suficiente. Por motor se registran latencia
+(``wa_stage_latency_seconds{stage="ocr_engine"}``) y resultado
+(``wa_ocr_engine_total``), de donde sale la tasa de aciertos del camino
+rápido.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Protocol, Sequence, Tuple
+
+from settings import getbool, getenv
+from telemetry import count, timed
+
+from .amount_extractor import find_amount_with_source
+from .op_extractor import find_operation_with_source
+
+logger = logging.getLogger(__name__)
+
+# Motores en orden de uso, separados por comas (``OCR_ENGINES`` en ``.env``).
+OCR_ENGINES = tuple(
+    name.strip().lower()
+    for name in getenv("OCR_ENGINES", "tesseract,easyocr").split(",")
+    if name.strip()
+)
+TESSERACT_LANG = getenv("OCR_TESSERACT_LANG", "spa+eng").strip()
+TESSERACT_CONFIG = getenv("OCR_TESSERACT_CONFIG", "--oem 1 --psm 6").strip()
+EASYOCR_LANGUAGES = tuple(
+    lang.strip() for lang in getenv("OCR_EASYOCR_LANGUAGES", "en,es").split(",") if lang.strip()
+)
+# EasyOCR en CPU: sin GPU evita sondear CUDA; ``quantize`` aplica cuantización
+# dinámica int8 a detector y reconocedor (menos memoria y más rápido en CPU).
+EASYOCR_GPU = getbool("OCR_EASYOCR_GPU", True)
+EASYOCR_QUANTIZE = getbool("OCR_EASYOCR_QUANTIZE", True)
+# Confianza mínima (0-1) de la línea que contiene cada campo para aceptarlo.
+MIN_FIELD_CONFIDENCE = float(getenv("OCR_MIN_CONFIDENCE", "0.6"))
+
+Box = Tuple[int, int, int, int]
+_AMOUNT_SHAPE = re.compile(r"^\d{1,6}(?:\.\d{1,2})?$")
+_OPERATION_SHAPE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9\-/\.]{4,29}$")
+
+
+class TextDetection(NamedTuple):
+    """Línea reconocida: texto, confianza (0-1) y caja ``(x0, y0, x1, y1)``."""
+
+    text: str
+    confidence: float = 1.0
+    box: Optional[Box] = None
+
+
+class OcrEngine(Protocol):
+    """Interfaz mínima de un motor de OCR."""
+
+    name: str
+
+    def available(self) -> bool:
+        """``True`` si el motor puede usarse en esta máquina."""
+
+    def read(self, image: Any) -> List[TextDetection]:
+        """Reconoce ``image`` (ruta o arreglo de OpenCV)."""
+
+    def preload(self) -> None:
+        """Carga modelos y recursos antes de la primera lectura."""
+
+
+class TesseractEngine:
+    """Camino rápido con Tesseract; agrupa las palabras en líneas."""
+
+    name = "tesseract"
+
+    def __init__(self, lang: str = TESSERACT_LANG, config: str = TESSERACT_CONFIG) -> None:
+        self.lang = lang
+        self.config = config
+        self._available: bool | None = None
+
+    def available(self) -> bool:
+        if self._available is None:
+            self._available = self._probe()
+        return self._available
+
+    def _probe(self) -> bool:
+        try:
+            import pytesseract
+
+            installed = set(pytesseract.get_languages(config=""))
+        except Exception as exc:
+            logger.info("Tesseract no está disponible; se usará el siguiente motor (%s)", exc)
+            return False
+        wanted = [lang for lang in self.lang.split("+") if lang in installed]
+        if not wanted:
+            logger.info("Tesseract no tiene instalados los idiomas %s", self.lang)
+            return False
+        self.lang = "+".join(wanted)
+        return True
+
+    def preload(self) -> None:
+        self.available()
+
+    def read(self, image: Any) -> List[TextDetection]:
+        import pytesseract
+
+        data = pytesseract.image_to_data(
+            image, lang=self.lang, config=self.config, output_type=pytesseract.Output.DICT
+        )
+        return lines_from_tesseract_data(data)
+
+
+def lines_from_tesseract_data(data: Dict[str, List[Any]]) -> List[TextDetection]:
+    """Convierte la salida palabra por palabra de ``image_to_data`` en líneas."""
+
+    lines: Dict[Tuple[int, int, int], List[int]] = {}
+    for index, word in enumerate(data.get("text", [])):
+        if not str(word).strip():
+            continue
+        key = (data["block_num"][index], data["par_num"][index], data["line_num"][index])
+        lines.setdefault(key, []).append(index)
+
+    detections: List[TextDetection] = []
+    for indexes in lines.values():
+        words = [str(data["text"][i]).strip() for i in indexes]
+        confidences = [max(float(data["conf"][i]), 0.0) / 100 for i in indexes]
+        x0 = min(int(data["left"][i]) for i in indexes)
+        y0 = min(int(data["top"][i]) for i in indexes)
+        x1 = max(int(data["left"][i]) + int(data["width"][i]) for i in indexes)
+        y1 = max(int(data["top"][i]) + int(data["height"][i]) for i in indexes)
+        detections.append(
+            TextDetection(" ".join(words), sum(confidences) / len(confidences), (x0, y0, x1, y1))
+        )
+    return detections
+
+
+class EasyOcrEngine:
+    """EasyOCR; el modelo se carga la primera vez que se usa."""
+
+    name = "easyocr"
+
+    def __init__(self, languages: Sequence[str] = EASYOCR_LANGUAGES, **reader_options: Any) -> None:
+        self.languages = list(languages)
+        reader_options.setdefault("gpu", EASYOCR_GPU)
+        reader_options.setdefault("quantize", EASYOCR_QUANTIZE)
+        self.reader_options = reader_options
+        self._reader: Any = None
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        try:
+            import easyocr  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    @property
+    def reader(self) -> Any:
+        with self._lock:
+            if self._reader is None:
+                import easyocr
+
+                with timed("ocr_model_load", engine=self.name):
+                    self._reader = easyocr.Reader(self.languages, **self.reader_options)
+        return self._reader
+
+    def preload(self) -> None:
+        if self.available():
+            _ = self.reader
+
+    def read(self, image: Any) -> List[TextDetection]:
+        detections: List[TextDetection] = []
+        for points, text, confidence in self.reader.readtext(image):
+            xs = [int(point[0]) for point in points]
+            ys = [int(point[1]) for point in points]
+            detections.append(
+                TextDetection(str(text), float(confidence), (min(xs), min(ys), max(xs), max(ys)))
+            )
+        return detections
+
+
+ENGINE_FACTORIES: Dict[str, Callable[[], OcrEngine]] = {
+    TesseractEngine.name: TesseractEngine,
+    EasyOcrEngine.name: EasyOcrEngine,
+}
+
+
+def _digits(value: str) -> str:
+    return re.sub(r"[^0-9A-Za-z]", "", value)
+
+
+def field_match(value: str | None, detections: Sequence[TextDetection]) -> TextDetection | None:
+    """Línea más confiable que contiene ``value`` (``None`` si no aparece)."""
+
+    if not value:
+        return None
+    # ``150.00`` suele aparecer como ``S/ 150`` o ``S/150.0``: basta la parte entera.
+    wanted = _digits(value.split(".")[0] if "." in value else value)
+    best: TextDetection | None = None
+    for detection in detections:
+        if wanted and wanted in _digits(detection.text):
+            if best is None or detection.confidence > best.confidence:
+                best = detection
+    return best
+
+
+def field_confidence(value: str | None, detections: Sequence[TextDetection]) -> float:
+    """Confianza de la mejor línea que contiene ``value`` (0 si no aparece)."""
+
+    match = field_match(value, detections)
+    return 0.0 if match is None else match.confidence
+
+
+def amount_is_well_formed(amount: str | None) -> bool:
+    if not amount or not _AMOUNT_SHAPE.match(amount):
+        return False
+    return float(amount) > 0
+
+
+def operation_is_well_formed(operation: str | None) -> bool:
+    if not operation or not _OPERATION_SHAPE.match(operation):
+        return False
+    return sum(ch.isdigit() for ch in operation) >= 4
+
+
+FIELDS: Tuple[str, ...] = ("monto", "numero_operacion")
+_WELL_FORMED: Dict[str, Callable[[str | None], bool]] = {
+    "monto": amount_is_well_formed,
+    "numero_operacion": operation_is_well_formed,
+}
+
+
+@dataclass
+class OcrResult:
+    """Campos leídos, con su confianza y la caja donde aparecieron.
+
+    Un valor mal formado se conserva (los extractores ya lo eligieron) pero
+    con confianza 0, para que cualquier otra lectura lo reemplace.
+    """
+
+    values: Dict[str, str] = field(default_factory=dict)
+    confidence: Dict[str, float] = field(default_factory=dict)
+    boxes: Dict[str, Box] = field(default_factory=dict)
+    engine: str = ""
+    texts: List[str] = field(default_factory=list)
+    engines_tried: List[str] = field(default_factory=list)
+    # Alto y ancho de la imagen en cuyas coordenadas están ``boxes``.
+    size: Optional[Tuple[int, int]] = None
+    # Motor que leyó cada campo.
+    sources: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def amount(self) -> str | None:
+        return self.values.get("monto")
+
+    @property
+    def operation(self) -> str | None:
+        return self.values.get("numero_operacion")
+
+    @classmethod
+    def from_detections(cls, engine: str, detections: Sequence[TextDetection]) -> "OcrResult":
+        texts = [detection.text for detection in detections]
+        found = {
+            "monto": find_amount_with_source(texts),
+            "numero_operacion": find_operation_with_source(texts),
+        }
+        result = cls(engine=engine, texts=texts, engines_tried=[engine])
+        for name, hit in found.items():
+            if hit is None or not hit[0]:
+                continue
+            value, line = hit
+            result.values[name] = value
+            result.sources[name] = engine
+            # Confianza y caja de la línea de donde el extractor sacó el valor,
+            # no de otra que solo comparta los dígitos (p. ej. la hora).
+            source = detections[line]
+            well_formed = _WELL_FORMED[name](value)
+            result.confidence[name] = source.confidence if well_formed else 0.0
+            if source.box is not None:
+                result.boxes[name] = source.box
+        return result
+
+    def is_confident(self, min_confidence: float) -> bool:
+        return all(self.confidence.get(name, 0.0) >= min_confidence for name in FIELDS)
+
+    def weak_fields(self, min_confidence: float) -> List[str]:
+        """Campos leídos pero por debajo del umbral (candidatos a un recorte)."""
+
+        return [
+            name
+            for name in FIELDS
+            if name in self.values and self.confidence.get(name, 0.0) < min_confidence
+        ]
+
+    def merge(
+        self,
+        other: "OcrResult",
+        *,
+        fields: Sequence[str] = FIELDS,
+        prefer_other: bool = False,
+        engine_order: Sequence[str] | None = None,
+    ) -> None:
+        """Toma de ``other`` cada campo que leyó con confianza mayor o igual.
+
+        Con ``prefer_other`` (lectura de otro motor, cuyas confianzas no son
+        comparables) se toma el valor de ``other`` salvo que falte o esté mal
+        formado y el actual no. Con ``engine_order`` (los motores de la
+        cascada, del más barato al más preciso) sólo se comparan confianzas
+        cuando ambos valores vienen del mismo motor; si no, gana el bien
+        formado y, entre dos bien formados, el del motor más preciso.
+        """
+
+        for name in fields:
+            if name not in other.values:
+                continue
+            well_formed = _WELL_FORMED[name]
+            if prefer_other:
+                take = well_formed(other.values[name]) or not well_formed(self.values.get(name))
+            elif (
+                engine_order is not None
+                and name in self.values
+                and self.sources.get(name) != other.sources.get(name)
+            ):
+                if well_formed(other.values[name]) != well_formed(self.values[name]):
+                    take = well_formed(other.values[name])
+                else:
+                    take = _engine_rank(engine_order, other.sources.get(name)) > _engine_rank(
+                        engine_order, self.sources.get(name)
+                    )
+            else:
+                take = other.confidence.get(name, 0.0) >= self.confidence.get(name, -1.0)
+            if take:
+                self.values[name] = other.values[name]
+                self.confidence[name] = other.confidence.get(name, 0.0)
+                if name in other.sources:
+                    self.sources[name] = other.sources[name]
+                if name in other.boxes:
+                    self.boxes[name] = other.boxes[name]
+                else:
+                    self.boxes.pop(name, None)
+        self.engine = other.engine or self.engine
+        self.texts = other.texts or self.texts
+        self.engines_tried.extend(other.engines_tried)
+
+    def relative_boxes(self) -> Dict[str, Tuple[float, float, float, float]]:
+        """Cajas como fracción del ancho y alto (vacío si no se conoce ``size``)."""
+
+        if not self.size:
+            return {}
+        height, width = self.size
+        return {
+            name: (box[0] / width, box[1] / height, box[2] / width, box[3] / height)
+            for name, box in self.boxes.items()
+        }
+
+    def to_record(self) -> Dict[str, str]:
+        """Campos para el registro exportado (la confianza sólo llega al JSONL)."""
+
+        record: Dict[str, str] = {}
+        for name in FIELDS:
+            if name in self.values:
+                record[name] = self.values[name]
+                record[f"{name}_confianza"] = f"{self.confidence.get(name, 0.0):.2f}"
+        if self.engine:
+            record["ocr_motor"] = self.engine
+        return record
+
+
+def _engine_rank(engine_order: Sequence[str], engine: str | None) -> int:
+    return engine_order.index(engine) if engine in engine_order else -1
+
+
+class OcrCascade:
+    """Ejecuta los motores en orden hasta que ambos campos son confiables.
+
+    Si ningún motor logra los dos campos, cada uno se toma del último motor
+    que lo leyó bien formado: los motores van del más barato al más preciso y
+    sus confianzas (promedio por palabra de Tesseract, probabilidad de
+    EasyOCR) no están en la misma escala.
+    """
+
+    def __init__(
+        self,
+        engines: Sequence[OcrEngine],
+        *,
+        min_confidence: float = MIN_FIELD_CONFIDENCE,
+    ) -> None:
+        self.engines = list(engines)
+        self.min_confidence = min_confidence
+
+    @property
+    def engine_names(self) -> List[str]:
+        """Nombres de los motores, del más barato al más preciso."""
+
+        return [engine.name for engine in self.engines]
+
+    def extract(self, image: Any) -> OcrResult:
+        best = OcrResult()
+        usable = [engine for engine in self.engines if engine.available()]
+        for position, engine in enumerate(usable):
+            is_last = position == len(usable) - 1
+            try:
+                with timed("ocr_engine", engine=engine.name):
+                    detections = engine.read(image)
+            except Exception:
+                logger.exception("El motor %s falló al leer el comprobante", engine.name)
+                count("wa_ocr_engine_total", engine=engine.name, result="error")
+                continue
+
+            best.merge(OcrResult.from_detections(engine.name, detections), prefer_other=True)
+            accepted = best.is_confident(self.min_confidence)
+            if accepted or is_last:
+                count(
+                    "wa_ocr_engine_total",
+                    engine=engine.name,
+                    result="accepted" if accepted else "exhausted",
+                    help_text="Lecturas por motor de OCR y resultado de la cascada.",
+                )
+                return best
+            count("wa_ocr_engine_total", engine=engine.name, result="fallback")
+        return best
+
+
+def build_cascade(names: Sequence[str] = OCR_ENGINES) -> OcrCascade:
+    """Crea la cascada con los motores configurados (los desconocidos se omiten)."""
+
+    engines: List[OcrEngine] = []
+    for name in names:
+        factory = ENGINE_FACTORIES.get(name)
+        if factory is None:
+            logger.warning("Motor de OCR desconocido: %s", name)
+            continue
+        engines.append(factory())
+    return OcrCascade(engines or [EasyOcrEngine()])
+
+
+__all__ = [
+    "ENGINE_FACTORIES",
+    "FIELDS",
+    "EasyOcrEngine",
+    "OcrCascade",
+    "OcrEngine",
+    "OcrResult",
+    "TesseractEngine",
+    "TextDetection",
+    "amount_is_well_formed",
+    "build_cascade",
+    "field_confidence",
+    "field_match",
+    "lines_from_tesseract_data",
+    "operation_is_well_formed",
+]
@@ -1,15 +1,91 @@
 # ocr.py
-import cv2
-import easyocr
 import os
+import threading
+from typing import Mapping, Sequence
 
-from .amount_extractor import find_amount_from_texts
-from .op_extractor import find_operation_number_from_texts
+from telemetry import count, timed
+
+from .adaptive import OCR_ADAPTIVE, AdaptiveReader, confirm_fields
+from .engines import OcrCascade, OcrResult, build_cascade
+from .pool import active_pool
 
 # ─────────────────────────────────────────────
-#   OCR GLOBAL (se crea una sola vez)
+#   CASCADA DE MOTORES (se crea una sola vez)
+#   Tesseract primero; EasyOCR sólo si hace falta.
+#   El modelo de EasyOCR se carga recién al usarlo.
 # ─────────────────────────────────────────────
-reader = easyocr.Reader(['en', 'es'])  # Idiomas a reconocer
+_cascade: OcrCascade | None = None
+_cascade_lock = threading.Lock()
+
+
+def get_cascade() -> OcrCascade:
+    """Devuelve la cascada de OCR del proceso (``OCR_ENGINES`` en ``.env``)."""
+
+    global _cascade
+    with _cascade_lock:
+        if _cascade is None:
+            _cascade = build_cascade()
+    return _cascade
+
+
+def read_voucher_in_process(image_path: str) -> OcrResult:
+    """Lee el comprobante en este proceso con la cascada (y el modo adaptativo)."""
+
+    cascade = get_cascade()
+    with timed("ocr"):
+        if OCR_ADAPTIVE:
+            result = AdaptiveReader(cascade).read(image_path)
+        else:
+            result = cascade.extract(image_path)
+
+    count("wa_ocr_fields_total", field="monto", found=str(result.amount is not None).lower())
+    count("wa_ocr_fields_total", field="numero_operacion", found=str(result.operation is not None).lower())
+    return result
+
+
+def read_voucher(image_path: str) -> OcrResult:
+    """Lee el comprobante y devuelve el :class:`OcrResult` completo.
+
+    Incluye valores, confianza por campo y motor; ``OcrResult.to_record()``
+    da los campos listos para exportar. Si hay un pool de OCR instalado
+    (``OCR_WORKERS``), la lectura corre en uno de sus procesos.
+    """
+
+    pool = active_pool()
+    if pool is not None:
+        return pool.read(image_path)
+    return read_voucher_in_process(image_path)
+
+
+def confirm_voucher_in_process(
+    image_path: str, values: Mapping[str, str], boxes: Mapping[str, Sequence[float]]
+) -> bool:
+    """Verifica los recortes en este proceso con la cascada."""
+
+    with timed("ocr_confirm"):
+        confirmed = confirm_fields(get_cascade(), image_path, values, boxes)
+    count(
+        "wa_ocr_confirm_total",
+        result="agree" if confirmed else "disagree",
+        help_text="Verificaciones por recortes de la lectura de un comprobante parecido.",
+    )
+    return confirmed
+
+
+def confirm_voucher(
+    image_path: str, values: Mapping[str, str], boxes: Mapping[str, Sequence[float]]
+) -> bool:
+    """Comprueba con OCR sobre recortes que ``image_path`` muestra ``values``.
+
+    Es la verificación barata antes de reutilizar la lectura de un comprobante
+    casi idéntico: sólo se leen las franjas del monto y de la operación. Como
+    :func:`read_voucher`, corre en el pool de OCR si hay uno instalado.
+    """
+
+    pool = active_pool()
+    if pool is not None:
+        return pool.confirm(image_path, values, boxes)
+    return confirm_voucher_in_process(image_path, values, boxes)
 
 
 # ─────────────────────────────────────────────
@@ -26,21 +102,18 @@ def extract_voucher_data(image_path: str, debug: bool = False) -> tuple[str | No
     No imprime nada a menos que debug=True.
     """
 
-    # 1) Correr EasyOCR SOLO UNA VEZ
-    result = reader.readtext(image_path)
-    texts = [detection[1] for detection in result]
+    # 1) Correr la cascada: el motor rápido y, si no alcanza, EasyOCR
+    result = read_voucher(image_path)
 
     # Debug de textos OCR (para pruebas)
     if debug:
-        print("\nTexto extraído con EasyOCR:")
-        for t in texts:
+        print(f"\nTexto extraído con {result.engine or 'ningún motor'}:")
+        for t in result.texts:
             print(t)
 
-    # 2) Sacar monto usando tu extractor actual
-    amount = find_amount_from_texts(texts)
-
-    # 3) Sacar número de operación usando las nuevas reglas
-    op_number = find_operation_number_from_texts(texts)
+    # 2) Monto y número de operación ya vienen de tus extractores
+    amount = result.amount
+    op_number = result.operation
 
     # 👇 Esta función SOLO devuelve, no imprime
     return amount, op_number
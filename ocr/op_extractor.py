@@ -4,8 +4,19 @@
 # ─────────────────────────────────────────────
 import re
 
+from .amount_extractor import line_of_offset
+
 
 def find_operation_number_from_texts(text_list: list[str]) -> str | None:
+    """
+    Recibe la lista de textos que devuelve EasyOCR y busca el NÚMERO / CÓDIGO
+    DE OPERACIÓN (ver ``find_operation_with_source``).
+    """
+    found = find_operation_with_source(text_list)
+    return None if found is None else found[0]
+
+
+def find_operation_with_source(text_list: list[str]) -> tuple[str, int] | None:
     """
     Recibe la lista de textos que devuelve EasyOCR y busca el NÚMERO / CÓDIGO DE OPERACIÓN.
 
@@ -76,7 +87,7 @@ def find_operation_number_from_texts(text_list: list[str]) -> str | None:
             # 1.a) Mismo renglón: 'Nro. Operación 1407526'
             code_here = extract_code_from_line(text_list[idx])
             if code_here:
-                return code_here
+                return code_here, idx
 
             # 1.b) Renglones siguientes: soporta casos como:
             # Nro. Operación
@@ -108,7 +119,7 @@ def find_operation_number_from_texts(text_list: list[str]) -> str | None:
 
                 code = extract_code_from_line(candidate_line)
                 if code:
-                    return code
+                    return code, j
 
     # 2) Plan B: etiquetas dañadas tipo "Mro, deoperscion"
     #    Buscamos líneas que contengan "oper" pero no "exitosa/completa", etc.
@@ -130,7 +141,7 @@ def find_operation_number_from_texts(text_list: list[str]) -> str | None:
 
                 code = extract_code_from_line(candidate_line)
                 if code:
-                    return code
+                    return code, j
 
     # 3) Plan C: el código está entre 'Número de' y 'operación'
     #    Ejemplo:
@@ -152,7 +163,7 @@ def find_operation_number_from_texts(text_list: list[str]) -> str | None:
             if "oper" in neighbor and not any(
                 bad in neighbor for bad in ("exitosa", "exitoso", "completa", "completo")
             ):
-                return code
+                return code, idx
 
     # 4) Fallback: buscar patrones 'operación 123456' en todo el texto
     full_text = " ".join(text_list)
@@ -166,6 +177,6 @@ def find_operation_number_from_texts(text_list: list[str]) -> str | None:
         if not re.search(r"\d", code):
             continue
         if 4 <= len(code) <= 30:
-            return code
+            return code, line_of_offset(text_list, m.start(1))
 
     return None
@@ -0,0 +1,286 @@
+"""Procesos de OCR que comparten los modelos ya cargados.
+
+El proceso principal carga una sola vez los modelos de la cascada (EasyOCR,
+cuantizado en CPU) y congela el recolector de basura; luego crea los
+trabajadores con ``fork``. Los hijos heredan los pesos por copia-en-escritura,
+así que N trabajadores cuestan casi la memoria de uno. Cada hijo limita los
+hilos de torch (``OCR_THREADS_PER_WORKER``) para no competir por los núcleos.
+
+Donde no existe ``fork`` (Windows) se usa ``spawn``: cada trabajador carga sus
+propios modelos al iniciar, con el costo de memoria correspondiente. Lo mismo
+ocurre al recrear el pool tras la caída de un trabajador: para entonces el
+proceso principal ya tiene hilos (navegador, OCR local) y un ``fork`` podría
+trabarse, así que los nuevos procesos salen de ``forkserver`` (o ``spawn``).
+
+En el proceso principal no se debe correr inferencia antes de crear el pool:
+un hilo de OpenMP ya iniciado no sobrevive al ``fork`` y los hijos se traban.
+"""
+
+from __future__ import annotations
+
+import gc
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Iterator, Mapping, Sequence, Tuple, TypeVar
+
+from settings import getint
+from telemetry import METRICS, count, reset_logging_after_fork, timed
+
+from .engines import OcrResult
+
+logger = logging.getLogger(__name__)
+
+# Procesos de OCR (0 = el OCR corre en hilos del proceso principal).
+OCR_WORKERS = getint("OCR_WORKERS", 0)
+OCR_THREADS_PER_WORKER = getint("OCR_THREADS_PER_WORKER", 1)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_active: "OcrWorkerPool | None" = None
+_active_lock = threading.Lock()
+
+
+def limit_torch_threads(threads: int) -> None:
+    """Fija los hilos de torch del proceso actual (si torch está instalado)."""
+
+    try:
+        import torch
+    except ImportError:  # pragma: no cover - torch llega con easyocr
+        return
+    torch.set_num_threads(max(1, threads))
+
+
+def _preload_models() -> None:
+    from .ocr import get_cascade
+
+    for engine in get_cascade().engines:
+        preload = getattr(engine, "preload", None)
+        if preload is not None:
+            preload()
+
+
+def _worker_init(threads: int, load_models: bool) -> None:
+    global _active
+    _active = None  # el hijo heredó la referencia al pool del padre
+    # Con ``fork`` el hijo hereda también las métricas del padre: se vacían
+    # para no devolverlas duplicadas con la primera lectura.
+    METRICS.reset()
+    reset_logging_after_fork()
+    limit_torch_threads(threads)
+    if load_models:
+        _preload_models()
+
+
+def _ping() -> bool:
+    return True
+
+
+def _read_in_worker(image_path: str) -> OcrResult:
+    from .ocr import read_voucher_in_process
+
+    return read_voucher_in_process(image_path)
+
+
+def _confirm_in_worker(request: Tuple[str, Dict[str, str], Dict[str, Sequence[float]]]) -> bool:
+    from .ocr import confirm_voucher_in_process
+
+    return confirm_voucher_in_process(*request)
+
+
+def _with_metrics(func: Callable[[T], R], item: T) -> Tuple[R, Dict[str, Any]]:
+    """Ejecuta ``func`` en el hijo y devuelve su resultado con las métricas que generó."""
+
+    result = func(item)
+    return result, METRICS.drain()
+
+
+def _start_method(preferred: str | None) -> str:
+    methods = multiprocessing.get_all_start_methods()
+    if preferred in methods:
+        return preferred
+    return "fork" if "fork" in methods else "spawn"
+
+
+def _restart_method() -> str:
+    """Método para recrear el pool: nunca ``fork`` desde un padre que ya tiene hilos."""
+
+    return "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+class OcrWorkerPool:
+    """Pool de procesos para el OCR con modelos precargados en el padre."""
+
+    def __init__(
+        self,
+        workers: int = OCR_WORKERS,
+        *,
+        threads_per_worker: int = OCR_THREADS_PER_WORKER,
+        preload: bool = True,
+        start_method: str | None = None,
+    ) -> None:
+        self.workers = max(1, workers)
+        self.threads_per_worker = threads_per_worker
+        self.preload = preload
+        self.start_method = _start_method(start_method)
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def shares_models(self) -> bool:
+        return self.start_method == "fork"
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(self.start_method),
+            initializer=_worker_init,
+            initargs=(self.threads_per_worker, self.preload and not self.shares_models),
+        )
+
+    def start(self) -> "OcrWorkerPool":
+        if self._executor is not None:
+            return self
+        if self.preload and self.shares_models:
+            _preload_models()
+            # Los objetos ya creados pasan a la generación permanente: el GC de
+            # los hijos no los recorre ni ensucia sus páginas compartidas.
+            gc.freeze()
+        elif not self.shares_models:
+            logger.warning(
+                "Sin fork disponible: cada uno de los %s procesos de OCR cargará sus modelos",
+                self.workers,
+            )
+        self._executor = self._create_executor()
+        # Con ``fork`` todos los hijos nacen en el primer envío: se fuerza ahora,
+        # antes de que el proceso principal abra más hilos.
+        self._executor.submit(_ping).result()
+        logger.info(
+            "Pool de OCR iniciado (%s procesos, %s hilos de torch c/u, %s)",
+            self.workers,
+            self.threads_per_worker,
+            self.start_method,
+        )
+        return self
+
+    def _require_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self.start()
+            assert self._executor is not None
+            return self._executor
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        """Recrea el pool caído; si otro hilo ya lo hizo, no hace nada.
+
+        Los nuevos procesos no se crean con ``fork`` (ver el docstring del
+        módulo) y cargan sus propios modelos.
+        """
+
+        with self._lock:
+            if self._executor is not broken:
+                return
+            broken.shutdown(wait=False, cancel_futures=True)
+            if self.shares_models:
+                self.start_method = _restart_method()
+                logger.warning(
+                    "El pool de OCR se recrea con %s: cada uno de los %s procesos cargará sus modelos",
+                    self.start_method,
+                    self.workers,
+                )
+            self._executor = self._create_executor()
+        count("wa_ocr_pool_restarts_total", help_text="Reinicios del pool de OCR tras la caída de un proceso.")
+
+    def _run(self, func: Callable[[T], R], item: T) -> R:
+        """Ejecuta ``func(item)`` en un proceso del pool y suma sus métricas.
+
+        Si un trabajador muere (por ejemplo, falta de memoria) el pool se
+        recrea y la llamada se reintenta una vez. Se mide la espera total
+        (``ocr_pool``).
+        """
+
+        executor = self._require_executor()
+        try:
+            with timed("ocr_pool"):
+                result, metrics = executor.submit(_with_metrics, func, item).result()
+        except BrokenProcessPool:
+            logger.error("Un proceso de OCR terminó inesperadamente; se recrea el pool")
+            self._restart(executor)
+            result, metrics = self._require_executor().submit(_with_metrics, func, item).result()
+        METRICS.absorb(metrics)
+        return result
+
+    def read(self, image_path: str) -> OcrResult:
+        """Lee un comprobante en un proceso del pool (bloquea hasta el resultado).
+
+        Las métricas del OCR (motor, escalón, campos) vuelven con el
+        resultado y se suman aquí.
+        """
+
+        return self._run(_read_in_worker, image_path)
+
+    def confirm(
+        self, image_path: str, values: Mapping[str, str], boxes: Mapping[str, Sequence[float]]
+    ) -> bool:
+        """Verificación por recortes (:func:`ocr.ocr.confirm_voucher`) en un proceso del pool."""
+
+        return self._run(_confirm_in_worker, (image_path, dict(values), dict(boxes)))
+
+    def map(self, func: Callable[[T], R], items: Iterable[T], *, chunksize: int = 1) -> Iterator[R]:
+        """``executor.map`` sobre el pool; los resultados llegan en orden."""
+
+        outcomes = self._require_executor().map(partial(_with_metrics, func), items, chunksize=chunksize)
+        for result, metrics in outcomes:
+            METRICS.absorb(metrics)
+            yield result
+
+    def close(self) -> None:
+        global _active
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        with _active_lock:
+            if _active is self:
+                _active = None
+
+    def __enter__(self) -> "OcrWorkerPool":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def active_pool() -> OcrWorkerPool | None:
+    """Pool instalado con :func:`start_ocr_pool` (``None`` si el OCR es local)."""
+
+    return _active
+
+
+def start_ocr_pool(workers: int = OCR_WORKERS, **options: Any) -> OcrWorkerPool | None:
+    """Crea e instala el pool de OCR del proceso; ``workers <= 0`` lo deshabilita.
+
+    Mientras esté instalado, :func:`ocr.ocr.read_voucher` envía cada lectura
+    a un trabajador en lugar de correrla en el hilo que la pidió.
+    """
+
+    global _active
+    if workers <= 0:
+        return None
+    with _active_lock:
+        if _active is None:
+            _active = OcrWorkerPool(workers, **options).start()
+        return _active
+
+
+__all__ = [
+    "OCR_THREADS_PER_WORKER",
+    "OCR_WORKERS",
+    "OcrWorkerPool",
+    "active_pool",
+    "limit_torch_threads",
+    "start_ocr_pool",
+]
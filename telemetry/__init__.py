@@ -0,0 +1,39 @@
+"""Métricas de rendimiento y registro del pipeline de captura."""
+
+from .logs import (
+    DiscardSampler,
+    StructuredFormatter,
+    reset_logging_after_fork,
+    setup_logging,
+    shutdown_logging,
+)
+from .metrics import (
+    METRICS,
+    MetricsRegistry,
+    count,
+    gauge,
+    maybe_write_metrics_file,
+    observe,
+    render_prometheus,
+    start_http_exporter,
+    timed,
+    write_metrics_file,
+)
+
+__all__ = [
+    "DiscardSampler",
+    "METRICS",
+    "MetricsRegistry",
+    "count",
+    "gauge",
+    "maybe_write_metrics_file",
+    "observe",
+    "render_prometheus",
+    "reset_logging_after_fork",
+    "setup_logging",
+    "shutdown_logging",
+    "start_http_exporter",
+    "StructuredFormatter",
+    "timed",
+    "write_metrics_file",
+]
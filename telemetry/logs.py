@@ -0,0 +1,175 @@
+"""Registro no bloqueante con rotación, muestreo de descartes y campos estructurados.
+
+Los módulos sólo encolan registros (``QueueHandler``); un hilo dedicado
+(``QueueListener``) los formatea y los escribe en consola y en un archivo
+rotativo, de modo que el loop de asyncio nunca espera al disco.
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Tuple
+
+from settings import getint
+
+LOG_MAX_BYTES = getint("WA_LOG_MAX_BYTES", 5 * 1024 * 1024)
+LOG_BACKUP_COUNT = getint("WA_LOG_BACKUP_COUNT", 5)
+LOG_SAMPLE_SECONDS = float(getint("WA_LOG_SAMPLE_SECONDS", 300))
+# Sólo los registros de la captura van al archivo; el resto queda en consola.
+FILE_LOGGER_PREFIX = "app.whatsapp_processing"
+STRUCTURED_FIELDS: Tuple[str, ...] = ("chat", "data_id", "stage", "reason", "duration_ms")
+
+_lock = threading.Lock()
+_listener: QueueListener | None = None
+_queue_handler: QueueHandler | None = None
+
+
+class StructuredFormatter(logging.Formatter):
+    """Agrega al final de la línea los campos estructurados presentes.
+
+    ``logger.info("...", extra={"data_id": ..., "stage": ...})`` produce
+    ``... | data_id=... stage=...``, fácil de filtrar con ``grep`` o de
+    separar con un parser ``key=value``.
+    """
+
+    def __init__(self, fmt: str = "%(asctime)s [%(levelname)s] %(message)s") -> None:
+        super().__init__(fmt)
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        pairs = []
+        for name in STRUCTURED_FIELDS:
+            value = getattr(record, name, None)
+            if value is None or value == "":
+                continue
+            text = f"{value:.1f}" if isinstance(value, float) else str(value)
+            if any(ch.isspace() for ch in text) or '"' in text:
+                text = '"' + text.replace('"', '\\"') + '"'
+            pairs.append(f"{name}={text}")
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            pairs.append(f"suppressed={suppressed}")
+        return f"{line} | {' '.join(pairs)}" if pairs else line
+
+
+class DiscardSampler(logging.Filter):
+    """Deja pasar un mensaje repetido por ``data_id`` y etapa cada ``interval`` s.
+
+    Sólo afecta a registros con ``data_id``; el primero siempre se emite y los
+    siguientes dentro de la ventana se cuentan y se informan (``suppressed``)
+    en la próxima línea que pase. El registro de claves es LRU y acotado.
+    """
+
+    def __init__(self, interval: float = LOG_SAMPLE_SECONDS, max_keys: int = 10_000) -> None:
+        super().__init__()
+        self.interval = interval
+        self.max_keys = max_keys
+        self._seen: "OrderedDict[Tuple[str, str], Tuple[float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        data_id = getattr(record, "data_id", None)
+        if not data_id or record.levelno > logging.INFO:
+            return True
+        key = (str(data_id), str(getattr(record, "stage", "") or record.getMessage()))
+        now = time.monotonic()
+        with self._lock:
+            last, suppressed = self._seen.pop(key, (None, 0))
+            if last is not None and now - last < self.interval:
+                self._seen[key] = (last, suppressed + 1)
+                return False
+            self._seen[key] = (now, 0)
+            while len(self._seen) > self.max_keys:
+                self._seen.popitem(last=False)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+def setup_logging(
+    log_file: str | Path,
+    *,
+    level: int = logging.INFO,
+    max_bytes: int = LOG_MAX_BYTES,
+    backup_count: int = LOG_BACKUP_COUNT,
+    sample_seconds: float = LOG_SAMPLE_SECONDS,
+) -> QueueListener:
+    """Instala el registro en cola en el logger raíz (idempotente)."""
+
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is not None:
+            return _listener
+
+        formatter = StructuredFormatter()
+        console = logging.StreamHandler()
+        console.setFormatter(formatter)
+
+        path = Path(log_file)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        rotating = RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        rotating.setFormatter(formatter)
+        rotating.addFilter(logging.Filter(FILE_LOGGER_PREFIX))
+
+        records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        queue_handler = QueueHandler(records)
+        queue_handler.addFilter(DiscardSampler(sample_seconds))
+
+        root = logging.getLogger()
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+        _queue_handler = queue_handler
+
+        _listener = QueueListener(records, console, rotating, respect_handler_level=True)
+        _listener.start()
+        return _listener
+
+
+def shutdown_logging() -> None:
+    """Vacía la cola y detiene el hilo de escritura."""
+
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is None:
+            return
+        if _queue_handler is not None:
+            logging.getLogger().removeHandler(_queue_handler)
+            _queue_handler = None
+        _listener.stop()
+        _listener = None
+
+
+def reset_logging_after_fork() -> None:
+    """En un proceso hijo creado con ``fork``, escribe directo a la consola.
+
+    El hijo hereda el ``QueueHandler`` pero no el hilo que vacía la cola, así
+    que sus registros quedarían encolados para siempre.
+    """
+
+    global _listener, _queue_handler
+    root = logging.getLogger()
+    if _queue_handler is not None:
+        root.removeHandler(_queue_handler)
+    _queue_handler = None
+    _listener = None
+    if not root.handlers:
+        console = logging.StreamHandler()
+        console.setFormatter(StructuredFormatter())
+        root.addHandler(console)
+
+
+__all__ = [
+    "DiscardSampler",
+    "StructuredFormatter",
+    "reset_logging_after_fork",
+    "setup_logging",
+    "shutdown_logging",
+]
@@ -0,0 +1,309 @@
+"""Histogramas de latencia y contadores exportables en formato Prometheus."""
+
+from __future__ import annotations
+
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+from settings import getenv, getint
+
+logger = logging.getLogger(__name__)
+
+LATENCY_METRIC = "wa_stage_latency_seconds"
+LATENCY_HELP = "Latencia por etapa del pipeline de captura."
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+METRICS_FILE = getenv("METRICS_FILE", "outputs/metrics.prom").strip()
+METRICS_PORT = getint("METRICS_PORT", 0)
+METRICS_FILE_INTERVAL_SECONDS = 15.0
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Tuple[str, str] | None = None) -> str:
+    pairs = list(key)
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return "{" + body + "}"
+
+
+class _Histogram:
+    """Histograma acumulativo con cubetas fijas."""
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.samples = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.samples += 1
+
+
+class MetricsRegistry:
+    """Registro en memoria seguro entre hilos (el OCR corre fuera del loop)."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._help: Dict[str, str] = {}
+
+    def observe(self, stage: str, seconds: float, **labels: str) -> None:
+        """Registra la duración de una etapa en ``wa_stage_latency_seconds``."""
+
+        key = _label_key({"stage": stage, **labels})
+        with self._lock:
+            series = self._histograms.setdefault(LATENCY_METRIC, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(self._buckets)
+            histogram.observe(max(seconds, 0.0))
+
+    def count(self, name: str, amount: float = 1, *, help_text: str = "", **labels: str) -> None:
+        """Incrementa el contador ``name`` para la combinación de etiquetas dada."""
+
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+            if help_text:
+                self._help.setdefault(name, help_text)
+
+    def gauge(self, name: str, value: float, *, help_text: str = "", **labels: str) -> None:
+        """Fija el valor actual del indicador ``name`` (memoria, nodos del DOM...)."""
+
+        key = _label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+            if help_text:
+                self._help.setdefault(name, help_text)
+
+    def gauge_value(self, name: str, **labels: str) -> float | None:
+        with self._lock:
+            return self._gauges.get(name, {}).get(_label_key(labels))
+
+    def counter_value(self, name: str, **labels: str) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0)
+
+    def histogram_samples(self, stage: str) -> int:
+        key = _label_key({"stage": stage})
+        with self._lock:
+            histogram = self._histograms.get(LATENCY_METRIC, {}).get(key)
+            return 0 if histogram is None else histogram.samples
+
+    def drain(self) -> Dict[str, Any]:
+        """Retira contadores e histogramas acumulados para enviarlos a otro proceso.
+
+        Los trabajadores de OCR devuelven esto junto con cada lectura y el
+        proceso principal lo suma con :meth:`absorb`; sin eso sus métricas
+        quedarían en el registro del hijo, que nadie exporta.
+        """
+
+        with self._lock:
+            payload = {
+                "counters": self._counters,
+                "histograms": {
+                    name: {key: (h.counts, h.total, h.samples) for key, h in series.items()}
+                    for name, series in self._histograms.items()
+                },
+                "help": dict(self._help),
+            }
+            self._counters = {}
+            self._histograms = {}
+        return payload
+
+    def absorb(self, payload: Dict[str, Any]) -> None:
+        """Suma lo retirado con :meth:`drain` en otro proceso."""
+
+        with self._lock:
+            for name, series in payload.get("counters", {}).items():
+                target = self._counters.setdefault(name, {})
+                for key, amount in series.items():
+                    target[key] = target.get(key, 0) + amount
+            for name, series in payload.get("histograms", {}).items():
+                target_series = self._histograms.setdefault(name, {})
+                for key, (counts, total, samples) in series.items():
+                    histogram = target_series.get(key)
+                    if histogram is None:
+                        histogram = target_series[key] = _Histogram(self._buckets)
+                    histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                    histogram.total += total
+                    histogram.samples += samples
+            for name, text in payload.get("help", {}).items():
+                self._help.setdefault(name, text)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    def render(self) -> str:
+        """Serializa el registro con el formato de texto de Prometheus."""
+
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {LATENCY_HELP}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                        cumulative += bucket_count
+                        labels = _format_labels(key, ("le", repr(bound)))
+                        lines.append(f"{name}_bucket{labels} {cumulative}")
+                    labels = _format_labels(key, ("le", "+Inf"))
+                    lines.append(f"{name}_bucket{labels} {histogram.samples}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.total:.6f}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.samples}")
+            for name, series in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self._gauges.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} gauge")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+_last_file_write = 0.0
+
+
+def observe(stage: str, seconds: float, **labels: str) -> None:
+    METRICS.observe(stage, seconds, **labels)
+
+
+def count(name: str, amount: float = 1, *, help_text: str = "", **labels: str) -> None:
+    METRICS.count(name, amount, help_text=help_text, **labels)
+
+
+def gauge(name: str, value: float, *, help_text: str = "", **labels: str) -> None:
+    METRICS.gauge(name, value, help_text=help_text, **labels)
+
+
+@contextmanager
+def timed(stage: str, **labels: str) -> Iterator[None]:
+    """Mide el bloque (síncrono o con ``await`` dentro) y lo registra."""
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        METRICS.observe(stage, time.perf_counter() - started, **labels)
+
+
+def render_prometheus() -> str:
+    return METRICS.render()
+
+
+def write_metrics_file(path: str | Path | None = None) -> Path | None:
+    """Escribe el volcado de métricas de forma atómica (``.tmp`` + rename)."""
+
+    selected = path or METRICS_FILE
+    if not selected:
+        return None
+    target = Path(selected)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    temporary = target.with_suffix(target.suffix + ".tmp")
+    temporary.write_text(render_prometheus(), encoding="utf-8")
+    temporary.replace(target)
+    return target
+
+
+def maybe_write_metrics_file(interval: float = METRICS_FILE_INTERVAL_SECONDS) -> None:
+    """Vuelca las métricas a disco como máximo una vez cada ``interval`` segundos."""
+
+    global _last_file_write
+    now = time.monotonic()
+    if not METRICS_FILE or now - _last_file_write < interval:
+        return
+    _last_file_write = now
+    try:
+        write_metrics_file()
+    except OSError as exc:  # pragma: no cover - depende del sistema de archivos
+        logger.warning("No se pudo escribir el archivo de métricas: %s", exc)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802 - API de http.server
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        return
+
+
+def start_http_exporter(port: int | None = None, host: str = "127.0.0.1") -> ThreadingHTTPServer | None:
+    """Publica ``/metrics`` en un hilo de fondo. ``port=0`` lo deshabilita."""
+
+    selected = METRICS_PORT if port is None else port
+    if not selected:
+        return None
+    server = ThreadingHTTPServer((host, selected), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True)
+    thread.start()
+    logger.info("Métricas disponibles en http://%s:%d/metrics", host, selected)
+    return server
+
+
+__all__ = [
+    "METRICS",
+    "MetricsRegistry",
+    "count",
+    "gauge",
+    "maybe_write_metrics_file",
+    "observe",
+    "render_prometheus",
+    "start_http_exporter",
+    "timed",
+    "write_metrics_file",
+]
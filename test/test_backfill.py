@@ -0,0 +1,198 @@
+import asyncio
+import re
+
+from app.whatsapp_processing import backfill, loop, processing
+from app.whatsapp_processing.backfill import Backfill, backfill_step
+from app.whatsapp_processing.chats import ChatTarget
+
+
+class DummyElement:
+    def __init__(self, identifier):
+        self.identifier = identifier
+
+    async def get_attribute(self, name):
+        return self.identifier if name == "data-id" else ""
+
+    async def scroll_into_view_if_needed(self, timeout=None):
+        return
+
+
+class DummyChat:
+    """Historial del que sólo los últimos mensajes están cargados en el DOM."""
+
+    def __init__(self, total, loaded, chunk):
+        self.history = [f"msg-{index}" for index in range(total)]
+        self.first = total - loaded
+        self.chunk = chunk
+
+    def rows(self):
+        return DummyRows([DummyElement(data_id) for data_id in self.history[self.first :]])
+
+    async def load_older(self, page):
+        self.first = max(0, self.first - self.chunk)
+        return self.history[self.first]
+
+
+class DummyRows:
+    def __init__(self, elements):
+        self._elements = elements
+
+    async def count(self):
+        return len(self._elements)
+
+    def nth(self, index):
+        return self._elements[index]
+
+
+class DummyLocator:
+    def __init__(self, found):
+        self._found = found
+
+    async def count(self):
+        return int(self._found)
+
+
+class DummyKeyboard:
+    async def press(self, key):
+        return
+
+
+class DummyContainer:
+    async def wait_for(self, state=None):
+        return
+
+    async def focus(self):
+        return
+
+
+class DummyPage:
+    def __init__(self, chat):
+        self.chat = chat
+        self.keyboard = DummyKeyboard()
+
+    def locator(self, selector):
+        match = re.search(r'data-id="([^"]+)"', selector)
+        loaded = self.chat.history[self.chat.first :]
+        return DummyLocator(bool(match) and match.group(1) in loaded)
+
+    async def wait_for_timeout(self, value):
+        return
+
+
+def _patch_chat(monkeypatch, chat, exported):
+    async def processor(page, element, expected_id=""):
+        return {"data_id": element.identifier, "timestamp": "ts", "raw_text": element.identifier}
+
+    monkeypatch.setattr(backfill, "load_older_messages", chat.load_older)
+    monkeypatch.setattr(processing, "message_rows", lambda page: chat.rows())
+    monkeypatch.setattr(processing, "message_row_by_id", lambda page, data_id: DummyElement(data_id))
+    monkeypatch.setattr(processing, "process_message_strict", processor)
+    monkeypatch.setattr(processing, "append_csv", lambda payload, *path: exported.append(payload["data_id"]))
+    monkeypatch.setattr(processing, "append_jsonl", lambda payload, *path: None)
+    monkeypatch.setattr(processing, "export_to_sheets", lambda payload: None)
+
+
+def test_backfill_walks_up_to_the_previous_checkpoint(monkeypatch):
+    chat = DummyChat(total=30, loaded=10, chunk=5)
+    exported = []
+    _patch_chat(monkeypatch, chat, exported)
+    # La escucha ya registró los mensajes cargados; msg-9 fue el último de la sesión anterior.
+    processed_ids = {f"msg-{index}" for index in range(20, 30)}
+    state = Backfill(stop_id="msg-9")
+    page = DummyPage(chat)
+
+    steps = []
+    while not state.done:
+        steps.append(asyncio.run(backfill_step(page, state, processed_ids, max_new=4, verbose_print=False)))
+
+    assert steps == [4, 4, 2]
+    assert sorted(exported, key=lambda data_id: int(data_id.split("-")[1])) == [
+        f"msg-{index}" for index in range(10, 20)
+    ]
+    assert state.captured == 10
+
+
+def test_live_passes_leave_pending_history_to_the_backfill(monkeypatch, tmp_path):
+    chat = DummyChat(total=30, loaded=10, chunk=5)
+    exported = []
+    _patch_chat(monkeypatch, chat, exported)
+
+    async def at_bottom(page, last_id):
+        return False
+
+    monkeypatch.setattr(loop, "get_messages_container", lambda page: DummyContainer())
+    monkeypatch.setattr(loop, "_needs_scroll_to_bottom", at_bottom)
+    target = ChatTarget(
+        name="Chat",
+        csv_path=tmp_path / "comprobantes.csv",
+        jsonl_path=tmp_path / "comprobantes.jsonl",
+        cache_path=tmp_path / "wa_cache.json",
+    )
+    cursor = loop.CaptureCursor(
+        processed_ids={f"msg-{index}" for index in range(20, 30)},
+        last_id="msg-29",
+        last_signature="",
+        target=target,
+        backfill=Backfill(stop_id="msg-9"),
+    )
+    page = DummyPage(chat)
+
+    async def interleave():
+        while cursor.backfilling:
+            await backfill_step(page, cursor.backfill, cursor.processed_ids, max_new=4, verbose_print=False)
+            await loop.capture_pass(page, cursor, verbose_print=False)
+
+    asyncio.run(interleave())
+
+    assert sorted(exported, key=lambda data_id: int(data_id.split("-")[1])) == [
+        f"msg-{index}" for index in range(10, 20)
+    ]
+    assert cursor.backfill.captured == 10
+
+
+def test_backfill_without_checkpoint_stops_at_the_top(monkeypatch):
+    chat = DummyChat(total=8, loaded=4, chunk=4)
+    exported = []
+    _patch_chat(monkeypatch, chat, exported)
+    state = Backfill(stop_id="")
+    processed_ids = set()
+
+    while not state.done:
+        asyncio.run(backfill_step(DummyPage(chat), state, processed_ids, max_new=10, verbose_print=False))
+
+    assert sorted(exported) == sorted(chat.history)
+    assert state.steps == 1 + backfill.TOP_SCROLL_STABLE_ROUNDS
+
+
+def test_live_capture_schedules_and_persists_backfill(monkeypatch, tmp_path):
+    chat = DummyChat(total=30, loaded=10, chunk=5)
+    target = ChatTarget(
+        name="Chat",
+        csv_path=tmp_path / "comprobantes.csv",
+        jsonl_path=tmp_path / "comprobantes.jsonl",
+        cache_path=tmp_path / "wa_cache.json",
+    )
+    cursor = loop.CaptureCursor(processed_ids=set(), last_id="msg-3", last_signature="", target=target)
+    swept = []
+
+    async def fake_process(page, processed_ids, last_id, last_signature, **kwargs):
+        swept.append(last_id)
+        return 10, "msg-29", "sig"
+
+    async def fake_announce(page, last_id, previous_cached_id=""):
+        return
+
+    monkeypatch.setattr(loop, "get_messages_container", lambda page: DummyContainer())
+    monkeypatch.setattr(loop, "_announce_last_id_context", fake_announce)
+    monkeypatch.setattr(loop, "process_visible_top_to_bottom", fake_process)
+
+    asyncio.run(loop.start_live_capture(DummyPage(chat), cursor, verbose_print=False))
+
+    assert swept == ["msg-3"]
+    assert cursor.last_id == "msg-29"
+    assert cursor.backfilling and cursor.backfill.stop_id == "msg-3"
+    assert Backfill.load(tmp_path / "wa_cache.backfill.json").stop_id == "msg-3"
+
+    cursor.backfill.done = True
+    cursor.save()
+    assert not (tmp_path / "wa_cache.backfill.json").exists()
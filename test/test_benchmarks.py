@@ -0,0 +1,23 @@
+from benchmarks.bench_capture import run_capture_benchmark
+from benchmarks.bench_extractors import run_extractor_benchmark
+from benchmarks.fake_page import synthetic_messages
+
+
+def test_capture_benchmark_reports_round_trips():
+    messages = synthetic_messages(30, voucher_ratio=0.5, text_only_ratio=0.0)
+
+    result = run_capture_benchmark(messages, passes=2, blob_wait_ms=0)
+
+    assert result["messages"] == 30
+    assert result["captured"] == sum(1 for message in messages if message.blob_src)
+    assert result["round_trips_per_message"] > 0
+
+
+def test_extractor_benchmark_reports_timings_only():
+    records = [{"raw_text": "Nombre de cliente: Ana", "monto": "25", "numero_operacion": "12345678"}]
+
+    result = run_extractor_benchmark(records, repeat=2)
+
+    assert result["find_amount_from_texts"]["calls"] == 2
+    assert result["find_operation_number_from_texts"]["calls"] == 2
+    assert "agreement" not in result["find_amount_from_texts"]
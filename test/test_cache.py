@@ -44,4 +44,53 @@ def test_load_cache_prefers_large_csv(tmp_path):
     assert len(state.processed_ids) >= 1000
     assert state.last_id == "id_999"
     assert state.previous_id == ""
-    assert state.last_signature == ""
\ No newline at end of file
+    assert state.last_signature == ""
+
+def test_processed_id_index_membership_and_incremental_save(tmp_path):
+    from app.whatsapp_processing.cache import ProcessedIdIndex, index_path_for
+
+    cache_file = tmp_path / "cache.json"
+    prefix = "false_120363418492763014@g.us_"
+    index = ProcessedIdIndex(f"{prefix}{value:020X}_130069209026668@lid" for value in range(5000))
+
+    assert f"{prefix}{42:020X}_130069209026668@lid" in index
+    assert f"{prefix}{9999:020X}_130069209026668@lid" not in index
+    assert len(index) == 5000
+
+    save_cache(index, "last", "sig", cache_path=str(cache_file))
+    first_size = index_path_for(cache_file).stat().st_size
+
+    index.add("nuevo")
+    save_cache(index, "nuevo", "sig", cache_path=str(cache_file))
+
+    assert index_path_for(cache_file).stat().st_size == first_size + 8
+    payload = json.loads(cache_file.read_text(encoding="utf-8"))
+    assert payload["last_id"] == "nuevo"
+
+    state = load_cache(
+        cache_path=str(cache_file),
+        csv_path=str(tmp_path / "missing.csv"),
+        jsonl_path=str(tmp_path / "missing.jsonl"),
+        use_cache_file=True,
+    )
+    assert len(state.processed_ids) == 5002
+    assert f"{prefix}{7:020X}_130069209026668@lid" in state.processed_ids
+
+
+def test_processed_id_index_bulk_update_after_saving(tmp_path):
+    from app.whatsapp_processing.cache import ProcessedIdIndex
+
+    path = tmp_path / "ids.bin"
+    index = ProcessedIdIndex(f"msg-{value}" for value in range(3000))
+    index.save(path)
+    for value in range(2990, 3010):
+        index.add(f"msg-{value}")
+
+    index.update(f"msg-{value}" for value in range(2000, 12000))
+
+    assert len(index) == 12000
+    assert index.pending == 9000
+    assert all(f"msg-{value}" in index for value in (0, 3005, 11999))
+    assert list(index) == sorted(index)
+    index.save(path)
+    assert path.stat().st_size == 12000 * 8
@@ -0,0 +1,242 @@
+import csv
+import json
+import sqlite3
+import zipfile
+from pathlib import Path
+
+from app import chat_import
+from app.whatsapp_processing.cache import load_cache
+from app.whatsapp_processing.chat_export import normalize_timestamp, parse_export_lines
+from app.whatsapp_processing.chats import ChatTarget
+from app.whatsapp_processing.csv_export import append_csv, init_csv
+from app.whatsapp_processing.jsonl_export import append_jsonl
+from app.whatsapp_processing.partitions import existing_months, read_partitions, write_partitions
+from ocr.engines import OcrResult
+
+FORM = (
+    "Nombre de cliente: Aldo Rojas\n"
+    "N° de cel: +51929919731\n"
+    "Producto y cantidad: 1 PACK AMOR PROPIO\n"
+    "Balance: INGRESO\n"
+    "Servicio: PAGO A TIENDA\n"
+    "Método de pago: BCP\n"
+    "Cuenta: JOSEGERARDO\n"
+    "Detalle: LIMA ANTICIPO"
+)
+
+ANDROID_TRANSCRIPT = "\n".join(
+    [
+        "7/12/25, 11:20 p. m. - Los mensajes y las llamadas están cifrados de extremo a extremo.",
+        "7/12/25, 11:28 p. m. - Nicole Palomino: IMG-20251207-WA0012.jpg (archivo adjunto)",
+        *FORM.splitlines(),
+        "7/12/25, 11:30 p. m. - Nicole Palomino: hola",
+        "8/12/25, 9:05 a. m. - Nicole Palomino: <Multimedia omitido>",
+    ]
+)
+
+
+def _target(tmp_path):
+    return ChatTarget(
+        name="Comprobantes",
+        csv_path=tmp_path / "out" / "comprobantes.csv",
+        jsonl_path=tmp_path / "out" / "comprobantes.jsonl",
+        cache_path=tmp_path / "out" / "wa_cache.json",
+    )
+
+
+def _write_export(tmp_path):
+    path = tmp_path / "export.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("Chat de WhatsApp con Comprobantes.txt", ANDROID_TRANSCRIPT)
+        archive.writestr("IMG-20251207-WA0012.jpg", b"fake-jpeg")
+    return path
+
+
+def test_normalize_timestamp_matches_dom_format():
+    assert normalize_timestamp("7/12/25", "23:28") == "11:28 p.\u00a0m., 7/12/2025"
+    assert normalize_timestamp("8/12/2025", "9:05 a. m.") == "9:05 a.\u00a0m., 8/12/2025"
+    assert normalize_timestamp("12/7/25", "12:01:09 AM", day_first=False) == "12:01 a.\u00a0m., 7/12/2025"
+
+
+def test_parse_android_and_ios_transcripts():
+    android = parse_export_lines(ANDROID_TRANSCRIPT.splitlines())
+
+    assert [message.sender for message in android] == ["Nicole Palomino"] * 3
+    assert android[0].attachment == "IMG-20251207-WA0012.jpg"
+    assert android[0].text == FORM
+    assert android[2].media_omitted
+
+    ios = parse_export_lines(
+        [
+            "[7/12/25, 11:28:05 p. m.] Nicole: \u200e<adjunto: 00000012-PHOTO-2025-12-07.jpg>",
+            "[7/12/25, 11:28:06 p. m.] Nicole: Nombre de cliente: Aldo",
+            "Balance: INGRESO",
+        ]
+    )
+
+    assert len(ios) == 1
+    assert ios[0].attachment == "00000012-PHOTO-2025-12-07.jpg"
+    assert ios[0].text == "Nombre de cliente: Aldo\nBalance: INGRESO"
+
+
+def test_import_exports_vouchers_and_skips_duplicates(tmp_path, monkeypatch):
+    ocr_calls = []
+
+    def fake_ocr(image_path):
+        ocr_calls.append(image_path)
+        return OcrResult(values={"monto": "150.00", "numero_operacion": "12345678"})
+
+    monkeypatch.setattr("ocr.ocr.read_voucher", fake_ocr)
+    monkeypatch.setattr(chat_import, "IMG_DIR", tmp_path / "images")
+    target = _target(tmp_path)
+    export = _write_export(tmp_path)
+
+    summary = chat_import.import_chat_export(export, target=target, workers=1, sheets=False)
+
+    assert summary.imported == 1
+    assert summary.rejected == {"no_blob_image": 1, "no_text": 1}
+    records = [json.loads(line) for line in target.jsonl_path.read_text(encoding="utf-8").splitlines()]
+    assert records[0]["timestamp"] == "11:28 p.\u00a0m., 7/12/2025"
+    assert records[0]["monto"] == "150.00"
+    assert records[0]["Nombre de cliente"] == "Aldo Rojas"
+    image = Path(records[0]["img_file"])
+    assert image.parent.parent.parent == tmp_path / "images"
+    assert image.read_bytes() == b"fake-jpeg"
+
+    again = chat_import.import_chat_export(export, target=target, workers=1, sheets=False)
+
+    assert again.imported == 0
+    assert again.duplicates == 1
+    assert len(ocr_calls) == 1
+    with open(target.csv_path, newline="", encoding="utf-8") as handle:
+        assert len(list(csv.reader(handle))) == 2
+
+
+def test_attachments_are_read_from_a_single_open_zip(tmp_path, monkeypatch):
+    monkeypatch.setattr("ocr.ocr.read_voucher", lambda image_path: OcrResult(values={"monto": "15"}))
+    monkeypatch.setattr(chat_import, "IMG_DIR", tmp_path / "images")
+    lines = []
+    path = tmp_path / "export.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        for minute in range(3):
+            name = f"IMG-20251207-WA00{minute}.jpg"
+            lines += [f"7/12/25, 11:2{minute} p. m. - Nicole Palomino: {name} (archivo adjunto)", *FORM.splitlines()]
+            archive.writestr(name, f"fake-jpeg-{minute}".encode())
+        archive.writestr("Chat de WhatsApp con Comprobantes.txt", "\n".join(lines))
+    opened = []
+    real_zipfile = zipfile.ZipFile
+
+    def counting_zipfile(*args, **kwargs):
+        opened.append(args[0])
+        return real_zipfile(*args, **kwargs)
+
+    monkeypatch.setattr(zipfile, "ZipFile", counting_zipfile)
+
+    summary = chat_import.import_chat_export(path, target=_target(tmp_path), workers=1, sheets=False)
+
+    assert summary.imported == 3
+    # Transcripción, lista de miembros y una sola apertura para los tres adjuntos.
+    assert len(opened) == 3
+
+
+def test_import_skips_messages_captured_from_the_browser(tmp_path, monkeypatch):
+    monkeypatch.setattr("ocr.ocr.read_voucher", lambda image_path: OcrResult())
+    monkeypatch.setattr(chat_import, "IMG_DIR", tmp_path / "images")
+    target = _target(tmp_path)
+    target.jsonl_path.parent.mkdir(parents=True)
+    captured = {
+        "data_id": "false_123@g.us_ABC",
+        "timestamp": "11:28 p.\u00a0m., 7/12/2025",
+        "sender": "Nicole Palomino",
+        "raw_text": FORM.replace("\n", "\n\n  "),
+    }
+    target.jsonl_path.write_text(json.dumps(captured) + "\n", encoding="utf-8")
+
+    summary = chat_import.import_chat_export(_write_export(tmp_path), target=target, workers=1, sheets=False)
+
+    assert summary.imported == 0
+    assert summary.duplicates == 1
+
+
+def test_imported_rows_do_not_move_the_live_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr("ocr.ocr.read_voucher", lambda image_path: OcrResult())
+    monkeypatch.setattr(chat_import, "IMG_DIR", tmp_path / "images")
+    target = _target(tmp_path)
+    target.csv_path.parent.mkdir(parents=True)
+    init_csv(str(target.csv_path))
+    live = {"data_id": "false_123@g.us_LIVE", "timestamp": "8:00 a.\u00a0m., 9/12/2025", "sender": "Nicole"}
+    append_csv(live, str(target.csv_path))
+    append_jsonl(live, str(target.jsonl_path))
+
+    summary = chat_import.import_chat_export(_write_export(tmp_path), target=target, workers=1, sheets=False)
+    state = load_cache(
+        cache_path=str(target.cache_path),
+        csv_path=str(target.csv_path),
+        jsonl_path=str(target.jsonl_path),
+    )
+
+    assert summary.imported == 1
+    assert state.last_id == "false_123@g.us_LIVE"
+    assert len(state.processed_ids) == 2
+
+
+def test_sheets_failures_do_not_abort_the_import(tmp_path, monkeypatch):
+    def failing_sheets(record):
+        raise ConnectionError("sin red")
+
+    monkeypatch.setattr("ocr.ocr.read_voucher", lambda image_path: OcrResult())
+    monkeypatch.setattr(chat_import, "IMG_DIR", tmp_path / "images")
+    monkeypatch.setattr(chat_import, "export_to_sheets", failing_sheets)
+    target = _target(tmp_path)
+
+    summary = chat_import.import_chat_export(_write_export(tmp_path), target=target, workers=1, sheets=True)
+
+    assert summary.imported == 1
+    assert summary.sheets_failed == 1
+    assert summary.to_dict()["sheets_failed"] == 1
+
+
+class BrokenVouchers:
+    def upsert(self, record, chat):
+        raise sqlite3.OperationalError("database is locked")
+
+
+def test_voucher_store_failures_do_not_abort_the_import(tmp_path, monkeypatch):
+    monkeypatch.setattr("ocr.ocr.read_voucher", lambda image_path: OcrResult(values={"monto": "150"}))
+    monkeypatch.setattr(chat_import, "IMG_DIR", tmp_path / "images")
+    target = _target(tmp_path)
+
+    summary = chat_import.import_chat_export(
+        _write_export(tmp_path), target=target, workers=1, sheets=False, vouchers=BrokenVouchers()
+    )
+
+    assert summary.imported == 1
+    assert len(target.jsonl_path.read_text(encoding="utf-8").splitlines()) == 1
+    assert load_cache(cache_path=str(target.cache_path), use_cache_file=True).processed_ids
+
+
+def test_import_refreshes_the_monthly_partitions(tmp_path, monkeypatch):
+    monkeypatch.setattr("ocr.ocr.read_voucher", lambda image_path: OcrResult(values={"monto": "150"}))
+    monkeypatch.setattr(chat_import, "IMG_DIR", tmp_path / "images")
+    target = _target(tmp_path)
+    monkeypatch.setattr(
+        "app.whatsapp_processing.partitions.exported_jsonl_paths", lambda: [target.jsonl_path]
+    )
+    root = tmp_path / "partitions"
+    # La captura en vivo ya particionó febrero: diciembre es un mes cerrado.
+    target.jsonl_path.parent.mkdir(parents=True)
+    append_jsonl(
+        {"data_id": "msg-live", "timestamp": "9:00 a. m., 2/2/2026", "monto": "40", "Balance": "INGRESO"},
+        str(target.jsonl_path),
+    )
+    write_partitions(root=root)
+
+    chat_import.import_chat_export(
+        _write_export(tmp_path), target=target, workers=1, sheets=False, partitions=root
+    )
+
+    frame = read_partitions(["2025-12"], root=root)
+    imported = json.loads(target.jsonl_path.read_text(encoding="utf-8").splitlines()[-1])
+    assert list(frame["data_id"]) == [imported["data_id"]]
+    assert frame["monto"].tolist() == [150.0]
+    assert existing_months(root) == ["2025-12", "2026-02"]
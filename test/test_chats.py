@@ -0,0 +1,37 @@
+from app.whatsapp_processing import chats
+from app.whatsapp_processing.constants import CACHE_FILE, CHAT_NAME, CSV_FILE
+
+
+def test_primary_chat_keeps_legacy_paths():
+    target = chats.chat_target(CHAT_NAME)
+
+    assert target.csv_path == CSV_FILE
+    assert target.cache_path == CACHE_FILE
+
+
+def test_other_chats_get_their_own_partition():
+    target = chats.chat_target("Comprobantes Sede Norte")
+
+    assert target.csv_path.parent.name == "comprobantes_sede_norte"
+    assert target.csv_path != CSV_FILE
+
+
+def test_build_chat_targets_skips_duplicates():
+    targets = chats.build_chat_targets(["A", " A ", "B", ""])
+
+    assert [target.name for target in targets] == ["A", "B"]
+
+
+def test_prepare_chat_target_creates_partition(tmp_path):
+    target = chats.ChatTarget(
+        name="Sede",
+        csv_path=tmp_path / "sede" / "comprobantes.csv",
+        jsonl_path=tmp_path / "sede" / "comprobantes.jsonl",
+        cache_path=tmp_path / "sede" / "wa_cache.json",
+    )
+
+    state = chats.prepare_chat_target(target)
+
+    assert target.csv_path.exists()
+    assert len(state.processed_ids) == 0
+    assert state.last_id == ""
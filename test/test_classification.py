@@ -0,0 +1,141 @@
+import asyncio
+
+from app.whatsapp_processing import classification, processing
+from app.whatsapp_processing.rejections import MessageRejected, RejectionReason
+from app.whatsapp_processing.snapshot import MessageSnapshot
+
+_FORM = "Nombre de cliente: Ana\nMétodo de pago: YAPE\nCuenta: EUNOIA"
+_PRE = "[10:15 a. m., 7/12/2025] Equipo Ventas: "
+
+
+def _snapshot(**overrides):
+    values = {
+        "data_id": "msg-1",
+        "pre_plain_text": _PRE,
+        "text": _FORM,
+        "blob_src": "blob:https://web.whatsapp.com/1",
+        "data_src": "data:image/jpeg;base64,AAAA",
+    }
+    values.update(overrides)
+    return MessageSnapshot(**values)
+
+
+def test_snapshot_exposes_timestamp_and_sender():
+    snapshot = _snapshot()
+
+    assert snapshot.timestamp == "10:15 a. m., 7/12/2025"
+    assert snapshot.sender == "Equipo Ventas"
+
+
+def test_classify_rejects_cheap_stages_first():
+    assert classification.classify_snapshot(_snapshot(pre_plain_text=""))[0] is (
+        RejectionReason.NO_COPYABLE_BLOCK
+    )
+    assert classification.classify_snapshot(_snapshot(text=""))[0] is RejectionReason.NO_TEXT
+    assert classification.classify_snapshot(_snapshot(blob_src="", data_src=""))[0] is (
+        RejectionReason.NO_BLOB_IMAGE
+    )
+
+
+def test_classify_returns_fields_for_candidates():
+    reason, fields = classification.classify_snapshot(_snapshot(blob_src=""))
+
+    assert reason is None
+    assert fields["Nombre de cliente"] == "Ana"
+
+
+def test_classify_keeps_free_form_voucher_captions():
+    reason, fields = classification.classify_snapshot(_snapshot(text="CLAVE: 0912"))
+
+    assert reason is None
+    assert fields["Detalle"] == "CLAVE: 0912"
+
+
+def test_classify_filters_senders(monkeypatch):
+    monkeypatch.setattr(classification, "ALLOWED_SENDERS", frozenset({"Caja"}))
+
+    assert classification.classify_snapshot(_snapshot())[0] is RejectionReason.SENDER_NOT_ALLOWED
+
+
+def test_rejected_messages_never_wait_for_the_blob(monkeypatch):
+    class DummyMessage:
+        async def get_attribute(self, name):
+            return "msg-1"
+
+    async def fake_snapshot(message, data_id):
+        return _snapshot(data_id=data_id, blob_src="", data_src="")
+
+    async def fail_wait(message):
+        raise AssertionError("no debería esperar la imagen")
+
+    monkeypatch.setattr(processing, "read_message_snapshot", fake_snapshot)
+    monkeypatch.setattr(processing, "wait_for_blob_src", fail_wait)
+
+    try:
+        asyncio.run(processing.process_message_strict(None, DummyMessage()))
+    except MessageRejected as rejected:
+        assert rejected.reason is RejectionReason.NO_BLOB_IMAGE
+    else:  # pragma: no cover - el mensaje debe descartarse
+        raise AssertionError("se esperaba MessageRejected")
+
+
+def _data_url(image):
+    import base64
+
+    import cv2
+
+    ok, encoded = cv2.imencode(".jpg", image)
+    assert ok
+    return "data:image/jpeg;base64," + base64.b64encode(encoded.tobytes()).decode("ascii")
+
+
+def _voucher_thumbnail():
+    import numpy as np
+
+    image = np.full((100, 56, 3), 255, dtype=np.uint8)
+    image[:30] = (140, 30, 110)  # cabecera morada
+    for top in (40, 55, 70, 85):
+        image[top : top + 4, 8:48] = 40
+    return image
+
+
+def _photo_thumbnail():
+    import numpy as np
+
+    rng = np.random.default_rng(7)
+    return rng.integers(0, 256, size=(75, 100, 3), dtype=np.uint8)
+
+
+def test_thumbnail_triage_keeps_vouchers_and_guesses_provider():
+    from app.whatsapp_processing.triage import triage_thumbnail
+
+    verdict = triage_thumbnail(_data_url(_voucher_thumbnail()))
+
+    assert verdict.is_voucher is True
+    assert verdict.provider == "yape"
+    assert triage_thumbnail("data:image/jpeg;base64,AAAA").is_voucher is None
+
+
+def test_photo_thumbnails_never_wait_for_the_blob(monkeypatch):
+    class DummyMessage:
+        async def get_attribute(self, name):
+            return "msg-photo"
+
+    async def fake_snapshot(message, data_id):
+        return _snapshot(data_id=data_id, blob_src="", data_src=_data_url(_photo_thumbnail()))
+
+    async def fail_wait(message):
+        raise AssertionError("no debería esperar la imagen")
+
+    monkeypatch.setattr(processing, "read_message_snapshot", fake_snapshot)
+    monkeypatch.setattr(processing, "wait_for_blob_src", fail_wait)
+
+    try:
+        asyncio.run(processing.process_message_strict(None, DummyMessage()))
+    except MessageRejected as rejected:
+        assert rejected.reason is RejectionReason.NOT_A_VOUCHER_IMAGE
+    else:  # pragma: no cover - el mensaje debe descartarse
+        raise AssertionError("se esperaba MessageRejected")
+
+    monkeypatch.setattr(classification, "THUMBNAIL_TRIAGE", False)
+    assert classification.classify_snapshot(_snapshot(data_src=_data_url(_photo_thumbnail())))[0] is None
@@ -0,0 +1,92 @@
+import asyncio
+
+from playwright._impl._errors import TargetClosedError
+
+from app import connection_supervisor
+from app.login_state import LoginState, wait_for_login_state
+
+
+class DummyPage:
+    def __init__(self, name):
+        self.name = name
+
+    def is_closed(self):
+        return False
+
+    async def evaluate(self, script):
+        return 1
+
+
+def test_supervisor_resumes_session_after_disconnect(monkeypatch):
+    pages = iter([DummyPage("first"), DummyPage("second")])
+    supervisor = connection_supervisor.ConnectionSupervisor()
+
+    async def fake_connect(*, max_attempts=connection_supervisor.RECONNECT_MAX_ATTEMPTS):
+        supervisor.page = next(pages)
+        return True
+
+    monkeypatch.setattr(supervisor, "connect", fake_connect)
+    seen = []
+
+    async def session(page):
+        seen.append(page.name)
+        if page.name == "first":
+            raise TargetClosedError("Target closed")
+
+    asyncio.run(supervisor.run(session))
+
+    assert seen == ["first", "second"]
+    assert supervisor.reconnections == 1
+
+
+def test_supervisor_propagates_unrelated_errors(monkeypatch):
+    supervisor = connection_supervisor.ConnectionSupervisor()
+    supervisor.page = DummyPage("only")
+
+    async def session(page):
+        raise ValueError("boom")
+
+    try:
+        asyncio.run(supervisor.run(session))
+    except ValueError:
+        pass
+    else:  # pragma: no cover - la excepción es obligatoria
+        raise AssertionError("Se esperaba ValueError")
+    assert supervisor.reconnections == 0
+
+
+def test_backoff_delay_grows_and_is_capped():
+    first = connection_supervisor.backoff_delay(1)
+    later = connection_supervisor.backoff_delay(20)
+
+    assert first <= connection_supervisor.RECONNECT_BASE_DELAY_SECONDS * 1.2
+    assert later <= connection_supervisor.RECONNECT_MAX_DELAY_SECONDS * 1.2
+
+
+class SelectorPage:
+    def __init__(self, visible):
+        self.visible = visible
+
+    async def wait_for_selector(self, selector, state=None, timeout=None):
+        if selector in self.visible:
+            return object()
+        await asyncio.sleep(timeout / 1000)
+        raise TimeoutError(selector)
+
+
+def test_wait_for_login_state_returns_first_visible_indicator():
+    page = SelectorPage({'text="Pasos para iniciar sesión"'})
+
+    state = asyncio.run(wait_for_login_state(page, timeout=0.05))
+
+    assert state == LoginState.LOGGED_OUT
+
+
+def test_wait_for_login_state_ignores_known_state():
+    page = SelectorPage({'text="Pasos para iniciar sesión"'})
+
+    state = asyncio.run(
+        wait_for_login_state(page, timeout=0.05, ignore=LoginState.LOGGED_OUT)
+    )
+
+    assert state == LoginState.UNKNOWN
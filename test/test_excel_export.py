@@ -0,0 +1,79 @@
+import json
+
+from openpyxl import load_workbook
+
+from app.whatsapp_processing.excel_export import HEADERS, export_workbooks, workbook_path
+
+
+def _record(data_id, timestamp, monto, **fields):
+    record = {
+        "data_id": data_id,
+        "timestamp": timestamp,
+        "servicio_o_descripcion": "PAGO A TIENDA",
+        "Método de pago": "Yape",
+        "Balance": "INGRESO",
+        "monto": monto,
+        "numero_operacion": "06562708",
+    }
+    record.update(fields)
+    return record
+
+
+def _write_jsonl(path, records):
+    path.write_text("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records), encoding="utf-8")
+    return path
+
+
+def _rows(path):
+    workbook = load_workbook(path)
+    return workbook.active.title, list(workbook.active.iter_rows(values_only=True))
+
+
+def test_monthly_workbooks_follow_the_sheets_layout(tmp_path):
+    history = _write_jsonl(
+        tmp_path / "comprobantes.jsonl",
+        [
+            _record("msg-1", "11:28 p. m., 7/12/2025", "15"),
+            _record("msg-2", "9:05 a. m., 8/12/2025", "5", Balance="EGRESO"),
+            _record("msg-1", "11:28 p. m., 7/12/2025", "15"),
+            _record("msg-3", "9:05 a. m., 2/1/2026", "20"),
+            _record("msg-4", "sin fecha", "20"),
+        ],
+    )
+
+    assert export_workbooks([history], root=tmp_path) == {"2025-12": 2, "2026-01": 1}
+
+    title, rows = _rows(workbook_path("2025-12", tmp_path))
+    assert title == "DICIEMBRE"
+    assert rows[1][1:] == HEADERS
+    assert rows[2][1] == "DIC"
+    assert (rows[2][2].year, rows[2][2].month, rows[2][2].day) == (2025, 12, 7)
+    assert rows[2][6:] == ("BCP", "REALIZADO", 15, 0, "=I3-J3")
+    assert rows[3][8:] == (0, 5, "=K3+I4-J4")
+
+
+def test_only_open_months_are_regenerated(tmp_path):
+    history = _write_jsonl(
+        tmp_path / "comprobantes.jsonl",
+        [_record("msg-1", "11:28 p. m., 7/12/2025", "15"), _record("msg-3", "9:05 a. m., 2/1/2026", "20")],
+    )
+    export_workbooks([history], root=tmp_path)
+    closed = workbook_path("2025-12", tmp_path).stat().st_mtime_ns
+
+    _write_jsonl(
+        history,
+        [
+            _record("msg-0", "8:00 a. m., 1/12/2025", "99"),
+            _record("msg-1", "11:28 p. m., 7/12/2025", "15"),
+            _record("msg-3", "9:05 a. m., 2/1/2026", "20"),
+            _record("msg-4", "9:10 a. m., 3/1/2026", "10"),
+        ],
+    )
+    assert export_workbooks([history], root=tmp_path) == {"2026-01": 2}
+    assert workbook_path("2025-12", tmp_path).stat().st_mtime_ns == closed
+    assert export_workbooks([history], root=tmp_path, full=True) == {"2025-12": 2, "2026-01": 2}
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "comprobantes.jsonl",
+        "comprobantes_2025-12.xlsx",
+        "comprobantes_2026-01.xlsx",
+    ]
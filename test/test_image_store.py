@@ -0,0 +1,118 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from app.whatsapp_processing.image_store import ImageStore, content_hash
+
+
+def _jpeg(seed):
+    rng = np.random.default_rng(seed)
+    image = np.full((240, 160, 3), 255, dtype=np.uint8)
+    image[:60] = rng.integers(0, 256, size=3)
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 100])
+    assert ok
+    return encoded.tobytes()
+
+
+def test_identical_images_are_stored_once(tmp_path):
+    store = ImageStore(tmp_path)
+    data = _jpeg(1)
+
+    first = store.put("msg-1", data, "jpg", month="2025-10")
+    second = store.put("msg-2", data, "jpg", month="2025-12")
+
+    digest = content_hash(data)
+    assert first == second == tmp_path / digest[:2] / digest[2:4] / f"{digest}.jpg"
+    assert store.distinct == 1
+    reloaded = ImageStore(tmp_path)
+    assert reloaded.path_for("msg-2") == first
+    assert reloaded.entry("msg-2").month == "2025-10"
+
+
+def test_compaction_recompresses_and_archives_old_months(tmp_path):
+    store = ImageStore(tmp_path)
+    old = _jpeg(2)
+    store.put("old-1", old, "jpg", month="2025-10")
+    store.put("old-2", old, "jpg", month="2025-10")
+    recent = store.put("new-1", _jpeg(3), "jpg", month="2025-12")
+
+    summary = store.compact("2025-11", webp_quality=80, archive=True)
+
+    assert summary.recompressed == 1
+    assert summary.archived == 1
+    assert (tmp_path / "archive" / "2025-10.zip").exists()
+    assert store.path_for("old-1") is None
+    assert cv2.imdecode(np.frombuffer(store.read_bytes("old-2"), np.uint8), cv2.IMREAD_COLOR) is not None
+    assert store.path_for("new-1") == recent
+
+    reloaded = ImageStore(tmp_path)
+    assert reloaded.entry("old-1").member.endswith(".webp")
+    assert len(tmp_path.joinpath("index.jsonl").read_text(encoding="utf-8").splitlines()) == 3
+    # El mismo contenido vuelve a guardarse suelto para que el OCR pueda leerlo.
+    assert reloaded.put("old-3", old, "jpg").exists()
+
+
+def test_recorded_paths_stay_readable_after_archiving(tmp_path):
+    store = ImageStore(tmp_path)
+    data = _jpeg(4)
+    recorded = str(store.put("msg-1", data, "jpg", month="2025-09"))
+
+    store.compact("2025-11", archive=True)
+
+    assert not Path(recorded).exists()
+    reloaded = ImageStore(tmp_path)
+    assert reloaded.locate(recorded).archived
+    assert reloaded.read_recorded(recorded) == data
+
+
+def test_compaction_keeps_index_lines_appended_by_the_capture(tmp_path):
+    ImageStore(tmp_path).put("old-1", _jpeg(6), "jpg", month="2025-09")
+    compactor = ImageStore(tmp_path)
+    capture = ImageStore(tmp_path)
+    fresh = capture.put("new-1", _jpeg(7), "jpg", month="2025-12")
+
+    compactor.compact("2025-11", archive=True)
+
+    reloaded = ImageStore(tmp_path)
+    assert reloaded.entry("old-1").archived
+    assert reloaded.path_for("new-1") == fresh
+
+
+def test_index_reflects_months_archived_before_a_failure(tmp_path, monkeypatch):
+    store = ImageStore(tmp_path)
+    store.put("sep-1", _jpeg(8), "jpg", month="2025-09")
+    store.put("oct-1", _jpeg(9), "jpg", month="2025-10")
+    calls = []
+
+    def flaky_recompress(file, quality):
+        calls.append(file)
+        if len(calls) > 1:
+            raise OSError("disco lleno")
+        return file, 0, 0
+
+    monkeypatch.setattr(store, "_recompress", flaky_recompress)
+    try:
+        store.compact("2025-11", webp_quality=80, archive=True)
+    except OSError:
+        pass
+    else:
+        raise AssertionError("la compactación debía fallar")
+
+    reloaded = ImageStore(tmp_path)
+    assert reloaded.entry("sep-1").archived
+    assert reloaded.read_bytes("sep-1") == _jpeg(8)
+    assert not reloaded.entry("oct-1").archived
+
+
+def test_flat_images_are_migrated_and_resolved_by_their_old_path(tmp_path):
+    data = _jpeg(5)
+    (tmp_path / "msg-9.jpg").write_bytes(data)
+    store = ImageStore(tmp_path)
+
+    assert store.migrate_flat() == 1
+
+    assert not (tmp_path / "msg-9.jpg").exists()
+    assert store.read_recorded("outputs\\images\\msg-9.jpg") == data
+    assert store.read_recorded(data_id="msg-9") == data
+    assert store.locate("outputs\\images\\otro.jpg") is None
@@ -0,0 +1,44 @@
+import logging
+
+from telemetry import logs
+
+
+def _record(message, **fields):
+    record = logging.LogRecord("app.whatsapp_processing.processing", logging.INFO, __file__, 1, message, None, None)
+    for name, value in fields.items():
+        setattr(record, name, value)
+    return record
+
+
+def test_sampler_suppresses_repeated_discards_per_data_id():
+    sampler = logs.DiscardSampler(interval=60.0)
+
+    assert sampler.filter(_record("descartado", data_id="msg-1", stage="no_text"))
+    assert not sampler.filter(_record("descartado", data_id="msg-1", stage="no_text"))
+    assert sampler.filter(_record("descartado", data_id="msg-2", stage="no_text"))
+    assert sampler.filter(_record("sin data-id"))
+
+
+def test_structured_formatter_appends_fields():
+    formatter = logs.StructuredFormatter("%(message)s")
+    record = _record("Comprobante procesado", data_id="msg-1", stage="captured", duration_ms=12.345)
+
+    assert formatter.format(record) == (
+        "Comprobante procesado | data_id=msg-1 stage=captured duration_ms=12.3"
+    )
+
+
+def test_setup_logging_writes_capture_records_to_rotating_file(tmp_path):
+    log_file = tmp_path / "capture.log"
+    logs.setup_logging(log_file, max_bytes=1_000, backup_count=1)
+    try:
+        logging.getLogger("app.whatsapp_processing.processing").info(
+            "Se descartó un mensaje", extra={"data_id": "msg-9", "stage": "no_fields"}
+        )
+        logging.getLogger("otro.modulo").info("no va al archivo")
+    finally:
+        logs.shutdown_logging()
+
+    content = log_file.read_text(encoding="utf-8")
+    assert "data_id=msg-9 stage=no_fields" in content
+    assert "no va al archivo" not in content
@@ -0,0 +1,55 @@
+import asyncio
+import base64
+
+from app.whatsapp_processing import media
+from app.whatsapp_processing.image_store import content_hash, shard_path
+
+
+def _stored(root, content):
+    return root / shard_path(content_hash(content), "png")
+
+
+class DummyPage:
+    def __init__(self):
+        self.calls = []
+
+    async def evaluate(self, script, arg=None):
+        self.calls.append(dict(arg))
+        return {
+            key: {"b64": base64.b64encode(key.encode()).decode(), "contentType": "image/png"}
+            if url.startswith("blob:")
+            else {"error": "TypeError: Failed to fetch"}
+            for key, url in arg.items()
+        }
+
+
+def test_download_blobs_reports_errors_per_item(monkeypatch, tmp_path):
+    monkeypatch.setattr(media, "IMG_DIR", tmp_path)
+    page = DummyPage()
+
+    results = asyncio.run(
+        media.download_blobs(page, {"msg-1": "blob:one", "msg-2": "http://bad", "msg-3": ""})
+    )
+
+    assert len(page.calls) == 1
+    assert results["msg-1"].ok
+    assert results["msg-1"].path == str(_stored(tmp_path, b"msg-1"))
+    assert _stored(tmp_path, b"msg-1").read_bytes() == b"msg-1"
+    assert "Failed to fetch" in results["msg-2"].error
+    assert not results["msg-3"].ok
+
+
+def test_concurrent_downloads_share_one_evaluate(monkeypatch, tmp_path):
+    monkeypatch.setattr(media, "IMG_DIR", tmp_path)
+    page = DummyPage()
+
+    async def _run():
+        async with media.blob_batching(page, max_batch=3, linger_ms=1_000):
+            return await asyncio.gather(
+                *(media.download_from_blob(page, f"blob:{index}", f"msg-{index}") for index in range(3))
+            )
+
+    paths = asyncio.run(_run())
+
+    assert len(page.calls) == 1
+    assert paths == [str(_stored(tmp_path, f"msg-{index}".encode())) for index in range(3)]
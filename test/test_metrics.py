@@ -0,0 +1,37 @@
+from telemetry.metrics import MetricsRegistry
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        registry.observe("ocr", value)
+
+    text = registry.render()
+
+    assert 'wa_stage_latency_seconds_bucket{stage="ocr",le="0.1"} 1' in text
+    assert 'wa_stage_latency_seconds_bucket{stage="ocr",le="1.0"} 3' in text
+    assert 'wa_stage_latency_seconds_bucket{stage="ocr",le="+Inf"} 4' in text
+    assert 'wa_stage_latency_seconds_count{stage="ocr"} 4' in text
+
+
+def test_counters_are_grouped_by_labels():
+    registry = MetricsRegistry()
+    registry.count("wa_discarded_messages_total", reason="no_text")
+    registry.count("wa_discarded_messages_total", reason="no_text")
+    registry.count("wa_discarded_messages_total", reason="no_fields")
+
+    assert registry.counter_value("wa_discarded_messages_total", reason="no_text") == 2
+    text = registry.render()
+    assert "# TYPE wa_discarded_messages_total counter" in text
+    assert 'wa_discarded_messages_total{reason="no_fields"} 1' in text
+
+
+def test_gauges_keep_the_last_value():
+    registry = MetricsRegistry()
+    registry.gauge("wa_browser_dom_nodes", 1200, help_text="Nodos del DOM.")
+    registry.gauge("wa_browser_dom_nodes", 900, help_text="Nodos del DOM.")
+
+    assert registry.gauge_value("wa_browser_dom_nodes") == 900
+    text = registry.render()
+    assert "# TYPE wa_browser_dom_nodes gauge" in text
+    assert "wa_browser_dom_nodes 900" in text
@@ -0,0 +1,49 @@
+from app import multi_chat
+from app.chat_navigation import SidePaneChat, chats_with_activity
+from app.whatsapp_processing.chats import chat_target
+from app.whatsapp_processing.loop import CaptureCursor
+
+
+def _cursors(targets, swept=True):
+    return {
+        target.name: CaptureCursor(set(), "", "", target=target, swept=swept)
+        for target in targets
+    }
+
+
+def test_chats_with_activity_keeps_watched_order():
+    entries = [
+        SidePaneChat("Otro", unread=4),
+        SidePaneChat("Sede B", unread=1),
+        SidePaneChat("Sede A", unread=2),
+        SidePaneChat("Sede C"),
+    ]
+
+    assert chats_with_activity(entries, ["Sede A", "Sede B", "Sede C"]) == [
+        "Sede A",
+        "Sede B",
+    ]
+
+
+def test_select_chats_to_visit_only_returns_changed_chats():
+    targets = [chat_target(name) for name in ("Sede A", "Sede B", "Sede C")]
+    cursors = _cursors(targets)
+    entries = [
+        SidePaneChat("Sede A", selected=True),
+        SidePaneChat("Sede B"),
+        SidePaneChat("Sede C", unread=3),
+    ]
+
+    selected = multi_chat.select_chats_to_visit(targets, cursors, entries)
+
+    assert [target.name for target in selected] == ["Sede A", "Sede C"]
+
+
+def test_select_chats_to_visit_includes_chats_without_initial_sweep():
+    targets = [chat_target(name) for name in ("Sede A", "Sede B")]
+    cursors = _cursors(targets)
+    cursors["Sede B"].swept = False
+
+    selected = multi_chat.select_chats_to_visit(targets, cursors, [])
+
+    assert [target.name for target in selected] == ["Sede B"]
@@ -0,0 +1,112 @@
+import asyncio
+
+import cv2
+import numpy as np
+
+from app.whatsapp_processing import processing
+from app.whatsapp_processing.near_duplicates import MultiIndexHash, NearDuplicateIndex, hamming, phash
+from ocr.engines import OcrResult
+
+
+def _voucher(seed=0):
+    rng = np.random.default_rng(seed)
+    image = np.full((640, 360, 3), 245, dtype=np.uint8)
+    image[:120] = (140, 30, 110)
+    for top in range(160, 600, 40):
+        width = int(rng.integers(120, 320))
+        image[top : top + 14, 20:width] = 30
+    return image
+
+
+def _write(path, image, quality=95):
+    cv2.imwrite(str(path), image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return str(path)
+
+
+def test_phash_survives_recompression_and_resizing():
+    original = _voucher()
+    forwarded = cv2.imdecode(
+        cv2.imencode(".jpg", cv2.resize(original, (270, 480)), [cv2.IMWRITE_JPEG_QUALITY, 40])[1],
+        cv2.IMREAD_COLOR,
+    )
+
+    assert hamming(phash(original), phash(forwarded)) <= 6
+    assert hamming(phash(original), phash(_voucher(seed=5))) > 6
+
+
+def test_multi_index_returns_only_close_hashes():
+    index = MultiIndexHash(max_distance=1)
+    far = (1 << 63) | (1 << 40) | 0b0111
+    for value in (0b0000, 0b0001, 0b0111, far):
+        index.add(value, bin(value))
+
+    assert sorted(index.search(0b0000)) == [(0, "0b0"), (1, "0b1")]
+    assert list(MultiIndexHash(max_distance=3).search(0)) == []
+
+
+def test_index_persists_and_finds_neighbours(tmp_path):
+    index = NearDuplicateIndex(tmp_path / "phash.jsonl")
+    value_hash, match = index.lookup(_write(tmp_path / "a.jpg", _voucher()))
+    assert match is None
+    index.add(value_hash, "msg-1", {"monto": "150"})
+
+    reloaded = NearDuplicateIndex(tmp_path / "phash.jsonl")
+    _, match = reloaded.lookup(_write(tmp_path / "b.jpg", _voucher(), quality=50))
+
+    assert match.data_id == "msg-1"
+    assert match.record == {"monto": "150"}
+
+
+def _fake_ocr(calls, operation="12345678"):
+    def fake_ocr(image_path):
+        calls.append(image_path)
+        return OcrResult(
+            values={"monto": "150", "numero_operacion": operation},
+            boxes={"monto": (10, 100, 200, 120), "numero_operacion": (10, 400, 300, 420)},
+            size=(640, 360),
+        )
+
+    return fake_ocr
+
+
+def test_near_duplicate_is_only_marked_by_default(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(processing, "read_voucher", _fake_ocr(calls))
+    monkeypatch.setattr(processing, "PHASH_INDEX_FILE", tmp_path / "phash.jsonl")
+    first = _write(tmp_path / "first.jpg", _voucher())
+    asyncio.run(processing._read_voucher_fields("msg-1", first, 0.0))
+
+    monkeypatch.setattr(processing, "read_voucher", _fake_ocr(calls, operation="87654321"))
+    repost = _write(tmp_path / "repost.jpg", cv2.resize(_voucher(), (300, 533)), quality=60)
+    duplicate = asyncio.run(processing._read_voucher_fields("msg-2", repost, 0.0))
+
+    assert len(calls) == 2
+    assert duplicate["duplicado_de"] == "msg-1"
+    assert duplicate["numero_operacion"] == "87654321"
+
+
+def test_near_duplicate_reuses_the_extraction_only_when_crops_agree(tmp_path, monkeypatch):
+    calls, checks = [], []
+    agree = [True]
+
+    def fake_confirm(image_path, values, boxes):
+        checks.append((values["numero_operacion"], boxes["numero_operacion"]))
+        return agree[0]
+
+    monkeypatch.setattr(processing, "PHASH_REUSE_OCR", True)
+    monkeypatch.setattr(processing, "read_voucher", _fake_ocr(calls))
+    monkeypatch.setattr(processing, "confirm_voucher", fake_confirm)
+    monkeypatch.setattr(processing, "PHASH_INDEX_FILE", tmp_path / "phash.jsonl")
+    first = _write(tmp_path / "first.jpg", _voucher())
+    repost = _write(tmp_path / "repost.jpg", cv2.resize(_voucher(), (300, 533)), quality=60)
+
+    original = asyncio.run(processing._read_voucher_fields("msg-1", first, 0.0))
+    duplicate = asyncio.run(processing._read_voucher_fields("msg-2", repost, 0.0))
+    agree[0] = False
+    disputed = asyncio.run(processing._read_voucher_fields("msg-3", repost, 0.0))
+
+    assert "duplicado_de" not in original
+    assert duplicate["duplicado_de"] == disputed["duplicado_de"] == "msg-1"
+    assert duplicate["numero_operacion"] == "12345678"
+    assert checks[0] == ("12345678", [0.0278, 0.625, 0.8333, 0.6562])
+    assert len(calls) == 2
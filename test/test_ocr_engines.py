@@ -0,0 +1,249 @@
+import cv2
+import numpy as np
+
+from ocr.adaptive import AdaptiveReader, confirm_fields, downscale
+from ocr.engines import (
+    OcrCascade,
+    OcrResult,
+    TextDetection,
+    field_confidence,
+    lines_from_tesseract_data,
+)
+from telemetry import METRICS
+
+VOUCHER = [
+    TextDetection("Yapeaste!", 0.95),
+    TextDetection("S/ 150", 0.9),
+    TextDetection("Nro. de operación", 0.92),
+    TextDetection("12345678", 0.88),
+]
+
+
+class DummyEngine:
+    def __init__(self, name, detections=None, *, available=True, error=None):
+        self.name = name
+        self.detections = detections or []
+        self._available = available
+        self.error = error
+        self.calls = 0
+
+    def available(self):
+        return self._available
+
+    def read(self, image):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.detections
+
+
+def test_fast_engine_result_is_accepted_without_fallback():
+    METRICS.reset()
+    fast = DummyEngine("fast", VOUCHER)
+    slow = DummyEngine("slow", VOUCHER)
+
+    result = OcrCascade([fast, slow], min_confidence=0.6).extract("voucher.jpg")
+
+    assert (result.amount, result.operation, result.engine) == ("150", "12345678", "fast")
+    assert slow.calls == 0
+    assert METRICS.counter_value("wa_ocr_engine_total", engine="fast", result="accepted") == 1
+
+
+def test_low_confidence_falls_back_and_keeps_best_fields():
+    METRICS.reset()
+    shaky = [TextDetection(text, 0.3 if "1234" in text else conf) for text, conf, _box in VOUCHER]
+    fast = DummyEngine("fast", shaky)
+    slow = DummyEngine("slow", VOUCHER[:2])
+
+    result = OcrCascade([fast, slow], min_confidence=0.6).extract("voucher.jpg")
+
+    assert slow.calls == 1
+    assert result.amount == "150"
+    assert result.operation == "12345678"
+    assert result.confidence == {"monto": 0.9, "numero_operacion": 0.3}
+    assert result.engines_tried == ["fast", "slow"]
+    assert METRICS.counter_value("wa_ocr_engine_total", engine="fast", result="fallback") == 1
+    assert METRICS.counter_value("wa_ocr_engine_total", engine="slow", result="exhausted") == 1
+
+
+def test_fallback_prefers_the_later_engine_over_a_higher_score():
+    wrong = [
+        TextDetection("S/ 15", 0.55),
+        TextDetection("Nro. de operación", 0.9),
+        TextDetection("12845678", 0.55),
+    ]
+    fast = DummyEngine("fast", wrong)
+    slow = DummyEngine("slow", [TextDetection(text, 0.5, box) for text, _conf, box in VOUCHER])
+
+    result = OcrCascade([fast, slow], min_confidence=0.6).extract("voucher.jpg")
+
+    assert (result.amount, result.operation) == ("150", "12345678")
+    assert result.confidence["monto"] == 0.5
+
+
+def test_field_confidence_comes_from_the_line_the_value_was_read_from():
+    detections = [
+        TextDetection("S/ 15", 0.30, (10, 10, 80, 40)),
+        TextDetection("15 dic. 2025 - 03:15 p. m.", 0.97, (10, 60, 300, 90)),
+        TextDetection("Nro. de operación", 0.9),
+        TextDetection("12345678", 0.88, (10, 120, 200, 150)),
+    ]
+
+    result = OcrResult.from_detections("fast", detections)
+
+    assert result.values == {"monto": "15", "numero_operacion": "12345678"}
+    assert result.confidence["monto"] == 0.30
+    assert result.boxes["monto"] == (10, 10, 80, 40)
+    assert result.boxes["numero_operacion"] == (10, 120, 200, 150)
+    assert not result.is_confident(0.6)
+
+
+def test_unavailable_and_failing_engines_are_skipped():
+    broken = DummyEngine("broken", error=RuntimeError("boom"))
+    missing = DummyEngine("missing", VOUCHER, available=False)
+    slow = DummyEngine("slow", VOUCHER)
+
+    result = OcrCascade([missing, broken, slow]).extract("voucher.jpg")
+
+    assert missing.calls == 0
+    assert result.engine == "slow"
+    assert result.operation == "12345678"
+
+
+def test_tesseract_words_are_grouped_into_lines():
+    data = {
+        "text": ["S/", "150.00", "", "12345678"],
+        "conf": ["90", "70", "-1", "80"],
+        "block_num": [1, 1, 1, 2],
+        "par_num": [1, 1, 1, 1],
+        "line_num": [1, 1, 2, 1],
+        "left": [10, 40, 0, 10],
+        "top": [5, 5, 0, 50],
+        "width": [20, 60, 0, 90],
+        "height": [12, 12, 0, 12],
+    }
+
+    lines = lines_from_tesseract_data(data)
+
+    assert [line.text for line in lines] == ["S/ 150.00", "12345678"]
+    assert lines[0].box == (10, 5, 100, 17)
+    assert abs(lines[0].confidence - 0.8) < 1e-9
+    assert field_confidence("150.00", lines) == lines[0].confidence
+
+
+class ShapeEngine:
+    """Responde según el tamaño de la imagen recibida (reducida, recorte o completa)."""
+
+    name = "shape"
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.shapes = []
+
+    def available(self):
+        return True
+
+    def read(self, image):
+        self.shapes.append(image.shape[:2])
+        height, width = image.shape[:2]
+        kind = "small" if width < 1000 else ("crop" if height < 1000 else "full")
+        return self.responses.get(kind, [])
+
+
+def _voucher_image(tmp_path):
+    path = tmp_path / "voucher.png"
+    cv2.imwrite(str(path), np.full((2400, 1080, 3), 255, dtype=np.uint8))
+    return str(path)
+
+
+def test_downscale_never_enlarges():
+    image = np.zeros((100, 50, 3), dtype=np.uint8)
+
+    assert downscale(image, 200)[1] == 1.0
+    reduced, scale = downscale(np.zeros((2400, 1080, 3), dtype=np.uint8), 1200)
+    assert reduced.shape[:2] == (1200, 540)
+    assert scale == 0.5
+
+
+def test_confident_downscaled_read_stops_early(tmp_path):
+    METRICS.reset()
+    engine = ShapeEngine({"small": VOUCHER})
+
+    result = AdaptiveReader(OcrCascade([engine]), max_side=1200).read(_voucher_image(tmp_path))
+
+    assert engine.shapes == [(1200, 540)]
+    assert result.to_record()["numero_operacion_confianza"] == "0.88"
+    assert METRICS.counter_value("wa_ocr_adaptive_total", step="downscaled") == 1
+
+
+def test_low_confidence_field_is_reread_from_a_crop(tmp_path):
+    METRICS.reset()
+    small = [
+        TextDetection("S/ 150", 0.9, (10, 100, 200, 120)),
+        TextDetection("Nro. de operación", 0.9, (10, 400, 300, 420)),
+        TextDetection("12345678", 0.3, (10, 430, 300, 450)),
+    ]
+    engine = ShapeEngine({"small": small, "crop": [TextDetection("Operación 12345678", 0.95, (0, 5, 600, 45))]})
+
+    result = AdaptiveReader(OcrCascade([engine], min_confidence=0.6), max_side=1200).read(
+        _voucher_image(tmp_path)
+    )
+
+    assert len(engine.shapes) == 2
+    assert engine.shapes[1][0] < 1000
+    assert result.confidence == {"monto": 0.9, "numero_operacion": 0.95}
+    assert result.boxes["numero_operacion"][1] == 780 + 5
+    assert METRICS.counter_value("wa_ocr_adaptive_total", step="crop") == 1
+
+
+def test_crop_from_a_cheaper_engine_does_not_override_a_precise_read(tmp_path):
+    small_fast = [
+        TextDetection("S/ 15", 0.3, (10, 100, 200, 120)),
+        TextDetection("Nro. de operación", 0.9, (10, 400, 300, 420)),
+        TextDetection("12345678", 0.3, (10, 430, 300, 450)),
+    ]
+    fast = ShapeEngine({"small": small_fast, "crop": [TextDetection("S/ 15", 0.95, (0, 5, 600, 45))]})
+    fast.name = "fast"
+    slow = ShapeEngine({"small": [TextDetection("S/ 150", 0.5, (10, 100, 200, 120)), *small_fast[1:]]})
+    slow.name = "slow"
+
+    result = AdaptiveReader(OcrCascade([fast, slow], min_confidence=0.6), max_side=1200).read(
+        _voucher_image(tmp_path)
+    )
+
+    # Hubo recorte, pero su 0.95 del motor rápido no pisa el 0.5 del preciso.
+    assert any(height < 1000 for height, _width in fast.shapes[1:])
+    assert result.amount == "150"
+    assert result.sources["monto"] == "slow"
+
+
+def test_missing_field_escalates_to_full_resolution(tmp_path):
+    METRICS.reset()
+    engine = ShapeEngine({"small": VOUCHER[:2], "full": VOUCHER})
+
+    result = AdaptiveReader(OcrCascade([engine]), max_side=1200).read(_voucher_image(tmp_path))
+
+    assert engine.shapes == [(1200, 540), (2400, 1080)]
+    assert result.operation == "12345678"
+    assert METRICS.counter_value("wa_ocr_adaptive_total", step="full") == 1
+
+
+def test_adaptive_read_records_the_image_size(tmp_path):
+    engine = ShapeEngine({"small": VOUCHER})
+
+    result = AdaptiveReader(OcrCascade([engine]), max_side=1200).read(_voucher_image(tmp_path))
+
+    assert result.size == (2400, 1080)
+
+
+def test_confirm_fields_reads_only_the_field_bands(tmp_path):
+    boxes = {"monto": (0.0, 0.1, 0.5, 0.11), "numero_operacion": (0.0, 0.5, 0.5, 0.51)}
+    band = [TextDetection("S/ 150", 0.9), TextDetection("Nro. de operación 12345678", 0.9)]
+    engine = ShapeEngine({"crop": band})
+    cascade = OcrCascade([engine])
+    image_path = _voucher_image(tmp_path)
+
+    assert confirm_fields(cascade, image_path, {"monto": "150", "numero_operacion": "12345678"}, boxes)
+    assert all(height < 1000 for height, _width in engine.shapes)
+    assert not confirm_fields(cascade, image_path, {"monto": "15", "numero_operacion": "12345678"}, boxes)
+    assert not confirm_fields(cascade, image_path, {"monto": "150", "numero_operacion": "12345678"}, {})
@@ -0,0 +1,109 @@
+import multiprocessing
+import os
+
+import ocr.ocr as ocr_module
+from ocr import pool
+from ocr.engines import OcrCascade, TextDetection
+from telemetry import METRICS
+
+
+class PidEngine:
+    """Motor falso: el monto leído es el PID del proceso que hizo la lectura."""
+
+    name = "pid"
+    loads = []
+
+    def available(self):
+        return True
+
+    def preload(self):
+        PidEngine.loads.append(os.getpid())
+
+    def read(self, image):
+        return [
+            TextDetection(f"S/ {os.getpid()}", 0.9),
+            TextDetection("Nro. de operación", 0.9),
+            TextDetection("12345678", 0.9),
+        ]
+
+
+def test_pool_reads_in_workers_with_models_loaded_once(monkeypatch, tmp_path):
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return  # con ``spawn`` los hijos no heredan el motor falso
+    monkeypatch.setattr(ocr_module, "_cascade", OcrCascade([PidEngine()]))
+    monkeypatch.setattr(ocr_module, "OCR_ADAPTIVE", False)
+    image = str(tmp_path / "voucher.png")
+    METRICS.reset()
+
+    worker_pool = pool.start_ocr_pool(2)
+    try:
+        assert pool.active_pool() is worker_pool
+        results = [ocr_module.read_voucher(image) for _ in range(4)]
+    finally:
+        worker_pool.close()
+
+    assert PidEngine.loads == [os.getpid()]
+    assert all(result.operation == "12345678" for result in results)
+    assert str(os.getpid()) not in {result.amount for result in results}
+    assert pool.active_pool() is None
+    # Las métricas de los hijos vuelven con cada lectura.
+    assert METRICS.counter_value("wa_ocr_engine_total", engine="pid", result="accepted") == 4
+    assert METRICS.counter_value("wa_ocr_fields_total", field="monto", found="true") == 4
+    assert METRICS.histogram_samples("ocr") == 4
+
+
+def test_confirmation_runs_in_the_pool(monkeypatch, tmp_path):
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return
+    parent = os.getpid()
+    monkeypatch.setattr(ocr_module, "_cascade", OcrCascade([PidEngine()]))
+    monkeypatch.setattr(
+        ocr_module,
+        "confirm_fields",
+        lambda cascade, image_path, values, boxes: os.getpid() != parent and values["monto"] == "15",
+    )
+    METRICS.reset()
+
+    worker_pool = pool.start_ocr_pool(1, preload=False)
+    try:
+        confirmed = ocr_module.confirm_voucher(str(tmp_path / "voucher.png"), {"monto": "15"}, {})
+    finally:
+        worker_pool.close()
+
+    assert confirmed
+    assert METRICS.counter_value("wa_ocr_confirm_total", result="agree") == 1
+
+
+def test_pool_is_disabled_without_workers():
+    assert pool.start_ocr_pool(0) is None
+    assert pool.active_pool() is None
+
+
+class DummyExecutor:
+    def __init__(self):
+        self.shut_down = False
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+def test_concurrent_restarts_rebuild_the_pool_once(monkeypatch):
+    worker_pool = pool.OcrWorkerPool(1, start_method="fork")
+    created = []
+
+    def fake_create():
+        created.append(DummyExecutor())
+        return created[-1]
+
+    monkeypatch.setattr(worker_pool, "_create_executor", fake_create)
+    broken = DummyExecutor()
+    worker_pool._executor = broken
+
+    worker_pool._restart(broken)
+    worker_pool._restart(broken)
+
+    assert broken.shut_down
+    assert len(created) == 1 and worker_pool._executor is created[0]
+    # El padre ya tiene hilos: el pool recreado no vuelve a usar ``fork``.
+    assert worker_pool.start_method in ("forkserver", "spawn")
+    assert not worker_pool.shares_models
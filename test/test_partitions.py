@@ -0,0 +1,109 @@
+import json
+
+import pandas as pd
+
+from app.whatsapp_processing.partitions import (
+    existing_months,
+    parse_amounts,
+    parse_timestamps,
+    read_partitions,
+    write_partitions,
+)
+from app.whatsapp_processing.reports import main, monthly_report, totals_by
+
+
+def _record(data_id, timestamp, monto, **fields):
+    record = {
+        "data_id": data_id,
+        "timestamp": timestamp,
+        "sender": "Nicole",
+        "Método de pago": "Yape",
+        "Cuenta": "JoseGerardo",
+        "Balance": "INGRESO",
+        "monto": monto,
+    }
+    record.update(fields)
+    return record
+
+
+def _write_jsonl(path, records):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records), encoding="utf-8")
+    return path
+
+
+def test_parsers_are_vectorized_and_tolerant():
+    moments = parse_timestamps(pd.Series(["11:28 p. m., 7/12/2025", "12:05 a. m., 1/1/2026", "sin fecha"]))
+    assert moments.iloc[0] == pd.Timestamp(2025, 12, 7, 23, 28)
+    assert moments.iloc[1] == pd.Timestamp(2026, 1, 1, 0, 5)
+    assert pd.isna(moments.iloc[2])
+
+    amounts = parse_amounts(pd.Series(["15", "15,50", "1,234.50", "?", "S/ 15.00", "S/. 1,250.00", "-S/ 8,00"]))
+    assert amounts.iloc[:3].tolist() == [15.0, 15.5, 1234.5]
+    assert pd.isna(amounts.iloc[3])
+    assert amounts.iloc[4:].tolist() == [15.0, 1250.0, -8.0]
+
+
+def test_partitions_are_typed_and_closed_months_are_kept(tmp_path):
+    root = tmp_path / "partitions"
+    history = _write_jsonl(
+        tmp_path / "chat" / "comprobantes.jsonl",
+        [
+            _record("msg-1", "11:28 p. m., 7/12/2025", "15"),
+            _record("msg-2", "9:05 a. m., 8/12/2025", "20.00", **{"Método de pago": "Plin"}),
+            _record("msg-3", "9:05 a. m., 2/1/2026", "129.90", Balance="EGRESO"),
+        ],
+    )
+
+    assert write_partitions([history], root=root) == ["2025-12", "2026-01"]
+    frame = read_partitions(root=root)
+    assert frame["monto"].dtype == "float64"
+    assert str(frame["metodo"].dtype) == "category"
+    assert sorted(frame["metodo"].astype(str)) == ["BCP", "BCP", "LIGO"]
+    assert frame["fecha"].min() == pd.Timestamp(2025, 12, 7)
+
+    # Un registro tardío de diciembre no reescribe el mes cerrado; enero sí se actualiza.
+    _write_jsonl(
+        history,
+        [
+            _record("msg-0", "8:00 a. m., 1/12/2025", "99"),
+            _record("msg-1", "11:28 p. m., 7/12/2025", "15"),
+            _record("msg-3", "9:05 a. m., 2/1/2026", "129.90", Balance="EGRESO"),
+            _record("msg-4", "9:10 a. m., 3/1/2026", "10"),
+        ],
+    )
+    assert write_partitions([history], root=root) == ["2026-01"]
+    assert existing_months(root) == ["2025-12", "2026-01"]
+    assert len(read_partitions(["2025-12"], root=root)) == 2
+    assert write_partitions([history], root=root, full=True) == ["2025-12", "2026-01"]
+    assert sorted(read_partitions(["2025-12"], root=root)["data_id"]) == ["msg-0", "msg-1"]
+
+
+def test_reports_split_income_and_expense(tmp_path, capsys, monkeypatch):
+    root = tmp_path / "partitions"
+    history = _write_jsonl(
+        tmp_path / "chat" / "comprobantes.jsonl",
+        [
+            _record("msg-1", "11:28 p. m., 7/12/2025", "15"),
+            _record("msg-2", "9:05 p. m., 7/12/2025", "20", **{"Método de pago": "Plin", "sender": "Ana"}),
+            _record("msg-3", "9:05 a. m., 8/12/2025", "5", Balance="EGRESO"),
+            _record("msg-4", "9:30 a. m., 8/12/2025", "7", Balance=""),
+        ],
+    )
+    write_partitions([history], root=root)
+
+    report = monthly_report(root=root)
+    day = report["dia"].loc[pd.Timestamp(2025, 12, 7)]
+    assert (day["ingresos"], day["egresos"], day["comprobantes"]) == (35.0, 0.0, 2)
+    assert report["dia"].loc[pd.Timestamp(2025, 12, 8), "neto"] == -5.0
+    assert report["dia"].loc[pd.Timestamp(2025, 12, 8), "sin_balance"] == 7.0
+    assert report["metodo"].loc["BCP", "neto"] == 10.0
+    assert report["remitente"].loc["Ana", "ingresos"] == 20.0
+    assert totals_by(read_partitions(root=root), "cuenta").loc["JOSEGERARDO", "comprobantes"] == 4
+
+    monkeypatch.setattr("app.whatsapp_processing.partitions.exported_jsonl_paths", lambda: [history])
+    main(["--root", str(root), "--por", "metodo", "--actualizar"])
+    output = capsys.readouterr().out
+    assert "LIGO" in output
+    assert "4 comprobantes, neto 30.00" in output
+    assert "7.00 en comprobantes sin Balance" in output
@@ -0,0 +1,53 @@
+import json
+
+from app.whatsapp_processing.payment_index import (
+    PaymentIndex,
+    message_date,
+    normalize_amount,
+    normalize_operation,
+)
+
+
+def _record(data_id, operation="06562708", amount="15", method="YAPE"):
+    return {
+        "data_id": data_id,
+        "timestamp": "11:28 p. m., 7/12/2025",
+        "Método de pago": method,
+        "monto": amount,
+        "numero_operacion": operation,
+    }
+
+
+def test_normalizers():
+    assert normalize_operation("0656-2708") == "6562708"
+    assert normalize_operation("012") == ""
+    assert normalize_amount("15") == normalize_amount("15,00") == "15.00"
+    assert normalize_amount("1,234.5") == "1234.50"
+    assert normalize_amount("abc") == ""
+    assert message_date("11:28 p. m., 7/12/2025") == "2025-12-07"
+
+
+def test_lookup_separates_operation_and_payment_matches(tmp_path):
+    index = PaymentIndex(tmp_path / "payments.jsonl")
+    index.add(_record("msg-1"))
+    index.add(_record("msg-2", operation="99887766"))
+
+    matches = index.lookup(_record("msg-3", operation="6562708", amount="15.00"))
+
+    assert matches.operation == ["msg-1"]
+    assert matches.payment == ["msg-2"]
+    assert not index.lookup(_record("msg-4", operation="11112222", amount="20"))
+    assert len(PaymentIndex.load(tmp_path / "payments.jsonl")) == 2
+
+
+def test_rebuild_reads_exported_history(tmp_path):
+    history = tmp_path / "comprobantes.jsonl"
+    history.write_text(
+        "\n".join(json.dumps(_record(f"msg-{index}", operation=f"1000000{index}")) for index in range(3)),
+        encoding="utf-8",
+    )
+
+    index = PaymentIndex.rebuild([history, tmp_path / "missing.jsonl"], tmp_path / "payments.jsonl")
+
+    assert len(index) == 3
+    assert index.lookup(_record("new", operation="10000002")).operation == ["msg-2"]
@@ -1,6 +1,8 @@
 import asyncio
 
 from app.whatsapp_processing import processing
+from app.whatsapp_processing.payment_index import PaymentIndex
+from app.whatsapp_processing.rejections import MessageRejected, RejectionReason
 
 
 class DummyLocator:
@@ -48,6 +50,9 @@ class DummyRows:
     def nth(self, index):
         return self._elements[index]
 
+    def by_id(self, data_id):
+        return next(element for element in self._elements if element.identifier == data_id)
+
 async def _run_process(elements, monkeypatch, processor):
     page = DummyPage()
     processed_ids = set()
@@ -57,6 +62,7 @@ async def _run_process(elements, monkeypatch, processor):
     dummy_rows = DummyRows(elements)
 
     monkeypatch.setattr(processing, "message_rows", lambda page: dummy_rows)
+    monkeypatch.setattr(processing, "message_row_by_id", lambda page, data_id: dummy_rows.by_id(data_id))
     monkeypatch.setattr(processing, "append_csv", lambda payload: None)
     monkeypatch.setattr(processing, "append_jsonl", lambda payload: None)
     monkeypatch.setattr(processing, "export_to_sheets", lambda payload: None)
@@ -74,7 +80,7 @@ async def _run_process(elements, monkeypatch, processor):
 def test_process_visible_top_to_bottom_handles_thousand(monkeypatch):
     elements = [DummyElement(f"msg-{index}") for index in range(1000)]
 
-    async def processor(page, element):
+    async def processor(page, element, expected_id=""):
         return {
             "data_id": element.identifier,
             "timestamp": f"ts-{element.identifier}",
@@ -97,7 +103,7 @@ def test_process_visible_top_to_bottom_handles_thousand(monkeypatch):
 def test_process_visible_top_to_bottom_skips_errors(monkeypatch):
     elements = [DummyElement(f"msg-{index}") for index in range(10)]
 
-    async def processor(page, element):
+    async def processor(page, element, expected_id=""):
         if element.identifier == "msg-5":
             raise RuntimeError("boom")
         return {
@@ -115,4 +121,155 @@ def test_process_visible_top_to_bottom_skips_errors(monkeypatch):
 
     assert new_count == 9
     assert last_id == "msg-9"
-    assert "msg-5" not in processed_ids
\ No newline at end of file
+    assert "msg-5" not in processed_ids
+
+def test_process_visible_top_to_bottom_commits_in_chat_order(monkeypatch):
+    elements = [DummyElement(f"msg-{index}") for index in range(6)]
+    exported = []
+    running = []
+    peak = []
+
+    async def processor(page, element, expected_id=""):
+        running.append(element.identifier)
+        peak.append(len(running))
+        # Los primeros mensajes terminan último para forzar el reordenamiento.
+        await asyncio.sleep(0.001 * (6 - int(element.identifier.split("-")[1])))
+        running.remove(element.identifier)
+        return {
+            "data_id": element.identifier,
+            "timestamp": "ts",
+            "sender": "sender",
+            "raw_text": element.identifier,
+            "img_src_blob": "blob",
+            "img_src_data": "data",
+            "img_file": "/tmp/file.jpg",
+        }
+
+    rows = DummyRows(elements)
+    monkeypatch.setattr(processing, "message_rows", lambda page: rows)
+    monkeypatch.setattr(processing, "message_row_by_id", lambda page, data_id: rows.by_id(data_id))
+    monkeypatch.setattr(processing, "append_csv", lambda payload: exported.append(payload["data_id"]))
+    monkeypatch.setattr(processing, "append_jsonl", lambda payload: None)
+    monkeypatch.setattr(processing, "export_to_sheets", lambda payload: None)
+    monkeypatch.setattr(processing, "process_message_strict", processor)
+
+    new_count, last_id, _ = asyncio.run(
+        processing.process_visible_top_to_bottom(
+            DummyPage(), set(), "", "", verbose_print=False, concurrency=3
+        )
+    )
+
+    assert new_count == 6
+    assert last_id == "msg-5"
+    assert exported == [f"msg-{index}" for index in range(6)]
+    assert max(peak) <= 3
+
+
+def test_process_visible_top_to_bottom_respects_max_new_with_concurrency(monkeypatch):
+    elements = [DummyElement(f"msg-{index}") for index in range(10)]
+
+    async def processor(page, element, expected_id=""):
+        return {
+            "data_id": element.identifier,
+            "timestamp": "ts",
+            "sender": "sender",
+            "raw_text": element.identifier,
+            "img_src_blob": "blob",
+            "img_src_data": "data",
+            "img_file": "/tmp/file.jpg",
+        }
+
+    rows = DummyRows(elements)
+    monkeypatch.setattr(processing, "message_rows", lambda page: rows)
+    monkeypatch.setattr(processing, "message_row_by_id", lambda page, data_id: rows.by_id(data_id))
+    monkeypatch.setattr(processing, "append_csv", lambda payload: None)
+    monkeypatch.setattr(processing, "append_jsonl", lambda payload: None)
+    monkeypatch.setattr(processing, "export_to_sheets", lambda payload: None)
+    monkeypatch.setattr(processing, "process_message_strict", processor)
+
+    processed_ids = set()
+    new_count, last_id, _ = asyncio.run(
+        processing.process_visible_top_to_bottom(
+            DummyPage(), processed_ids, "", "", verbose_print=False, max_new=4, concurrency=3
+        )
+    )
+
+    assert new_count == 4
+    assert last_id == "msg-3"
+    assert processed_ids == {f"msg-{index}" for index in range(4)}
+
+
+def _payment(data_id, operation="06562708", amount="15"):
+    return {
+        "data_id": data_id,
+        "timestamp": "11:28 p. m., 7/12/2025",
+        "Método de pago": "YAPE",
+        "monto": amount,
+        "numero_operacion": operation,
+    }
+
+
+def test_capture_flags_repeated_operations(monkeypatch, tmp_path):
+    exported = []
+    payments = PaymentIndex(tmp_path / "payments.jsonl")
+    payments.add(_payment("old"))
+
+    async def processor(page, element, expected_id=""):
+        return _payment(element.identifier, amount="30")
+
+    rows = DummyRows([DummyElement("new")])
+    monkeypatch.setattr(processing, "message_rows", lambda page: rows)
+    monkeypatch.setattr(processing, "message_row_by_id", lambda page, data_id: rows.by_id(data_id))
+    monkeypatch.setattr(processing, "append_csv", lambda payload: exported.append(payload))
+    monkeypatch.setattr(processing, "append_jsonl", lambda payload: None)
+    monkeypatch.setattr(processing, "export_to_sheets", lambda payload: None)
+    monkeypatch.setattr(processing, "process_message_strict", processor)
+
+    asyncio.run(
+        processing.process_visible_top_to_bottom(
+            DummyPage(), set(), "", "", verbose_print=False, payments=payments
+        )
+    )
+
+    assert exported[0]["duplicado_operacion"] == "old"
+    assert "duplicado_pago" not in exported[0]
+    assert len(payments) == 2
+
+
+def test_tasks_read_the_row_they_were_scheduled_for(monkeypatch):
+    elements = [DummyElement(f"msg-{index}") for index in range(6)]
+    rows = DummyRows(elements)
+    seen = []
+
+    async def processor(page, element, expected_id=""):
+        seen.append((expected_id, element.identifier))
+        if len(seen) == 1:
+            # Llega un mensaje nuevo arriba mientras las tareas esperan turno.
+            elements.insert(0, DummyElement("arrived"))
+        await asyncio.sleep(0)
+        return {"data_id": element.identifier, "timestamp": element.identifier, "raw_text": "x"}
+
+    monkeypatch.setattr(processing, "message_rows", lambda page: rows)
+    monkeypatch.setattr(processing, "message_row_by_id", lambda page, data_id: rows.by_id(data_id))
+    monkeypatch.setattr(processing, "append_csv", lambda payload: None)
+    monkeypatch.setattr(processing, "append_jsonl", lambda payload: None)
+    monkeypatch.setattr(processing, "export_to_sheets", lambda payload: None)
+    monkeypatch.setattr(processing, "process_message_strict", processor)
+
+    asyncio.run(
+        processing.process_visible_top_to_bottom(
+            DummyPage(), set(), "", "", verbose_print=False, concurrency=3
+        )
+    )
+
+    assert all(expected == found for expected, found in seen)
+
+
+def test_process_message_strict_rejects_a_moved_row():
+    try:
+        asyncio.run(processing.process_message_strict(None, DummyElement("other"), "msg-1"))
+    except MessageRejected as rejected:
+        assert rejected.reason is RejectionReason.ERROR
+        assert rejected.data_id == "msg-1"
+    else:  # pragma: no cover - el mensaje debe descartarse
+        raise AssertionError("se esperaba MessageRejected")
@@ -0,0 +1,135 @@
+import json
+
+from app.whatsapp_processing.reconciliation import captured_frame, load_statement, main, reconcile
+
+
+def _record(data_id, timestamp, monto, operation="", method="Yape", balance="INGRESO"):
+    return {
+        "data_id": data_id,
+        "timestamp": timestamp,
+        "sender": "Nicole",
+        "Método de pago": method,
+        "Balance": balance,
+        "monto": monto,
+        "numero_operacion": operation,
+    }
+
+
+def _captured(tmp_path):
+    history = tmp_path / "comprobantes.jsonl"
+    records = [
+        _record("msg-1", "11:28 p. m., 7/12/2025", "15", "06562708"),
+        _record("msg-2", "9:05 a. m., 8/12/2025", "20.00", "11112222"),
+        _record("msg-3", "9:10 a. m., 8/12/2025", "35", ""),
+        _record("msg-4", "9:15 a. m., 9/12/2025", "50", "99990000"),
+        _record("msg-5", "6:00 p. m., 9/12/2025", "12", "", method="Plin"),
+    ]
+    history.write_text("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records), encoding="utf-8")
+    return history
+
+
+def _statement(tmp_path):
+    path = tmp_path / "estado_bcp_diciembre.csv"
+    path.write_text(
+        "Movimientos de la cuenta\n"
+        "Cuenta;191-0000000\n"
+        "Fecha;Descripción operación;Monto;N° de operación\n"
+        "07/12/2025;YAPE ALDO ROJAS;15,00;0656-2708\n"
+        "08/12/2025;YAPE ANA;25,00;11112222\n"
+        "09/12/2025;YAPE LUIS;35,00;55556666\n"
+        "10/12/2025;YAPE SIN COMPROBANTE;80,00;77778888\n",
+        encoding="utf-8",
+    )
+    return path
+
+
+def test_statement_loader_finds_header_and_normalizes(tmp_path):
+    statement = load_statement(_statement(tmp_path))
+
+    assert statement["fila"].tolist() == [4, 5, 6, 7]
+    assert statement["operacion"].tolist()[0] == "6562708"
+    assert statement["monto"].tolist() == [15.0, 25.0, 35.0, 80.0]
+    assert set(statement["metodo"]) == {"BCP"}
+    assert statement["fecha"].dt.day.tolist() == [7, 8, 9, 10]
+
+
+def test_reconcile_splits_matched_conflicts_and_unmatched(tmp_path):
+    result = reconcile(load_statement(_statement(tmp_path)), captured_frame([_captured(tmp_path)]))
+
+    matched = dict(zip(result.matched["data_id"], result.matched["criterio"]))
+    assert matched == {"msg-1": "operacion", "msg-3": "monto_fecha_metodo"}
+    assert result.conflicts[["data_id", "motivo"]].values.tolist() == [["msg-2", "monto_o_fecha_distintos"]]
+    assert result.unmatched_statement["operacion"].tolist() == ["77778888"]
+    # El pago por Plin no se busca en un estado de BCP.
+    assert result.unmatched_captured["data_id"].tolist() == ["msg-4"]
+
+
+def test_cli_writes_the_four_sets(tmp_path, capsys, monkeypatch):
+    history = _captured(tmp_path)
+    monkeypatch.setattr("app.whatsapp_processing.reconciliation.exported_jsonl_paths", lambda: [history])
+
+    main([str(_statement(tmp_path)), "--salida", str(tmp_path / "out")])
+
+    assert sorted(p.name for p in (tmp_path / "out").iterdir()) == [
+        "comprobantes_sin_movimiento.csv",
+        "conciliados.csv",
+        "conflictos.csv",
+        "estado_sin_comprobante.csv",
+    ]
+    assert "2 conciliados, 1 conflictos" in capsys.readouterr().out
+
+
+def test_repeated_amounts_are_paired_one_to_one_by_closest_day(tmp_path):
+    history = tmp_path / "comprobantes.jsonl"
+    records = [
+        _record("msg-1", "9:00 a. m., 8/12/2025", "15"),
+        _record("msg-2", "9:30 a. m., 8/12/2025", "15"),
+        _record("msg-3", "9:00 a. m., 9/12/2025", "15"),
+    ]
+    history.write_text("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records), encoding="utf-8")
+    statement = tmp_path / "estado_bcp.csv"
+    statement.write_text(
+        "Fecha;Descripción operación;Monto\n"
+        "09/12/2025;YAPE A;15,00\n"
+        "08/12/2025;YAPE B;15,00\n"
+        "08/12/2025;YAPE C;15,00\n"
+        "08/12/2025;YAPE D;15,00\n",
+        encoding="utf-8",
+    )
+
+    result = reconcile(load_statement(statement), captured_frame([history]))
+
+    pairs = dict(zip(result.matched["descripcion"], result.matched["data_id"]))
+    assert pairs == {"YAPE A": "msg-3", "YAPE B": "msg-1", "YAPE C": "msg-2"}
+    assert result.unmatched_statement["descripcion"].tolist() == ["YAPE D"]
+    assert result.unmatched_captured.empty
+
+
+def test_direction_is_part_of_the_match_and_currency_amounts_are_read(tmp_path):
+    history = tmp_path / "comprobantes.jsonl"
+    records = [
+        _record("msg-1", "9:00 a. m., 8/12/2025", "15"),
+        _record("msg-2", "9:30 a. m., 8/12/2025", "1250", balance="EGRESO"),
+        _record("msg-3", "10:00 a. m., 8/12/2025", "40", "33334444"),
+    ]
+    history.write_text("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records), encoding="utf-8")
+    statement = tmp_path / "estado_bcp.csv"
+    statement.write_text(
+        "Fecha;Descripción operación;Monto;N° de operación\n"
+        "08/12/2025;CARGO A;-S/ 15.00;\n"
+        "08/12/2025;CARGO B;-S/. 1,250.00;\n"
+        "08/12/2025;CARGO C;-40,00;33334444\n"
+        "08/12/2025;ILEGIBLE;pendiente;\n",
+        encoding="utf-8",
+    )
+
+    loaded = load_statement(statement)
+    assert loaded["direccion"].tolist() == ["EGRESO", "EGRESO", "EGRESO"]
+    assert loaded["monto"].tolist() == [15.0, 1250.0, 40.0]
+
+    result = reconcile(loaded, captured_frame([history]))
+
+    assert result.matched["data_id"].tolist() == ["msg-2"]
+    assert result.conflicts[["data_id", "motivo"]].values.tolist() == [["msg-3", "direccion_distinta"]]
+    assert result.unmatched_statement["descripcion"].tolist() == ["CARGO A"]
+    assert result.unmatched_captured["data_id"].tolist() == ["msg-1"]
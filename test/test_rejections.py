@@ -0,0 +1,138 @@
+import asyncio
+
+from app.whatsapp_processing import processing
+from app.whatsapp_processing.rejections import (
+    MessageRejected,
+    RejectionCache,
+    RejectionReason,
+)
+
+
+class DummyLocator:
+    async def count(self):
+        return 0
+
+
+class DummyElement:
+    def __init__(self, identifier):
+        self.identifier = identifier
+
+    async def get_attribute(self, name):
+        if name == "data-id":
+            return self.identifier
+        return ""
+
+    async def scroll_into_view_if_needed(self, timeout=None):
+        return
+
+
+class DummyRows:
+    def __init__(self, elements):
+        self._elements = elements
+
+    async def count(self):
+        return len(self._elements)
+
+    def nth(self, index):
+        return self._elements[index]
+
+    def by_id(self, data_id):
+        return next(element for element in self._elements if element.identifier == data_id)
+
+
+class DummyPage:
+    def __init__(self):
+        self.timeouts = []
+
+    def locator(self, selector):
+        return DummyLocator()
+
+    async def wait_for_timeout(self, value):
+        self.timeouts.append(value)
+
+
+def test_permanent_rejections_are_always_skipped():
+    cache = RejectionCache()
+    cache.record("msg-1", RejectionReason.SENDER_NOT_ALLOWED, now=0.0)
+
+    assert cache.should_skip("msg-1", now=10_000.0)
+    assert not cache.should_skip("msg-2", now=0.0)
+
+
+def test_transient_rejections_are_retried_a_bounded_number_of_times():
+    cache = RejectionCache(max_retries=2, retry_seconds=30.0)
+    cache.record("msg-1", RejectionReason.IMAGE_NOT_LOADED, now=0.0)
+
+    assert cache.should_skip("msg-1", now=10.0)
+    assert not cache.should_skip("msg-1", now=31.0)
+
+    cache.record("msg-1", RejectionReason.IMAGE_NOT_LOADED, now=31.0)
+    cache.record("msg-1", RejectionReason.IMAGE_NOT_LOADED, now=62.0)
+
+    assert cache.should_skip("msg-1", now=1_000.0)
+
+
+def test_unrendered_or_edited_captions_are_retried():
+    cache = RejectionCache(max_retries=1, retry_seconds=30.0)
+    for reason in (RejectionReason.NO_BLOB_IMAGE, RejectionReason.NO_TEXT, RejectionReason.NO_FIELDS):
+        cache.record(reason.value, reason, now=0.0)
+
+        assert cache.should_skip(reason.value, now=10.0)
+        assert not cache.should_skip(reason.value, now=31.0)
+
+
+def test_thumbnail_rejections_are_retried():
+    cache = RejectionCache(max_retries=1, retry_seconds=30.0)
+    cache.record("msg-1", RejectionReason.NOT_A_VOUCHER_IMAGE, now=0.0)
+
+    assert not cache.should_skip("msg-1", now=31.0)
+
+
+def test_cache_evicts_least_recently_recorded_entries():
+    cache = RejectionCache(max_entries=2)
+    cache.record("msg-1", RejectionReason.NO_TEXT)
+    cache.record("msg-2", RejectionReason.NO_TEXT)
+    cache.record("msg-3", RejectionReason.NO_TEXT)
+
+    assert "msg-1" not in cache
+    assert len(cache) == 2
+
+
+def test_cache_round_trips_through_disk(tmp_path):
+    path = tmp_path / "wa_cache.rejections.json"
+    cache = RejectionCache()
+    cache.record("msg-1", RejectionReason.NO_BLOB_IMAGE, now=5.0)
+    cache.save(path)
+
+    restored = RejectionCache.load(path)
+
+    assert restored.reason("msg-1") is RejectionReason.NO_BLOB_IMAGE
+    assert not restored.dirty
+
+
+def test_process_visible_skips_cached_rejections(monkeypatch):
+    elements = [DummyElement(f"msg-{index}") for index in range(5)]
+    calls = []
+
+    async def processor(page, element, expected_id=""):
+        calls.append(element.identifier)
+        raise MessageRejected(RejectionReason.NO_FIELDS, element.identifier)
+
+    rows = DummyRows(elements)
+    monkeypatch.setattr(processing, "message_rows", lambda page: rows)
+    monkeypatch.setattr(processing, "message_row_by_id", lambda page, data_id: rows.by_id(data_id))
+    monkeypatch.setattr(processing, "process_message_strict", processor)
+
+    page = DummyPage()
+    rejections = RejectionCache()
+
+    async def _two_passes():
+        for _ in range(2):
+            await processing.process_visible_top_to_bottom(
+                page, set(), "", "", verbose_print=False, rejections=rejections
+            )
+
+    asyncio.run(_two_passes())
+
+    assert calls == [f"msg-{index}" for index in range(5)]
+    assert len(page.timeouts) == 5
@@ -0,0 +1,125 @@
+import asyncio
+
+from app import connection_supervisor
+from app.session_housekeeping import SessionHousekeeper, SessionMetrics
+from telemetry import METRICS
+
+
+class DummyCDP:
+    def __init__(self, heap_mb, nodes):
+        self.heap_mb = heap_mb
+        self.nodes = nodes
+        self.sent = []
+        self.handlers = {}
+
+    def on(self, event, handler):
+        self.handlers[event] = handler
+
+    async def send(self, method, params=None):
+        self.sent.append((method, params) if params else method)
+        if method != "Performance.getMetrics":
+            return {}
+        return {
+            "metrics": [
+                {"name": "JSHeapUsedSize", "value": self.heap_mb * 1024 * 1024},
+                {"name": "Nodes", "value": self.nodes},
+                {"name": "JSEventListeners", "value": 40},
+            ]
+        }
+
+
+class DummyContext:
+    def __init__(self, cdp):
+        self.cdp = cdp
+
+    async def new_cdp_session(self, page):
+        return self.cdp
+
+
+class DummyPage:
+    def __init__(self, cdp):
+        self.context = DummyContext(cdp)
+        self.routes = []
+        self.reloads = 0
+
+    def is_closed(self):
+        return False
+
+    async def evaluate(self, script):
+        return 1
+
+    async def route(self, pattern, handler):
+        self.routes.append(handler)
+
+    async def reload(self, wait_until=None, timeout=None):
+        self.reloads += 1
+        # Tras recargar, la pestaña vuelve a un tamaño normal.
+        self.context.cdp.heap_mb = 100
+
+
+def test_profile_pictures_are_blocked_by_chrome_without_routes():
+    METRICS.reset()
+    cdp = DummyCDP(100, 1000)
+    page = DummyPage(cdp)
+    asyncio.run(SessionHousekeeper().install(page))
+
+    assert page.routes == []
+    assert ("Network.setBlockedURLs", {"urls": ["*://pps.whatsapp.net/*"]}) in cdp.sent
+    failed = cdp.handlers["Network.loadingFailed"]
+    failed({"type": "Image", "blockedReason": "inspector"})
+    failed({"type": "Fetch", "errorText": "net::ERR_ABORTED"})
+    assert METRICS.counter_value("wa_blocked_requests_total", resource="image") == 1
+
+
+def test_reload_reason_waits_for_minimum_uptime():
+    housekeeper = SessionHousekeeper(max_heap_mb=500, max_dom_nodes=10_000, min_uptime=60)
+    page = DummyPage(DummyCDP(800, 1000))
+    asyncio.run(housekeeper.install(page))
+
+    metrics = asyncio.run(housekeeper.sample())
+
+    assert metrics == SessionMetrics(js_heap_bytes=800 * 1024 * 1024, dom_nodes=1000, listeners=40)
+    assert METRICS.gauge_value("wa_browser_dom_nodes") == 1000
+    assert housekeeper.reload_reason(metrics, now=housekeeper._loaded_at + 10) == ""
+    assert "800 MB" in housekeeper.reload_reason(metrics, now=housekeeper._loaded_at + 61)
+    crowded = SessionMetrics(js_heap_bytes=0, dom_nodes=20_000)
+    assert "20000 nodos" in housekeeper.reload_reason(crowded, now=housekeeper._loaded_at + 61)
+
+
+def test_reload_is_deferred_while_backfilling():
+    backfilling = [True]
+    housekeeper = SessionHousekeeper(max_heap_mb=500, min_uptime=0, defer_reload=lambda: backfilling[0])
+    metrics = SessionMetrics(js_heap_bytes=800 * 1024 * 1024, dom_nodes=1000)
+
+    assert housekeeper.reload_reason(metrics) == ""
+    backfilling[0] = False
+    assert "800 MB" in housekeeper.reload_reason(metrics)
+
+
+def test_supervisor_reloads_and_resumes_on_the_same_page(monkeypatch):
+    page = DummyPage(DummyCDP(800, 1000))
+    housekeeper = SessionHousekeeper(interval=0.01, max_heap_mb=500, min_uptime=0)
+    supervisor = connection_supervisor.ConnectionSupervisor(housekeeper=housekeeper)
+    supervisor.page = page
+
+    async def fail_connect(**kwargs):  # pragma: no cover - no debe reconectar
+        raise AssertionError("La recarga no debe reconectar")
+
+    monkeypatch.setattr(supervisor, "connect", fail_connect)
+    sessions = []
+
+    async def session(current):
+        sessions.append(current)
+        if len(sessions) == 1:
+            # Captura en curso hasta que el mantenimiento pida recargar.
+            await asyncio.sleep(10)
+
+    asyncio.run(supervisor.run(session))
+
+    assert sessions == [page, page]
+    assert page.reloads == 1 and housekeeper.reloads == 1
+    assert page.routes == []
+    sent = page.context.cdp.sent
+    assert sum(isinstance(item, tuple) and item[0] == "Network.setBlockedURLs" for item in sent) == 2
+    assert supervisor.reconnections == 0
+    assert METRICS.counter_value("wa_browser_reloads_total") >= 1
@@ -0,0 +1,79 @@
+import json
+from datetime import datetime
+
+from app.whatsapp_processing.text_blocks import parse_message_timestamp
+from app.whatsapp_processing.voucher_store import VoucherStore, main, normalize_phone
+
+
+def _record(data_id, timestamp, **fields):
+    record = {
+        "data_id": data_id,
+        "timestamp": timestamp,
+        "sender": "Nicole",
+        "Nombre de cliente": "Aldo Rojas",
+        "N° de cel": "+51929919731",
+        "Método de pago": "Yape",
+        "monto": "15",
+        "numero_operacion": "06562708",
+    }
+    record.update(fields)
+    return record
+
+
+def test_parse_message_timestamp_handles_both_meridiems():
+    assert parse_message_timestamp("11:28 p. m., 7/12/2025") == datetime(2025, 12, 7, 23, 28)
+    assert parse_message_timestamp("12:05 a. m., 1/1/2026") == datetime(2026, 1, 1, 0, 5)
+    assert parse_message_timestamp("sin fecha") is None
+    assert normalize_phone("+51 929 919 731") == "929919731"
+
+
+def test_query_by_phone_operation_and_date_range(tmp_path):
+    with VoucherStore(tmp_path / "vouchers.sqlite3") as store:
+        store.upsert(_record("msg-1", "11:28 p. m., 7/12/2025"))
+        store.upsert(_record("msg-2", "9:05 a. m., 8/12/2025", **{"N° de cel": "987654321"}))
+        store.upsert(_record("msg-3", "9:05 a. m., 2/1/2026", numero_operacion="77788899"))
+        store.upsert(_record("msg-1", "11:28 p. m., 7/12/2025", monto="20"))
+
+        assert len(store) == 3
+        assert [r["data_id"] for r in store.query(phone="929 919 731")] == ["msg-1", "msg-3"]
+        assert store.query(phone="929919731")[0]["monto"] == "20"
+        assert [r["data_id"] for r in store.query(operation="6562708")] == ["msg-1", "msg-2"]
+        assert [r["data_id"] for r in store.query(since="2025-12-08", until="2025-12-31")] == ["msg-2"]
+        assert [r["data_id"] for r in store.query(method="YAPE", limit=1)] == ["msg-1"]
+
+
+def test_filters_that_normalize_to_nothing_match_nothing(tmp_path):
+    with VoucherStore(tmp_path / "vouchers.sqlite3") as store:
+        store.upsert(_record("msg-1", "11:28 p. m., 7/12/2025", numero_operacion=""))
+
+        assert store.query(operation="123") == []
+        assert store.query(operation="0000000") == []
+        assert store.query(phone="sin número") == []
+        assert store.query(method=" ") == []
+        assert len(store.query()) == 1
+
+
+def test_cli_rebuilds_and_searches(tmp_path, capsys, monkeypatch):
+    history = tmp_path / "comprobantes.jsonl"
+    history.write_text(json.dumps(_record("msg-1", "11:28 p. m., 7/12/2025")) + "\n", encoding="utf-8")
+    monkeypatch.setattr(
+        "app.whatsapp_processing.voucher_store.exported_jsonl_paths", lambda: [history]
+    )
+
+    main(["--db", str(tmp_path / "vouchers.sqlite3"), "buscar", "--operacion", "06562708"])
+
+    output = capsys.readouterr().out
+    assert '"data_id": "msg-1"' in output
+    assert "1 comprobantes encontrados" in output
+
+
+def test_cli_rejects_an_operation_that_normalizes_to_nothing(tmp_path, capsys):
+    try:
+        main(["--db", str(tmp_path / "vouchers.sqlite3"), "buscar", "--operacion", "123"])
+    except SystemExit as exc:
+        assert exc.code == 2
+    else:
+        raise AssertionError("--operacion 123 debió rechazarse")
+
+    assert "--operacion '123'" in capsys.readouterr().err
+    assert not (tmp_path / "vouchers.sqlite3").exists()